@@ -0,0 +1,93 @@
+"""
+Order archival.
+
+Delivered and cancelled orders older than ORDER_ARCHIVE_AFTER_DAYS are moved,
+in batches, from ``orders``/``order_items`` into ``orders_archive`` and
+``order_items_archive``. Archived rows keep their ids and carry an
+``archive_month`` ("YYYY-MM") partition key, so the hot tables only hold
+recent and in-flight orders. History reads union both sides (see
+app/listings.py).
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+from app.models import (
+    ArchivedOrder, ArchivedOrderItem, Order, OrderItem, OrderStatus, PaymentQRCode
+)
+import logging
+import os
+import time
+
+ORDER_ARCHIVE_AFTER_DAYS = int(os.getenv("ORDER_ARCHIVE_AFTER_DAYS", "90"))
+ORDER_ARCHIVE_BATCH_SIZE = int(os.getenv("ORDER_ARCHIVE_BATCH_SIZE", "1000"))
+ORDER_ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ORDER_ARCHIVE_INTERVAL_SECONDS", "3600"))
+ARCHIVED_STATUSES = (OrderStatus.DELIVERED, OrderStatus.CANCELLED)  # Orders that won't change again
+
+logger = logging.getLogger(__name__)
+
+ORDER_COLUMNS = [column.name for column in Order.__table__.columns]
+ORDER_ITEM_COLUMNS = [column.name for column in OrderItem.__table__.columns]
+
+def ensure_order_indexes(engine):
+    """Create the orders and order_items indexes on databases whose tables predate them"""
+    for index in (*Order.__table__.indexes, *OrderItem.__table__.indexes):
+        index.create(bind=engine, checkfirst=True)
+
+def _month(dialect_name: str, column):
+    if dialect_name == "postgresql":
+        return func.to_char(column, "YYYY-MM")
+    return func.strftime("%Y-%m", column)
+
+def archive_batch(db: Session, cutoff: datetime, batch_size: int = ORDER_ARCHIVE_BATCH_SIZE) -> int:
+    """Move one batch of finished orders created before `cutoff`; returns how many were moved"""
+    # The newest order is never archived: SQLite hands out max(id) + 1, so moving it would let its id be reused
+    newest_id = select(func.max(Order.id)).scalar_subquery()
+    order_ids = db.execute(
+        select(Order.id)
+        .where(Order.status.in_(ARCHIVED_STATUSES), Order.created_at < cutoff, Order.id < newest_id)
+        .order_by(Order.id)
+        .limit(batch_size)
+    ).scalars().all()
+    if not order_ids:
+        return 0
+
+    dialect = db.get_bind().dialect.name
+    db.execute(insert(ArchivedOrder).from_select(
+        ORDER_COLUMNS + ["archive_month"],
+        select(*Order.__table__.columns, _month(dialect, Order.created_at)).where(Order.id.in_(order_ids))
+    ))
+    db.execute(insert(ArchivedOrderItem).from_select(
+        ORDER_ITEM_COLUMNS + ["archive_month"],
+        select(*OrderItem.__table__.columns, _month(dialect, Order.created_at))
+        .join(Order, Order.id == OrderItem.order_id)
+        .where(OrderItem.order_id.in_(order_ids))
+    ))
+    db.execute(delete(OrderItem).where(OrderItem.order_id.in_(order_ids)))
+    db.execute(delete(PaymentQRCode).where(PaymentQRCode.order_id.in_(order_ids)))  # Only needed while unpaid
+    db.execute(delete(Order).where(Order.id.in_(order_ids)))
+    db.commit()
+    return len(order_ids)
+
+def archive_orders(
+    db: Session,
+    older_than: timedelta = timedelta(days=ORDER_ARCHIVE_AFTER_DAYS),
+    batch_size: int = ORDER_ARCHIVE_BATCH_SIZE,
+    max_seconds: Optional[float] = None,
+) -> int:
+    """Archive finished orders older than `older_than`, one transaction per batch.
+
+    With `max_seconds`, stops after the batch that crosses the time budget and
+    leaves the rest for the next run.
+    """
+    cutoff = datetime.utcnow() - older_than
+    deadline = None if max_seconds is None else time.monotonic() + max_seconds
+    moved = 0
+    while deadline is None or time.monotonic() < deadline:
+        count = archive_batch(db, cutoff, batch_size)
+        if not count:
+            break
+        moved += count
+    if moved:
+        logger.info("Archived %s orders created before %s", moved, cutoff)
+    return moved
@@ -1,22 +1,31 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
+from typing import Dict, Optional
+from jose import JWTError, jwk, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import delete, select
 from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models import User, UserRole
+from app.cache import cache
+from app.database import SessionLocal
+from app.models import TokenRevocation, User, UserRole
 from app.schemas import TokenData
 import os
+import time
 
 # Security configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))  # Verified tokens remembered per process
+
+# Parsed once; given the raw secret, python-jose re-parses it on every decode
+SIGNING_KEY = jwk.construct(SECRET_KEY, ALGORITHM)
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a plain password against its hash"""
@@ -64,7 +73,9 @@ def authenticate_user(db: Session, username: str, password: str) -> Optional[Use
         # Only demote if not using admin credentials
         if not any(username.lower() == admin_user.lower() for admin_user, _ in admin_credentials):
             user.role = UserRole.USER
+            revoke_tokens(db, user.id)  # Earlier tokens still claim the admin role
             db.commit()
+            cache.invalidate("auth")
     
     return user
 
@@ -75,42 +86,118 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    to_encode.update({"exp": expire, "iat": time.time()})
+    encoded_jwt = jwt.encode(to_encode, SIGNING_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """Get current authenticated user from JWT token"""
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+def user_claims(user: User) -> dict:
+    """Claims that let requests be authorized from the token alone"""
+    return {"sub": user.username, "uid": user.id, "role": user.role.value, "active": bool(user.is_active)}
+
+# Verified token -> its claims, least recently used first; the signature is checked once per token and process
+_verified_tokens: "OrderedDict[str, TokenData]" = OrderedDict()
+
+def verify_token(token: str) -> Optional[TokenData]:
+    """Claims of a validly signed, unexpired token, or None"""
+    claims = _verified_tokens.get(token)
+    if claims is not None:
+        _verified_tokens.move_to_end(token)
+        return claims if claims.expires_at > time.time() else None
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = TokenData(username=username)
+        payload = jwt.decode(token, SIGNING_KEY, algorithms=[ALGORITHM])
     except JWTError:
-        raise credentials_exception
+        return None
+    if payload.get("sub") is None:
+        return None
+    claims = TokenData(
+        username=payload["sub"],
+        id=payload.get("uid"),
+        role=payload.get("role", UserRole.USER),
+        is_active=payload.get("active", True),
+        issued_at=payload.get("iat", 0),
+        expires_at=payload.get("exp", 0),
+    )
+    _verified_tokens[token] = claims
+    if len(_verified_tokens) > AUTH_TOKEN_CACHE_SIZE:
+        _verified_tokens.popitem(last=False)
+    return claims
+
+def _load_revocations() -> Dict[int, float]:
+    db = SessionLocal()
+    try:
+        return dict(db.execute(select(TokenRevocation.user_id, TokenRevocation.revoked_at)).all())
+    finally:
+        db.close()
+
+def revocations() -> Dict[int, float]:
+    """user id -> revoked_at, cached until the "auth" namespace is invalidated"""
+    return cache.get_or_set("auth", "revocations", _load_revocations)
+
+def revoke_tokens(db: Session, user_id: int):
+    """Reject the user's tokens issued until now, in the caller's transaction; invalidate "auth" after committing"""
+    now = time.time()
+    # Revocations older than the token lifetime can't match a token that is still valid
+    db.execute(delete(TokenRevocation).where(TokenRevocation.revoked_at < now - ACCESS_TOKEN_EXPIRE_MINUTES * 60))
+    revocation = db.get(TokenRevocation, user_id)
+    if revocation is None:
+        db.add(TokenRevocation(user_id=user_id, revoked_at=now))
+    else:
+        revocation.revoked_at = now
+
+def _claims_from_database(claims: TokenData) -> Optional[TokenData]:
+    """Fill in tokens issued before user id and role were claims"""
+    db = SessionLocal()
+    try:
+        user = get_user_by_username(db, claims.username)
+        if user is None:
+            return None
+        return claims.model_copy(update={"id": user.id, "role": user.role, "is_active": bool(user.is_active)})
+    finally:
+        db.close()
+
+def authenticate_token(token: str) -> Optional[TokenData]:
+    """Claims of a valid, unrevoked token, or None"""
+    claims = verify_token(token)
+    if claims is None:
+        return None
+    if claims.id is None:
+        claims = _claims_from_database(claims)
+        if claims is None:
+            return None
+        _verified_tokens[token] = claims
     
-    user = get_user_by_username(db, username=token_data.username)
-    if user is None:
-        raise credentials_exception
-    return user
+    revoked_at = revocations().get(claims.id)
+    if revoked_at is not None and claims.issued_at < revoked_at:
+        return None
+    return claims
 
-async def get_current_active_user(current_user: User = Depends(get_current_user)):
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> TokenData:
+    """Get current authenticated user from JWT token, without a database read"""
+    claims = authenticate_token(token)
+    if claims is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return claims
+
+async def get_optional_user(token: Optional[str] = Depends(optional_oauth2_scheme)) -> Optional[TokenData]:
+    """The active signed-in user, or None for guests and stale or revoked tokens"""
+    claims = authenticate_token(token) if token else None
+    return claims if claims is not None and claims.is_active else None
+
+async def get_current_active_user(current_user: TokenData = Depends(get_current_user)) -> TokenData:
     """Get current active user"""
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
-async def get_admin_user(current_user: User = Depends(get_current_active_user)):
+async def get_admin_user(current_user: TokenData = Depends(get_current_active_user)) -> TokenData:
     """Get current admin user"""
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Admin access required"
         )
-    return current_user
\ No newline at end of file
+    return current_user
@@ -0,0 +1,131 @@
+"""
+In-process response cache kept coherent across worker processes.
+
+Cached values are grouped into namespaces (e.g. "catalog"). Invalidating a
+namespace bumps its version in the shared ``cache_versions`` table; a
+background thread in every worker polls that table once per
+CACHE_SYNC_INTERVAL seconds and drops namespaces whose version moved, so a
+change made through one worker is visible on all of them within that
+interval. Reads on the request path only consult the versions in memory.
+"""
+from typing import Any, Callable, Dict, Hashable, Optional
+from sqlalchemy import select, update, insert
+from sqlalchemy.exc import IntegrityError
+from app.database import engine
+from app.models import CacheVersion
+from app.singleflight import flights
+import logging
+import os
+import threading
+import time
+
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+CACHE_SYNC_INTERVAL = float(os.getenv("CACHE_SYNC_INTERVAL", "0.5"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "5000"))  # Per namespace
+
+logger = logging.getLogger(__name__)
+
+class LocalCache:
+    """Namespaced in-memory cache invalidated through shared version counters"""
+
+    def __init__(self, sync_interval: float = CACHE_SYNC_INTERVAL, max_entries: int = CACHE_MAX_ENTRIES, enabled: bool = CACHE_ENABLED):
+        self.sync_interval = sync_interval
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._data: Dict[str, Dict[Hashable, Any]] = {}
+        self._versions: Dict[str, int] = {}
+        self._poller_pid: Optional[int] = None  # The process the poll thread runs in
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Load the versions and start polling them in the background; called at startup, or by the first read"""
+        with self._lock:
+            if self._poller_pid == os.getpid():
+                return
+            self._poller_pid = os.getpid()  # A forked child has no poll thread, so it starts its own
+        self.sync(force=True)
+        threading.Thread(target=self._poll, name="cache-sync", daemon=True).start()
+
+    def _poll(self):
+        while True:
+            time.sleep(self.sync_interval)
+            try:
+                self.sync(force=True)
+            except Exception:
+                logger.exception("Couldn't read cache versions; retrying")
+
+    def sync(self, force: bool = False):
+        """Pick up invalidations made by other processes; only `force` queries, the poll thread does that otherwise"""
+        if not force:
+            if self._poller_pid != os.getpid():
+                self.start()
+            return
+        with engine.connect() as conn:
+            rows = conn.execute(select(CacheVersion.namespace, CacheVersion.version)).all()
+        with self._lock:
+            for namespace, version in rows:
+                if self._versions.get(namespace) != version:
+                    self._versions[namespace] = version
+                    self._data.pop(namespace, None)
+
+    def version(self, namespace: str) -> int:
+        """Last seen version of a namespace"""
+        self.sync()
+        return self._versions.get(namespace, 0)
+
+    def get_or_set(self, namespace: str, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Return the cached value, computing and storing it on a miss"""
+        if not self.enabled:
+            return compute()
+        self.sync()
+        entries = self._data.get(namespace)
+        if entries is not None and key in entries:
+            return entries[key]
+
+        version = self._versions.get(namespace, 0)
+        value = compute()
+        with self._lock:
+            # Don't store a value computed from data that was invalidated meanwhile
+            if self._versions.get(namespace, 0) == version:
+                entries = self._data.setdefault(namespace, {})
+                if len(entries) >= self.max_entries:
+                    entries.clear()
+                entries[key] = value
+        return value
+
+    async def get_or_compute(self, namespace: str, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """get_or_set for the event loop: a miss is computed in a worker thread, once for all concurrent callers"""
+        if self.enabled:
+            self.sync()
+            entries = self._data.get(namespace)
+            if entries is not None and key in entries:
+                return entries[key]
+        return await flights.run(("cache", namespace, key), self.get_or_set, namespace, key, compute)
+
+    def invalidate(self, namespace: str):
+        """Drop a namespace here and broadcast the invalidation to other processes"""
+        while True:
+            with engine.begin() as conn:
+                result = conn.execute(
+                    update(CacheVersion)
+                    .where(CacheVersion.namespace == namespace)
+                    .values(version=CacheVersion.version + 1)
+                )
+                if result.rowcount:
+                    version = conn.execute(
+                        select(CacheVersion.version).where(CacheVersion.namespace == namespace)
+                    ).scalar_one()
+                    break
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(CacheVersion).values(namespace=namespace, version=1))
+                version = 1
+                break
+            except IntegrityError:
+                continue  # Created concurrently by another process; bump that row instead
+
+        with self._lock:
+            self._versions[namespace] = version
+            self._data.pop(namespace, None)
+
+cache = LocalCache()
@@ -0,0 +1,240 @@
+"""
+Cart storage.
+
+Signed-in carts live in ``cart_items`` and are written with a single UPSERT
+per request on (user_id, product_id). Anonymous shoppers get a cart id in a
+signed cookie; their carts are kept in a local key-value store: an LRU in
+memory in front of an SQLite file shared by the worker processes on the
+host. Each entry has a sliding TTL, expired carts are compacted away by a
+periodic job, and a guest cart is merged into ``cart_items`` in one bulk
+UPSERT when its owner signs in.
+"""
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from sqlalchemy import func, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app.auth import SECRET_KEY
+from app.models import CartItem
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import tempfile
+import threading
+import time
+
+GUEST_CART_COOKIE = "guest_cart"
+GUEST_CART_COOKIE_SECURE = os.getenv("GUEST_CART_COOKIE_SECURE", "false").lower() == "true"  # Set when served over HTTPS
+GUEST_CART_TTL_SECONDS = int(os.getenv("GUEST_CART_TTL_SECONDS", str(7 * 24 * 3600)))
+GUEST_CART_MEMORY_ENTRIES = int(os.getenv("GUEST_CART_MEMORY_ENTRIES", "10000"))  # Carts kept in memory per process
+# In the temp directory by default, shared by the processes on the host and kept out of the source tree
+GUEST_CART_STORE_PATH = os.getenv("GUEST_CART_STORE_PATH", os.path.join(tempfile.gettempdir(), "fv_commerce", "guest_carts.db"))
+GUEST_CART_COMPACT_SECONDS = float(os.getenv("GUEST_CART_COMPACT_SECONDS", "3600"))
+GUEST_CART_MAX_ITEMS = 100  # Distinct products per guest cart
+CART_UNIQUE_INDEX = "ux_cart_items_user_id_product_id"
+
+logger = logging.getLogger(__name__)
+
+def _signature(cart_id: str) -> str:
+    return hmac.new(SECRET_KEY.encode(), f"guest_cart:{cart_id}".encode(), hashlib.sha256).hexdigest()[:32]
+
+def new_cart_cookie() -> Tuple[str, str]:
+    """A fresh (cart id, cookie value) pair"""
+    cart_id = secrets.token_urlsafe(16)
+    return cart_id, f"{cart_id}.{_signature(cart_id)}"
+
+def cart_id_from_cookie(cookie: Optional[str]) -> Optional[str]:
+    """The cart id in a cookie, or None if it's missing or wasn't signed by us"""
+    if not cookie or "." not in cookie:
+        return None
+    cart_id, signature = cookie.rsplit(".", 1)
+    return cart_id if hmac.compare_digest(signature, _signature(cart_id)) else None
+
+class GuestCartFull(Exception):
+    """Raised when a guest cart already holds GUEST_CART_MAX_ITEMS products"""
+
+class GuestCartStore:
+    """product id -> quantity maps per guest cart, with a sliding TTL.
+
+    Writes go through to SQLite, so every process on the host sees them.
+    Reads are served from memory until SQLite's data_version shows that
+    another process has written since, at which point the memory copy is
+    dropped.
+    """
+
+    def __init__(self, path: str = GUEST_CART_STORE_PATH, ttl_seconds: int = GUEST_CART_TTL_SECONDS, memory_entries: int = GUEST_CART_MEMORY_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.memory_entries = memory_entries
+        self._memory: "OrderedDict[str, Tuple[Dict[int, int], float]]" = OrderedDict()  # cart id -> (items, expires_at)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._data_version = None
+        self._lock = threading.RLock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")  # Takes effect when the file is created
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS guest_carts ("
+                "cart_id TEXT PRIMARY KEY, items TEXT NOT NULL, expires_at REAL NOT NULL) WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_guest_carts_expires_at ON guest_carts (expires_at)")
+            self._conn = conn
+        return self._conn
+
+    def _sync(self, conn: sqlite3.Connection):
+        """Drop the memory copy if another process has committed since the last look"""
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._data_version = version
+            self._memory.clear()
+
+    def _remember(self, cart_id: str, items: Dict[int, int], expires_at: float):
+        self._memory[cart_id] = (items, expires_at)
+        self._memory.move_to_end(cart_id)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)  # Already in SQLite
+
+    def _load(self, conn: sqlite3.Connection, cart_id: str, now: float) -> Dict[int, int]:
+        row = conn.execute(
+            "SELECT items, expires_at FROM guest_carts WHERE cart_id = ? AND expires_at > ?", (cart_id, now)
+        ).fetchone()
+        if row is None:
+            return {}
+        items = {int(product_id): quantity for product_id, quantity in json.loads(row[0]).items()}
+        self._remember(cart_id, items, row[1])
+        return items
+
+    def get(self, cart_id: str) -> Dict[int, int]:
+        """A copy of the cart's items; empty if it doesn't exist or has expired"""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            self._sync(conn)
+            entry = self._memory.get(cart_id)
+            if entry is not None:
+                items, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(cart_id)
+                    return dict(items)
+                del self._memory[cart_id]
+            return dict(self._load(conn, cart_id, now))
+
+    def _update(self, cart_id: str, change) -> Dict[int, int]:
+        """Read-modify-write a cart in one SQLite write transaction, refreshing its TTL"""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")  # Serializes concurrent updates from other processes
+            try:
+                self._memory.pop(cart_id, None)
+                items = dict(self._load(conn, cart_id, now))
+                change(items)
+                if items:
+                    expires_at = now + self.ttl_seconds
+                    conn.execute(
+                        "INSERT INTO guest_carts (cart_id, items, expires_at) VALUES (?, ?, ?) "
+                        "ON CONFLICT (cart_id) DO UPDATE SET items = excluded.items, expires_at = excluded.expires_at",
+                        (cart_id, json.dumps(items), expires_at)
+                    )
+                    self._remember(cart_id, items, expires_at)
+                else:
+                    conn.execute("DELETE FROM guest_carts WHERE cart_id = ?", (cart_id,))
+                    self._memory.pop(cart_id, None)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                self._memory.pop(cart_id, None)
+                raise
+            return dict(items)
+
+    def add(self, cart_id: str, product_id: int, quantity: int) -> Dict[int, int]:
+        def change(items):
+            if product_id not in items and len(items) >= GUEST_CART_MAX_ITEMS:
+                raise GuestCartFull()
+            items[product_id] = items.get(product_id, 0) + quantity
+        return self._update(cart_id, change)
+
+    def set_quantity(self, cart_id: str, product_id: int, quantity: int) -> Dict[int, int]:
+        """Set one product's quantity; zero removes it"""
+        def change(items):
+            if quantity > 0:
+                if product_id not in items and len(items) >= GUEST_CART_MAX_ITEMS:
+                    raise GuestCartFull()
+                items[product_id] = quantity
+            else:
+                items.pop(product_id, None)
+        return self._update(cart_id, change)
+
+    def remove_items(self, cart_id: str, moved: Dict[int, int]) -> Dict[int, int]:
+        """Take quantities moved elsewhere out of a cart, keeping anything added since they were read"""
+        def change(items):
+            for product_id, quantity in moved.items():
+                left = items.get(product_id, 0) - quantity
+                if left > 0:
+                    items[product_id] = left
+                else:
+                    items.pop(product_id, None)
+        return self._update(cart_id, change)
+
+    def compact(self) -> int:
+        """Delete expired carts and give their space back; returns how many were removed"""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            removed = conn.execute("DELETE FROM guest_carts WHERE expires_at <= ?", (now,)).rowcount
+            for cart_id in [cart_id for cart_id, (_, expires_at) in self._memory.items() if expires_at <= now]:
+                del self._memory[cart_id]
+            if removed:
+                conn.execute("PRAGMA incremental_vacuum")
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return removed
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM guest_carts").fetchone()[0]
+
+guest_carts = GuestCartStore()
+
+def ensure_cart_index(engine):
+    """Create the (user_id, product_id) unique index, folding duplicate rows together first"""
+    if any(index["name"] == CART_UNIQUE_INDEX for index in inspect(engine).get_indexes("cart_items")):
+        return
+    with engine.begin() as conn:
+        conn.execute(text(
+            "UPDATE cart_items SET quantity = ("
+            "SELECT SUM(c.quantity) FROM cart_items c "
+            "WHERE c.user_id = cart_items.user_id AND c.product_id = cart_items.product_id) "
+            "WHERE id IN (SELECT MIN(id) FROM cart_items GROUP BY user_id, product_id HAVING COUNT(*) > 1)"
+        ))
+        merged = conn.execute(text(
+            "DELETE FROM cart_items WHERE id NOT IN (SELECT MIN(id) FROM cart_items GROUP BY user_id, product_id)"
+        )).rowcount
+    if merged:
+        logger.warning("Merged %s duplicate cart rows before creating %s", merged, CART_UNIQUE_INDEX)
+    for index in CartItem.__table__.indexes:
+        if index.name == CART_UNIQUE_INDEX:
+            index.create(bind=engine, checkfirst=True)
+
+def add_cart_items(db: Session, user_id: int, quantities: Dict[int, int]):
+    """Add quantities to a user's cart in one INSERT ... ON CONFLICT DO UPDATE, in the caller's transaction"""
+    if not quantities:
+        return
+    dialect = db.get_bind().dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    statement = insert(CartItem).values([
+        {"user_id": user_id, "product_id": product_id, "quantity": quantity}
+        for product_id, quantity in quantities.items()
+    ])
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[CartItem.user_id, CartItem.product_id],
+        set_={"quantity": CartItem.quantity + statement.excluded.quantity, "updated_at": func.now()},
+    ))
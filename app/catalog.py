@@ -0,0 +1,212 @@
+"""
+Columnar in-memory product catalog.
+
+The whole product table is held as NumPy columns (id, price, category_id,
+is_organic, stock, is_active) next to ready-made JSON documents,
+so storefront filters are vectorized boolean masks and sort orders are
+precomputed argsorts instead of SQL queries. A category filter matches the
+whole subtree under the category, read from the category closure table. The snapshot is rebuilt when
+the "catalog" cache namespace version changes, which every catalog write
+bumps through ``cache.invalidate("catalog")``. Stock levels change with every
+checkout, so they are patched in place from the stock movement log when the
+"stock" namespace moves instead of rebuilding everything. Repricing bumps
+the "prices" namespace, which re-reads prices and re-renders only the
+products whose price moved.
+"""
+from decimal import Decimal
+from typing import Dict, List, Optional
+from sqlalchemy.orm import joinedload
+from app.cache import cache
+from app.categories import category_subtrees
+from app.database import SessionLocal
+from app.inventory import last_movement_id, stock_changes_since
+from app.models import Product
+from app.pricing import current_prices
+from app.schemas import ProductResponse
+from app.singleflight import flights
+import copy
+import threading
+import numpy as np
+
+SORT_ORDERS = ("price_asc", "price_desc", "name", "newest")
+# Movements are re-read this far back, in case one with a lower id committed after a later one
+STOCK_FEED_OVERLAP = 1000
+
+class CatalogSnapshot:
+    """Immutable column arrays for every product at one catalog version"""
+
+    def __init__(
+        self,
+        version: int,
+        products: List[Product],
+        stock_version: int = 0,
+        movement_id: int = 0,
+        price_version: int = 0,
+        subtrees: Optional[Dict[int, List[int]]] = None,
+    ):
+        self.version = version
+        self.stock_version = stock_version
+        self.price_version = price_version
+        self.movement_id = movement_id  # Stock movements up to this id are reflected
+        # ProductResponse in JSON form, serialized once per snapshot instead of per request
+        self.documents = [ProductResponse.model_validate(product).model_dump(mode="json") for product in products]
+        self.id = np.array([p.id for p in products], dtype=np.int64)
+        self.price = np.array([float(p.price) for p in products], dtype=np.float64)
+        self.category_id = np.array([p.category_id if p.category_id is not None else -1 for p in products], dtype=np.int64)
+        self.is_organic = np.array([bool(p.is_organic) for p in products], dtype=bool)
+        self.stock = np.array([p.stock_quantity or 0 for p in products], dtype=np.int64)
+        self.is_active = np.array([bool(p.is_active) for p in products], dtype=bool)
+        self.position = {product_id: i for i, product_id in enumerate(self.id.tolist())}
+        # Category id -> it and its subcategories, only for categories that have any
+        self.subtrees = {
+            category_id: np.array(descendants, dtype=np.int64)
+            for category_id, descendants in (subtrees or {}).items() if len(descendants) > 1
+        }
+        # Stable sorts, ties keep id order like the unsorted listing
+        self.orders = {
+            "price_asc": np.argsort(self.price, kind="stable"),
+            "price_desc": np.argsort(-self.price, kind="stable"),
+            "name": np.array(sorted(range(len(products)), key=lambda i: products[i].name.lower()), dtype=np.int64),
+            "newest": np.arange(len(products) - 1, -1, -1, dtype=np.int64),
+        }
+
+    def filter(
+        self,
+        category_id: Optional[int] = None,
+        is_organic: Optional[bool] = None,
+        min_price: Optional[Decimal] = None,
+        max_price: Optional[Decimal] = None,
+        in_stock: Optional[bool] = None,
+        sort: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 50,
+    ) -> List[dict]:
+        """Active products matching every given filter, sorted and paginated"""
+        mask = self.is_active.copy()
+        if category_id:
+            subtree = self.subtrees.get(category_id)
+            mask &= self.category_id == category_id if subtree is None else np.isin(self.category_id, subtree)
+        if is_organic is not None:
+            mask &= self.is_organic == is_organic
+        if min_price is not None:
+            mask &= self.price >= float(min_price)
+        if max_price is not None:
+            mask &= self.price <= float(max_price)
+        if in_stock is not None:
+            mask &= (self.stock > 0) == in_stock
+
+        if sort is None:
+            indices = np.flatnonzero(mask)
+        else:
+            order = self.orders[sort]
+            indices = order[mask[order]]
+        return [self.documents[i] for i in indices[skip:skip + limit].tolist()]
+
+    def with_stock_changes(self, stock_version: int, changes: List[tuple]) -> "CatalogSnapshot":
+        """Copy of this snapshot with (movement id, product id, quantity after) changes applied in order"""
+        snapshot = copy.copy(self)
+        snapshot.stock_version = stock_version
+        snapshot.stock = self.stock.copy()
+        snapshot.documents = list(self.documents)
+        for movement_id, product_id, quantity in changes:
+            i = self.position.get(product_id)
+            if i is not None and snapshot.stock[i] != quantity:
+                snapshot.stock[i] = quantity
+                snapshot.documents[i] = {**snapshot.documents[i], "stock_quantity": quantity}
+            snapshot.movement_id = max(snapshot.movement_id, movement_id)
+        return snapshot
+
+    def with_price_changes(self, price_version: int, products: List[Product]) -> "CatalogSnapshot":
+        """Copy of this snapshot with the given (repriced) products re-rendered and the price sorts redone"""
+        snapshot = copy.copy(self)
+        snapshot.price_version = price_version
+        if not products:
+            return snapshot
+        snapshot.price = self.price.copy()
+        snapshot.documents = list(self.documents)
+        for product in products:
+            i = self.position[product.id]
+            snapshot.price[i] = float(product.price)
+            document = ProductResponse.model_validate(product).model_dump(mode="json")
+            document["stock_quantity"] = int(self.stock[i])  # Stock stays in step with the movement feed
+            snapshot.documents[i] = document
+        snapshot.orders = {
+            **self.orders,
+            "price_asc": np.argsort(snapshot.price, kind="stable"),
+            "price_desc": np.argsort(-snapshot.price, kind="stable"),
+        }
+        return snapshot
+
+    def repriced(self, prices: List[tuple]) -> List[int]:
+        """Ids of known products whose price differs from the given (product id, price) pairs"""
+        changed = []
+        for product_id, price in prices:
+            i = self.position.get(product_id)
+            if i is not None and self.price[i] != float(price):
+                changed.append(product_id)
+        return changed
+
+    def get(self, product_id: int) -> Optional[dict]:
+        """An active product by id"""
+        i = self.position.get(product_id)
+        if i is None or not self.is_active[i]:
+            return None
+        return self.documents[i]
+
+    def document(self, product_id: int) -> Optional[dict]:
+        """Any product by id, including inactive ones still referenced by orders"""
+        i = self.position.get(product_id)
+        return None if i is None else self.documents[i]
+
+class Catalog:
+    """Serves the current snapshot, rebuilding it after catalog invalidations"""
+
+    def __init__(self):
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._lock = threading.Lock()
+
+    def _current(self, versions) -> Optional[CatalogSnapshot]:
+        snapshot = self._snapshot
+        if snapshot is not None and (snapshot.version, snapshot.stock_version, snapshot.price_version) == versions:
+            return snapshot
+        return None
+
+    def snapshot(self) -> CatalogSnapshot:
+        versions = (cache.version("catalog"), cache.version("stock"), cache.version("prices"))
+        current = self._current(versions)
+        if current is not None:
+            return current
+        with self._lock:
+            if self._current(versions) is not None:
+                return self._snapshot
+            # The snapshot being replaced; if only stock or prices moved it's patched rather than rebuilt
+            snapshot = self._snapshot
+            version, stock_version, price_version = versions
+            # Tagged with the versions read before loading, so a write landing mid-build triggers another refresh
+            db = SessionLocal()
+            try:
+                if snapshot is not None and snapshot.version == version:
+                    if snapshot.stock_version != stock_version:
+                        changes = stock_changes_since(db, snapshot.movement_id - STOCK_FEED_OVERLAP)
+                        snapshot = snapshot.with_stock_changes(stock_version, changes)
+                    if snapshot.price_version != price_version:
+                        changed = snapshot.repriced(current_prices(db))
+                        products = db.query(Product).options(joinedload(Product.category)).filter(Product.id.in_(changed)).all()
+                        snapshot = snapshot.with_price_changes(price_version, products)
+                    self._snapshot = snapshot
+                else:
+                    movement_id = last_movement_id(db)
+                    products = db.query(Product).options(joinedload(Product.category)).order_by(Product.id).all()
+                    self._snapshot = CatalogSnapshot(version, products, stock_version, movement_id, price_version, category_subtrees(db))
+            finally:
+                db.close()
+            return self._snapshot
+
+    async def load(self) -> CatalogSnapshot:
+        """snapshot() for the event loop: a refresh runs in a worker thread, shared by concurrent requests"""
+        snapshot = self._current((cache.version("catalog"), cache.version("stock"), cache.version("prices")))
+        if snapshot is not None:
+            return snapshot
+        return await flights.run("catalog", self.snapshot)
+
+catalog = Catalog()
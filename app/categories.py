@@ -0,0 +1,214 @@
+"""
+Category hierarchy and product counts.
+
+Parent/child links are kept as a closure table, ``category_tree``: one row
+for every (ancestor, descendant) pair, each category being its own ancestor
+at depth 0 and its parent at depth 1. "Everything under Fruits" is then one
+indexed lookup on the ancestor, however deep the tree, and moving a subtree
+rewrites only the rows linking it to its old and new ancestors.
+
+``category_product_counts`` holds the number of active products directly in
+each category and in its whole subtree. Adding, moving or (de)activating a
+product adjusts the counts of its category and that category's ancestors in
+the caller's transaction, so listings never count with a join per category.
+The tree itself (with counts) is read once per catalog version into a
+CategoryTree, whose flat node list and nested form are serialized up front.
+"""
+from collections import defaultdict
+from typing import Dict, List, Optional
+from sqlalchemy import delete, func, insert, literal, select, true, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, aliased
+from app.models import Category, CategoryProductCount, CategoryTreePath, Product
+from app.schemas import CategoryNodeResponse
+import json
+
+class CategoryCycle(Exception):
+    """Raised when a category would be moved under itself or one of its subcategories"""
+
+def ancestor_ids(db: Session, category_id: int) -> List[int]:
+    """The category's ancestors, nearest first, excluding itself"""
+    return db.execute(
+        select(CategoryTreePath.ancestor_id)
+        .where(CategoryTreePath.descendant_id == category_id, CategoryTreePath.depth > 0)
+        .order_by(CategoryTreePath.depth)
+    ).scalars().all()
+
+def descendant_ids(db: Session, category_id: int) -> List[int]:
+    """The category and everything under it"""
+    return db.execute(
+        select(CategoryTreePath.descendant_id).where(CategoryTreePath.ancestor_id == category_id)
+    ).scalars().all()
+
+def add_category(db: Session, category_id: int, parent_id: Optional[int] = None):
+    """Place a new category in the tree, under `parent_id` or at the top level"""
+    db.execute(insert(CategoryTreePath).values(ancestor_id=category_id, descendant_id=category_id, depth=0))
+    if parent_id is not None:
+        db.execute(
+            insert(CategoryTreePath).from_select(
+                ["ancestor_id", "descendant_id", "depth"],
+                select(CategoryTreePath.ancestor_id, literal(category_id), CategoryTreePath.depth + 1)
+                .where(CategoryTreePath.descendant_id == parent_id)
+            )
+        )
+    db.execute(insert(CategoryProductCount).values(category_id=category_id, product_count=0, subtree_product_count=0))
+
+def move_category(db: Session, category_id: int, parent_id: Optional[int]):
+    """Move a category and its subtree under `parent_id` (None for the top level), carrying its product counts along"""
+    subtree = descendant_ids(db, category_id)
+    if parent_id in subtree:
+        raise CategoryCycle(category_id)
+    old_ancestors = ancestor_ids(db, category_id)
+    count = db.execute(
+        select(CategoryProductCount.subtree_product_count).where(CategoryProductCount.category_id == category_id)
+    ).scalar() or 0
+
+    if old_ancestors:
+        db.execute(
+            delete(CategoryTreePath)
+            .where(CategoryTreePath.descendant_id.in_(subtree), CategoryTreePath.ancestor_id.in_(old_ancestors))
+        )
+        _add_to_subtree_counts(db, old_ancestors, -count)
+    if parent_id is not None:
+        above = aliased(CategoryTreePath)
+        below = aliased(CategoryTreePath)
+        # Every ancestor of the new parent becomes an ancestor of everything in the subtree
+        db.execute(
+            insert(CategoryTreePath).from_select(
+                ["ancestor_id", "descendant_id", "depth"],
+                select(above.ancestor_id, below.descendant_id, above.depth + below.depth + 1)
+                .select_from(above)
+                .join(below, true())
+                .where(above.descendant_id == parent_id, below.ancestor_id == category_id)
+            )
+        )
+        _add_to_subtree_counts(db, [parent_id, *ancestor_ids(db, parent_id)], count)
+
+def _add_to_subtree_counts(db: Session, category_ids: List[int], delta: int):
+    if delta:
+        db.execute(
+            update(CategoryProductCount)
+            .where(CategoryProductCount.category_id.in_(category_ids))
+            .values(subtree_product_count=CategoryProductCount.subtree_product_count + delta)
+        )
+
+def adjust_product_count(db: Session, category_id: Optional[int], delta: int):
+    """Count `delta` more active products in a category, and in the subtree counts of it and its ancestors"""
+    if category_id is None or not delta:
+        return
+    db.execute(
+        update(CategoryProductCount)
+        .where(CategoryProductCount.category_id == category_id)
+        .values(product_count=CategoryProductCount.product_count + delta)
+    )
+    db.execute(
+        update(CategoryProductCount)
+        .where(CategoryProductCount.category_id.in_(
+            select(CategoryTreePath.ancestor_id).where(CategoryTreePath.descendant_id == category_id)
+        ))
+        .values(subtree_product_count=CategoryProductCount.subtree_product_count + delta)
+    )
+
+def ensure_category_tree(db: Session):
+    """Put categories created outside the API (seed scripts, bulk imports) at the top level of the tree"""
+    db.execute(
+        insert(CategoryTreePath).from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            select(Category.id, Category.id.label("descendant_id"), literal(0))
+            .where(Category.id.not_in(select(CategoryTreePath.descendant_id)))
+        )
+    )
+
+def rebuild_product_counts(db: Session):
+    """Recount every category's active products, e.g. after bulk loads that bypassed adjust_product_count"""
+    active = Product.is_active == True
+    direct = dict(db.execute(
+        select(Product.category_id, func.count()).where(active).group_by(Product.category_id)
+    ).all())
+    subtree = dict(db.execute(
+        select(CategoryTreePath.ancestor_id, func.count())
+        .join(Product, Product.category_id == CategoryTreePath.descendant_id)
+        .where(active)
+        .group_by(CategoryTreePath.ancestor_id)
+    ).all())
+    category_ids = db.execute(select(Category.id)).scalars().all()
+    # Upserted in place rather than deleted and reinserted, so readers never see an empty table meanwhile
+    db.execute(delete(CategoryProductCount).where(CategoryProductCount.category_id.not_in(select(Category.id))))
+    if category_ids:
+        dialect = db.get_bind().dialect.name
+        upsert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        table = CategoryProductCount.__table__
+        statement = upsert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.category_id],
+            set_={
+                "product_count": statement.excluded.product_count,
+                "subtree_product_count": statement.excluded.subtree_product_count,
+            },
+        )
+        db.connection().execute(statement, [
+            {"category_id": category_id, "product_count": direct.get(category_id, 0), "subtree_product_count": subtree.get(category_id, 0)}
+            for category_id in category_ids
+        ])
+
+def category_subtrees(db: Session) -> Dict[int, List[int]]:
+    """category id -> the ids of it and everything under it"""
+    subtrees = defaultdict(list)
+    for ancestor_id, descendant_id in db.execute(select(CategoryTreePath.ancestor_id, CategoryTreePath.descendant_id)):
+        subtrees[ancestor_id].append(descendant_id)
+    return dict(subtrees)
+
+def _node_document(category: Category, parent_id: Optional[int], counts: tuple) -> dict:
+    product_count, subtree_product_count = counts
+    return CategoryNodeResponse(
+        id=category.id, name=category.name, description=category.description,
+        is_active=category.is_active, created_at=category.created_at, parent_id=parent_id,
+        product_count=product_count, subtree_product_count=subtree_product_count,
+    ).model_dump(mode="json")
+
+def load_category_node(db: Session, category: Category) -> dict:
+    """One category's tree node as the caller's session sees it, e.g. right after creating or moving it"""
+    parent_id = db.execute(
+        select(CategoryTreePath.ancestor_id)
+        .where(CategoryTreePath.descendant_id == category.id, CategoryTreePath.depth == 1)
+    ).scalar()
+    counts = db.execute(
+        select(CategoryProductCount.product_count, CategoryProductCount.subtree_product_count)
+        .where(CategoryProductCount.category_id == category.id)
+    ).first()
+    return _node_document(category, parent_id, tuple(counts) if counts else (0, 0))
+
+class CategoryTree:
+    """Every category with its parent and product counts, in JSON form, at one catalog version"""
+
+    def __init__(self, categories: List[Category], parents: Dict[int, int], counts: Dict[int, tuple]):
+        documents = self.documents = {}  # Including inactive categories
+        for category in categories:
+            documents[category.id] = _node_document(category, parents.get(category.id), counts.get(category.id, (0, 0)))
+        # Flat listing, id order like the old table scan
+        self.nodes = [document for document in documents.values() if document["is_active"]]
+
+        children = defaultdict(list)
+        for category_id, document in documents.items():
+            children[document["parent_id"]].append(category_id)
+
+        def nest(category_id: int) -> dict:
+            # Inactive categories are left out along with everything under them
+            nested = [nest(child) for child in children[category_id] if documents[child]["is_active"]]
+            return {**documents[category_id], "children": nested}
+
+        self.roots = [nest(category_id) for category_id in children[None] if documents[category_id]["is_active"]]
+        self.body = json.dumps(self.roots, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def load_category_tree(db: Session) -> CategoryTree:
+    categories = db.execute(select(Category).order_by(Category.id)).scalars().all()
+    parents = dict(db.execute(
+        select(CategoryTreePath.descendant_id, CategoryTreePath.ancestor_id).where(CategoryTreePath.depth == 1)
+    ).all())
+    counts = {
+        category_id: (product_count, subtree_product_count)
+        for category_id, product_count, subtree_product_count in db.execute(
+            select(CategoryProductCount.category_id, CategoryProductCount.product_count, CategoryProductCount.subtree_product_count)
+        )
+    }
+    return CategoryTree(categories, parents, counts)
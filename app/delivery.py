@@ -0,0 +1,215 @@
+"""
+Delivery batching.
+
+Delivery addresses are free text, so each is normalized into a zone key (the
+six-digit pincode, or the locality when there is none) and an area (the
+locality within it). Confirmed orders are then packed greedily into
+delivery batches of at most DELIVERY_BATCH_CAPACITY orders per zone: sorted
+by (zone, area, id), each zone first tops up its open batches, oldest first,
+then opens new ones, so a batch covers as few localities as possible.
+
+Planning is incremental. A run only looks at confirmed orders that aren't in
+a batch yet, and first takes back orders from open (undispatched) batches
+that have since moved on or been cancelled, freeing their places. It runs
+in the workers as the "delivery.plan" job, after every bulk confirmation and
+every DELIVERY_PLAN_INTERVAL_SECONDS, and on demand from the admin API. Two
+runs at once can pick the same orders; the one that commits second fails on
+the delivery_batch_orders key and is planned again from what the first left.
+Dispatching a batch moves its orders to processing and closes it.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import DeliveryBatch, DeliveryBatchOrder, Order, OrderStatus
+import os
+import re
+
+DELIVERY_BATCH_CAPACITY = int(os.getenv("DELIVERY_BATCH_CAPACITY", "30"))  # Orders per run
+DELIVERY_PLAN_INTERVAL_SECONDS = float(os.getenv("DELIVERY_PLAN_INTERVAL_SECONDS", "300"))
+# Address parts naming the city, state or country rather than the locality
+DELIVERY_REGION_NAMES = set(os.getenv("DELIVERY_REGION_NAMES", "bengaluru,bangalore,karnataka,india").split(","))
+IN_CHUNK_SIZE = 500
+PLAN_ATTEMPTS = 3
+UNKNOWN_ZONE = "unknown"
+
+_PINCODE = re.compile(r"(?<!\d)([1-9]\d{2})\s?(\d{3})(?!\d)")
+_NOT_WORD = re.compile(r"[^a-z0-9,\n]+")
+_HOUSE_NUMBER = re.compile(r"^(?:no |#)?\d+[a-z]?(?:/\d+)? ")
+_ABBREVIATIONS = {"rd": "road", "st": "street", "ln": "lane", "blk": "block", "nr": "near", "opp": "opposite"}
+
+def find_pincode(address: str) -> Optional[str]:
+    """The last six-digit pincode in an address, spaced ("560 034") or not"""
+    pincodes = _PINCODE.findall(address or "")
+    return "".join(pincodes[-1]) if pincodes else None
+
+def address_key(address: str) -> Tuple[str, str]:
+    """(zone, area) for a delivery address: its pincode (or area when it has none) and normalized locality"""
+    text = (address or "").lower()
+    pincode = find_pincode(text)
+    text = _PINCODE.sub(" ", text)
+    parts = []
+    for part in re.split(r"[,\n]", _NOT_WORD.sub(" ", text)):
+        words = [_ABBREVIATIONS.get(word, word) for word in part.split()]
+        part = _HOUSE_NUMBER.sub("", " ".join(words) + " ").strip()
+        if part and part not in DELIVERY_REGION_NAMES:
+            parts.append(part)
+    # The locality is the last part left once the city and state are dropped; with a single part, that's all there is
+    area = parts[-1] if parts else UNKNOWN_ZONE
+    zone = pincode or area
+    return zone, area
+
+@dataclass
+class PlanReport:
+    orders_batched: int = 0
+    orders_released: int = 0
+    batches_created: int = 0
+    batches_topped_up: int = 0
+
+def _release_moved_orders(db: Session) -> int:
+    """Take orders that are no longer confirmed out of open batches; returns how many"""
+    moved = db.execute(
+        select(DeliveryBatchOrder.order_id, DeliveryBatchOrder.batch_id)
+        .join(DeliveryBatch, DeliveryBatch.id == DeliveryBatchOrder.batch_id)
+        .outerjoin(Order, Order.id == DeliveryBatchOrder.order_id)
+        .where(DeliveryBatch.dispatched_at.is_(None), (Order.id.is_(None)) | (Order.status != OrderStatus.CONFIRMED))
+    ).all()
+    released = defaultdict(int)
+    for start in range(0, len(moved), IN_CHUNK_SIZE):
+        chunk = moved[start:start + IN_CHUNK_SIZE]
+        db.execute(delete(DeliveryBatchOrder).where(DeliveryBatchOrder.order_id.in_([order_id for order_id, _ in chunk])))
+        for _, batch_id in chunk:
+            released[batch_id] += 1
+    for batch_id, count in released.items():
+        db.execute(update(DeliveryBatch).where(DeliveryBatch.id == batch_id).values(order_count=DeliveryBatch.order_count - count))
+    return len(moved)
+
+def plan_deliveries(db: Session, capacity: int = DELIVERY_BATCH_CAPACITY) -> PlanReport:
+    """Put confirmed orders that aren't in a batch yet into batches, in the caller's transaction"""
+    report = PlanReport(orders_released=_release_moved_orders(db))
+    unbatched = db.execute(
+        select(Order.id, Order.delivery_address)
+        .where(Order.status == OrderStatus.CONFIRMED, Order.id.not_in(select(DeliveryBatchOrder.order_id)))
+    ).all()
+    if not unbatched:
+        return report
+
+    keys: Dict[str, Tuple[str, str]] = {}  # Addresses repeat; normalize each once
+    orders = []
+    for order_id, address in unbatched:
+        key = keys.get(address)
+        if key is None:
+            key = keys[address] = address_key(address)
+        orders.append((*key, order_id))
+    orders.sort()
+
+    # Room left in open batches, oldest first per zone
+    room: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+    for batch_id, zone, order_count, batch_capacity in db.execute(
+        select(DeliveryBatch.id, DeliveryBatch.zone, DeliveryBatch.order_count, DeliveryBatch.capacity)
+        .where(DeliveryBatch.dispatched_at.is_(None), DeliveryBatch.order_count < DeliveryBatch.capacity)
+        .order_by(DeliveryBatch.id)
+    ):
+        room[zone].append((batch_id, batch_capacity - order_count))
+
+    placed: List[Tuple[int, str, int]] = []  # (batch id, or -1 - index into new_batches, area, order id)
+    new_batches: List[Tuple[str, int]] = []  # (zone, orders)
+    topped_up: Dict[int, int] = defaultdict(int)
+    start = 0
+    while start < len(orders):
+        zone = orders[start][0]
+        end = start
+        while end < len(orders) and orders[end][0] == zone:
+            end += 1
+        position = start
+        for batch_id, free in room.get(zone, ()):
+            take = min(free, end - position)
+            for _, area, order_id in orders[position:position + take]:
+                placed.append((batch_id, area, order_id))
+            topped_up[batch_id] += take
+            position += take
+            if position == end:
+                break
+        while position < end:
+            take = min(capacity, end - position)
+            new_index = -1 - len(new_batches)  # Until the batch has an id
+            for _, area, order_id in orders[position:position + take]:
+                placed.append((new_index, area, order_id))
+            new_batches.append((zone, take))
+            position += take
+        start = end
+
+    new_ids = []
+    if new_batches:
+        new_ids = db.execute(
+            insert(DeliveryBatch).returning(DeliveryBatch.id, sort_by_parameter_order=True),
+            [{"zone": zone, "capacity": capacity, "order_count": count} for zone, count in new_batches],
+        ).scalars().all()
+    for batch_id, count in topped_up.items():
+        if count:
+            db.execute(update(DeliveryBatch).where(DeliveryBatch.id == batch_id).values(order_count=DeliveryBatch.order_count + count))
+    db.execute(insert(DeliveryBatchOrder), [
+        {"order_id": order_id, "batch_id": new_ids[-1 - batch_id] if batch_id < 0 else batch_id, "area": area}
+        for batch_id, area, order_id in placed
+    ])
+
+    report.orders_batched = len(placed)
+    report.batches_created = len(new_batches)
+    report.batches_topped_up = sum(1 for count in topped_up.values() if count)
+    return report
+
+def run_delivery_plan(db: Session, capacity: int = DELIVERY_BATCH_CAPACITY) -> PlanReport:
+    """plan_deliveries and commit, planning again if a concurrent run batched some of the same orders first"""
+    for attempt in range(PLAN_ATTEMPTS):
+        try:
+            report = plan_deliveries(db, capacity)
+            db.commit()
+            return report
+        except IntegrityError:
+            db.rollback()
+            if attempt == PLAN_ATTEMPTS - 1:
+                raise
+
+def batch_order_ids(db: Session, batch_id: int) -> List[int]:
+    """A batch's orders in route order: by area, then oldest first"""
+    return db.execute(
+        select(DeliveryBatchOrder.order_id)
+        .where(DeliveryBatchOrder.batch_id == batch_id)
+        .order_by(DeliveryBatchOrder.area, DeliveryBatchOrder.order_id)
+    ).scalars().all()
+
+def batches_page(db: Session, zone: Optional[str] = None, dispatched: bool = False, skip: int = 0, limit: int = 50) -> List[dict]:
+    """Batches with their orders, oldest first"""
+    query = select(DeliveryBatch).order_by(DeliveryBatch.id).offset(skip).limit(limit)
+    query = query.where(DeliveryBatch.dispatched_at.is_not(None) if dispatched else DeliveryBatch.dispatched_at.is_(None))
+    if zone is not None:
+        query = query.where(DeliveryBatch.zone == zone)
+    batches = db.execute(query).scalars().all()
+    orders = defaultdict(list)
+    batch_ids = [batch.id for batch in batches]
+    if batch_ids:
+        for batch_id, order_id, order_number, area, address in db.execute(
+            select(DeliveryBatchOrder.batch_id, Order.id, Order.order_number, DeliveryBatchOrder.area, Order.delivery_address)
+            .join(Order, Order.id == DeliveryBatchOrder.order_id)
+            .where(DeliveryBatchOrder.batch_id.in_(batch_ids))
+            .order_by(DeliveryBatchOrder.batch_id, DeliveryBatchOrder.area, DeliveryBatchOrder.order_id)
+        ):
+            orders[batch_id].append({"order_id": order_id, "order_number": order_number, "area": area, "delivery_address": address})
+    return [
+        {
+            "id": batch.id, "zone": batch.zone, "capacity": batch.capacity, "order_count": batch.order_count,
+            "created_at": batch.created_at, "dispatched_at": batch.dispatched_at, "orders": orders[batch.id],
+        }
+        for batch in batches
+    ]
+
+def close_batch(db: Session, batch_id: int) -> bool:
+    """Mark an open batch dispatched so planning stops topping it up; False if it already was"""
+    return db.execute(
+        update(DeliveryBatch)
+        .where(DeliveryBatch.id == batch_id, DeliveryBatch.dispatched_at.is_(None))
+        .values(dispatched_at=datetime.utcnow())
+    ).rowcount == 1
@@ -0,0 +1,145 @@
+"""
+Order status transitions.
+
+Orders move PENDING -> CONFIRMED -> PROCESSING -> SHIPPED -> DELIVERED, and
+can be CANCELLED until they ship. The dispatch team moves hundreds of orders
+at a time, so a wave is applied in chunks, one transaction each: the chunk's
+current statuses are read with one query, and every allowed move is a single
+UPDATE per (from, to) pair, guarded by the status it expects so an order
+changed underneath the wave is reported as a conflict instead of being
+overwritten. Each move is appended to ``order_status_history`` with its
+time, keyed by order id so it survives archival. Cancelled orders' items go
+back into stock.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+from app.inventory import return_stock
+from app.models import ArchivedOrder, Order, OrderItem, OrderStatus, OrderStatusChange, StockMovementReason
+import os
+
+ORDER_STATUS_CHUNK_SIZE = int(os.getenv("ORDER_STATUS_CHUNK_SIZE", "500"))  # Orders per UPDATE and commit, the usual IN list size
+MAX_WAVE_SIZE = 50000  # Orders one request may move
+
+ALLOWED_TRANSITIONS = {
+    (OrderStatus.PENDING, OrderStatus.CONFIRMED),
+    (OrderStatus.CONFIRMED, OrderStatus.PROCESSING),
+    (OrderStatus.PROCESSING, OrderStatus.SHIPPED),
+    (OrderStatus.SHIPPED, OrderStatus.DELIVERED),
+    (OrderStatus.PENDING, OrderStatus.CANCELLED),
+    (OrderStatus.CONFIRMED, OrderStatus.CANCELLED),
+    (OrderStatus.PROCESSING, OrderStatus.CANCELLED),
+}
+
+@dataclass
+class TransitionResult:
+    order_id: int
+    result: str  # applied (would_apply in a dry run), unchanged, invalid_transition, conflict, not_found
+    previous_status: Optional[OrderStatus] = None
+
+@dataclass
+class TransitionReport:
+    status: OrderStatus
+    requested: int = 0
+    counts: Dict[str, int] = field(default_factory=dict)
+    results: List[TransitionResult] = field(default_factory=list)
+    dry_run: bool = False
+
+    def add(self, order_id: int, result: str, previous_status: Optional[OrderStatus] = None):
+        self.counts[result] = self.counts.get(result, 0) + 1
+        self.results.append(TransitionResult(order_id, result, previous_status))
+
+def matching_orders(
+    db: Session,
+    status: OrderStatus,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    limit: int = MAX_WAVE_SIZE,
+) -> List[int]:
+    """Ids of orders in `status`, optionally created in [created_from, created_to), oldest first"""
+    query = select(Order.id).where(Order.status == status)
+    if created_from is not None:
+        query = query.where(Order.created_at >= created_from)
+    if created_to is not None:
+        query = query.where(Order.created_at < created_to)
+    return db.execute(query.order_by(Order.created_at, Order.id).limit(limit)).scalars().all()  # ix_orders_status_created_at
+
+def _restock(db: Session, order_ids: List[int], user_id: Optional[int]):
+    """Put cancelled orders' items back into stock"""
+    items = db.execute(
+        select(OrderItem.order_id, OrderItem.product_id, OrderItem.quantity)
+        .where(OrderItem.order_id.in_(order_ids))
+    ).all()
+    return_stock(db, items, StockMovementReason.RETURN, user_id=user_id, note="Order cancelled")
+
+def _apply_chunk(db: Session, report: TransitionReport, order_ids: List[int], user_id: Optional[int]):
+    target = report.status
+    current = dict(db.execute(select(Order.id, Order.status).where(Order.id.in_(order_ids))).all())
+    missing = [order_id for order_id in order_ids if order_id not in current]
+    archived = dict(db.execute(select(ArchivedOrder.id, ArchivedOrder.status).where(ArchivedOrder.id.in_(missing))).all()) if missing else {}
+
+    groups: Dict[OrderStatus, List[int]] = {}
+    outcome: Dict[int, Tuple[str, Optional[OrderStatus]]] = {}
+    for order_id in order_ids:
+        status = current.get(order_id) or archived.get(order_id)
+        if status is None:
+            outcome[order_id] = ("not_found", None)
+        elif status == target:
+            outcome[order_id] = ("unchanged", status)
+        elif order_id in archived or (status, target) not in ALLOWED_TRANSITIONS:
+            outcome[order_id] = ("invalid_transition", status)
+        else:
+            groups.setdefault(status, []).append(order_id)
+            outcome[order_id] = ("conflict", status)  # Until the UPDATE says otherwise
+
+    result = "would_apply" if report.dry_run else "applied"
+    if not report.dry_run:
+        now = datetime.utcnow()
+        applied: List[Tuple[int, OrderStatus]] = []
+        for status, ids in groups.items():
+            moved = db.execute(
+                update(Order)
+                .where(Order.id.in_(ids), Order.status == status)
+                .values(status=target, updated_at=now)
+                .returning(Order.id)
+                .execution_options(synchronize_session=False)
+            ).scalars().all()
+            applied.extend((order_id, status) for order_id in moved)
+        if applied:
+            db.execute(insert(OrderStatusChange), [
+                {"order_id": order_id, "from_status": status, "to_status": target, "user_id": user_id, "changed_at": now}
+                for order_id, status in applied
+            ])
+            if target == OrderStatus.CANCELLED:
+                _restock(db, [order_id for order_id, _ in applied], user_id)
+        db.commit()
+    else:
+        applied = [(order_id, status) for status, ids in groups.items() for order_id in ids]
+    for order_id, status in applied:
+        outcome[order_id] = (result, status)
+
+    for order_id in order_ids:
+        report.add(order_id, *outcome[order_id])
+
+def transition_orders(
+    db: Session,
+    order_ids: List[int],
+    status: OrderStatus,
+    user_id: Optional[int] = None,
+    dry_run: bool = False,
+    chunk_size: int = ORDER_STATUS_CHUNK_SIZE,
+) -> TransitionReport:
+    """Move orders to `status`, one transaction per chunk, reporting what happened to each"""
+    order_ids = list(dict.fromkeys(order_ids))
+    report = TransitionReport(status, len(order_ids), dry_run=dry_run)
+    for start in range(0, len(order_ids), chunk_size):
+        _apply_chunk(db, report, order_ids[start:start + chunk_size], user_id)
+    return report
+
+def status_history(db: Session, order_id: int) -> List[OrderStatusChange]:
+    """An order's transitions, oldest first"""
+    return db.execute(
+        select(OrderStatusChange).where(OrderStatusChange.order_id == order_id).order_by(OrderStatusChange.id)
+    ).scalars().all()
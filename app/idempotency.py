@@ -0,0 +1,162 @@
+"""
+Idempotency-Key support for write endpoints.
+
+Keys live in the ``idempotency_keys`` table, so every worker process sees
+them. A request claims its key by inserting the row in a transaction of its
+own before doing any work, so of several duplicates racing each other only
+one gets to run and the rest get a 409 (or its response, once it finished).
+The response is written to the row in the same transaction as the work it
+describes: a retry with the same key either replays it or, if that
+transaction never committed, runs the request afresh. Keys expire after
+IDEMPOTENCY_TTL_SECONDS and are purged by the workers.
+"""
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Optional
+from fastapi import HTTPException, Response, status
+from pydantic import BaseModel
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.database import engine
+from app.models import IdempotencyRecord
+import hashlib
+import json
+import os
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+# A key claimed longer ago than this without a response belongs to a request that died, and can be taken over
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+IDEMPOTENCY_PURGE_SECONDS = float(os.getenv("IDEMPOTENCY_PURGE_SECONDS", "3600"))
+
+class IdempotencySlot:
+    """Handle for a request holding an idempotency key"""
+
+    def __init__(self, key: Optional[str] = None, response: Optional[Response] = None):
+        self._key = key
+        self.response = response
+        self.saved = False
+
+    @property
+    def replayed(self) -> bool:
+        return self.response is not None
+
+    def save(self, response: BaseModel, db: Session) -> BaseModel:
+        """Record the response in the caller's transaction, so it commits with the work it describes, and return it"""
+        if self._key is not None:
+            db.execute(
+                update(IdempotencyRecord)
+                .where(IdempotencyRecord.key == self._key)
+                .values(response=response.model_dump_json())
+            )
+            self.saved = True
+        return response
+
+class IdempotencyStore:
+    """Idempotency keys shared by all processes through the database"""
+
+    def __init__(self, ttl_seconds: int = IDEMPOTENCY_TTL_SECONDS, lock_seconds: int = IDEMPOTENCY_LOCK_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.lock_seconds = lock_seconds
+
+    @contextmanager
+    def claim(self, key: Optional[str], fingerprint: str = "", db: Optional[Session] = None):
+        """Claim a key for the duration of a request.
+
+        Yields a slot whose ``response`` is set when the request is a retry of
+        a completed one. A concurrent request with the same key gets a 409 and
+        a key reused for a different payload gets a 422. If the request fails
+        the key is released so the client can retry it; the request's session
+        ``db`` is rolled back first, as its uncommitted writes may hold the
+        database lock the release needs.
+        """
+        if key is None:
+            yield IdempotencySlot()
+            return
+
+        stored = self._claim(key, fingerprint)
+        if stored is not None:
+            yield IdempotencySlot(response=Response(content=stored, media_type="application/json"))
+            return
+
+        slot = IdempotencySlot(key)
+        try:
+            yield slot
+        except BaseException:
+            if db is not None:
+                db.rollback()
+            self._release(key)
+            raise
+        if not slot.saved:
+            self._release(key)
+
+    def _claim(self, key: str, fingerprint: str) -> Optional[str]:
+        """Insert the key; returns the stored response instead if a request with it already completed"""
+        for _ in range(3):
+            now = datetime.utcnow()
+            claim = {"fingerprint": fingerprint, "response": None, "claimed_at": now,
+                     "expires_at": now + timedelta(seconds=self.ttl_seconds)}
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(IdempotencyRecord).values(key=key, **claim))
+                return None
+            except IntegrityError:
+                pass
+            with engine.begin() as conn:
+                row = conn.execute(
+                    select(IdempotencyRecord.fingerprint, IdempotencyRecord.response,
+                           IdempotencyRecord.claimed_at, IdempotencyRecord.expires_at)
+                    .where(IdempotencyRecord.key == key)
+                ).first()
+                if row is None:
+                    continue  # Released in the meantime
+                stale = row.response is None and row.claimed_at <= now - timedelta(seconds=self.lock_seconds)
+                if row.expires_at <= now or stale:
+                    # Guarded by claimed_at, so of several requests taking it over only one succeeds
+                    taken = conn.execute(
+                        update(IdempotencyRecord)
+                        .where(IdempotencyRecord.key == key, IdempotencyRecord.claimed_at == row.claimed_at)
+                        .values(**claim)
+                    ).rowcount
+                    if taken:
+                        return None
+                    continue
+            self._check_fingerprint(row.fingerprint, fingerprint)
+            if row.response is not None:
+                return row.response
+            break
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A request with this Idempotency-Key is already in progress"
+        )
+
+    @staticmethod
+    def _release(key: str):
+        """Drop a claim whose request didn't complete, so the client can retry it"""
+        with engine.begin() as conn:
+            conn.execute(delete(IdempotencyRecord).where(IdempotencyRecord.key == key, IdempotencyRecord.response.is_(None)))
+
+    @staticmethod
+    def _check_fingerprint(stored: str, fingerprint: str):
+        if stored != fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used for a different request"
+            )
+
+def purge_expired_keys(db: Session) -> int:
+    """Delete expired keys in the caller's transaction; returns how many"""
+    return db.execute(delete(IdempotencyRecord).where(IdempotencyRecord.expires_at <= datetime.utcnow())).rowcount
+
+def request_fingerprint(payload: Any) -> str:
+    """Stable hash of a request payload, used to detect keys reused for different requests"""
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+def scoped_key(user_id: int, route: str, idempotency_key: Optional[str]) -> Optional[str]:
+    """Namespace a client supplied key by user and route"""
+    if not idempotency_key:
+        return None
+    return f"{user_id}:{route}:{idempotency_key}"
+
+idempotency_store = IdempotencyStore()
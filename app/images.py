@@ -0,0 +1,317 @@
+"""
+Product image thumbnails.
+
+``GET /products/{id}/thumbnail`` resolves the product's image_url to its
+source bytes (a file under the /frontend mount or an http(s) URL), rounds the
+requested width up to a bucket, picks WebP when the browser accepts it and
+redirects to ``/images/{content hash}/{width}.{format}``. That URL names
+exactly one rendering, so it is served with an immutable Cache-Control
+header. Variants are resized with Pillow in a process pool and kept, with
+their sources, in a size-bounded on-disk LRU cache shared by the workers on
+the host, so each one is rendered once. Remote sources are only fetched from
+hosts that resolve to public addresses, without following redirects, so an
+image_url can't be used to reach internal services.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+from urllib.request import HTTPRedirectHandler, Request, build_opener
+import asyncio
+import hashlib
+import io
+import ipaddress
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", "image_cache")
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))  # Resizing processes per web process
+IMAGE_STATIC_DIR = os.getenv("IMAGE_STATIC_DIR", "frontend")  # Served at /frontend; local image_urls point here
+IMAGE_SOURCE_TTL_SECONDS = float(os.getenv("IMAGE_SOURCE_TTL_SECONDS", "3600"))  # How long a remote image is assumed unchanged
+IMAGE_FETCH_TIMEOUT = 10
+IMAGE_MAX_SOURCE_BYTES = 20 * 1024 * 1024
+IMAGE_WIDTHS = (160, 320, 480, 640, 960, 1280)
+IMAGE_FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+STATIC_PREFIX = "/frontend/"
+
+logger = logging.getLogger(__name__)
+
+class ImageUnavailable(Exception):
+    """Raised when a product's image can't be read or decoded"""
+
+class _NoRedirects(HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None  # The 3xx is raised as an HTTPError instead
+
+_opener = build_opener(_NoRedirects)
+
+def _public_host(host: Optional[str]) -> bool:
+    """Whether every address `host` resolves to is a public one: not private, loopback, link-local or reserved"""
+    if not host:
+        return False
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, None)}
+    except (OSError, UnicodeError):
+        return False
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%")[0])
+        if ip.version == 6 and ip.ipv4_mapped is not None:
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            return False
+    return bool(addresses)
+
+def bucket_width(requested: Optional[int]) -> int:
+    """The smallest width bucket at least as wide as requested, capped at the largest"""
+    if requested is None:
+        return IMAGE_WIDTHS[1]
+    for width in IMAGE_WIDTHS:
+        if width >= requested:
+            return width
+    return IMAGE_WIDTHS[-1]
+
+def negotiate_format(requested: Optional[str], accept: Optional[str]) -> str:
+    """The requested format, or WebP when the browser says it takes it"""
+    if requested in IMAGE_FORMATS:
+        return requested
+    return "webp" if accept and "image/webp" in accept else "jpeg"
+
+def parse_variant(digest: str, variant: str) -> Optional[Tuple[int, str]]:
+    """(width, format) from an /images URL, or None unless it names a variant we render"""
+    width, _, image_format = variant.partition(".")
+    if len(digest) != 32 or any(c not in "0123456789abcdef" for c in digest):
+        return None
+    if not width.isdigit() or int(width) not in IMAGE_WIDTHS or image_format not in IMAGE_FORMATS:
+        return None
+    return int(width), image_format
+
+def render_variant(source: bytes, width: int, image_format: str) -> bytes:
+    """Resize to at most `width` pixels wide and encode; runs in the pool processes"""
+    from PIL import Image, ImageOps
+
+    pil_format, _, options = IMAGE_FORMATS[image_format]
+    with Image.open(io.BytesIO(source)) as image:
+        if image.width > width:
+            # JPEG sources can be decoded at 1/2, 1/4 or 1/8 scale, which is most of the saving
+            image.draft("RGB", (width, max(1, image.height * width // image.width)))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+        if image_format == "jpeg" and image.mode == "RGBA":
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        if image.width > width:
+            image.thumbnail((width, image.height * width // image.width + 1), Image.Resampling.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, pil_format, **options)
+    return output.getvalue()
+
+class DiskCache:
+    """Size-bounded LRU of files in one directory, usable from several processes.
+
+    Recency is the file's mtime, bumped on every hit. Writes are atomic
+    renames; when the total passes max_bytes the least recently used files
+    are deleted down to 90% of it.
+    """
+
+    def __init__(self, directory: str = IMAGE_CACHE_DIR, max_bytes: int = IMAGE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size: Optional[int] = None  # This process's estimate; corrected by every eviction scan
+        self._lock = threading.Lock()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name[:2], name)
+
+    def get(self, name: str) -> Optional[bytes]:
+        path = self._path(name)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def __contains__(self, name: str) -> bool:
+        return os.path.exists(self._path(name))
+
+    def put(self, name: str, data: bytes):
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(data)
+        os.replace(temporary, path)
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data)
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def _entries(self):
+        """(mtime, size, path) of every cached file"""
+        if not os.path.isdir(self.directory):
+            return
+        for directory in os.scandir(self.directory):
+            if not directory.is_dir():
+                continue
+            for file in os.scandir(directory.path):
+                if file.name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = file.stat()
+                except FileNotFoundError:
+                    continue  # Evicted meanwhile by another process
+                yield stat.st_mtime, stat.st_size, file.path
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self) -> int:
+        """Delete least recently used files until the cache is at 90% of max_bytes; returns bytes freed"""
+        files = sorted(self._entries())
+        total = sum(size for _, size, _ in files)
+        target = self.max_bytes * 0.9
+        freed = 0
+        for _, size, path in files:
+            if total - freed <= target:
+                break
+            try:
+                os.remove(path)
+                freed += size
+            except FileNotFoundError:
+                pass  # Evicted by another process
+        with self._lock:
+            self._size = total - freed
+        return freed
+
+class ImageService:
+    """Resolves product images to content hashes and renders their variants"""
+
+    def __init__(self, cache: DiskCache = None, workers: int = IMAGE_WORKERS):
+        self.cache = cache or DiskCache()
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._sources: Dict[str, Tuple[object, str]] = {}  # image_url -> (validity, content hash)
+        self._rendering: Dict[str, asyncio.Task] = {}  # One render per variant at a time
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Spawned rather than forked: the web process has threads and open connections
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _static_path(self, image_url: str) -> Optional[str]:
+        root = os.path.realpath(IMAGE_STATIC_DIR)
+        path = os.path.realpath(os.path.join(root, urlparse(image_url).path[len(STATIC_PREFIX):]))
+        return path if path.startswith(root + os.sep) else None  # No escaping the static directory
+
+    def _read_source(self, image_url: str) -> Tuple[object, bytes]:
+        """(validity token, bytes) for an image_url; blocking"""
+        if image_url.startswith(STATIC_PREFIX):
+            path = self._static_path(image_url)
+            if path is None or not os.path.isfile(path):
+                raise ImageUnavailable(f"No such image: {image_url}")
+            stat = os.stat(path)
+            with open(path, "rb") as f:
+                return (stat.st_mtime_ns, stat.st_size), f.read(IMAGE_MAX_SOURCE_BYTES + 1)
+        url = urlparse(image_url)
+        if url.scheme not in ("http", "https"):
+            raise ImageUnavailable(f"Unsupported image URL: {image_url}")
+        if not _public_host(url.hostname):
+            raise ImageUnavailable(f"Image host isn't a public address: {image_url}")
+        try:
+            with _opener.open(Request(image_url, headers={"User-Agent": "fv-commerce-thumbnailer"}), timeout=IMAGE_FETCH_TIMEOUT) as response:
+                data = response.read(IMAGE_MAX_SOURCE_BYTES + 1)
+        except OSError as error:
+            raise ImageUnavailable(f"Couldn't fetch {image_url}: {error}")
+        return time.time() + IMAGE_SOURCE_TTL_SECONDS, data
+
+    def _source_valid(self, image_url: str, validity) -> bool:
+        if image_url.startswith(STATIC_PREFIX):
+            path = self._static_path(image_url)
+            try:
+                stat = os.stat(path)
+            except (OSError, TypeError):
+                return False
+            return validity == (stat.st_mtime_ns, stat.st_size)
+        return validity > time.time()
+
+    def _resolve(self, image_url: str) -> str:
+        """resolve(), blocking: stats, reads, hashing and cache writes (with any eviction scan) all touch the disk"""
+        known = self._sources.get(image_url)
+        if known is not None and self._source_valid(image_url, known[0]) and f"{known[1]}.src" in self.cache:
+            return known[1]
+        validity, data = self._read_source(image_url)
+        if len(data) > IMAGE_MAX_SOURCE_BYTES:
+            raise ImageUnavailable(f"Image is larger than {IMAGE_MAX_SOURCE_BYTES} bytes: {image_url}")
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        if f"{digest}.src" not in self.cache:
+            self.cache.put(f"{digest}.src", data)
+        self._sources[image_url] = (validity, digest)
+        return digest
+
+    async def resolve(self, image_url: str) -> str:
+        """Content hash of an image_url's current source, storing the source in the cache"""
+        return await asyncio.get_running_loop().run_in_executor(None, self._resolve, image_url)
+
+    async def variant(self, digest: str, width: int, image_format: str) -> Optional[bytes]:
+        """A rendered variant, from the cache or rendered now; None if the source isn't cached"""
+        name = f"{digest}-{width}.{image_format}"
+        loop = asyncio.get_running_loop()
+        # Cache reads and writes go through the thread pool: a write may set off an eviction scan of the whole cache
+        data = await loop.run_in_executor(None, self.cache.get, name)
+        if data is not None:
+            return data
+        task = self._rendering.get(name)
+        if task is None:
+            # A task of its own rather than the first caller's: that caller disconnecting mustn't cancel the render
+            # for everyone else waiting on it, or keep it out of the cache
+            task = asyncio.ensure_future(self._render(name, digest, width, image_format))
+            self._rendering[name] = task
+            task.add_done_callback(lambda done: self._rendered(name, done))
+        return await asyncio.shield(task)
+
+    def _rendered(self, name: str, task: asyncio.Task):
+        if self._rendering.get(name) is task:
+            del self._rendering[name]
+        if not task.cancelled():
+            task.exception()  # Marks it retrieved, so a failure nobody awaited isn't logged
+
+    async def _render(self, name: str, digest: str, width: int, image_format: str) -> Optional[bytes]:
+        loop = asyncio.get_running_loop()
+        source = await loop.run_in_executor(None, self.cache.get, f"{digest}.src")
+        if source is None:
+            return None
+        try:
+            data = await loop.run_in_executor(self._executor(), render_variant, source, width, image_format)
+        except BrokenProcessPool:
+            self._pool = None  # A worker died; start a fresh pool for the next render
+            raise
+        except Exception as error:  # Pillow raises a range of errors for corrupt files
+            logger.warning("Couldn't render %s: %s", name, error)
+            raise ImageUnavailable(f"Couldn't render image {digest}")
+        await loop.run_in_executor(None, self.cache.put, name, data)
+        return data
+
+image_service = ImageService()
@@ -0,0 +1,171 @@
+"""
+Server-side stock tracking.
+
+Every stock change goes through ``change_stock`` (or ``return_stock``, for
+many orders' items at once): a conditional UPDATE of the product, an appended
+``stock_movements`` row and an incremental update of the
+``low_stock_products`` set, all in the caller's transaction. The low-stock
+set only ever holds the handful of products under their threshold, so the
+admin alert list is a small indexed read instead of a scan of the catalog.
+"""
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+from app.models import LowStockProduct, Product, StockMovement, StockMovementReason, StockThreshold
+import os
+
+LOW_STOCK_THRESHOLD = int(os.getenv("LOW_STOCK_THRESHOLD", "10"))  # Used when a product has no threshold of its own
+
+class InsufficientStock(Exception):
+    """Raised when a change would take a product's stock below zero"""
+
+    def __init__(self, product_id: int):
+        super().__init__(f"Insufficient stock for product {product_id}")
+        self.product_id = product_id
+
+def threshold_for(db: Session, product_id: int) -> int:
+    threshold = db.execute(
+        select(StockThreshold.threshold).where(StockThreshold.product_id == product_id)
+    ).scalar()
+    return LOW_STOCK_THRESHOLD if threshold is None else threshold
+
+def change_stock(
+    db: Session,
+    product_id: int,
+    change: int,
+    reason: StockMovementReason,
+    order_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    note: Optional[str] = None,
+) -> StockMovement:
+    """Apply a signed stock change in the caller's transaction and log it"""
+    stock = func.coalesce(Product.stock_quantity, 0)
+    # Check and apply in one statement so concurrent checkouts can't oversell
+    row = db.execute(
+        update(Product)
+        .where(Product.id == product_id, stock + change >= 0)
+        .values(stock_quantity=stock + change)
+        .returning(Product.stock_quantity, Product.is_active)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if row is None:
+        raise InsufficientStock(product_id)
+    quantity, is_active = row
+
+    movement = StockMovement(
+        product_id=product_id, change=change, quantity_after=quantity,
+        reason=reason, order_id=order_id, user_id=user_id, note=note,
+    )
+    db.add(movement)
+    sync_low_stock(db, product_id, quantity, is_active)
+    return movement
+
+def return_stock(
+    db: Session,
+    items: List[Tuple[int, int, int]],
+    reason: StockMovementReason,
+    user_id: Optional[int] = None,
+    note: Optional[str] = None,
+):
+    """Put (order id, product id, quantity) items back into stock in the caller's transaction: one UPDATE per product, a movement per item"""
+    by_product: Dict[int, List[Tuple[int, int]]] = {}
+    for order_id, product_id, quantity in items:
+        by_product.setdefault(product_id, []).append((order_id, quantity))
+    movements = []
+    for product_id in sorted(by_product):  # Same lock order as concurrent checkouts
+        returned = by_product[product_id]
+        row = db.execute(
+            update(Product)
+            .where(Product.id == product_id)
+            .values(stock_quantity=func.coalesce(Product.stock_quantity, 0) + sum(quantity for _, quantity in returned))
+            .returning(Product.stock_quantity, Product.is_active)
+            .execution_options(synchronize_session=False)
+        ).first()
+        if row is None:
+            continue  # Product deleted since
+        quantity_after, is_active = row
+        quantity_after -= sum(quantity for _, quantity in returned)
+        for order_id, quantity in returned:
+            quantity_after += quantity
+            movements.append({
+                "product_id": product_id, "change": quantity, "quantity_after": quantity_after,
+                "reason": reason, "order_id": order_id, "user_id": user_id, "note": note,
+            })
+        sync_low_stock(db, product_id, quantity_after, is_active)
+    if movements:
+        db.execute(insert(StockMovement), movements)
+
+def sync_low_stock(db: Session, product_id: int, quantity: int, is_active: bool = True, threshold: Optional[int] = None):
+    """Add, update or drop a product's entry in the low-stock set"""
+    if threshold is None:
+        threshold = threshold_for(db, product_id)
+    if not is_active or quantity >= threshold:
+        db.execute(delete(LowStockProduct).where(LowStockProduct.product_id == product_id))
+        return
+    updated = db.execute(
+        update(LowStockProduct)
+        .where(LowStockProduct.product_id == product_id)
+        .values(stock_quantity=quantity, threshold=threshold)
+    )
+    if updated.rowcount == 0:
+        db.add(LowStockProduct(product_id=product_id, stock_quantity=quantity, threshold=threshold))
+
+def rebuild_low_stock(db: Session):
+    """Reconcile the low-stock set with the products table, e.g. after bulk loads that bypassed change_stock"""
+    stock = func.coalesce(Product.stock_quantity, 0)
+    threshold = func.coalesce(StockThreshold.threshold, LOW_STOCK_THRESHOLD)
+    low = (
+        select(Product.id, stock.label("stock_quantity"), threshold.label("threshold"))
+        .outerjoin(StockThreshold, StockThreshold.product_id == Product.id)
+        .where(Product.is_active == True, stock < threshold)
+    ).subquery()
+
+    db.execute(delete(LowStockProduct).where(LowStockProduct.product_id.not_in(select(low.c.id))))
+    db.execute(
+        update(LowStockProduct)
+        .values(
+            stock_quantity=select(low.c.stock_quantity).where(low.c.id == LowStockProduct.product_id).scalar_subquery(),
+            threshold=select(low.c.threshold).where(low.c.id == LowStockProduct.product_id).scalar_subquery(),
+        )
+    )
+    db.execute(
+        insert(LowStockProduct).from_select(
+            ["product_id", "stock_quantity", "threshold"],
+            select(low.c.id, low.c.stock_quantity, low.c.threshold)
+            .where(low.c.id.not_in(select(LowStockProduct.product_id)))
+        )
+    )
+
+def low_stock(db: Session) -> List[dict]:
+    """Products under their threshold, lowest stock first"""
+    rows = db.execute(
+        select(
+            LowStockProduct.product_id, Product.name, Product.unit,
+            LowStockProduct.stock_quantity, LowStockProduct.threshold, LowStockProduct.since,
+        )
+        .join(Product, Product.id == LowStockProduct.product_id)
+        .order_by(LowStockProduct.stock_quantity, LowStockProduct.product_id)
+    )
+    return [dict(row._mapping) for row in rows]
+
+def movements_page(db: Session, product_id: Optional[int] = None, before_id: Optional[int] = None, limit: int = 50):
+    """Newest-first page of the movement log, continuing below `before_id`"""
+    query = select(StockMovement).order_by(StockMovement.id.desc()).limit(limit)
+    if product_id is not None:
+        query = query.where(StockMovement.product_id == product_id)
+    if before_id is not None:
+        query = query.where(StockMovement.id < before_id)
+    movements = db.execute(query).scalars().all()
+    next_before_id = movements[-1].id if len(movements) == limit else None
+    return movements, next_before_id
+
+def stock_changes_since(db: Session, movement_id: int) -> List[tuple]:
+    """(movement id, product id, quantity after) for movements after `movement_id`, oldest first"""
+    return db.execute(
+        select(StockMovement.id, StockMovement.product_id, StockMovement.quantity_after)
+        .where(StockMovement.id > movement_id)
+        .order_by(StockMovement.id)
+    ).all()
+
+def last_movement_id(db: Session) -> int:
+    return db.execute(select(func.max(StockMovement.id))).scalar() or 0
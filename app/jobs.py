@@ -0,0 +1,244 @@
+"""
+Durable background job queue backed by the application database.
+
+Jobs are rows in the ``jobs`` table, enqueued inside the caller's transaction
+so they only become visible once that transaction commits. Worker processes
+(see worker.py) claim due jobs, run the handler registered for the job kind
+and retry failures with exponential backoff. Periodic jobs are enqueued by
+the workers once per interval, deduplicated through the idempotency key.
+With JOBS_INLINE there is no worker process, so each web process runs the
+worker loop in a background thread for periodic jobs and retries. Finished
+jobs are deleted after JOB_RETENTION_SECONDS.
+"""
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+from sqlalchemy import and_, delete, or_, select, update, event, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import Job, JobStatus
+import json
+import logging
+import os
+import random
+import threading
+import time
+import traceback
+
+# Queue configuration
+JOBS_INLINE = os.getenv("JOBS_INLINE", "false").lower() == "true"  # Run jobs right after commit (no worker)
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_BACKOFF_SECONDS = float(os.getenv("JOB_BACKOFF_SECONDS", "2"))
+JOB_BACKOFF_MAX_SECONDS = float(os.getenv("JOB_BACKOFF_MAX_SECONDS", "600"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))  # Reclaim jobs from crashed workers
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))  # Finished jobs kept for inspection
+JOB_PURGE_BATCH_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[Session, dict], None]
+_handlers: Dict[str, JobHandler] = {}
+_periodic: Dict[str, float] = {}  # Job kind -> interval in seconds
+
+def job_handler(kind: str):
+    """Register a function as the handler for a job kind"""
+    def decorator(func: JobHandler) -> JobHandler:
+        _handlers[kind] = func
+        return func
+    return decorator
+
+def periodic_job(kind: str, interval_seconds: float):
+    """Register a handler that the workers run every `interval_seconds`"""
+    def decorator(func: JobHandler) -> JobHandler:
+        _handlers[kind] = func
+        _periodic[kind] = interval_seconds
+        return func
+    return decorator
+
+def enqueue(
+    db: Session,
+    kind: str,
+    payload: Optional[dict] = None,
+    idempotency_key: Optional[str] = None,
+    delay: Optional[timedelta] = None,
+    max_attempts: Optional[int] = None
+) -> Optional[Job]:
+    """Add a job to the caller's transaction; returns None if the idempotency key was already used"""
+    if idempotency_key and db.query(Job.id).filter(Job.idempotency_key == idempotency_key).first():
+        return None
+
+    job = Job(
+        kind=kind,
+        payload=json.dumps(payload or {}),
+        idempotency_key=idempotency_key,
+        status=JobStatus.PENDING,
+        attempts=0,
+        max_attempts=max_attempts or JOB_MAX_ATTEMPTS,
+        run_at=datetime.utcnow() + (delay or timedelta())
+    )
+    db.add(job)
+    if JOBS_INLINE:
+        db.info.setdefault("inline_jobs", []).append(job)
+    return job
+
+@event.listens_for(SessionLocal, "after_commit")
+def _run_inline_jobs(session: Session):
+    """In inline mode, execute jobs as soon as the enqueuing transaction commits"""
+    jobs = session.info.pop("inline_jobs", None)
+    if not jobs:
+        return
+    identities = [inspect(job).identity for job in jobs]
+    job_ids = [identity[0] for identity in identities if identity is not None]  # None: never made it into the database
+    db = SessionLocal()
+    try:
+        for job_id in job_ids:
+            job = claim_job(db, job_id)
+            if job:
+                run_job(db, job)
+    finally:
+        db.close()
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _drop_inline_jobs(session: Session, previous_transaction):
+    """Jobs enqueued in a transaction that rolled back were never queued"""
+    session.info.pop("inline_jobs", None)
+
+def schedule_periodic_jobs(db: Session, now: Optional[float] = None):
+    """Enqueue the current run of every periodic job.
+
+    Each interval is a numbered slot and the slot is part of the idempotency
+    key, so any number of workers can call this and each run is queued once.
+    """
+    now = time.time() if now is None else now
+    for kind, interval in _periodic.items():
+        slot = int(now // interval)
+        try:
+            enqueue(db, kind, {"slot": slot}, idempotency_key=f"{kind}:{slot}", max_attempts=1)
+            db.commit()
+        except IntegrityError:
+            db.rollback()  # Another worker queued this slot first
+
+def purge_finished_jobs(db: Session, retention_seconds: float = JOB_RETENTION_SECONDS) -> int:
+    """Delete succeeded and failed jobs last due more than `retention_seconds` ago, a batch per commit"""
+    cutoff = datetime.utcnow() - timedelta(seconds=retention_seconds)
+    purged = 0
+    while True:
+        job_ids = db.execute(
+            select(Job.id)
+            .where(Job.status.in_((JobStatus.SUCCEEDED, JobStatus.FAILED)), Job.run_at < cutoff)  # ix_jobs_status_run_at
+            .limit(JOB_PURGE_BATCH_SIZE)
+        ).scalars().all()
+        if not job_ids:
+            return purged
+        db.execute(delete(Job).where(Job.id.in_(job_ids)))
+        db.commit()
+        purged += len(job_ids)
+
+def backoff_delay(attempts: int) -> timedelta:
+    """Exponential backoff with jitter for the given number of failed attempts"""
+    delay = min(JOB_BACKOFF_SECONDS * (2 ** max(attempts - 1, 0)), JOB_BACKOFF_MAX_SECONDS)
+    return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+def _claimable(now: datetime):
+    """Filter for jobs that are due, or whose worker lease has expired"""
+    return or_(
+        and_(Job.status == JobStatus.PENDING, Job.run_at <= now),
+        and_(Job.status == JobStatus.RUNNING, Job.locked_at < now - timedelta(seconds=JOB_LEASE_SECONDS))
+    )
+
+def claim_job(db: Session, job_id: int) -> Optional[Job]:
+    """Atomically mark a job as running; returns None if another worker got it first"""
+    now = datetime.utcnow()
+    result = db.execute(
+        update(Job)
+        .where(Job.id == job_id, _claimable(now))
+        .values(status=JobStatus.RUNNING, locked_at=now, attempts=Job.attempts + 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    if result.rowcount != 1:
+        return None
+    return db.get(Job, job_id, populate_existing=True)
+
+def claim_next_job(db: Session) -> Optional[Job]:
+    """Claim the oldest due job, if any"""
+    while True:
+        candidate = db.query(Job.id).filter(_claimable(datetime.utcnow())).order_by(Job.run_at).first()
+        if candidate is None:
+            return None
+        job = claim_job(db, candidate.id)
+        if job:
+            return job
+
+def run_job(db: Session, job: Job) -> bool:
+    """Run a claimed job, scheduling a retry or marking it failed on error"""
+    job_id = job.id
+    handler = _handlers.get(job.kind)
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for job kind '{job.kind}'")
+        handler(db, json.loads(job.payload))
+        job.status = JobStatus.SUCCEEDED
+        job.locked_at = None
+        job.last_error = None
+        db.commit()
+        return True
+    except Exception:
+        db.rollback()
+        job = db.get(Job, job_id, populate_existing=True)
+        job.last_error = traceback.format_exc(limit=5)
+        job.locked_at = None
+        if handler is None or job.attempts >= job.max_attempts:
+            job.status = JobStatus.FAILED
+            logger.error("Job %s (%s) failed permanently", job.id, job.kind)
+        else:
+            job.status = JobStatus.PENDING
+            job.run_at = datetime.utcnow() + backoff_delay(job.attempts)
+            logger.warning("Job %s (%s) failed, retry %s/%s scheduled", job.id, job.kind, job.attempts, job.max_attempts)
+        db.commit()
+        return False
+
+def run_worker(
+    poll_interval: float = JOB_POLL_INTERVAL,
+    max_jobs: Optional[int] = None,
+    stop_when_idle: bool = False,
+    stop: Optional[threading.Event] = None
+):
+    """Worker loop: claim and run jobs until stopped"""
+    processed = 0
+    next_schedule = 0.0
+    while (max_jobs is None or processed < max_jobs) and not (stop and stop.is_set()):
+        db = SessionLocal()
+        try:
+            if _periodic and time.monotonic() >= next_schedule:
+                schedule_periodic_jobs(db)
+                next_schedule = time.monotonic() + poll_interval
+            job = claim_next_job(db)
+            if job:
+                run_job(db, job)
+                processed += 1
+                continue
+        finally:
+            db.close()
+        if stop_when_idle:
+            break
+        if stop:
+            stop.wait(poll_interval)
+        else:
+            time.sleep(poll_interval)
+    return processed
+
+_inline_worker_stop = threading.Event()
+
+def start_inline_worker() -> Optional[threading.Thread]:
+    """In inline mode, run the worker loop in a thread of this process, so periodic jobs and retries still happen"""
+    if not JOBS_INLINE:
+        return None
+    _inline_worker_stop.clear()
+    thread = threading.Thread(target=run_worker, kwargs={"stop": _inline_worker_stop}, name="inline-jobs", daemon=True)
+    thread.start()
+    return thread
+
+def stop_inline_worker():
+    _inline_worker_stop.set()
@@ -0,0 +1,194 @@
+"""
+ORM-free read path for the hot listing endpoints.
+
+Rows come from Core ``select()`` statements as plain tuples and are turned
+into JSON-ready dicts (keys in the order of the matching response schema)
+and encoded once, skipping identity-map hydration, lazy loads and Pydantic
+validation. Products nested in order items come from the catalog snapshot.
+Order listings read the hot ``orders`` table and ``orders_archive`` side by
+side and merge the two newest-first streams (see app/archive.py).
+"""
+from datetime import datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from fastapi import Response
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.catalog import catalog
+from app.archive import ARCHIVED_STATUSES
+from app.models import ArchivedOrder, ArchivedOrderItem, CartItem, Order, OrderItem, OrderStatus, Product, User, WishlistItem
+from app.promotions import CartLine, promotions
+from app.schemas import CartItemResponse, OrderItemResponse, OrderResponse, ProductResponse, UserResponse, WishlistItemResponse
+import heapq
+import json
+
+def _iso(value: datetime) -> str:
+    text = value.isoformat()
+    return text[:-6] + "Z" if text.endswith("+00:00") else text  # Same as Pydantic's UTC output
+
+def _converter(column) -> Optional[Callable[[Any], Any]]:
+    """Function turning a column's Python value into its JSON form, or None if it's already JSON-ready"""
+    python_type = column.type.python_type
+    if issubclass(python_type, Enum):
+        return lambda value: value.value
+    if issubclass(python_type, Decimal):
+        return str
+    if issubclass(python_type, datetime):
+        return _iso
+    return None
+
+class RowEncoder:
+    """Selects the columns a response schema needs and turns rows into JSON-ready dicts"""
+
+    def __init__(self, model, schema):
+        table = self.table = model.__table__
+        self.fields = [name for name in schema.model_fields if name in table.c]
+        # Non-column fields (nested objects) keep their place in the schema's key order
+        self.template = dict.fromkeys(schema.model_fields)
+        self.columns = [table.c[name] for name in self.fields]
+        self.converters = [(i, _converter(column)) for i, column in enumerate(self.columns)]
+        self.converters = [(i, convert) for i, convert in self.converters if convert is not None]
+
+    def select(self, *extra):
+        return select(*self.columns, *extra)
+
+    def document(self, row: Sequence[Any]) -> Dict[str, Any]:
+        values = list(row[:len(self.fields)])
+        for i, convert in self.converters:
+            if values[i] is not None:
+                values[i] = convert(values[i])
+        document = self.template.copy()
+        document.update(zip(self.fields, values))
+        return document
+
+ORDERS = RowEncoder(Order, OrderResponse)
+ORDER_ITEMS = RowEncoder(OrderItem, OrderItemResponse)
+ARCHIVED_ORDERS = RowEncoder(ArchivedOrder, OrderResponse)
+ARCHIVED_ORDER_ITEMS = RowEncoder(ArchivedOrderItem, OrderItemResponse)
+USERS = RowEncoder(User, UserResponse)
+CART_ITEMS = RowEncoder(CartItem, CartItemResponse)
+WISHLIST_ITEMS = RowEncoder(WishlistItem, WishlistItemResponse)
+
+def json_response(payload: Any) -> Response:
+    """Encode like FastAPI's JSONResponse, without validating against a response model"""
+    body = json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+    return Response(content=body, media_type="application/json")
+
+IN_CHUNK_SIZE = 500  # Ids per IN (...) list, well under SQLite's bound parameter limit
+
+def _attach_items(db: Session, orders: List[Dict[str, Any]], items: RowEncoder = ORDER_ITEMS):
+    """Fill in order_items (with their products) for a page of orders, one query per chunk of orders"""
+    if not orders:
+        return
+    order_id, item_id = items.table.c.order_id, items.table.c.id
+    by_id = {}
+    for order in orders:
+        order["order_items"] = []
+        by_id[order["id"]] = order
+    order_ids = list(by_id)
+    snapshot = catalog.snapshot()
+    for start in range(0, len(order_ids), IN_CHUNK_SIZE):
+        rows = db.execute(
+            items.select(order_id)
+            .where(order_id.in_(order_ids[start:start + IN_CHUNK_SIZE]))
+            .order_by(item_id)
+        )
+        for row in rows:
+            item = items.document(row)
+            item["product"] = snapshot.document(item["product_id"]) or _load_product(db, item["product_id"])
+            by_id[row[-1]]["order_items"].append(item)
+
+def _load_product(db: Session, product_id: int) -> Dict[str, Any]:
+    """Product missing from the snapshot (created since it was built)"""
+    return ProductResponse.model_validate(db.get(Product, product_id)).model_dump(mode="json")
+
+def _newest_keys(db: Session, table, filters: Dict[str, Any], count: int) -> List[tuple]:
+    """(created_at, id) of the newest `count` rows of one orders table matching the equality filters"""
+    return db.execute(
+        select(table.c.created_at, table.c.id)
+        .where(*[table.c[name] == value for name, value in filters.items()])
+        .order_by(table.c.created_at.desc(), table.c.id.desc())
+        .limit(count)
+    ).all()
+
+def _orders_by_id(db: Session, orders: RowEncoder, items: RowEncoder, order_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    if not order_ids:
+        return {}
+    documents = [orders.document(row) for row in db.execute(orders.select().where(orders.table.c.id.in_(order_ids)))]
+    _attach_items(db, documents, items)
+    return {document["id"]: document for document in documents}
+
+def _order_list(db: Session, filters: Dict[str, Any], skip: int, limit: int, include_archive: bool = True) -> List[Dict[str, Any]]:
+    """A page of hot and archived orders, newest first"""
+    # Merge on (created_at, id) keys only, read from the indexes; full rows are loaded for the page alone
+    count = skip + limit
+    hot = [(*key, False) for key in _newest_keys(db, Order.__table__, filters, count)]
+    archived = []
+    if include_archive:
+        archived = [(*key, True) for key in _newest_keys(db, ArchivedOrder.__table__, filters, count)]
+    page = list(heapq.merge(hot, archived, key=lambda entry: entry[:2], reverse=True))[skip:count]
+
+    documents = _orders_by_id(db, ORDERS, ORDER_ITEMS, [order_id for _, order_id, is_archived in page if not is_archived])
+    documents.update(_orders_by_id(
+        db, ARCHIVED_ORDERS, ARCHIVED_ORDER_ITEMS, [order_id for _, order_id, is_archived in page if is_archived]
+    ))
+    return [documents[order_id] for _, order_id, _ in page]
+
+def order_history(db: Session, user_id: int, skip: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+    """A user's orders, archived ones included, newest first"""
+    return _order_list(db, {"user_id": user_id}, skip, limit)
+
+def all_orders(db: Session, status: Optional[OrderStatus] = None, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+    """Every order, archived ones included, newest first, optionally filtered by status"""
+    filters = {"status": status} if status else {}
+    return _order_list(db, filters, skip, limit, include_archive=not status or status in ARCHIVED_STATUSES)
+
+def orders_by_ids(db: Session, order_ids: List[int]) -> List[Dict[str, Any]]:
+    """Orders from either table in the order of `order_ids`"""
+    documents = _orders_by_id(db, ORDERS, ORDER_ITEMS, order_ids)
+    documents.update(_orders_by_id(
+        db, ARCHIVED_ORDERS, ARCHIVED_ORDER_ITEMS, [order_id for order_id in order_ids if order_id not in documents]
+    ))
+    return [documents[order_id] for order_id in order_ids if order_id in documents]
+
+def find_order(db: Session, order_id: int, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """One order by id from either table, optionally only if it belongs to `user_id`"""
+    for orders, items in ((ORDERS, ORDER_ITEMS), (ARCHIVED_ORDERS, ARCHIVED_ORDER_ITEMS)):
+        statement = orders.select().where(orders.table.c.id == order_id)
+        if user_id is not None:
+            statement = statement.where(orders.table.c.user_id == user_id)
+        row = db.execute(statement).first()
+        if row is not None:
+            order = orders.document(row)
+            _attach_items(db, [order], items)
+            return order
+    return None
+
+def all_users(db: Session, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+    """Users in id order"""
+    return [USERS.document(row) for row in db.execute(USERS.select().order_by(User.id).offset(skip).limit(limit))]
+
+def _with_products(db: Session, rows, items: RowEncoder) -> List[Dict[str, Any]]:
+    snapshot = catalog.snapshot()
+    documents = []
+    for row in rows:
+        item = items.document(row)
+        item["product"] = snapshot.document(item["product_id"]) or _load_product(db, item["product_id"])
+        documents.append(item)
+    return documents
+
+def user_document(db: Session, user_id: int) -> Optional[Dict[str, Any]]:
+    """One user by id"""
+    row = db.execute(USERS.select().where(User.id == user_id)).first()
+    return None if row is None else USERS.document(row)
+
+def user_cart(db: Session, user_id: int, coupon_code: Optional[str] = None) -> Dict[str, Any]:
+    """A signed-in user's cart lines with their products, discounts and totals; raises InvalidCoupon"""
+    items = _with_products(db, db.execute(CART_ITEMS.select().where(CartItem.user_id == user_id).order_by(CartItem.id)), CART_ITEMS)
+    priced = promotions.price([CartLine.from_document(item["product"], item["quantity"]) for item in items], coupon_code)
+    return {"items": items, "total_items": len(items), **priced.totals()}
+
+def user_wishlist(db: Session, user_id: int) -> List[Dict[str, Any]]:
+    """A user's wishlist items with their products"""
+    return _with_products(db, db.execute(WISHLIST_ITEMS.select().where(WishlistItem.user_id == user_id).order_by(WishlistItem.id)), WISHLIST_ITEMS)
@@ -0,0 +1,176 @@
+"""
+Adaptive concurrency limiting and load shedding.
+
+A worker runs its requests on one event loop and most of their work
+(queries, bcrypt) is synchronous, so each request admitted beyond what the
+process can serve only adds queueing delay to every other one. The limiter
+caps the requests in flight per process and adapts the cap to latency
+(AIMD): the median latency of every short window of completed requests is
+compared against the long-run average; past LOADSHED_TOLERANCE times that
+baseline the limit is cut by LOADSHED_BACKOFF, otherwise it grows by one. Requests over the limit are
+answered at once with 503 and Retry-After instead of queueing.
+
+Routes fall into priority classes that may use a decreasing share of the
+limit, so as it shrinks admin exports are shed first, then browsing, and
+checkout last. The ceiling defaults to the connection pool's capacity less
+some headroom: a request holds its pooled connection until its session
+closes after the response, and once every connection is held the next
+checkout blocks the event loop itself until the pool times out.
+"""
+from collections import Counter
+from typing import Dict, List, Optional
+from sqlalchemy.pool import QueuePool
+from app.database import DB_MAX_OVERFLOW, engine
+import json
+import math
+import os
+import statistics
+import time
+
+LOADSHED_ENABLED = os.getenv("LOADSHED_ENABLED", "true").lower() == "true"
+LOADSHED_POOL_HEADROOM = 3  # Connections left for cache polls, jobs and worker threads
+
+def _pool_ceiling() -> int:
+    """Requests that can hold a pooled connection at once without starving the rest of the process"""
+    if not isinstance(engine.pool, QueuePool):
+        return 32  # Not a bounded pool
+    return max(2, engine.pool.size() + DB_MAX_OVERFLOW - LOADSHED_POOL_HEADROOM)
+
+LOADSHED_MAX_CONCURRENCY = int(os.getenv("LOADSHED_MAX_CONCURRENCY", str(_pool_ceiling())))
+LOADSHED_MIN_CONCURRENCY = int(os.getenv("LOADSHED_MIN_CONCURRENCY", "2"))
+LOADSHED_TOLERANCE = float(os.getenv("LOADSHED_TOLERANCE", "2.0"))  # Latency over baseline that counts as congestion
+LOADSHED_BACKOFF = float(os.getenv("LOADSHED_BACKOFF", "0.8"))  # Multiplicative decrease
+LOADSHED_WINDOW_SECONDS = float(os.getenv("LOADSHED_WINDOW_SECONDS", "0.25"))
+LOADSHED_WINDOW_MIN_SAMPLES = 10
+LOADSHED_BASELINE_WEIGHT = 0.05  # Weight of each window in the baseline average, i.e. it spans roughly 20 windows
+
+CRITICAL, NORMAL, LOW = "critical", "normal", "low"
+# Share of the current limit each class may fill
+PRIORITY_SHARES = {CRITICAL: 1.0, NORMAL: 0.75, LOW: 0.25}
+# Checkout writes: signing in, changing the cart and placing orders. Reading carts and orders is ordinary browsing
+CRITICAL_PREFIXES = ("/token", "/cart", "/guest/cart", "/orders")
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+EXEMPT_PREFIXES = ("/health", "/frontend")
+
+def priority_for(method: str, path: str) -> Optional[str]:
+    """Priority class of a route, or None if it isn't limited"""
+    if path.startswith(EXEMPT_PREFIXES):
+        return None
+    if path.startswith("/admin/"):
+        return LOW
+    if method not in READ_METHODS and path.startswith(CRITICAL_PREFIXES):
+        return CRITICAL
+    return NORMAL
+
+class ConcurrencyLimiter:
+    """AIMD limit on requests in flight, with per-class shares of it"""
+
+    def __init__(self, max_limit: int = LOADSHED_MAX_CONCURRENCY, min_limit: int = LOADSHED_MIN_CONCURRENCY,
+                 tolerance: float = LOADSHED_TOLERANCE, backoff: float = LOADSHED_BACKOFF,
+                 window_seconds: float = LOADSHED_WINDOW_SECONDS, enabled: bool = LOADSHED_ENABLED):
+        self.max_limit = max_limit
+        self.min_limit = min(min_limit, max_limit)
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.window_seconds = window_seconds
+        self.enabled = enabled
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.baseline: Optional[float] = None
+        self._window: List[float] = []
+        self._window_started = time.monotonic()
+        self.admitted = Counter()
+        self.shed = Counter()
+
+    def try_acquire(self, priority: str) -> bool:
+        """Admit a request of this class if it fits its share of the limit"""
+        if self.in_flight >= max(1.0, self.limit * PRIORITY_SHARES[priority]):
+            self.shed[priority] += 1
+            return False
+        self.in_flight += 1
+        self.admitted[priority] += 1
+        return True
+
+    def release(self, priority: str, latency: float, sample: bool = True):
+        """Free a request's slot; `sample` is False for responses whose latency says nothing about load"""
+        self.in_flight -= 1
+        if sample and priority != LOW:  # Admin exports are slow by nature; they'd read as congestion
+            self._window.append(latency)
+        now = time.monotonic()
+        if len(self._window) >= LOADSHED_WINDOW_MIN_SAMPLES and now - self._window_started >= self.window_seconds:
+            self._adjust(statistics.median(self._window))
+            self._window = []
+            self._window_started = now
+
+    def _adjust(self, latency: float):
+        congested = self.baseline is not None and latency > self.baseline * self.tolerance
+        if self.baseline is None:
+            self.baseline = latency
+        else:
+            self.baseline += (latency - self.baseline) * LOADSHED_BASELINE_WEIGHT
+        if congested:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1)
+
+    def retry_after(self) -> int:
+        """Seconds a shed client should wait: about how long the requests in flight take to drain"""
+        return max(1, math.ceil((self.baseline or 0) * self.tolerance * self.in_flight))
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "enabled": self.enabled,
+            "limit": round(self.limit, 1),
+            "max_limit": self.max_limit,
+            "in_flight": self.in_flight,
+            "baseline_latency_ms": round(self.baseline * 1000, 2) if self.baseline is not None else None,
+            "classes": {
+                priority: {"share": share, "admitted": self.admitted[priority], "shed": self.shed[priority]}
+                for priority, share in PRIORITY_SHARES.items()
+            },
+        }
+
+class LoadSheddingMiddleware:
+    """ASGI middleware rejecting requests over the concurrency limit with 503 and Retry-After"""
+
+    def __init__(self, app, limiter: ConcurrencyLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.limiter.enabled:
+            return await self.app(scope, receive, send)
+        priority = priority_for(scope["method"], scope["path"])
+        if priority is None:
+            return await self.app(scope, receive, send)
+
+        if not self.limiter.try_acquire(priority):
+            body = json.dumps({"detail": "Server busy, please retry"}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(self.limiter.retry_after()).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Throttled and busy responses return at once; counting them would drag the baseline down
+            self.limiter.release(priority, time.perf_counter() - start, sample=status_code not in (429, 503))
+
+load_limiter = ConcurrencyLimiter()
@@ -1,40 +1,124 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Cookie, Depends, File, HTTPException, Header, Query, Response, UploadFile, status
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from app.database import get_db, engine, Base
-from app.models import User, UserRole, Category, Product, CartItem, WishlistItem, Order, OrderItem, OrderStatus, PaymentStatus
+from sqlalchemy import and_, text
+from app.database import get_db, engine, Base, SessionLocal
+from app.models import (
+    User, UserRole, Category, Product, CartItem, WishlistItem, Order, OrderItem, OrderStatus, PaymentStatus, PaymentQRCode,
+    StockMovementReason, StockThreshold, Promotion, OrderDiscount, DeliveryBatch, ArchivedOrder
+)
 from app.schemas import (
-    UserCreate, UserResponse, Token, CategoryCreate, CategoryResponse,
-    ProductCreate, ProductResponse, CartItemCreate, CartItemResponse, CartResponse,
+    UserCreate, UserResponse, UserStatusUpdate, Token, TokenData, CategoryCreate, CategoryParentUpdate,
+    CategoryNodeResponse, CategoryTreeResponse, ProductCreate, ProductUpdate, ProductResponse, CartItemCreate, CartItemResponse, CartResponse, CartQuantityUpdate,
+    GuestCartItemResponse, GuestCartResponse,
     WishlistItemCreate, WishlistItemResponse, OrderCreate, OrderResponse, QRCodePayment,
-    ProductPriceUpdate
+    ProductPriceUpdate, StockAdjustment, StockThresholdUpdate, StockMovementResponse, StockMovementPage,
+    LowStockProductResponse, ProductPriceResponse, PricePoint, ReconciliationReportResponse, RecommendationResponse,
+    BootstrapResponse, AdminStatsResponse, PromotionCreate, PromotionUpdate, PromotionResponse,
+    BulkOrderStatusUpdate, BulkOrderStatusResponse, OrderStatusChangeResponse, DeliveryPlanResponse, DeliveryBatchResponse,
+    ServiceabilityResponse, ServiceAreasUploadResponse
 )
 from app.auth import (
-    authenticate_user, create_access_token, get_current_active_user, 
-    get_admin_user, get_password_hash
+    authenticate_user, create_access_token, get_current_active_user, get_optional_user,
+    get_admin_user, get_password_hash, revoke_tokens, user_claims
+)
+from app.jobs import enqueue, start_inline_worker, stop_inline_worker
+from app.idempotency import idempotency_store, request_fingerprint, scoped_key
+from app.ratelimit import RateLimitMiddleware, rate_limiter
+from app.loadshed import LoadSheddingMiddleware, load_limiter
+from app.cache import cache
+from app.catalog import catalog, SORT_ORDERS
+from app.categories import (
+    CategoryCycle, CategoryTree, add_category, adjust_product_count, ensure_category_tree, load_category_node,
+    load_category_tree, move_category, rebuild_product_counts
+)
+from app.listings import json_response
+from app.inventory import (
+    InsufficientStock, change_stock, sync_low_stock, rebuild_low_stock, low_stock, movements_page
+)
+from app import listings
+from app.archive import ensure_order_indexes
+from app.carts import (
+    GUEST_CART_COOKIE, GUEST_CART_COOKIE_SECURE, GUEST_CART_TTL_SECONDS, GuestCartFull,
+    add_cart_items, cart_id_from_cookie, ensure_cart_index, guest_carts, new_cart_cookie
 )
-from typing import List
+from app.pricing import backfill_price_history, set_price, price_history, prices_as_of, utc
+from app.promotions import CartLine, InvalidCoupon, promotions
+from app.delivery import batch_order_ids, batches_page, close_batch, find_pincode, run_delivery_plan
+from app.fulfilment import MAX_WAVE_SIZE, matching_orders, status_history, transition_orders
+from app.reconciliation import REPORTED_MISMATCHES, SettlementFileError, reconcile_settlement
+from app.recommendations import RECOMMENDATIONS_TOP_K, recommendations_for
+from app.search import MIN_QUERY_LENGTH, order_search
+from app.serviceability import (
+    PINCODE_DIGITS, ServiceabilityFileError, parse_service_areas, replace_service_areas, serviceability
+)
+from app.images import (
+    IMAGE_FORMATS, IMMUTABLE_CACHE_CONTROL, ImageUnavailable, bucket_width, image_service, negotiate_format, parse_variant
+)
+from app.payments import build_upi_payload, store_qr_code_image
+from app.singleflight import SingleFlightTimeout, flights
+from app.stats import dashboard_stats
+from app import tasks  # noqa: F401 - registers background job handlers
+from typing import List, Optional
+from contextlib import asynccontextmanager
+from datetime import datetime
+import io
 from decimal import Decimal
 import uuid
-import qrcode
-import io
-import base64
 import uvicorn
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
+ensure_order_indexes(engine)
+ensure_cart_index(engine)
+order_search.ensure(engine)
+
+RECONCILE_LOCK_KEY = 0x46560001  # Postgres advisory lock taken by reconcile_bulk_loads
+
+def reconcile_bulk_loads():
+    """Catch up the low-stock set, price history, category tree and order search with rows loaded outside the API (seed scripts, bulk imports)"""
+    db = SessionLocal()
+    try:
+        # Every worker runs this at startup; one at a time, so later ones find the work done instead of
+        # inserting the same rows. On SQLite the first write below takes the database write lock, which does the same
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": RECONCILE_LOCK_KEY})
+        rebuild_low_stock(db)
+        backfill_price_history(db)
+        ensure_category_tree(db)
+        rebuild_product_counts(db)
+        order_search.backfill(db)
+        db.commit()
+    finally:
+        db.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    reconcile_bulk_loads()
+    cache.start()  # The first version poll, here rather than in the first request
+    start_inline_worker()  # Only with JOBS_INLINE, where no worker process runs periodic jobs
+    yield
+    stop_inline_worker()
+    image_service.close()
 
 app = FastAPI(
     title="FV Commerce - Vegetables & Fruits Store",
     description="A modern e-commerce API for selling fresh vegetables and fruits with user authentication, cart, wishlist, and QR code payments",
     version="2.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
+# Middleware added last runs first. Load shedding sits inside the rate limiter, so requests it rejects never take a
+# concurrency slot or skew the latency the limit adapts to
+app.add_middleware(LoadSheddingMiddleware, limiter=load_limiter)
+# Add rate limiting middleware (inside CORS, so rejections still carry CORS headers)
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -44,6 +128,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(SingleFlightTimeout)
+async def single_flight_timeout_handler(request, exc: SingleFlightTimeout):
+    """A shared computation outlasted the caller's wait; it keeps running and the retry will likely find it done"""
+    return JSONResponse(status_code=503, content={"detail": "Busy, please retry"}, headers={"Retry-After": "1"})
+
 # Mount static files
 app.mount("/frontend", StaticFiles(directory="frontend", html=True), name="frontend")
 
@@ -90,6 +179,8 @@ async def register_user(user: UserCreate, db: Session = Depends(get_db)):
         hashed_password=hashed_password
     )
     db.add(db_user)
+    db.flush()
+    order_search.index_customer(db, db_user.id)
     db.commit()
     db.refresh(db_user)
     
@@ -97,7 +188,9 @@ async def register_user(user: UserCreate, db: Session = Depends(get_db)):
 
 @app.post("/token", response_model=Token)
 async def login_for_access_token(
+    response: Response,
     form_data: OAuth2PasswordRequestForm = Depends(),
+    guest_cart: Optional[str] = Cookie(None),
     db: Session = Depends(get_db)
 ):
     """Authenticate user and return access token"""
@@ -108,7 +201,20 @@ async def login_for_access_token(
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token = create_access_token(data={"sub": user.username})
+    
+    # Move the cart the shopper built while signed out into their account. The guest cart is only emptied once the
+    # account's cart has committed, so a failed merge leaves it in place for the next sign-in
+    cart_id = cart_id_from_cookie(guest_cart)
+    if cart_id:
+        snapshot = await catalog.load()
+        items = guest_carts.get(cart_id)
+        if items:
+            add_cart_items(db, user.id, {pid: quantity for pid, quantity in items.items() if snapshot.get(pid)})
+            db.commit()
+            guest_carts.remove_items(cart_id, items)
+        response.delete_cookie(GUEST_CART_COOKIE)
+    
+    access_token = create_access_token(data=user_claims(user))
     return Token(
         access_token=access_token, 
         token_type="bearer",
@@ -116,37 +222,89 @@ async def login_for_access_token(
     )
 
 @app.get("/users/me", response_model=UserResponse)
-async def read_users_me(current_user: User = Depends(get_current_active_user)):
+async def read_users_me(current_user: TokenData = Depends(get_current_active_user), db: Session = Depends(get_db)):
     """Get current authenticated user"""
-    return UserResponse.model_validate(current_user)
+    user = db.get(User, current_user.id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return UserResponse.model_validate(user)
 
 # ============ CATEGORY ENDPOINTS (Admin Only) ============
 
-@app.post("/categories", response_model=CategoryResponse)
+@app.post("/categories", response_model=CategoryNodeResponse)
 async def create_category(
     category: CategoryCreate, 
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_admin_user)
+    current_user: TokenData = Depends(get_admin_user)
 ):
-    """Create a new category (Admin only)"""
+    """Create a new category, optionally under a parent (Admin only)"""
     if db.query(Category).filter(Category.name == category.name).first():
         raise HTTPException(status_code=400, detail="Category already exists")
+    if category.parent_id is not None and not db.get(Category, category.parent_id):
+        raise HTTPException(status_code=404, detail="Parent category not found")
     
-    db_category = Category(**category.model_dump())
+    db_category = Category(**category.model_dump(exclude={"parent_id"}))
     db.add(db_category)
+    db.flush()
+    add_category(db, db_category.id, category.parent_id)
+    db.commit()
+    cache.invalidate("catalog")
+    cache.invalidate("categories")
+    # From this session: a shared tree load may have started before the commit
+    return load_category_node(db, db_category)
+
+@app.put("/categories/{category_id}/parent", response_model=CategoryNodeResponse)
+async def move_category_to_parent(
+    category_id: int,
+    update: CategoryParentUpdate,
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_admin_user)
+):
+    """Move a category and its subcategories under another parent, or to the top level (Admin only)"""
+    db_category = db.get(Category, category_id)
+    if not db_category:
+        raise HTTPException(status_code=404, detail="Category not found")
+    if update.parent_id is not None and not db.get(Category, update.parent_id):
+        raise HTTPException(status_code=404, detail="Parent category not found")
+    
+    try:
+        move_category(db, category_id, update.parent_id)
+    except CategoryCycle:
+        raise HTTPException(status_code=400, detail="A category can't be moved under itself or one of its subcategories")
     db.commit()
-    db.refresh(db_category)
-    return CategoryResponse.model_validate(db_category)
+    cache.invalidate("catalog")
+    cache.invalidate("categories")
+    return load_category_node(db, db_category)
 
-@app.get("/categories", response_model=List[CategoryResponse])
+@app.get("/categories", response_model=List[CategoryNodeResponse])
 async def list_categories(
     skip: int = 0, 
-    limit: int = 100, 
-    db: Session = Depends(get_db)
+    limit: int = 100
 ):
-    """List all active categories"""
-    categories = db.query(Category).filter(Category.is_active == True).offset(skip).limit(limit).all()
-    return [CategoryResponse.model_validate(cat) for cat in categories]
+    """List all active categories with their parent and active product counts"""
+    return json_response(await active_categories(skip, limit))
+
+@app.get("/categories/tree", response_model=List[CategoryTreeResponse])
+async def get_category_tree():
+    """Active categories nested under their parents, with active product counts"""
+    # Serialized once per catalog version
+    return Response(content=(await category_tree()).body, media_type="application/json")
+
+def _load_category_tree() -> CategoryTree:
+    """Load the tree in a session of its own: it runs in a worker thread, shared by requests that may finish first"""
+    db = SessionLocal()
+    try:
+        return load_category_tree(db)
+    finally:
+        db.close()
+
+async def category_tree() -> CategoryTree:
+    """The category tree, cached until the catalog changes; concurrent misses share one load"""
+    return await cache.get_or_compute("catalog", "category_tree", _load_category_tree)
+
+async def active_categories(skip: int = 0, limit: int = 100) -> List[dict]:
+    """Active categories in JSON form, from the cached category tree"""
+    return (await category_tree()).nodes[skip:skip + limit]
 
 # ============ PRODUCT ENDPOINTS ============
 
@@ -154,7 +312,7 @@ async def list_categories(
 async def create_product(
     product: ProductCreate, 
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_admin_user)
+    current_user: TokenData = Depends(get_admin_user)
 ):
     """Create a new product (Admin only)"""
     # Check if category exists
@@ -162,10 +320,72 @@ async def create_product(
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     
-    db_product = Product(**product.model_dump())
+    # Opening stock goes through the movement log like every other stock change
+    opening_stock = product.stock_quantity
+    db_product = Product(**product.model_dump(exclude={"stock_quantity"}), stock_quantity=0)
     db.add(db_product)
+    db.flush()
+    set_price(db, db_product, db_product.price, user_id=current_user.id)
+    adjust_product_count(db, db_product.category_id, 1)
+    if opening_stock:
+        change_stock(db, db_product.id, opening_stock, StockMovementReason.RESTOCK, user_id=current_user.id, note="Opening stock")
+    else:
+        sync_low_stock(db, db_product.id, 0)
+    db.commit()
+    db.refresh(db_product)
+    cache.invalidate("catalog")
+    return ProductResponse.model_validate(db_product)
+
+PRODUCT_CLEARABLE_FIELDS = ("description", "image_url", "nutritional_info", "origin")  # Others ignore an explicit null
+
+@app.put("/products/{product_id}", response_model=ProductResponse)
+async def update_product(
+    product_id: int,
+    product_update: ProductUpdate,
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_admin_user)
+):
+    """Update product details; price and stock changes are recorded like their dedicated endpoints' (Admin only)"""
+    db_product = db.query(Product).filter(Product.id == product_id).first()
+    if not db_product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    
+    changes = product_update.model_dump(exclude_unset=True)
+    if changes.get("category_id") is not None and not db.get(Category, changes["category_id"]):
+        raise HTTPException(status_code=404, detail="Category not found")
+    if changes.get("stock_quantity") is not None and changes["stock_quantity"] < 0:
+        raise HTTPException(status_code=400, detail="Stock quantity can't be negative")
+    
+    price = changes.pop("price", None)
+    stock_quantity = changes.pop("stock_quantity", None)
+    old_category_id, was_active = db_product.category_id, bool(db_product.is_active)
+    for field, value in changes.items():
+        if value is not None or field in PRODUCT_CLEARABLE_FIELDS:
+            setattr(db_product, field, value)
+    db.flush()
+    
+    # Category counts follow the product out of its old category and into the new one
+    if (db_product.category_id, bool(db_product.is_active)) != (old_category_id, was_active):
+        adjust_product_count(db, old_category_id, -1 if was_active else 0)
+        adjust_product_count(db, db_product.category_id, 1 if db_product.is_active else 0)
+    repriced = price is not None and price != db_product.price
+    if repriced:
+        set_price(db, db_product, price, user_id=current_user.id)
+    restocked = stock_quantity is not None and stock_quantity != (db_product.stock_quantity or 0)
+    if restocked:
+        change_stock(
+            db, product_id, stock_quantity - (db_product.stock_quantity or 0), StockMovementReason.ADJUSTMENT,
+            user_id=current_user.id, note="Product update"
+        )
+    elif bool(db_product.is_active) != was_active:
+        sync_low_stock(db, product_id, db_product.stock_quantity or 0, bool(db_product.is_active))
     db.commit()
     db.refresh(db_product)
+    cache.invalidate("catalog")
+    if repriced:
+        cache.invalidate("prices")
+    if restocked:
+        cache.invalidate("stock")
     return ProductResponse.model_validate(db_product)
 
 @app.put("/products/{product_id}/price", response_model=ProductResponse)
@@ -173,110 +393,181 @@ async def update_product_price(
     product_id: int,
     price_update: ProductPriceUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_admin_user)
+    current_user: TokenData = Depends(get_admin_user)
 ):
-    """Update product price (Admin only)"""
+    """Update product price now, or schedule it with effective_from (Admin only)"""
     db_product = db.query(Product).filter(Product.id == product_id).first()
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    db_product.price = price_update.price
+    entry = set_price(db, db_product, price_update.price, price_update.effective_from, current_user.id)
     db.commit()
     db.refresh(db_product)
+    if entry.applied_at is not None:
+        cache.invalidate("prices")
     return ProductResponse.model_validate(db_product)
 
+@app.get("/products/{product_id}/prices", response_model=List[ProductPriceResponse])
+async def get_price_history(
+    product_id: int,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_admin_user)
+):
+    """Price history, latest effective first, including scheduled changes (Admin only)"""
+    if not db.get(Product, product_id):
+        raise HTTPException(status_code=404, detail="Product not found")
+    
+    return [ProductPriceResponse.model_validate(entry) for entry in price_history(db, product_id, min(max(limit, 1), 1000))]
+
 @app.get("/products", response_model=List[ProductResponse])
 async def list_products(
     skip: int = 0, 
     limit: int = 50,
     category_id: int = None,
     is_organic: bool = None,
-    db: Session = Depends(get_db)
+    min_price: Optional[Decimal] = None,
+    max_price: Optional[Decimal] = None,
+    in_stock: Optional[bool] = None,
+    sort: Optional[str] = None
 ):
-    """List all active products with optional filters"""
-    query = db.query(Product).filter(Product.is_active == True)
+    """List all active products with optional filters and sort order"""
+    if sort is not None and sort not in SORT_ORDERS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(SORT_ORDERS)}")
     
-    if category_id:
-        query = query.filter(Product.category_id == category_id)
-    if is_organic is not None:
-        query = query.filter(Product.is_organic == is_organic)
-    
-    products = query.offset(skip).limit(limit).all()
-    return [ProductResponse.model_validate(product) for product in products]
+    # Answered from the in-memory columnar catalog, no database round trip
+    snapshot = await catalog.load()
+    return json_response(snapshot.filter(
+        category_id=category_id,
+        is_organic=is_organic,
+        min_price=min_price,
+        max_price=max_price,
+        in_stock=in_stock,
+        sort=sort,
+        skip=skip,
+        limit=limit
+    ))
 
 @app.get("/products/{product_id}", response_model=ProductResponse)
-async def get_product(product_id: int, db: Session = Depends(get_db)):
+async def get_product(product_id: int):
     """Get a specific product"""
-    product = db.query(Product).filter(
-        and_(Product.id == product_id, Product.is_active == True)
-    ).first()
+    product = (await catalog.load()).get(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return ProductResponse.model_validate(product)
+    return json_response(product)
+
+@app.get("/products/{product_id}/recommendations", response_model=List[RecommendationResponse])
+async def get_recommendations(product_id: int, limit: int = RECOMMENDATIONS_TOP_K, db: Session = Depends(get_db)):
+    """Products frequently bought together with this one"""
+    snapshot = await catalog.load()
+    if not snapshot.get(product_id):
+        raise HTTPException(status_code=404, detail="Product not found")
+    
+    # Precomputed by the recommendations job; one index lookup, products come from the in-memory catalog
+    recommendations = []
+    for recommended_id, orders in recommendations_for(db, product_id, min(max(limit, 1), RECOMMENDATIONS_TOP_K)):
+        product = snapshot.get(recommended_id)
+        if product:
+            recommendations.append({"product": product, "orders": orders})
+    return json_response(recommendations)
+
+# ============ IMAGE ENDPOINTS ============
+
+@app.get("/products/{product_id}/thumbnail")
+async def get_product_thumbnail(
+    product_id: int,
+    w: Optional[int] = None,
+    format: Optional[str] = None,
+    accept: Optional[str] = Header(None)
+):
+    """Redirect to the product image resized to a width bucket, as WebP when the browser takes it"""
+    product = (await catalog.load()).get(product_id)
+    if not product or not product.get("image_url"):
+        raise HTTPException(status_code=404, detail="Product image not found")
+    
+    try:
+        digest = await image_service.resolve(product["image_url"])
+    except ImageUnavailable:
+        raise HTTPException(status_code=404, detail="Product image unavailable")
+    # Short-lived: the target changes when the image does, the target itself never changes
+    return RedirectResponse(
+        f"/images/{digest}/{bucket_width(w)}.{negotiate_format(format, accept)}",
+        headers={"Cache-Control": "public, max-age=300", "Vary": "Accept"}
+    )
+
+@app.get("/images/{digest}/{variant}")
+async def get_image_variant(digest: str, variant: str):
+    """A rendered image variant, addressed by the hash of its source"""
+    parsed = parse_variant(digest, variant)
+    if parsed is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    width, image_format = parsed
+    try:
+        data = await image_service.variant(digest, width, image_format)
+    except ImageUnavailable:
+        data = None
+    if data is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return Response(
+        content=data,
+        media_type=IMAGE_FORMATS[image_format][1],
+        headers={"Cache-Control": IMMUTABLE_CACHE_CONTROL, "ETag": f'"{digest}-{variant}"'}
+    )
 
 # ============ CART ENDPOINTS ============
 
 @app.post("/cart/add", response_model=CartItemResponse)
 async def add_to_cart(
     cart_item: CartItemCreate,
+    idempotency_key: Optional[str] = Header(None),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: TokenData = Depends(get_current_active_user)
 ):
     """Add item to cart"""
-    # Check if product exists
-    product = db.query(Product).filter(Product.id == cart_item.product_id).first()
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    
-    # Check if item already in cart
-    existing_item = db.query(CartItem).filter(
-        and_(CartItem.user_id == current_user.id, CartItem.product_id == cart_item.product_id)
-    ).first()
-    
-    if existing_item:
-        existing_item.quantity += cart_item.quantity
+    with idempotency_store.claim(
+        scoped_key(current_user.id, "POST /cart/add", idempotency_key),
+        request_fingerprint(cart_item.model_dump()),
+        db
+    ) as slot:
+        if slot.replayed:
+            return slot.response
+        
+        # Check if product exists
+        product = db.query(Product).filter(Product.id == cart_item.product_id).first()
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        
+        # Insert or add to the existing line in one statement, so concurrent adds can't create duplicates
+        add_cart_items(db, current_user.id, {cart_item.product_id: cart_item.quantity})
+        db_cart_item = db.query(CartItem).filter(
+            and_(CartItem.user_id == current_user.id, CartItem.product_id == cart_item.product_id)
+        ).populate_existing().first()
+        response = slot.save(CartItemResponse.model_validate(db_cart_item), db)
         db.commit()
-        db.refresh(existing_item)
-        return CartItemResponse.model_validate(existing_item)
-    
-    # Add new item to cart
-    db_cart_item = CartItem(
-        user_id=current_user.id,
-        product_id=cart_item.product_id,
-        quantity=cart_item.quantity
-    )
-    db.add(db_cart_item)
-    db.commit()
-    db.refresh(db_cart_item)
-    return CartItemResponse.model_validate(db_cart_item)
+        return response
 
 @app.get("/cart", response_model=CartResponse)
 async def get_cart(
+    coupon: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: TokenData = Depends(get_current_active_user)
 ):
-    """Get user's cart"""
-    cart_items = db.query(CartItem).filter(CartItem.user_id == current_user.id).all()
-    
-    total_amount = Decimal("0.00")
-    cart_item_responses = []
-    
-    for item in cart_items:
-        item_response = CartItemResponse.model_validate(item)
-        total_amount += item.product.price * Decimal(str(item.quantity))
-        cart_item_responses.append(item_response)
-    
-    return CartResponse(
-        items=cart_item_responses,
-        total_items=len(cart_items),
-        total_amount=total_amount
-    )
+    """Get user's cart, with promotions (and the coupon, if given) applied"""
+    # Products come from the catalog snapshot rather than a lazy load per line
+    # Listings read the snapshot and promotions synchronously; refresh them off the event loop first
+    await catalog.load()
+    await promotions.load()
+    try:
+        return json_response(listings.user_cart(db, current_user.id, coupon))
+    except InvalidCoupon:
+        raise HTTPException(status_code=400, detail="Invalid coupon code")
 
 @app.delete("/cart/{item_id}")
 async def remove_from_cart(
     item_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: TokenData = Depends(get_current_active_user)
 ):
     """Remove item from cart"""
     cart_item = db.query(CartItem).filter(
@@ -290,13 +581,112 @@ async def remove_from_cart(
     db.commit()
     return {"message": "Item removed from cart"}
 
+@app.put("/cart/items/{product_id}")
+async def set_cart_quantity(
+    product_id: int,
+    update: CartQuantityUpdate,
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_current_active_user)
+):
+    """Set a product's quantity in the cart; 0 removes it"""
+    cart_item = db.query(CartItem).filter(
+        and_(CartItem.user_id == current_user.id, CartItem.product_id == product_id)
+    ).first()
+    
+    if update.quantity == 0:
+        if cart_item:
+            db.delete(cart_item)
+            db.commit()
+        return {"product_id": product_id, "quantity": 0}
+    
+    if cart_item:
+        cart_item.quantity = update.quantity
+    else:
+        if not db.get(Product, product_id):
+            raise HTTPException(status_code=404, detail="Product not found")
+        add_cart_items(db, current_user.id, {product_id: update.quantity})
+    db.commit()
+    return {"product_id": product_id, "quantity": update.quantity}
+
+# ============ GUEST CART ENDPOINTS ============
+
+async def guest_cart_response(items: dict, coupon_code: Optional[str] = None) -> GuestCartResponse:
+    """Guest cart lines with their products and discounts, skipping products that have since been removed"""
+    snapshot = await catalog.load()
+    lines = []
+    cart_lines = []
+    for product_id, quantity in items.items():
+        product = snapshot.get(product_id)
+        if product is None:
+            continue
+        lines.append(GuestCartItemResponse(product_id=product_id, quantity=quantity, product=product))
+        cart_lines.append(CartLine.from_document(product, quantity))
+    priced = (await promotions.load()).price(cart_lines, coupon_code)
+    return GuestCartResponse(items=lines, total_items=len(lines), **priced.totals())
+
+@app.get("/guest/cart", response_model=GuestCartResponse)
+async def get_guest_cart(coupon: Optional[str] = None, guest_cart: Optional[str] = Cookie(None)):
+    """Get the signed-out shopper's cart, with promotions (and the coupon, if given) applied"""
+    cart_id = cart_id_from_cookie(guest_cart)
+    try:
+        return await guest_cart_response(guest_carts.get(cart_id) if cart_id else {}, coupon)
+    except InvalidCoupon:
+        raise HTTPException(status_code=400, detail="Invalid coupon code")
+
+@app.post("/guest/cart/add", response_model=GuestCartResponse)
+async def add_to_guest_cart(
+    cart_item: CartItemCreate,
+    response: Response,
+    guest_cart: Optional[str] = Cookie(None)
+):
+    """Add item to the signed-out shopper's cart, starting one if needed"""
+    if cart_item.quantity <= 0:
+        raise HTTPException(status_code=400, detail="Quantity must be positive")
+    if not (await catalog.load()).get(cart_item.product_id):
+        raise HTTPException(status_code=404, detail="Product not found")
+    
+    cart_id = cart_id_from_cookie(guest_cart)
+    if cart_id is None:
+        cart_id, cookie = new_cart_cookie()
+    else:
+        cookie = guest_cart
+    try:
+        items = guest_carts.add(cart_id, cart_item.product_id, cart_item.quantity)
+    except GuestCartFull:
+        raise HTTPException(status_code=400, detail="Cart is full")
+    # Refreshed on every write, matching the cart's sliding expiry
+    response.set_cookie(
+        GUEST_CART_COOKIE, cookie, max_age=GUEST_CART_TTL_SECONDS,
+        httponly=True, samesite="lax", secure=GUEST_CART_COOKIE_SECURE
+    )
+    return await guest_cart_response(items)
+
+@app.put("/guest/cart/items/{product_id}", response_model=GuestCartResponse)
+async def set_guest_cart_quantity(
+    product_id: int,
+    update: CartQuantityUpdate,
+    guest_cart: Optional[str] = Cookie(None)
+):
+    """Set a product's quantity in the signed-out shopper's cart; 0 removes it"""
+    cart_id = cart_id_from_cookie(guest_cart)
+    if cart_id is None:
+        raise HTTPException(status_code=404, detail="Cart not found")
+    if update.quantity and not (await catalog.load()).get(product_id):
+        raise HTTPException(status_code=404, detail="Product not found")
+    
+    try:
+        items = guest_carts.set_quantity(cart_id, product_id, update.quantity)
+    except GuestCartFull:
+        raise HTTPException(status_code=400, detail="Cart is full")
+    return await guest_cart_response(items)
+
 # ============ WISHLIST ENDPOINTS ============
 
 @app.post("/wishlist/add", response_model=WishlistItemResponse)
 async def add_to_wishlist(
     wishlist_item: WishlistItemCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: TokenData = Depends(get_current_active_user)
 ):
     """Add item to wishlist"""
     # Check if product exists
@@ -324,17 +714,17 @@ async def add_to_wishlist(
 @app.get("/wishlist", response_model=List[WishlistItemResponse])
 async def get_wishlist(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: TokenData = Depends(get_current_active_user)
 ):
     """Get user's wishlist"""
-    wishlist_items = db.query(WishlistItem).filter(WishlistItem.user_id == current_user.id).all()
-    return [WishlistItemResponse.model_validate(item) for item in wishlist_items]
+    await catalog.load()
+    return json_response(listings.user_wishlist(db, current_user.id))
 
 @app.delete("/wishlist/{item_id}")
 async def remove_from_wishlist(
     item_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: TokenData = Depends(get_current_active_user)
 ):
     """Remove item from wishlist"""
     wishlist_item = db.query(WishlistItem).filter(
@@ -348,103 +738,184 @@ async def remove_from_wishlist(
     db.commit()
     return {"message": "Item removed from wishlist"}
 
+# ============ PAGE LOAD ENDPOINTS ============
+
+@app.get("/bootstrap", response_model=BootstrapResponse)
+async def bootstrap(
+    products_limit: int = 50,
+    guest_cart: Optional[str] = Cookie(None),
+    db: Session = Depends(get_db),
+    current_user: Optional[TokenData] = Depends(get_optional_user)
+):
+    """Categories, products and the shopper's profile, cart and wishlist in one request"""
+    # Replaces five page-load requests: one token check and one session; everything but the user's rows is in memory
+    payload = {
+        "categories": await active_categories(),
+        "products": (await catalog.load()).filter(limit=min(max(products_limit, 1), 500)),
+        "user": None,
+        "cart": None,
+        "wishlist": None
+    }
+    if current_user is None:
+        cart_id = cart_id_from_cookie(guest_cart)
+        payload["cart"] = (await guest_cart_response(guest_carts.get(cart_id) if cart_id else {})).model_dump(mode="json")
+    else:
+        await catalog.load()
+        await promotions.load()
+        payload["user"] = listings.user_document(db, current_user.id)
+        payload["cart"] = listings.user_cart(db, current_user.id)
+        payload["wishlist"] = listings.user_wishlist(db, current_user.id)
+    return json_response(payload)
+
 # ============ ORDER ENDPOINTS ============
 
+@app.get("/serviceability/{pincode}", response_model=ServiceabilityResponse)
+async def get_serviceability(pincode: str):
+    """Whether we deliver to a pincode, with the zone, delivery fee, daily order cutoff and when an order placed now goes out"""
+    if len(pincode) != PINCODE_DIGITS or not pincode.isdigit():
+        raise HTTPException(status_code=400, detail=f"Pincodes are {PINCODE_DIGITS} digits")
+    coverage = serviceability.current()
+    if not coverage.prefixes:
+        return ServiceabilityResponse(pincode=pincode, serviceable=True)  # No table uploaded yet
+    area = coverage.lookup(pincode)
+    if area is None:
+        return ServiceabilityResponse(pincode=pincode, serviceable=False)
+    return ServiceabilityResponse(
+        pincode=pincode, serviceable=True, zone=area.zone, delivery_fee=area.delivery_fee, cutoff=area.cutoff,
+        dispatch_date=area.dispatch_date()
+    )
+
 @app.post("/orders", response_model=OrderResponse)
 async def create_order(
     order: OrderCreate,
+    idempotency_key: Optional[str] = Header(None),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: TokenData = Depends(get_current_active_user)
 ):
     """Create order from cart"""
-    # Get cart items
-    cart_items = db.query(CartItem).filter(CartItem.user_id == current_user.id).all()
-    
-    if not cart_items:
-        raise HTTPException(status_code=400, detail="Cart is empty")
-    
-    # Calculate total
-    total_amount = Decimal("0.00")
-    order_items_data = []
-    
-    for item in cart_items:
-        unit_price = item.product.price
-        total_price = unit_price * Decimal(str(item.quantity))
-        total_amount += total_price
+    with idempotency_store.claim(
+        scoped_key(current_user.id, "POST /orders", idempotency_key),
+        request_fingerprint(order.model_dump()),
+        db
+    ) as slot:
+        if slot.replayed:
+            return slot.response
         
-        order_items_data.append({
-            "product_id": item.product_id,
-            "quantity": item.quantity,
-            "unit_price": unit_price,
-            "total_price": total_price
-        })
-    
-    # Create order
-    order_number = f"ORD-{uuid.uuid4().hex[:8].upper()}"
-    
-    db_order = Order(
-        user_id=current_user.id,
-        order_number=order_number,
-        total_amount=total_amount,
-        delivery_address=order.delivery_address,
-        notes=order.notes
-    )
-    db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
-    
-    # Create order items
-    for item_data in order_items_data:
-        order_item = OrderItem(order_id=db_order.id, **item_data)
-        db.add(order_item)
-    
-    # Clear cart
-    for item in cart_items:
-        db.delete(item)
-    
-    db.commit()
-    
-    # Generate QR code for payment
-    qr_data = f"upi://pay?pa=merchant@upi&pn=FVCommerce&mc=5411&tr={order_number}&tn=Payment for {order_number}&am={total_amount}&cu=INR"
-    
-    db_order.qr_code_data = qr_data
-    db.commit()
-    db.refresh(db_order)
-    
-    return OrderResponse.model_validate(db_order)
+        # Once a serviceability table has been uploaded, only addresses in it are accepted
+        coverage = serviceability.current()
+        if coverage.prefixes:
+            pincode = find_pincode(order.delivery_address)
+            if pincode is None:
+                raise HTTPException(status_code=400, detail="Add the 6-digit pincode to the delivery address")
+            if coverage.lookup(pincode) is None:
+                raise HTTPException(status_code=400, detail=f"We don't deliver to {pincode} yet")
+        
+        # Get cart items
+        # By product id: stock rows are then locked in the same order as every other checkout and return_stock
+        cart_items = db.query(CartItem).filter(CartItem.user_id == current_user.id).order_by(CartItem.product_id).all()
+        
+        if not cart_items:
+            raise HTTPException(status_code=400, detail="Cart is empty")
+        
+        # Calculate total, less the promotions (and coupon) the cart qualifies for
+        try:
+            priced = (await promotions.load()).price(
+                [CartLine(item.product_id, item.product.category_id, item.product.price, item.quantity) for item in cart_items],
+                order.coupon_code
+            )
+        except InvalidCoupon:
+            raise HTTPException(status_code=400, detail="Invalid coupon code")
+        total_amount = priced.total
+        line_discounts = priced.line_discounts()
+        order_items_data = []
+        
+        for item in cart_items:
+            unit_price = item.product.price
+            # What the shopper pays for the line; unit_price stays the list price
+            total_price = unit_price * Decimal(str(item.quantity)) - line_discounts.get(item.product_id, Decimal("0.00"))
+            
+            order_items_data.append({
+                "product_id": item.product_id,
+                "quantity": item.quantity,
+                "unit_price": unit_price,
+                "total_price": total_price
+            })
+        
+        # Create order, its items and clear the cart in a single transaction
+        order_number = f"ORD-{uuid.uuid4().hex[:8].upper()}"
+        
+        db_order = Order(
+            user_id=current_user.id,
+            order_number=order_number,
+            total_amount=total_amount,
+            delivery_address=order.delivery_address,
+            notes=order.notes,
+            qr_code_data=build_upi_payload(order_number, total_amount)
+        )
+        db.add(db_order)
+        db.flush()
+        order_search.index_order(db, db_order.id)
+        
+        for item_data in order_items_data:
+            db.add(OrderItem(order_id=db_order.id, **item_data))
+            try:
+                change_stock(
+                    db, item_data["product_id"], -item_data["quantity"], StockMovementReason.CHECKOUT,
+                    order_id=db_order.id, user_id=current_user.id
+                )
+            except InsufficientStock:
+                db.rollback()
+                product = next(item.product for item in cart_items if item.product_id == item_data["product_id"])
+                raise HTTPException(status_code=400, detail=f"Insufficient stock for {product.name}")
+        
+        for applied in priced.discounts:
+            db.add(OrderDiscount(order_id=db_order.id, product_id=applied.product_id, promotion_id=applied.promotion_id, amount=applied.amount))
+        
+        for item in cart_items:
+            db.delete(item)
+        
+        # Post-checkout work (QR rendering, notifications, ...) runs in the job worker
+        enqueue(db, "order.placed", {"order_id": db_order.id}, idempotency_key=f"order.placed:{order_number}")
+        
+        # The key's response commits with the order, so a retry either replays it or finds no order placed
+        db.flush()
+        response = slot.save(OrderResponse.model_validate(db_order), db)
+        db.commit()
+        cache.invalidate("stock")
+        
+        return response
 
 @app.get("/orders", response_model=List[OrderResponse])
 async def get_order_history(
     skip: int = 0,
     limit: int = 50,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: TokenData = Depends(get_current_active_user)
 ):
     """Get user's order history"""
-    orders = db.query(Order).filter(Order.user_id == current_user.id).order_by(Order.created_at.desc()).offset(skip).limit(limit).all()
-    return [OrderResponse.model_validate(order) for order in orders]
+    await catalog.load()
+    return json_response(listings.order_history(db, current_user.id, skip, limit))
 
 @app.get("/orders/{order_id}", response_model=OrderResponse)
 async def get_order(
     order_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: TokenData = Depends(get_current_active_user)
 ):
     """Get specific order"""
-    order = db.query(Order).filter(
-        and_(Order.id == order_id, Order.user_id == current_user.id)
-    ).first()
+    await catalog.load()
+    order = listings.find_order(db, order_id, current_user.id)
     
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    return OrderResponse.model_validate(order)
+    return json_response(order)
 
 @app.get("/orders/{order_id}/qr-code")
 async def get_payment_qr_code(
     order_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: TokenData = Depends(get_current_active_user)
 ):
     """Get QR code for payment"""
     order = db.query(Order).filter(
@@ -457,22 +928,22 @@ async def get_payment_qr_code(
     if order.payment_status == PaymentStatus.COMPLETED:
         raise HTTPException(status_code=400, detail="Order already paid")
     
-    # Generate QR code image
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(order.qr_code_data)
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
-    img_buffer = io.BytesIO()
-    img.save(img_buffer, format='PNG')
-    img_str = base64.b64encode(img_buffer.getvalue()).decode()
+    # Use the image pre-rendered by the job worker, if it has run yet
+    qr_code = db.get(PaymentQRCode, order.id)
+    if qr_code:
+        qr_code_image = qr_code.image_data
+    else:
+        # Rendered off the event loop, once however many times the payer's app polls meanwhile, and stored. The
+        # session's connection goes back to the pool first: requests parked here mustn't hold the pool between them
+        db.close()
+        qr_code_image = await flights.run(("qr-code", order.id), store_qr_code_image, order.id, order.qr_code_data)
     
     return {
         "order_id": order.id,
         "order_number": order.order_number,
         "amount": order.total_amount,
         "qr_code_data": order.qr_code_data,
-        "qr_code_image": f"data:image/png;base64,{img_str}",
+        "qr_code_image": qr_code_image,
         "payment_instructions": "Scan this QR code with any UPI app to make payment"
     }
 
@@ -484,26 +955,325 @@ async def get_all_orders(
     limit: int = 100,
     status: OrderStatus = None,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_admin_user)
+    current_user: TokenData = Depends(get_admin_user)
 ):
     """Get all orders (Admin only)"""
-    query = db.query(Order)
-    if status:
-        query = query.filter(Order.status == status)
-    
-    orders = query.order_by(Order.created_at.desc()).offset(skip).limit(limit).all()
-    return [OrderResponse.model_validate(order) for order in orders]
+    await catalog.load()
+    return json_response(listings.all_orders(db, status, skip, limit))
+
+@app.get("/admin/orders/search", response_model=List[OrderResponse])
+async def search_orders(
+    q: str,
+    skip: int = 0,
+    limit: int = 50,
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_admin_user)
+):
+    """Orders whose number starts with `q`, or whose customer username/email, delivery address or notes contain it, latest first (Admin only)"""
+    term = q.strip()
+    if len(term) < MIN_QUERY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Search for at least {MIN_QUERY_LENGTH} characters")
+    order_ids = order_search.search(db, term, max(skip, 0), min(max(limit, 1), 200))
+    await catalog.load()
+    return json_response(listings.orders_by_ids(db, order_ids))
+
+@app.get("/admin/orders/{order_id}/status-history", response_model=List[OrderStatusChangeResponse])
+async def get_order_status_history(
+    order_id: int,
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_admin_user)
+):
+    """An order's status moves, oldest first, archived orders included (Admin only)"""
+    if not db.get(Order, order_id) and not db.get(ArchivedOrder, order_id):
+        raise HTTPException(status_code=404, detail="Order not found")
+    return status_history(db, order_id)
+
+@app.post("/admin/orders/status/bulk", response_model=BulkOrderStatusResponse)
+def bulk_update_order_status(
+    update: BulkOrderStatusUpdate,
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_admin_user)
+):
+    """Move a list of orders, or those matching a filter, to a status in chunked transactions, reporting each order (Admin only)"""
+    if update.filter is not None:
+        order_ids = matching_orders(
+            db, OrderStatus(update.filter.status.value), update.filter.created_from, update.filter.created_to,
+            min(max(update.filter.limit, 1), MAX_WAVE_SIZE),
+        )
+    elif len(update.order_ids) > MAX_WAVE_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_WAVE_SIZE} orders per request")
+    else:
+        order_ids = update.order_ids
+    status = OrderStatus(update.status.value)
+    report = transition_orders(db, order_ids, status, current_user.id, dry_run=update.dry_run)
+    if status == OrderStatus.CANCELLED and report.counts.get("applied") and not update.dry_run:
+        cache.invalidate("stock")  # Cancelled items went back into stock
+    if status == OrderStatus.CONFIRMED and report.counts.get("applied") and not update.dry_run:
+        enqueue(db, "delivery.plan")  # Batch the newly confirmed orders
+        db.commit()
+    return BulkOrderStatusResponse.model_validate(report)
+
+@app.post("/admin/delivery/plan", response_model=DeliveryPlanResponse)
+def plan_delivery_batches(
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_admin_user)
+):
+    """Put confirmed orders that aren't in a delivery batch yet into batches now, ahead of the planning job (Admin only)"""
+    return DeliveryPlanResponse.model_validate(run_delivery_plan(db))
+
+@app.get("/admin/delivery/batches", response_model=List[DeliveryBatchResponse])
+async def get_delivery_batches(
+    zone: Optional[str] = None,
+    dispatched: bool = False,
+    skip: int = 0,
+    limit: int = 50,
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_admin_user)
+):
+    """Open (or dispatched) delivery batches, oldest first, with their orders in route order (Admin only)"""
+    return batches_page(db, zone, dispatched, max(skip, 0), min(max(limit, 1), 200))
+
+@app.post("/admin/delivery/batches/{batch_id}/dispatch", response_model=BulkOrderStatusResponse)
+async def dispatch_delivery_batch(
+    batch_id: int,
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_admin_user)
+):
+    """Close a delivery batch and move its orders to processing (Admin only)"""
+    if db.get(DeliveryBatch, batch_id) is None:
+        raise HTTPException(status_code=404, detail="Delivery batch not found")
+    if not close_batch(db, batch_id):
+        raise HTTPException(status_code=400, detail="Delivery batch already dispatched")
+    db.commit()  # Closed before its orders move on, so planning doesn't take them back out
+    report = transition_orders(db, batch_order_ids(db, batch_id), OrderStatus.PROCESSING, current_user.id)
+    return BulkOrderStatusResponse.model_validate(report)
 
 @app.get("/admin/users", response_model=List[UserResponse])
 async def get_all_users(
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_admin_user)
+    current_user: TokenData = Depends(get_admin_user)
 ):
     """Get all users (Admin only)"""
-    users = db.query(User).offset(skip).limit(limit).all()
-    return [UserResponse.model_validate(user) for user in users]
+    return json_response(listings.all_users(db, skip, limit))
+
+@app.put("/admin/users/{user_id}/status", response_model=UserResponse)
+async def update_user_status(
+    user_id: int,
+    update: UserStatusUpdate,
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_admin_user)
+):
+    """Activate or deactivate a user, revoking their tokens so the change applies immediately (Admin only)"""
+    if user_id == current_user.id and not update.is_active:
+        raise HTTPException(status_code=400, detail="You can't deactivate your own account")
+    user = db.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    user.is_active = update.is_active
+    # Issued tokens carry the old status as a claim
+    revoke_tokens(db, user.id)
+    db.commit()
+    cache.invalidate("auth")
+    db.refresh(user)
+    return UserResponse.model_validate(user)
+
+@app.get("/admin/inventory/low-stock", response_model=List[LowStockProductResponse])
+async def get_low_stock_products(
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_admin_user)
+):
+    """Active products below their low-stock threshold, lowest stock first (Admin only)"""
+    return low_stock(db)
+
+@app.get("/admin/inventory/movements", response_model=StockMovementPage)
+async def get_stock_movements(
+    product_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    limit: int = 50,
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_admin_user)
+):
+    """Stock movement history, newest first; pass next_before_id back as before_id for the next page (Admin only)"""
+    movements, next_before_id = movements_page(db, product_id, before_id, min(max(limit, 1), 500))
+    return StockMovementPage(
+        movements=[StockMovementResponse.model_validate(movement) for movement in movements],
+        next_before_id=next_before_id
+    )
+
+@app.post("/admin/inventory/{product_id}/adjust", response_model=StockMovementResponse)
+async def adjust_stock(
+    product_id: int,
+    adjustment: StockAdjustment,
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_admin_user)
+):
+    """Add or remove stock, e.g. a delivery or spoilage (Admin only)"""
+    if not db.get(Product, product_id):
+        raise HTTPException(status_code=404, detail="Product not found")
+    
+    try:
+        movement = change_stock(
+            db, product_id, adjustment.change, adjustment.reason,
+            user_id=current_user.id, note=adjustment.note
+        )
+    except InsufficientStock:
+        raise HTTPException(status_code=400, detail="Stock can't go below zero")
+    
+    db.commit()
+    db.refresh(movement)
+    cache.invalidate("stock")
+    return StockMovementResponse.model_validate(movement)
+
+@app.put("/admin/inventory/{product_id}/threshold")
+async def set_stock_threshold(
+    product_id: int,
+    threshold_update: StockThresholdUpdate,
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_admin_user)
+):
+    """Set the stock level below which a product is reported as low (Admin only)"""
+    product = db.get(Product, product_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    
+    threshold = db.get(StockThreshold, product_id)
+    if threshold:
+        threshold.threshold = threshold_update.threshold
+    else:
+        db.add(StockThreshold(product_id=product_id, threshold=threshold_update.threshold))
+    sync_low_stock(db, product_id, product.stock_quantity or 0, product.is_active, threshold_update.threshold)
+    db.commit()
+    
+    return {
+        "product_id": product_id,
+        "threshold": threshold_update.threshold,
+        "low_stock": bool(product.is_active) and (product.stock_quantity or 0) < threshold_update.threshold
+    }
+
+@app.get("/admin/prices", response_model=List[PricePoint])
+async def get_prices_as_of(
+    at: datetime,
+    product_id: Optional[List[int]] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_admin_user)
+):
+    """Prices in effect at a point in time, for all products or the given product_id values (Admin only)"""
+    prices = prices_as_of(db, at, product_id)
+    return [PricePoint(product_id=pid, price=price) for pid, price in sorted(prices.items())]
+
+@app.post("/admin/promotions", response_model=PromotionResponse)
+async def create_promotion(
+    promotion: PromotionCreate,
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_admin_user)
+):
+    """Create a promotion or, with a code, a coupon (Admin only)"""
+    if promotion.product_id is not None and not db.get(Product, promotion.product_id):
+        raise HTTPException(status_code=404, detail="Product not found")
+    if promotion.category_id is not None and not db.get(Category, promotion.category_id):
+        raise HTTPException(status_code=404, detail="Category not found")
+    if promotion.code and db.query(Promotion).filter(Promotion.code == promotion.code).first():
+        raise HTTPException(status_code=400, detail="Coupon code already exists")
+    
+    db_promotion = Promotion(**promotion.model_dump(exclude={"starts_at", "ends_at"}))
+    db_promotion.starts_at = promotion.starts_at and utc(promotion.starts_at)
+    db_promotion.ends_at = promotion.ends_at and utc(promotion.ends_at)
+    db.add(db_promotion)
+    db.commit()
+    db.refresh(db_promotion)
+    cache.invalidate("promotions")
+    return PromotionResponse.model_validate(db_promotion)
+
+@app.get("/admin/promotions", response_model=List[PromotionResponse])
+async def list_promotions(
+    active_only: bool = False,
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_admin_user)
+):
+    """List promotions, newest first (Admin only)"""
+    query = db.query(Promotion)
+    if active_only:
+        query = query.filter(Promotion.is_active == True)
+    promotion_list = query.order_by(Promotion.id.desc()).offset(skip).limit(min(max(limit, 1), 1000)).all()
+    return [PromotionResponse.model_validate(promotion) for promotion in promotion_list]
+
+@app.put("/admin/promotions/{promotion_id}", response_model=PromotionResponse)
+async def update_promotion(
+    promotion_id: int,
+    update: PromotionUpdate,
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_admin_user)
+):
+    """Rename, reschedule, activate or deactivate a promotion (Admin only)"""
+    db_promotion = db.get(Promotion, promotion_id)
+    if not db_promotion:
+        raise HTTPException(status_code=404, detail="Promotion not found")
+    
+    # Discounts stay fixed once created, so orders' order_discounts keep meaning what they did
+    changes = update.model_dump(exclude_unset=True)
+    for name in ("starts_at", "ends_at"):
+        if changes.get(name) is not None:
+            changes[name] = utc(changes[name])
+    for name, value in changes.items():
+        setattr(db_promotion, name, value)
+    if db_promotion.starts_at and db_promotion.ends_at and db_promotion.ends_at <= db_promotion.starts_at:
+        raise HTTPException(status_code=400, detail="ends_at must be after starts_at")
+    db.commit()
+    db.refresh(db_promotion)
+    cache.invalidate("promotions")
+    return PromotionResponse.model_validate(db_promotion)
+
+@app.post("/admin/payments/reconcile", response_model=ReconciliationReportResponse)
+def reconcile_payments(
+    settlement: UploadFile = File(...),
+    dry_run: bool = False,
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_admin_user)
+):
+    """Apply a UPI settlement CSV (order_number, amount, status) to order payment statuses (Admin only)"""
+    lines = io.TextIOWrapper(settlement.file, encoding="utf-8-sig", newline="")
+    try:
+        report = reconcile_settlement(db, lines, dry_run=dry_run, keep_mismatches=REPORTED_MISMATCHES)
+    except SettlementFileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return ReconciliationReportResponse.model_validate(report)
+
+@app.post("/admin/serviceability", response_model=ServiceAreasUploadResponse)
+def upload_service_areas(
+    areas: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_admin_user)
+):
+    """Replace the serviceability table with a CSV of pincode prefixes (prefix, zone, delivery_fee, cutoff, serviceable) (Admin only)"""
+    lines = io.TextIOWrapper(areas.file, encoding="utf-8-sig", newline="")
+    try:
+        parsed = parse_service_areas(lines)
+    except ServiceabilityFileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    replace_service_areas(db, parsed)
+    db.commit()
+    cache.invalidate("serviceability")  # Every process rebuilds its index
+    return ServiceAreasUploadResponse(prefixes=len(parsed), serviceable_prefixes=sum(1 for area in parsed if area.serviceable))
+
+@app.get("/admin/stats", response_model=AdminStatsResponse)
+async def get_admin_stats(current_user: TokenData = Depends(get_admin_user)):
+    """Catalog, user, order and revenue totals for the dashboard (Admin only)"""
+    return await flights.run("admin-stats", dashboard_stats)
+
+@app.get("/admin/rate-limits")
+async def get_rate_limit_stats(current_user: TokenData = Depends(get_admin_user)):
+    """Rate limit budgets with allowed/rejected request counters for this process (Admin only)"""
+    return rate_limiter.stats()
+
+@app.get("/admin/concurrency")
+async def get_concurrency_stats(current_user: TokenData = Depends(get_admin_user)):
+    """Adaptive concurrency limit, requests in flight and admitted/shed counters per priority class (Admin only)"""
+    return load_limiter.stats()
 
 @app.get("/health")
 async def health_check():
@@ -525,4 +1295,4 @@ async def health_check():
     }
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
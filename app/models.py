@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, DECIMAL, Enum
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Time, Text, ForeignKey, DECIMAL, Enum, Index, Float
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -43,6 +43,26 @@ class Category(Base):
     # Relationships
     products = relationship("Product", back_populates="category")
 
+class CategoryTreePath(Base):
+    """Closure table of the category hierarchy: a row per (ancestor, descendant) pair, each category its own ancestor at depth 0"""
+    __tablename__ = "category_tree"
+    
+    ancestor_id = Column(Integer, ForeignKey("categories.id"), primary_key=True)  # Subtree lookups
+    descendant_id = Column(Integer, ForeignKey("categories.id"), primary_key=True)
+    depth = Column(Integer, nullable=False)  # 1 for the parent
+    
+    __table_args__ = (
+        Index("ix_category_tree_descendant_id_depth", "descendant_id", "depth"),  # Ancestor lookups
+    )
+
+class CategoryProductCount(Base):
+    """Active products per category, kept up to date as products are added, moved and (de)activated"""
+    __tablename__ = "category_product_counts"
+    
+    category_id = Column(Integer, ForeignKey("categories.id"), primary_key=True)
+    product_count = Column(Integer, nullable=False, default=0)  # Directly in the category
+    subtree_product_count = Column(Integer, nullable=False, default=0)  # In it or any subcategory
+
 class Product(Base):
     """Product model for vegetables and fruits"""
     __tablename__ = "products"
@@ -82,6 +102,10 @@ class CartItem(Base):
     # Relationships
     user = relationship("User", back_populates="cart_items")
     product = relationship("Product", back_populates="cart_items")
+    
+    __table_args__ = (
+        Index("ux_cart_items_user_id_product_id", "user_id", "product_id", unique=True),  # One row per product, upserted
+    )
 
 class WishlistItem(Base):
     """Wishlist item model"""
@@ -132,13 +156,19 @@ class Order(Base):
     # Relationships
     user = relationship("User", back_populates="orders")
     order_items = relationship("OrderItem", back_populates="order")
+    
+    __table_args__ = (
+        Index("ix_orders_created_at", "created_at"),  # Admin listing, newest first
+        Index("ix_orders_user_id_created_at", "user_id", "created_at"),  # Order history
+        Index("ix_orders_status_created_at", "status", "created_at"),  # Admin listing by status
+    )
 
 class OrderItem(Base):
     """Order item model"""
     __tablename__ = "order_items"
     
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
     product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
     quantity = Column(Integer, nullable=False)
     unit_price = Column(DECIMAL(10, 2), nullable=False)
@@ -146,4 +176,304 @@ class OrderItem(Base):
     
     # Relationships
     order = relationship("Order", back_populates="order_items")
-    product = relationship("Product", back_populates="order_items")
\ No newline at end of file
+    product = relationship("Product", back_populates="order_items")
+
+class PaymentQRCode(Base):
+    """Pre-rendered payment QR code image for an order"""
+    __tablename__ = "payment_qr_codes"
+    
+    order_id = Column(Integer, ForeignKey("orders.id"), primary_key=True)
+    image_data = Column(Text, nullable=False)  # data:image/png;base64,... URI
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class JobStatus(str, enum.Enum):
+    """Background job status enum"""
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+class Job(Base):
+    """Durable background job executed by the worker processes"""
+    __tablename__ = "jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False, index=True)
+    payload = Column(Text, nullable=False, default="{}")  # JSON encoded arguments
+    idempotency_key = Column(String, unique=True, index=True)
+    status = Column(Enum(JobStatus), default=JobStatus.PENDING, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_at = Column(DateTime(timezone=True), nullable=False)  # Not picked up before this time
+    locked_at = Column(DateTime(timezone=True))  # Set while a worker holds the job
+    last_error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    
+    __table_args__ = (
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+    )
+
+
+class RateLimitBucket(Base):
+    """Token bucket state shared between processes (RATE_LIMIT_BACKEND=database)"""
+    __tablename__ = "rate_limit_buckets"
+    
+    key = Column(String, primary_key=True)  # "<rule>:<ip or user>"
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)  # Unix timestamp of the last refill
+
+
+class CacheVersion(Base):
+    """Version counter per cache namespace, bumped to invalidate it in every worker"""
+    __tablename__ = "cache_versions"
+    
+    namespace = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class StockMovementReason(str, enum.Enum):
+    """Why a product's stock level changed"""
+    CHECKOUT = "checkout"
+    RESTOCK = "restock"
+    ADJUSTMENT = "adjustment"
+    DAMAGE = "damage"
+    RETURN = "return"
+
+class StockMovement(Base):
+    """Append-only log of stock level changes"""
+    __tablename__ = "stock_movements"
+    
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    change = Column(Integer, nullable=False)  # Signed delta
+    quantity_after = Column(Integer, nullable=False)
+    reason = Column(Enum(StockMovementReason), nullable=False)
+    order_id = Column(Integer)  # Not a foreign key: the order may have moved to orders_archive
+    user_id = Column(Integer, ForeignKey("users.id"))  # Who made the change
+    note = Column(String)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        Index("ix_stock_movements_product_id_id", "product_id", "id"),  # Keyset paging per product
+    )
+
+
+class StockThreshold(Base):
+    """Per-product low-stock threshold overriding LOW_STOCK_THRESHOLD"""
+    __tablename__ = "stock_thresholds"
+    
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    threshold = Column(Integer, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class LowStockProduct(Base):
+    """Maintained set of active products whose stock is below their threshold"""
+    __tablename__ = "low_stock_products"
+    
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    stock_quantity = Column(Integer, nullable=False)
+    threshold = Column(Integer, nullable=False)
+    since = Column(DateTime(timezone=True), server_default=func.now())  # When it went low
+
+
+class ProductPrice(Base):
+    """Append-only price history; a row takes effect at effective_from, which may be in the future"""
+    __tablename__ = "product_prices"
+    
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    price = Column(DECIMAL(10, 2), nullable=False)
+    effective_from = Column(DateTime(timezone=True), nullable=False)
+    applied_at = Column(DateTime(timezone=True))  # When products.price was set from this row; null while scheduled
+    user_id = Column(Integer, ForeignKey("users.id"))  # Who set the price
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        Index("ix_product_prices_product_id_effective_from", "product_id", "effective_from"),  # Point-in-time lookups
+        Index("ix_product_prices_applied_at_effective_from", "applied_at", "effective_from"),  # Due scheduled prices
+    )
+
+
+class ArchivedOrder(Base):
+    """Delivered/cancelled order moved out of the hot orders table, keeping its original id"""
+    __tablename__ = "orders_archive"
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    order_number = Column(String, unique=True, nullable=False)
+    total_amount = Column(DECIMAL(10, 2), nullable=False)
+    status = Column(Enum(OrderStatus), nullable=False)
+    payment_status = Column(Enum(PaymentStatus))
+    payment_method = Column(String)
+    qr_code_data = Column(String)
+    delivery_address = Column(Text)
+    notes = Column(Text)
+    created_at = Column(DateTime(timezone=True))
+    updated_at = Column(DateTime(timezone=True))
+    archive_month = Column(String, nullable=False)  # "YYYY-MM" of created_at, the partition key
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        Index("ix_orders_archive_month_created_at", "archive_month", "created_at"),
+        Index("ix_orders_archive_created_at", "created_at"),
+        Index("ix_orders_archive_user_id_created_at", "user_id", "created_at"),
+        Index("ix_orders_archive_status_created_at", "status", "created_at"),
+    )
+
+
+class ArchivedOrderItem(Base):
+    """Order item of an archived order"""
+    __tablename__ = "order_items_archive"
+    
+    id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, ForeignKey("orders_archive.id"), nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    unit_price = Column(DECIMAL(10, 2), nullable=False)
+    total_price = Column(DECIMAL(10, 2), nullable=False)
+    archive_month = Column(String, nullable=False, index=True)
+
+
+class ProductPairCount(Base):
+    """Sparse co-occurrence matrix: how many orders contain both products, stored in both directions"""
+    __tablename__ = "product_pair_counts"
+    
+    product_id = Column(Integer, primary_key=True)
+    other_product_id = Column(Integer, primary_key=True)
+    orders = Column(Integer, nullable=False)
+
+
+class ProductRecommendation(Base):
+    """Top products bought together with a product, rebuilt from product_pair_counts"""
+    __tablename__ = "product_recommendations"
+    
+    product_id = Column(Integer, primary_key=True)
+    rank = Column(Integer, primary_key=True)  # 0 is the product most often bought with it
+    recommended_product_id = Column(Integer, nullable=False)
+    orders = Column(Integer, nullable=False)
+
+
+class RecommendationRun(Base):
+    """One run of the recommendation job; the latest last_order_id is where the next incremental run starts"""
+    __tablename__ = "recommendation_runs"
+    
+    id = Column(Integer, primary_key=True)
+    full = Column(Boolean, nullable=False)  # Recounted from every order rather than the new ones
+    last_order_id = Column(Integer, nullable=False)
+    baskets = Column(Integer, nullable=False)  # Orders counted, with at least two products
+    products = Column(Integer, nullable=False)  # Products re-ranked
+    started_at = Column(DateTime(timezone=True), nullable=False)
+    finished_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class TokenRevocation(Base):
+    """Access tokens of this user issued before revoked_at are rejected, e.g. after deactivation"""
+    __tablename__ = "token_revocations"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    revoked_at = Column(Float, nullable=False)  # Unix timestamp, compared with the token's iat
+
+
+class PromotionKind(str, enum.Enum):
+    """Promotion kind enum"""
+    PERCENTAGE = "percentage"  # value percent off
+    FIXED = "fixed"  # value off each unit
+    BUY_X_GET_Y = "buy_x_get_y"  # get_quantity free for every buy_quantity bought
+
+
+class Promotion(Base):
+    """Discount rule on one product, one category, or (neither set) everything; a code makes it a coupon"""
+    __tablename__ = "promotions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    kind = Column(Enum(PromotionKind), nullable=False)
+    value = Column(DECIMAL(10, 2))  # Percent or amount; unused for buy X get Y
+    buy_quantity = Column(Integer)
+    get_quantity = Column(Integer)
+    product_id = Column(Integer, ForeignKey("products.id"))
+    category_id = Column(Integer, ForeignKey("categories.id"))
+    code = Column(String, unique=True)  # Applies only when the shopper enters it
+    starts_at = Column(DateTime(timezone=True))
+    ends_at = Column(DateTime(timezone=True))
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+
+class OrderDiscount(Base):
+    """Promotion applied to an order line at checkout"""
+    __tablename__ = "order_discounts"
+    
+    id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, nullable=False, index=True)  # No foreign key: the order may since have moved to orders_archive
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    promotion_id = Column(Integer, ForeignKey("promotions.id"), nullable=False)
+    amount = Column(DECIMAL(10, 2), nullable=False)
+
+class OrderStatusChange(Base):
+    """Append-only log of order status transitions"""
+    __tablename__ = "order_status_history"
+    
+    id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, nullable=False)  # No foreign key: the order may since have moved to orders_archive
+    from_status = Column(Enum(OrderStatus), nullable=False)
+    to_status = Column(Enum(OrderStatus), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"))  # Who made the change
+    changed_at = Column(DateTime(timezone=True), nullable=False)
+    
+    __table_args__ = (
+        Index("ix_order_status_history_order_id_id", "order_id", "id"),  # An order's timeline
+    )
+
+
+class DeliveryBatch(Base):
+    """A delivery run: confirmed orders in one zone, up to a capacity, dispatched together"""
+    __tablename__ = "delivery_batches"
+    
+    id = Column(Integer, primary_key=True)
+    zone = Column(String, nullable=False)  # Pincode, or the normalized area when the address has none
+    capacity = Column(Integer, nullable=False)
+    order_count = Column(Integer, nullable=False, default=0)
+    dispatched_at = Column(DateTime(timezone=True))  # Still taking orders while null
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        Index("ix_delivery_batches_dispatched_at_zone", "dispatched_at", "zone"),  # Open batches to top up
+    )
+
+class DeliveryBatchOrder(Base):
+    """An order's place in a delivery batch"""
+    __tablename__ = "delivery_batch_orders"
+    
+    order_id = Column(Integer, primary_key=True)  # No foreign key: the order may since have moved to orders_archive
+    batch_id = Column(Integer, ForeignKey("delivery_batches.id"), nullable=False)
+    area = Column(String, nullable=False)  # Normalized locality, for the route within the zone
+    
+    __table_args__ = (
+        Index("ix_delivery_batch_orders_batch_id_area", "batch_id", "area"),
+    )
+
+
+class ServiceArea(Base):
+    """A pincode, or pincode prefix, with whether we deliver there and on what terms"""
+    __tablename__ = "service_areas"
+    
+    prefix = Column(String, primary_key=True)  # 1-6 leading digits; the longest prefix of a pincode applies
+    serviceable = Column(Boolean, nullable=False, default=True)  # False carves an area out of a shorter prefix
+    zone = Column(String)
+    delivery_fee = Column(DECIMAL(10, 2))
+    cutoff = Column(Time)  # Orders placed later in the day go out the next day
+
+
+class IdempotencyRecord(Base):
+    """A write request's Idempotency-Key: claimed before the request runs, holding its response once it completed"""
+    __tablename__ = "idempotency_keys"
+    
+    key = Column(String, primary_key=True)  # user id:route:client key
+    fingerprint = Column(String, nullable=False)  # Hash of the request payload
+    response = Column(Text)  # JSON; null while the request is still running
+    claimed_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
@@ -0,0 +1,44 @@
+from decimal import Decimal
+from sqlalchemy.exc import IntegrityError
+from app.database import SessionLocal
+from app.models import PaymentQRCode
+import qrcode
+import io
+import base64
+
+# UPI merchant configuration
+UPI_PAYEE_ADDRESS = "merchant@upi"
+UPI_PAYEE_NAME = "FVCommerce"
+UPI_MERCHANT_CODE = "5411"
+
+def build_upi_payload(order_number: str, amount: Decimal) -> str:
+    """Build the UPI deep link encoded in an order's payment QR code"""
+    return (
+        f"upi://pay?pa={UPI_PAYEE_ADDRESS}&pn={UPI_PAYEE_NAME}&mc={UPI_MERCHANT_CODE}"
+        f"&tr={order_number}&tn=Payment for {order_number}&am={amount}&cu=INR"
+    )
+
+def render_qr_code_image(data: str) -> str:
+    """Render QR code data as a base64 PNG data URI"""
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    img = qr.make_image(fill_color="black", back_color="white")
+    img_buffer = io.BytesIO()
+    img.save(img_buffer, format='PNG')
+    img_str = base64.b64encode(img_buffer.getvalue()).decode()
+    return f"data:image/png;base64,{img_str}"
+
+def store_qr_code_image(order_id: int, data: str) -> str:
+    """Render an order's QR code and keep it where the payment page looks first; opens its own session"""
+    image = render_qr_code_image(data)
+    db = SessionLocal()
+    try:
+        db.add(PaymentQRCode(order_id=order_id, image_data=image))
+        db.commit()
+    except IntegrityError:
+        db.rollback()  # Stored meanwhile by the order.placed job
+    finally:
+        db.close()
+    return image
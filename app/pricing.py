@@ -0,0 +1,150 @@
+"""
+Product price history.
+
+Every price a product has had, or will have, is a row in ``product_prices``
+with the time it takes effect. ``products.price`` stays the current price
+that checkout reads; immediate changes update it in the same transaction,
+scheduled ones are applied by the "prices.apply_scheduled" periodic job.
+Point-in-time questions ("what did this cost last Tuesday") are answered
+from the (product_id, effective_from) index instead of from orders.
+"""
+from bisect import bisect_right
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+from app.models import Product, ProductPrice
+import os
+
+PRICE_TICK_SECONDS = float(os.getenv("PRICE_TICK_SECONDS", "60"))  # How often scheduled prices are applied
+IN_CHUNK_SIZE = 500
+
+def utc(value: datetime) -> datetime:
+    """Naive UTC, the form timestamps are stored and compared in"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def set_price(
+    db: Session,
+    product: Product,
+    price: Decimal,
+    effective_from: Optional[datetime] = None,
+    user_id: Optional[int] = None,
+) -> ProductPrice:
+    """Record a price change in the caller's transaction, applying it now unless it's scheduled for later"""
+    now = datetime.utcnow()
+    # History is append-only: a time in the past means "now" rather than rewriting what earlier prices were
+    effective_from = now if effective_from is None else max(utc(effective_from), now)
+    entry = ProductPrice(product_id=product.id, price=price, effective_from=effective_from, user_id=user_id)
+    if effective_from <= now:
+        product.price = price
+        entry.applied_at = now
+    db.add(entry)
+    return entry
+
+def backfill_price_history(db: Session):
+    """Give products without any history (created before it existed, or bulk loaded) their current price as an opening entry"""
+    opened = func.coalesce(Product.created_at, func.current_timestamp())
+    db.execute(
+        insert(ProductPrice).from_select(
+            ["product_id", "price", "effective_from", "applied_at"],
+            select(Product.id, Product.price, opened, opened)
+            .where(Product.id.not_in(select(ProductPrice.product_id)))
+        )
+    )
+
+def apply_due_prices(db: Session, now: Optional[datetime] = None) -> List[int]:
+    """Apply scheduled prices whose time has come; returns the repriced product ids"""
+    now = datetime.utcnow() if now is None else utc(now)
+    due = db.execute(
+        select(ProductPrice.id, ProductPrice.product_id)
+        .where(ProductPrice.applied_at.is_(None), ProductPrice.effective_from <= now)
+    ).all()
+    if not due:
+        return []
+    product_ids = sorted({product_id for _, product_id in due})
+    # The latest effective entry wins, which may be an immediate change made after the schedule came due
+    for product_id, price in prices_as_of(db, now, product_ids).items():
+        db.execute(update(Product).where(Product.id == product_id).values(price=price))
+    for start in range(0, len(due), IN_CHUNK_SIZE):
+        db.execute(
+            update(ProductPrice)
+            .where(ProductPrice.id.in_([entry_id for entry_id, _ in due[start:start + IN_CHUNK_SIZE]]))
+            .values(applied_at=now)
+        )
+    return product_ids
+
+def price_at(db: Session, product_id: int, at: datetime) -> Optional[Decimal]:
+    """A product's price at one moment, or None before its first entry"""
+    return db.execute(
+        select(ProductPrice.price)
+        .where(ProductPrice.product_id == product_id, ProductPrice.effective_from <= utc(at))
+        .order_by(ProductPrice.effective_from.desc(), ProductPrice.id.desc())
+        .limit(1)
+    ).scalar()
+
+def prices_as_of(db: Session, at: datetime, product_ids: Optional[Sequence[int]] = None) -> Dict[int, Decimal]:
+    """Every product's (or the given products') price at one moment, in a single query per chunk"""
+    def query(ids):
+        ranked = select(
+            ProductPrice.product_id,
+            ProductPrice.price,
+            func.row_number().over(
+                partition_by=ProductPrice.product_id,
+                order_by=(ProductPrice.effective_from.desc(), ProductPrice.id.desc()),
+            ).label("rank"),
+        ).where(ProductPrice.effective_from <= utc(at))
+        if ids is not None:
+            ranked = ranked.where(ProductPrice.product_id.in_(ids))
+        ranked = ranked.subquery()
+        return db.execute(select(ranked.c.product_id, ranked.c.price).where(ranked.c.rank == 1))
+
+    if product_ids is None:
+        return dict(query(None).all())
+    prices = {}
+    product_ids = list(product_ids)
+    for start in range(0, len(product_ids), IN_CHUNK_SIZE):
+        prices.update(query(product_ids[start:start + IN_CHUNK_SIZE]).all())
+    return prices
+
+def prices_at(db: Session, lookups: Iterable[Tuple[int, datetime]]) -> List[Optional[Decimal]]:
+    """Prices for many (product id, moment) pairs, e.g. every line of a batch of orders.
+
+    The history of all products involved is read once, in index order, and
+    each lookup is a binary search in its product's timeline.
+    """
+    lookups = [(product_id, utc(at)) for product_id, at in lookups]
+    product_ids = sorted({product_id for product_id, _ in lookups})
+    timelines: Dict[int, Tuple[List[datetime], List[Decimal]]] = {}
+    for start in range(0, len(product_ids), IN_CHUNK_SIZE):
+        rows = db.execute(
+            select(ProductPrice.product_id, ProductPrice.effective_from, ProductPrice.price)
+            .where(ProductPrice.product_id.in_(product_ids[start:start + IN_CHUNK_SIZE]))
+            .order_by(ProductPrice.product_id, ProductPrice.effective_from, ProductPrice.id)
+        )
+        for product_id, effective_from, price in rows:
+            times, prices = timelines.setdefault(product_id, ([], []))
+            times.append(effective_from)
+            prices.append(price)
+
+    results = []
+    for product_id, at in lookups:
+        times, prices = timelines.get(product_id, ((), ()))
+        i = bisect_right(times, at)
+        results.append(prices[i - 1] if i else None)
+    return results
+
+def price_history(db: Session, product_id: int, limit: int = 100) -> List[ProductPrice]:
+    """A product's entries, latest effective first, scheduled ones included"""
+    return db.execute(
+        select(ProductPrice)
+        .where(ProductPrice.product_id == product_id)
+        .order_by(ProductPrice.effective_from.desc(), ProductPrice.id.desc())
+        .limit(limit)
+    ).scalars().all()
+
+def current_prices(db: Session) -> List[Tuple[int, Decimal]]:
+    """(product id, price) for every product, in id order"""
+    return db.execute(select(Product.id, Product.price).order_by(Product.id)).all()
@@ -0,0 +1,217 @@
+"""
+Promotions and coupons.
+
+Discount rules (percent off, an amount off each unit, buy X get Y free) live
+in ``promotions``, scoped to a product, a category or everything. Carts are
+priced far more often than rules change, so the rules are compiled into a
+PromotionSet: indexed by product id and by category id, with the few
+unscoped rules kept apart; a category rule is indexed under every category
+in that category's subtree. Pricing a cart is one pass over its lines that
+only looks at the rules indexed under each line's product and category, with
+no queries. The set is rebuilt when the "promotions" cache namespace version
+changes, which every admin edit bumps, or the "categories" one, which
+changes to the category tree bump.
+
+Each line gets the single largest discount among the rules that match it;
+discounts don't stack. Within a bucket, percentage and fixed rules are kept
+strongest first, so only the first live one of each kind is evaluated. Coupon rules only match once their code is entered.
+Discounts given at checkout are kept in ``order_discounts`` by order id, so
+they survive the order moving to the archive.
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import or_, select
+from app.cache import cache
+from app.categories import category_subtrees
+from app.database import SessionLocal
+from app.models import Promotion, PromotionKind
+from app.pricing import utc
+from app.singleflight import flights
+import threading
+
+CENT = Decimal("0.01")
+ZERO = Decimal("0.00")
+
+class InvalidCoupon(Exception):
+    """Raised when a coupon code doesn't match any live promotion"""
+
+@dataclass(frozen=True)
+class Rule:
+    """A compiled promotion"""
+    id: int
+    name: str
+    kind: PromotionKind
+    value: Decimal
+    buy_quantity: int
+    get_quantity: int
+    code: Optional[str]
+    starts_at: Optional[datetime]
+    ends_at: Optional[datetime]
+
+    def live(self, now: datetime) -> bool:
+        return (self.starts_at is None or self.starts_at <= now) and (self.ends_at is None or now < self.ends_at)
+
+    def discount(self, unit_price: Decimal, quantity: int) -> Decimal:
+        """Amount off a line of `quantity` units at `unit_price`"""
+        if self.kind == PromotionKind.PERCENTAGE:
+            return (unit_price * quantity * self.value / 100).quantize(CENT, ROUND_HALF_UP)
+        if self.kind == PromotionKind.FIXED:
+            return min(self.value, unit_price) * quantity
+        free = quantity // (self.buy_quantity + self.get_quantity) * self.get_quantity
+        return unit_price * free
+
+@dataclass
+class CartLine:
+    product_id: int
+    category_id: Optional[int]
+    unit_price: Decimal
+    quantity: int
+
+    @classmethod
+    def from_document(cls, product: dict, quantity: int) -> "CartLine":
+        """A line of a product in its JSON (catalog snapshot) form"""
+        return cls(product["id"], product["category_id"], Decimal(product["price"]), quantity)
+
+@dataclass
+class AppliedDiscount:
+    product_id: int
+    promotion_id: int
+    name: str
+    amount: Decimal
+
+    def document(self) -> dict:
+        return {"product_id": self.product_id, "promotion_id": self.promotion_id, "name": self.name, "amount": str(self.amount)}
+
+@dataclass
+class PricedCart:
+    subtotal: Decimal = ZERO
+    discount: Decimal = ZERO
+    discounts: List[AppliedDiscount] = field(default_factory=list)
+    coupon_code: Optional[str] = None
+
+    @property
+    def total(self) -> Decimal:
+        return self.subtotal - self.discount
+
+    def line_discounts(self) -> Dict[int, Decimal]:
+        """product id -> discount"""
+        return {applied.product_id: applied.amount for applied in self.discounts}
+
+    def totals(self) -> dict:
+        """The cart response's pricing fields, JSON-ready"""
+        return {
+            "total_amount": str(self.total),
+            "subtotal_amount": str(self.subtotal),
+            "discount_amount": str(self.discount),
+            "discounts": [applied.document() for applied in self.discounts],
+            "coupon_code": self.coupon_code,
+        }
+
+Bucket = List[Tuple[PromotionKind, List[Rule]]]
+
+def _bucket(rules: List[Rule]) -> Bucket:
+    """Rules grouped by kind, percentage and fixed ones strongest first: the first that applies is the best of its kind"""
+    by_kind = defaultdict(list)
+    for rule in rules:
+        by_kind[rule.kind].append(rule)
+    for kind in (PromotionKind.PERCENTAGE, PromotionKind.FIXED):
+        by_kind[kind].sort(key=lambda rule: (-rule.value, rule.id))
+    return [(kind, kind_rules) for kind, kind_rules in by_kind.items() if kind_rules]
+
+class PromotionSet:
+    """Promotions that are or will become live, indexed by what they apply to"""
+
+    def __init__(self, version: Tuple[int, int], promotions: Iterable[Promotion], subtrees: Optional[Dict[int, List[int]]] = None):
+        self.version = version
+        subtrees = subtrees or {}
+        by_product: Dict[int, List[Rule]] = defaultdict(list)
+        by_category: Dict[int, List[Rule]] = defaultdict(list)
+        everywhere: List[Rule] = []
+        self.codes: Dict[str, List[Rule]] = defaultdict(list)
+        self.count = 0
+        for promotion in promotions:
+            rule = Rule(
+                promotion.id, promotion.name, promotion.kind, promotion.value or ZERO,
+                promotion.buy_quantity or 0, promotion.get_quantity or 0, promotion.code,
+                promotion.starts_at and utc(promotion.starts_at), promotion.ends_at and utc(promotion.ends_at),
+            )
+            if promotion.product_id is not None:
+                by_product[promotion.product_id].append(rule)
+            elif promotion.category_id is not None:
+                for category_id in subtrees.get(promotion.category_id, (promotion.category_id,)):
+                    by_category[category_id].append(rule)
+            else:
+                everywhere.append(rule)
+            if rule.code:
+                self.codes[rule.code].append(rule)
+            self.count += 1
+        self.by_product: Dict[int, Bucket] = {key: _bucket(rules) for key, rules in by_product.items()}
+        self.by_category: Dict[int, Bucket] = {key: _bucket(rules) for key, rules in by_category.items()}
+        self.everywhere: Bucket = _bucket(everywhere)
+
+    def price(self, lines: Iterable[CartLine], coupon_code: Optional[str] = None, now: Optional[datetime] = None) -> PricedCart:
+        """Subtotal and the best discount for each line; raises InvalidCoupon for a code that isn't live"""
+        now = datetime.utcnow() if now is None else utc(now)
+        code = coupon_code.strip().upper() if coupon_code else None
+        if code and not any(rule.live(now) for rule in self.codes.get(code, ())):
+            raise InvalidCoupon(code)
+        priced = PricedCart(coupon_code=code)
+        for line in lines:
+            line_amount = line.unit_price * line.quantity
+            best, best_amount = None, ZERO
+            buckets = (self.by_product.get(line.product_id, ()), self.by_category.get(line.category_id, ()), self.everywhere)
+            for kind, rules in chain.from_iterable(buckets):
+                for rule in rules:
+                    if (rule.code is None or rule.code == code) and rule.live(now):
+                        amount = min(rule.discount(line.unit_price, line.quantity), line_amount)
+                        if amount > best_amount:
+                            best, best_amount = rule, amount
+                        if kind != PromotionKind.BUY_X_GET_Y:
+                            break  # The rest of this kind are weaker
+            priced.subtotal += line_amount
+            if best is not None:
+                priced.discount += best_amount
+                priced.discounts.append(AppliedDiscount(line.product_id, best.id, best.name, best_amount))
+        return priced
+
+class Promotions:
+    """Serves the compiled promotion set, recompiling it after admin edits"""
+
+    def __init__(self):
+        self._set: Optional[PromotionSet] = None
+        self._lock = threading.Lock()
+
+    def current(self) -> PromotionSet:
+        version = (cache.version("promotions"), cache.version("categories"))
+        compiled = self._set
+        if compiled is not None and compiled.version == version:
+            return compiled
+        with self._lock:
+            if self._set is None or self._set.version != version:
+                db = SessionLocal()
+                try:
+                    # Ended promotions are left out; ones not started yet are compiled and wait for their time
+                    rows = db.execute(
+                        select(Promotion)
+                        .where(Promotion.is_active == True, or_(Promotion.ends_at.is_(None), Promotion.ends_at > datetime.utcnow()))
+                    ).scalars().all()
+                    self._set = PromotionSet(version, rows, category_subtrees(db))
+                finally:
+                    db.close()
+            return self._set
+
+    async def load(self) -> PromotionSet:
+        """current() for the event loop: a recompile runs in a worker thread, shared by concurrent requests"""
+        compiled = self._set
+        if compiled is not None and compiled.version == (cache.version("promotions"), cache.version("categories")):
+            return compiled
+        return await flights.run("promotions", self.current)
+
+    def price(self, lines: Iterable[CartLine], coupon_code: Optional[str] = None) -> PricedCart:
+        return self.current().price(lines, coupon_code)
+
+promotions = Promotions()
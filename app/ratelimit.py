@@ -0,0 +1,227 @@
+"""
+Token-bucket rate limiting.
+
+Each rule gives a route a budget (burst capacity plus refill rate) per client
+IP or per authenticated user. Buckets live in a sharded in-memory store by
+default; set RATE_LIMIT_BACKEND=database to share them between processes
+through the application database. Database buckets cost a write per limited
+request, so the middleware takes them in a worker thread rather than on the
+event loop.
+"""
+from abc import ABC, abstractmethod
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import case, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from app.auth import verify_token
+from app.database import engine
+from app.models import RateLimitBucket
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+import zlib
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory or database
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() == "true"
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    """Budget for one route: `capacity` requests in a burst, refilled at `refill_per_second`"""
+    name: str
+    method: str
+    path: str
+    capacity: float
+    refill_per_second: float
+    per: str = "ip"  # "ip" or "user"
+
+# Per-route budgets. Login and registration run bcrypt, so they get the tightest budgets.
+DEFAULT_RULES = [
+    RateLimitRule("login", "POST", "/token", capacity=10, refill_per_second=10 / 60),
+    RateLimitRule("register", "POST", "/register", capacity=5, refill_per_second=5 / 600),
+    RateLimitRule("checkout", "POST", "/orders", capacity=10, refill_per_second=10 / 60, per="user"),
+    RateLimitRule("cart_add", "POST", "/cart/add", capacity=60, refill_per_second=1, per="user"),
+    RateLimitRule("guest_cart_add", "POST", "/guest/cart/add", capacity=60, refill_per_second=1),
+]
+
+class BucketStore(ABC):
+    """Interface for token bucket storage backends"""
+
+    blocking = False  # Whether take() does I/O, and so has to run off the event loop
+
+    @abstractmethod
+    def take(self, key: str, capacity: float, refill_per_second: float, cost: float = 1.0) -> Tuple[bool, float]:
+        """Try to take `cost` tokens; returns (allowed, seconds until enough tokens are available)"""
+
+class MemoryBucketStore(BucketStore):
+    """In-process bucket store, sharded to keep lock contention low"""
+
+    def __init__(self, shards: int = 16, max_keys_per_shard: int = 10000):
+        self._shards = [({}, threading.Lock()) for _ in range(shards)]
+        self.max_keys_per_shard = max_keys_per_shard
+
+    def take(self, key, capacity, refill_per_second, cost=1.0):
+        buckets, lock = self._shards[zlib.crc32(key.encode()) % len(self._shards)]
+        now = time.monotonic()
+        with lock:
+            bucket = buckets.get(key)
+            if bucket is None:
+                if len(buckets) >= self.max_keys_per_shard:
+                    self._prune(buckets, now)
+                tokens = capacity
+            else:
+                tokens = min(capacity, bucket[0] + (now - bucket[1]) * refill_per_second)
+            if tokens >= cost:
+                buckets[key] = (tokens - cost, now, capacity, refill_per_second)
+                return True, 0.0
+            buckets[key] = (tokens, now, capacity, refill_per_second)
+            return False, (cost - tokens) / refill_per_second
+
+    @staticmethod
+    def _prune(buckets: dict, now: float):
+        """Forget buckets that have refilled completely; they behave like new ones"""
+        for key in [k for k, (tokens, updated, capacity, rate) in buckets.items()
+                    if tokens + (now - updated) * rate >= capacity]:
+            del buckets[key]
+
+class DatabaseBucketStore(BucketStore):
+    """Bucket store shared by every process using the application database"""
+
+    blocking = True
+
+    def take(self, key, capacity, refill_per_second, cost=1.0):
+        now = time.time()
+        table = RateLimitBucket.__table__
+        refilled = table.c.tokens + (now - table.c.updated_at) * refill_per_second
+        available = case((refilled > capacity, capacity), else_=refilled)
+        with engine.begin() as conn:
+            # Refill and take in one conditional UPDATE so concurrent processes can't both spend the same tokens
+            result = conn.execute(
+                update(table)
+                .where(table.c.key == key, available >= cost)
+                .values(tokens=available - cost, updated_at=now)
+            )
+            if result.rowcount == 1:
+                return True, 0.0
+            tokens = conn.execute(select(available).where(table.c.key == key)).scalar()
+
+        if tokens is None:
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(table).values(key=key, tokens=capacity - cost, updated_at=now))
+                return True, 0.0
+            except IntegrityError:
+                # Another process created the bucket first
+                return self.take(key, capacity, refill_per_second, cost)
+        return False, max(cost - tokens, 0.0) / refill_per_second
+
+class RateLimiter:
+    """Applies rate limit rules to requests and counts the outcomes"""
+
+    def __init__(self, rules: List[RateLimitRule], store: BucketStore, enabled: bool = True):
+        self.rules: Dict[Tuple[str, str], RateLimitRule] = {(rule.method, rule.path): rule for rule in rules}
+        self.store = store
+        self.enabled = enabled
+        self.allowed = Counter()
+        self.rejected = Counter()
+
+    def rule_for(self, method: str, path: str) -> Optional[RateLimitRule]:
+        return self.rules.get((method, path))
+
+    def check(self, rule: RateLimitRule, client_key: str) -> Tuple[bool, float]:
+        allowed, retry_after = self.store.take(
+            f"{rule.name}:{client_key}", rule.capacity, rule.refill_per_second
+        )
+        (self.allowed if allowed else self.rejected)[rule.name] += 1
+        return allowed, retry_after
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.store).__name__,
+            "rules": {
+                rule.name: {
+                    "route": f"{rule.method} {rule.path}",
+                    "per": rule.per,
+                    "capacity": rule.capacity,
+                    "refill_per_second": rule.refill_per_second,
+                    "allowed": self.allowed[rule.name],
+                    "rejected": self.rejected[rule.name],
+                }
+                for rule in self.rules.values()
+            },
+        }
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+def client_ip(scope) -> str:
+    """Client address, honoring X-Forwarded-For only when configured to"""
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = _header(scope, b"x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+def client_user(scope) -> Optional[str]:
+    """Username from a valid bearer token, if the request carries one"""
+    authorization = _header(scope, b"authorization")
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return None
+    claims = verify_token(authorization[7:])  # Shares the verified-token cache with the auth dependencies
+    return claims.username if claims else None
+
+class RateLimitMiddleware:
+    """ASGI middleware rejecting requests over budget with 429 and Retry-After"""
+
+    def __init__(self, app, limiter: "RateLimiter"):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.limiter.enabled:
+            return await self.app(scope, receive, send)
+        rule = self.limiter.rule_for(scope["method"], scope["path"])
+        if rule is None:
+            return await self.app(scope, receive, send)
+
+        client_key = None
+        if rule.per == "user":
+            user = client_user(scope)
+            client_key = f"user:{user}" if user else None
+        if client_key is None:
+            client_key = f"ip:{client_ip(scope)}"
+
+        if self.limiter.store.blocking:
+            allowed, retry_after = await asyncio.get_running_loop().run_in_executor(None, self.limiter.check, rule, client_key)
+        else:
+            allowed, retry_after = self.limiter.check(rule, client_key)
+        if allowed:
+            return await self.app(scope, receive, send)
+
+        body = json.dumps({"detail": "Too many requests, please retry later"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+def create_bucket_store(backend: str = RATE_LIMIT_BACKEND) -> BucketStore:
+    if backend == "database":
+        return DatabaseBucketStore()
+    return MemoryBucketStore()
+
+rate_limiter = RateLimiter(DEFAULT_RULES, create_bucket_store(), enabled=RATE_LIMIT_ENABLED)
@@ -0,0 +1,246 @@
+"""
+"Frequently bought together" recommendations.
+
+Co-occurrence counts (how many orders contain both of two products) are
+mined from order baskets and kept as a sparse matrix in
+``product_pair_counts``, one row per (product, other product) in both
+directions. The RECOMMENDATIONS_TOP_K partners of every product are
+materialized in ``product_recommendations`` keyed by (product_id, rank), so
+serving them is a single primary-key range scan.
+
+Counting runs in the workers as the "recommendations.update" job. It folds
+in the orders placed since the last run and re-ranks only the products they
+touched; every RECOMMENDATIONS_REBUILD_SECONDS it instead recounts every
+order in the hot and archive tables, which also forgets orders cancelled
+after they were counted. Both happen in the one job so they never run
+concurrently. Baskets are read in chunks that never split an order and
+turned into pairs with NumPy.
+"""
+from datetime import datetime, timedelta
+from itertools import chain
+from typing import Iterator, List, Optional, Tuple
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app.models import (
+    ArchivedOrder, ArchivedOrderItem, Order, OrderItem, OrderStatus,
+    ProductPairCount, ProductRecommendation, RecommendationRun
+)
+import logging
+import os
+import numpy as np
+
+RECOMMENDATIONS_TOP_K = int(os.getenv("RECOMMENDATIONS_TOP_K", "10"))
+RECOMMENDATIONS_INTERVAL_SECONDS = float(os.getenv("RECOMMENDATIONS_INTERVAL_SECONDS", "600"))
+RECOMMENDATIONS_REBUILD_SECONDS = float(os.getenv("RECOMMENDATIONS_REBUILD_SECONDS", str(24 * 3600)))
+RECOMMENDATIONS_MAX_BASKET = int(os.getenv("RECOMMENDATIONS_MAX_BASKET", "50"))  # Bigger orders are bulk buys, not baskets
+RECOMMENDATIONS_CHUNK_ROWS = 200000  # Order items read per chunk
+WRITE_CHUNK_SIZE = 5000
+IN_CHUNK_SIZE = 500
+PRODUCT_BITS = 32  # Pair keys are product << 32 | other product
+
+logger = logging.getLogger(__name__)
+
+def _int_array(rows, columns: int) -> np.ndarray:
+    """Rows of integers as an (n, columns) array; much faster than np.array() on Row objects"""
+    return np.fromiter(chain.from_iterable(rows), dtype=np.int64, count=len(rows) * columns).reshape(-1, columns)
+
+def _offsets(sizes: np.ndarray) -> np.ndarray:
+    """Position of every element within its group, for consecutive groups of the given sizes"""
+    total = int(sizes.sum())
+    return np.arange(total, dtype=np.int64) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+
+def _group_starts(sorted_values: np.ndarray) -> np.ndarray:
+    return np.flatnonzero(np.r_[True, sorted_values[1:] != sorted_values[:-1]])
+
+def basket_pairs(
+    order_ids: np.ndarray, product_ids: np.ndarray, max_basket: int = RECOMMENDATIONS_MAX_BASKET
+) -> Tuple[np.ndarray, np.ndarray, int]:
+    """Pair keys with the number of orders holding both products, plus the number of baskets counted.
+
+    Rows may come in any order, but every row of an order must be in the same call.
+    """
+    rows = np.unique((order_ids.astype(np.int64) << PRODUCT_BITS) | product_ids.astype(np.int64))  # One row per product per order
+    orders, products = rows >> PRODUCT_BITS, rows & ((1 << PRODUCT_BITS) - 1)
+    starts = _group_starts(orders)
+    sizes = np.diff(np.r_[starts, len(rows)])
+    kept = (sizes >= 2) & (sizes <= max_basket)
+    starts, sizes = starts[kept], sizes[kept]
+    if not len(sizes):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), 0
+
+    # Each row of a basket is paired with each row of the same basket, itself excluded
+    row_index = np.repeat(starts, sizes) + _offsets(sizes)
+    row_basket_size = np.repeat(sizes, sizes)
+    left = np.repeat(row_index, row_basket_size)
+    right = np.repeat(np.repeat(starts, sizes), row_basket_size) + _offsets(row_basket_size)
+    distinct = left != right
+    keys = (products[left[distinct]] << PRODUCT_BITS) | products[right[distinct]]
+    keys, counts = np.unique(keys, return_counts=True)
+    return keys, counts.astype(np.int64), len(sizes)
+
+class PairCounter:
+    """Sums pair counts over many chunks of baskets"""
+
+    def __init__(self):
+        self.keys = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.baskets = 0
+
+    def add(self, order_ids: np.ndarray, product_ids: np.ndarray):
+        keys, counts, baskets = basket_pairs(order_ids, product_ids)
+        self.baskets += baskets
+        if not len(keys):
+            return
+        keys, inverse = np.unique(np.concatenate([self.keys, keys]), return_inverse=True)
+        self.counts = np.bincount(inverse, weights=np.concatenate([self.counts, counts]), minlength=len(keys)).astype(np.int64)
+        self.keys = keys
+
+    def pairs(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(product ids, other product ids, orders) sorted by product"""
+        return self.keys >> PRODUCT_BITS, self.keys & ((1 << PRODUCT_BITS) - 1), self.counts
+
+def top_k(
+    product_ids: np.ndarray, other_ids: np.ndarray, counts: np.ndarray, k: int = RECOMMENDATIONS_TOP_K
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """The k most frequent partners of every product as (product, rank, other product, orders); ties go to the lower id"""
+    order = np.lexsort((other_ids, -counts, product_ids))
+    product_ids, other_ids, counts = product_ids[order], other_ids[order], counts[order]
+    starts = _group_starts(product_ids)
+    ranks = _offsets(np.diff(np.r_[starts, len(product_ids)]))
+    kept = ranks < k
+    return product_ids[kept], ranks[kept], other_ids[kept], counts[kept]
+
+def _baskets(db: Session, after_order_id: int, up_to_order_id: int) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """(order ids, product ids) of non-cancelled orders in the id range, from both order tables, in chunks that don't split an order"""
+    for order_model, item_model in ((ArchivedOrder, ArchivedOrderItem), (Order, OrderItem)):
+        result = db.connection().execute(  # Core rows; the ORM loading layer would double the read time
+            select(item_model.order_id, item_model.product_id)
+            .join(order_model, order_model.id == item_model.order_id)
+            .where(
+                item_model.order_id > after_order_id,
+                item_model.order_id <= up_to_order_id,
+                order_model.status != OrderStatus.CANCELLED,
+            )
+            .order_by(item_model.order_id)
+            .execution_options(yield_per=RECOMMENDATIONS_CHUNK_ROWS)
+        )
+        carry = np.empty((0, 2), dtype=np.int64)
+        for rows in result.partitions():
+            chunk = np.concatenate([carry, _int_array(rows, 2)])
+            cut = int(np.searchsorted(chunk[:, 0], chunk[-1, 0]))  # First row of the last order, which may continue
+            carry = chunk[cut:]
+            if cut:
+                yield chunk[:cut, 0], chunk[:cut, 1]
+        if len(carry):
+            yield carry[:, 0], carry[:, 1]
+
+def _count(db: Session, after_order_id: int, up_to_order_id: int) -> PairCounter:
+    counter = PairCounter()
+    for order_ids, product_ids in _baskets(db, after_order_id, up_to_order_id):
+        counter.add(order_ids, product_ids)
+    return counter
+
+def _insert_rows(db: Session, model, rows: List[dict]):
+    for start in range(0, len(rows), WRITE_CHUNK_SIZE):
+        db.connection().execute(insert(model.__table__), rows[start:start + WRITE_CHUNK_SIZE])  # Core executemany, skipping the ORM bulk path
+
+def _recommendation_rows(product_ids, ranks, other_ids, counts) -> List[dict]:
+    return [
+        {"product_id": product_id, "rank": rank, "recommended_product_id": other_id, "orders": orders}
+        for product_id, rank, other_id, orders in zip(product_ids.tolist(), ranks.tolist(), other_ids.tolist(), counts.tolist())
+    ]
+
+def _newest_order_id(db: Session) -> int:
+    # The newest order is never archived, so the hot table's max id is the overall one
+    return db.execute(select(func.max(Order.id))).scalar() or 0
+
+def last_run(db: Session) -> Optional[RecommendationRun]:
+    return db.execute(select(RecommendationRun).order_by(RecommendationRun.id.desc()).limit(1)).scalar()
+
+def rebuild_recommendations(db: Session) -> RecommendationRun:
+    """Recount every order and replace the pair counts and recommendations in one transaction"""
+    started_at = datetime.utcnow()
+    up_to = _newest_order_id(db)
+    counter = _count(db, 0, up_to)
+    product_ids, other_ids, counts = counter.pairs()
+
+    db.execute(delete(ProductPairCount))
+    _insert_rows(db, ProductPairCount, [
+        {"product_id": product_id, "other_product_id": other_id, "orders": orders}
+        for product_id, other_id, orders in zip(product_ids.tolist(), other_ids.tolist(), counts.tolist())
+    ])
+    db.execute(delete(ProductRecommendation))
+    ranked = top_k(product_ids, other_ids, counts)
+    _insert_rows(db, ProductRecommendation, _recommendation_rows(*ranked))
+    db.execute(delete(RecommendationRun))  # Earlier runs are superseded; this keeps the run log to one day
+    run = RecommendationRun(
+        full=True, last_order_id=up_to, baskets=counter.baskets,
+        products=len(np.unique(ranked[0])), started_at=started_at
+    )
+    db.add(run)
+    db.commit()
+    logger.info("Rebuilt recommendations from %s baskets, %s pairs", counter.baskets, len(counts))
+    return run
+
+def update_recommendations(db: Session, rebuild_after: float = RECOMMENDATIONS_REBUILD_SECONDS) -> RecommendationRun:
+    """Fold orders placed since the last run into the pair counts and re-rank the products they touched.
+
+    Recounts from scratch instead when there is no full run younger than `rebuild_after` seconds.
+    """
+    rebuilt_recently = db.execute(
+        select(RecommendationRun.id)
+        .where(RecommendationRun.full.is_(True), RecommendationRun.started_at > datetime.utcnow() - timedelta(seconds=rebuild_after))
+        .limit(1)
+    ).scalar()
+    if rebuilt_recently is None:
+        return rebuild_recommendations(db)
+    previous = last_run(db)
+    started_at = datetime.utcnow()
+    up_to = _newest_order_id(db)
+    counter = _count(db, previous.last_order_id, up_to)
+    product_ids, other_ids, counts = counter.pairs()
+
+    if len(counts):
+        dialect = db.get_bind().dialect.name
+        upsert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        rows = [
+            {"product_id": product_id, "other_product_id": other_id, "orders": orders}
+            for product_id, other_id, orders in zip(product_ids.tolist(), other_ids.tolist(), counts.tolist())
+        ]
+        table = ProductPairCount.__table__
+        statement = upsert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.product_id, table.c.other_product_id],
+            set_={"orders": table.c.orders + statement.excluded.orders},
+        )
+        # One statement run with executemany; a multi-row VALUES list costs more to compile than to execute
+        for start in range(0, len(rows), WRITE_CHUNK_SIZE):
+            db.connection().execute(statement, rows[start:start + WRITE_CHUNK_SIZE])
+
+    # A product's ranking only depends on its own row of the matrix
+    touched = np.unique(product_ids).tolist()
+    for start in range(0, len(touched), IN_CHUNK_SIZE):
+        chunk = touched[start:start + IN_CHUNK_SIZE]
+        pairs = _int_array(db.connection().execute(
+            select(ProductPairCount.product_id, ProductPairCount.other_product_id, ProductPairCount.orders)
+            .where(ProductPairCount.product_id.in_(chunk))
+        ).all(), 3)
+        db.execute(delete(ProductRecommendation).where(ProductRecommendation.product_id.in_(chunk)))
+        _insert_rows(db, ProductRecommendation, _recommendation_rows(*top_k(pairs[:, 0], pairs[:, 1], pairs[:, 2])))
+    run = RecommendationRun(
+        full=False, last_order_id=max(up_to, previous.last_order_id), baskets=counter.baskets,
+        products=len(touched), started_at=started_at
+    )
+    db.add(run)
+    db.commit()
+    return run
+
+def recommendations_for(db: Session, product_id: int, limit: int = RECOMMENDATIONS_TOP_K) -> List[Tuple[int, int]]:
+    """(recommended product id, orders together) for a product, best first"""
+    return db.execute(
+        select(ProductRecommendation.recommended_product_id, ProductRecommendation.orders)
+        .where(ProductRecommendation.product_id == product_id)
+        .order_by(ProductRecommendation.rank)
+        .limit(limit)
+    ).all()
@@ -0,0 +1,281 @@
+"""
+Payment reconciliation against UPI settlement files.
+
+A settlement file is a CSV with at least ``order_number``, ``amount`` and
+``status`` columns. It is streamed row by row and matched against an
+in-memory hash index of the orders awaiting payment, built with one query
+up front; rows for other orders (refunds, repeats) are resolved together in
+a second, batched pass that also covers archived orders (refunds often
+arrive after an order has been archived). Payment status transitions are written as chunked
+bulk UPDATEs, guarded by the status they expect, and every row that can't be
+applied ends up in the mismatch report.
+"""
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from app.models import ArchivedOrder, Order, PaymentStatus
+import csv
+import os
+
+RECONCILE_CHUNK_SIZE = int(os.getenv("RECONCILE_CHUNK_SIZE", "10000"))  # Rows per UPDATE flush and commit
+REPORTED_MISMATCHES = 1000  # Mismatches returned by the admin endpoint; the CLI writes all of them
+IN_CHUNK_SIZE = 500
+MAX_AMOUNT_DIGITS = 12  # Rupee digits; anything longer can't be an order total
+
+SETTLEMENT_STATUSES = {
+    "success": PaymentStatus.COMPLETED,
+    "completed": PaymentStatus.COMPLETED,
+    "settled": PaymentStatus.COMPLETED,
+    "failed": PaymentStatus.FAILED,
+    "failure": PaymentStatus.FAILED,
+    "refunded": PaymentStatus.REFUNDED,
+    "refund": PaymentStatus.REFUNDED,
+}
+ALLOWED_TRANSITIONS = {
+    (PaymentStatus.PENDING, PaymentStatus.COMPLETED),
+    (PaymentStatus.PENDING, PaymentStatus.FAILED),
+    (PaymentStatus.FAILED, PaymentStatus.COMPLETED),  # Customer paid on a retry
+    (PaymentStatus.COMPLETED, PaymentStatus.REFUNDED),
+}
+AWAITING_PAYMENT = (PaymentStatus.PENDING, PaymentStatus.FAILED)
+REQUIRED_COLUMNS = ("order_number", "amount", "status")
+
+class SettlementFileError(ValueError):
+    """Raised when a settlement file doesn't have the expected columns"""
+
+@dataclass
+class Mismatch:
+    """A settlement row that couldn't be applied"""
+    line: int
+    order_number: str
+    kind: str  # invalid_row, unknown_order, amount_mismatch, invalid_transition, duplicate
+    detail: str
+    expected_amount: Optional[str] = None
+    settled_amount: Optional[str] = None
+
+@dataclass
+class ReconciliationReport:
+    rows: int = 0
+    applied: Dict[str, int] = field(default_factory=dict)  # Target payment status -> orders moved to it
+    already_applied: int = 0  # Orders already in the settled status before this run
+    conflicts: int = 0  # Orders whose status changed underneath the run
+    mismatch_counts: Dict[str, int] = field(default_factory=dict)
+    mismatches: List[Mismatch] = field(default_factory=list)
+    dry_run: bool = False
+
+    def mismatch(self, mismatch: Mismatch, keep: Optional[int]):
+        self.mismatch_counts[mismatch.kind] = self.mismatch_counts.get(mismatch.kind, 0) + 1
+        if keep is None or len(self.mismatches) < keep:
+            self.mismatches.append(mismatch)
+
+def _paise(amount: str) -> Optional[int]:
+    """A rupee amount in whole paise, or None if it isn't one (unreadable, infinite, too large, fractional paise)"""
+    try:
+        value = Decimal(amount.strip())
+        if not value.is_finite() or value.adjusted() >= MAX_AMOUNT_DIGITS:
+            return None
+        value *= 100
+        return int(value) if value == value.to_integral_value() else None
+    except ArithmeticError:  # decimal.InvalidOperation and decimal.Overflow
+        return None
+
+def _money(paise: int) -> str:
+    return f"{paise // 100}.{paise % 100:02d}"
+
+class OrderIndex:
+    """order_number -> order state, held in parallel lists to keep a million entries compact"""
+
+    def __init__(self):
+        self.position: Dict[str, int] = {}
+        self.ids: List[int] = []
+        self.amounts: List[int] = []  # Paise
+        self.stored: List[PaymentStatus] = []  # Status in the database
+        self.current: List[PaymentStatus] = []  # Status after the rows seen so far
+        self.changed: List[bool] = []  # Moved by this run
+        self.archived: List[bool] = []  # In orders_archive rather than orders
+
+    def add_rows(self, rows, archived: bool = False):
+        for order_id, order_number, total_amount, payment_status in rows:
+            if order_number in self.position:
+                continue
+            self.position[order_number] = len(self.ids)
+            self.ids.append(order_id)
+            self.amounts.append(int(total_amount * 100))
+            status = payment_status or PaymentStatus.PENDING
+            self.stored.append(status)
+            self.current.append(status)
+            self.changed.append(False)
+            self.archived.append(archived)
+
+    @classmethod
+    def awaiting_payment(cls, db: Session) -> "OrderIndex":
+        """Index of every order that is still waiting for its payment, built in one query"""
+        index = cls()
+        index.add_rows(db.execute(
+            select(Order.id, Order.order_number, Order.total_amount, Order.payment_status)
+            .where((Order.payment_status.in_(AWAITING_PAYMENT)) | (Order.payment_status.is_(None)))
+            .execution_options(yield_per=IN_CHUNK_SIZE * 20)
+        ))
+        return index
+
+    def load(self, db: Session, order_numbers: List[str]):
+        """Add specific orders, whatever their status, looking in the archive for those not in orders"""
+        for table in (Order, ArchivedOrder):
+            for start in range(0, len(order_numbers), IN_CHUNK_SIZE):
+                self.add_rows(db.execute(
+                    select(table.id, table.order_number, table.total_amount, table.payment_status)
+                    .where(table.order_number.in_(order_numbers[start:start + IN_CHUNK_SIZE]))
+                ), archived=table is ArchivedOrder)
+            order_numbers = [order_number for order_number in order_numbers if order_number not in self.position]
+
+class Reconciler:
+    """Applies settlement rows to an OrderIndex and flushes the resulting transitions"""
+
+    def __init__(self, db: Session, dry_run: bool = False, keep_mismatches: Optional[int] = None):
+        self.db = db
+        self.dry_run = dry_run
+        self.keep_mismatches = keep_mismatches
+        self.report = ReconciliationReport(dry_run=dry_run)
+        self.index = OrderIndex.awaiting_payment(db)
+        self.pending: List[int] = []  # Index positions changed since the last flush
+        self.deferred: List[Tuple[int, str, int, PaymentStatus]] = []
+
+    def apply(self, line: int, order_number: str, paise: int, target: PaymentStatus, defer: bool = True):
+        index = self.index
+        i = index.position.get(order_number)
+        if i is None:
+            if defer:
+                self.deferred.append((line, order_number, paise, target))
+            else:
+                self.reject(line, order_number, "unknown_order", "No order with this number")
+            return
+
+        current = index.current[i]
+        if index.amounts[i] != paise:
+            self.reject(
+                line, order_number, "amount_mismatch", f"Order total differs ({target.value})",
+                _money(index.amounts[i]), _money(paise)
+            )
+        elif current == target:
+            if index.changed[i]:
+                self.reject(line, order_number, "duplicate", f"Settled as {target.value} earlier in this file")
+            else:
+                self.report.already_applied += 1
+        elif (current, target) not in ALLOWED_TRANSITIONS:
+            self.reject(line, order_number, "invalid_transition", f"Payment is {current.value}, can't become {target.value}")
+        else:
+            index.current[i] = target
+            index.changed[i] = True
+            self.pending.append(i)
+
+    def reject(self, line, order_number, kind, detail, expected=None, settled=None):
+        self.report.mismatch(Mismatch(line, order_number, kind, detail, expected, settled), self.keep_mismatches)
+
+    def flush(self):
+        """Write the transitions collected since the last flush as one UPDATE per table, (from, to) and id chunk"""
+        index = self.index
+        applied = self.report.applied
+        groups: Dict[Tuple[bool, PaymentStatus, PaymentStatus], List[int]] = {}
+        for i in dict.fromkeys(self.pending):  # An order moved twice in one chunk is written once, with its final status
+            if index.current[i] != index.stored[i]:
+                groups.setdefault((index.archived[i], index.stored[i], index.current[i]), []).append(i)
+        self.pending = []
+        if self.dry_run:
+            for (_, _, target), positions in groups.items():
+                applied[target.value] = applied.get(target.value, 0) + len(positions)
+            return
+        for (archived, stored, target), positions in groups.items():
+            table = ArchivedOrder if archived else Order
+            for start in range(0, len(positions), IN_CHUNK_SIZE):
+                chunk = positions[start:start + IN_CHUNK_SIZE]
+                expected = table.payment_status == stored
+                if stored == PaymentStatus.PENDING:
+                    expected = expected | table.payment_status.is_(None)
+                moved = set(self.db.scalars(
+                    update(table)
+                    .where(table.id.in_([index.ids[i] for i in chunk]), expected)
+                    .values(payment_status=target)
+                    .returning(table.id)
+                    .execution_options(synchronize_session=False)
+                ))
+                if moved:  # Only rows the guarded UPDATE actually moved count as applied
+                    applied[target.value] = applied.get(target.value, 0) + len(moved)
+                conflicted = [i for i in chunk if index.ids[i] not in moved]
+                self.report.conflicts += len(conflicted)
+                for i in chunk:
+                    if index.ids[i] in moved:
+                        index.stored[i] = target
+                if conflicted:
+                    self._reload(table, conflicted)
+        self.db.commit()
+
+    def _reload(self, table, positions: List[int]):
+        """Re-read orders whose status changed underneath the run, so later rows are checked against what is stored"""
+        index = self.index
+        statuses = dict(self.db.execute(
+            select(table.id, table.payment_status).where(table.id.in_([index.ids[i] for i in positions]))
+        ).all())
+        for i in positions:
+            status = statuses.get(index.ids[i]) or PaymentStatus.PENDING
+            index.stored[i] = index.current[i] = status
+            index.changed[i] = False
+
+    def finish(self) -> ReconciliationReport:
+        """Resolve rows for orders outside the index in one batched pass, then flush"""
+        self.flush()
+        deferred, self.deferred = self.deferred, []
+        self.index.load(self.db, list(dict.fromkeys(order_number for _, order_number, _, _ in deferred)))
+        for line, order_number, paise, target in deferred:
+            self.apply(line, order_number, paise, target, defer=False)
+        self.flush()
+        self.report.mismatches.sort(key=lambda mismatch: mismatch.line)
+        return self.report
+
+def reconcile_settlement(
+    db: Session,
+    lines: Iterable[str],
+    dry_run: bool = False,
+    keep_mismatches: Optional[int] = None,
+    chunk_size: int = RECONCILE_CHUNK_SIZE,
+) -> ReconciliationReport:
+    """Stream a settlement CSV (any iterable of lines, e.g. an open file) and apply it to order payments"""
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    columns = {name.strip().lower(): i for i, name in enumerate(header or [])}
+    missing = [name for name in REQUIRED_COLUMNS if name not in columns]
+    if missing:
+        raise SettlementFileError(f"Settlement file is missing columns: {', '.join(missing)}")
+    number_at, amount_at, status_at = (columns[name] for name in REQUIRED_COLUMNS)
+    width = max(number_at, amount_at, status_at) + 1
+
+    reconciler = Reconciler(db, dry_run, keep_mismatches)
+    report = reconciler.report
+    for line, row in enumerate(reader, start=2):
+        if not row:
+            continue
+        report.rows += 1
+        if len(row) < width:
+            reconciler.reject(line, "", "invalid_row", "Too few columns")
+            continue
+        order_number = row[number_at].strip()
+        target = SETTLEMENT_STATUSES.get(row[status_at].strip().lower())
+        paise = _paise(row[amount_at])
+        if target is None or paise is None:
+            reconciler.reject(line, order_number, "invalid_row", f"Unreadable status or amount: {row[status_at]!r}, {row[amount_at]!r}")
+            continue
+        reconciler.apply(line, order_number, paise, target)
+        if report.rows % chunk_size == 0:
+            reconciler.flush()
+    return reconciler.finish()
+
+def write_mismatch_report(report: ReconciliationReport, output):
+    """Write the kept mismatches as CSV to a text stream"""
+    writer = csv.writer(output)
+    writer.writerow(["line", "order_number", "kind", "detail", "expected_amount", "settled_amount"])
+    for mismatch in report.mismatches:
+        writer.writerow([
+            mismatch.line, mismatch.order_number, mismatch.kind, mismatch.detail,
+            mismatch.expected_amount or "", mismatch.settled_amount or "",
+        ])
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr, field_validator, ConfigDict
-from typing import Optional, List
-from datetime import datetime
+from pydantic import BaseModel, EmailStr, field_validator, model_validator, ConfigDict
+from typing import Dict, Optional, List, Union
+from datetime import date, datetime, time
 from decimal import Decimal
 from enum import Enum
 
@@ -23,6 +23,18 @@ class PaymentStatus(str, Enum):
     FAILED = "failed"
     REFUNDED = "refunded"
 
+class StockMovementReason(str, Enum):
+    CHECKOUT = "checkout"
+    RESTOCK = "restock"
+    ADJUSTMENT = "adjustment"
+    DAMAGE = "damage"
+    RETURN = "return"
+
+class PromotionKind(str, Enum):
+    PERCENTAGE = "percentage"
+    FIXED = "fixed"
+    BUY_X_GET_Y = "buy_x_get_y"
+
 # User schemas
 class UserBase(BaseModel):
     """Base user schema"""
@@ -77,8 +89,17 @@ class Token(BaseModel):
     user_role: UserRole
 
 class TokenData(BaseModel):
-    """Token data schema"""
+    """Token data schema; the signed-in user as described by the token's claims"""
     username: Optional[str] = None
+    id: Optional[int] = None
+    role: UserRole = UserRole.USER
+    is_active: bool = True
+    issued_at: float = 0.0  # iat, checked against token revocations
+    expires_at: float = 0.0
+
+class UserStatusUpdate(BaseModel):
+    """Schema for activating or deactivating a user"""
+    is_active: bool
 
 # Category schemas
 class CategoryBase(BaseModel):
@@ -88,7 +109,7 @@ class CategoryBase(BaseModel):
 
 class CategoryCreate(CategoryBase):
     """Schema for category creation"""
-    pass
+    parent_id: Optional[int] = None  # Top level when omitted
 
 class CategoryResponse(CategoryBase):
     """Schema for category response"""
@@ -98,6 +119,20 @@ class CategoryResponse(CategoryBase):
     
     model_config = ConfigDict(from_attributes=True)
 
+class CategoryParentUpdate(BaseModel):
+    """Schema for moving a category (and everything under it) to another parent"""
+    parent_id: Optional[int] = None  # None moves it to the top level
+
+class CategoryNodeResponse(CategoryResponse):
+    """Schema for a category with its place in the tree and active product counts"""
+    parent_id: Optional[int] = None
+    product_count: int = 0  # Directly in the category
+    subtree_product_count: int = 0  # In the category or any subcategory
+
+class CategoryTreeResponse(CategoryNodeResponse):
+    """Schema for a category with its subcategories nested under it"""
+    children: List["CategoryTreeResponse"] = []
+
 # Product schemas
 class ProductBase(BaseModel):
     """Base product schema"""
@@ -114,7 +149,13 @@ class ProductBase(BaseModel):
 
 class ProductCreate(ProductBase):
     """Schema for product creation"""
-    pass
+    
+    @field_validator('stock_quantity')
+    @classmethod
+    def validate_stock_quantity(cls, v):
+        if v < 0:
+            raise ValueError("Stock quantity can't be negative")
+        return v
 
 class ProductResponse(ProductBase):
     """Schema for product response"""
@@ -126,6 +167,11 @@ class ProductResponse(ProductBase):
     
     model_config = ConfigDict(from_attributes=True)
 
+class RecommendationResponse(BaseModel):
+    """Schema for a product frequently bought together with another"""
+    product: ProductResponse
+    orders: int  # Orders that contained both products
+
 class ProductUpdate(BaseModel):
     """Schema for product updates"""
     name: Optional[str] = None
@@ -139,6 +185,13 @@ class ProductUpdate(BaseModel):
     origin: Optional[str] = None
     is_organic: Optional[bool] = None
     is_active: Optional[bool] = None
+    
+    @field_validator('price')
+    @classmethod
+    def validate_price(cls, v):
+        if v is not None and v <= 0:
+            raise ValueError('Price must be positive')
+        return v
 
 # Cart schemas
 class CartItemBase(BaseModel):
@@ -158,11 +211,49 @@ class CartItemResponse(CartItemBase):
     
     model_config = ConfigDict(from_attributes=True)
 
+class AppliedDiscountResponse(BaseModel):
+    """Schema for a promotion applied to a cart line"""
+    product_id: int
+    promotion_id: int
+    name: str
+    amount: Decimal
+
 class CartResponse(BaseModel):
     """Schema for cart response"""
     items: List[CartItemResponse]
     total_items: int
-    total_amount: Decimal
+    total_amount: Decimal  # After discounts
+    subtotal_amount: Decimal
+    discount_amount: Decimal
+    discounts: List[AppliedDiscountResponse]
+    coupon_code: Optional[str] = None
+
+class CartQuantityUpdate(BaseModel):
+    """Schema for setting a cart line's quantity"""
+    quantity: int  # 0 removes the product
+    
+    @field_validator('quantity')
+    @classmethod
+    def validate_quantity(cls, v):
+        if v < 0:
+            raise ValueError('Quantity must not be negative')
+        return v
+
+class GuestCartItemResponse(BaseModel):
+    """Schema for a guest cart line"""
+    product_id: int
+    quantity: int
+    product: ProductResponse
+
+class GuestCartResponse(BaseModel):
+    """Schema for guest cart response"""
+    items: List[GuestCartItemResponse]
+    total_items: int
+    total_amount: Decimal  # After discounts
+    subtotal_amount: Decimal
+    discount_amount: Decimal
+    discounts: List[AppliedDiscountResponse]
+    coupon_code: Optional[str] = None
 
 # Wishlist schemas
 class WishlistItemBase(BaseModel):
@@ -203,7 +294,7 @@ class OrderBase(BaseModel):
 
 class OrderCreate(OrderBase):
     """Schema for order creation"""
-    pass
+    coupon_code: Optional[str] = None
 
 class OrderResponse(OrderBase):
     """Schema for order response"""
@@ -230,10 +321,289 @@ class QRCodePayment(BaseModel):
 class ProductPriceUpdate(BaseModel):
     """Schema for updating product price"""
     price: Decimal
+    effective_from: Optional[datetime] = None  # Schedule the change for later; applied immediately if omitted
     
     @field_validator('price')
     @classmethod
     def validate_price(cls, v):
         if v <= 0:
             raise ValueError('Price must be positive')
-        return v
\ No newline at end of file
+        return v
+
+class ProductPriceResponse(BaseModel):
+    """Schema for a price history entry"""
+    id: int
+    product_id: int
+    price: Decimal
+    effective_from: datetime
+    applied_at: Optional[datetime] = None
+    user_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+    
+    model_config = ConfigDict(from_attributes=True)
+
+class PricePoint(BaseModel):
+    """Schema for a product's price at a point in time"""
+    product_id: int
+    price: Decimal
+
+# Inventory schemas
+class StockAdjustment(BaseModel):
+    """Schema for a manual stock change"""
+    change: int  # Signed delta, e.g. 20 for a delivery or -3 for spoilage
+    reason: StockMovementReason = StockMovementReason.ADJUSTMENT
+    note: Optional[str] = None
+    
+    @field_validator('change')
+    @classmethod
+    def validate_change(cls, v):
+        if v == 0:
+            raise ValueError('Change must not be zero')
+        return v
+    
+    @field_validator('reason')
+    @classmethod
+    def validate_reason(cls, v):
+        if v == StockMovementReason.CHECKOUT:
+            raise ValueError('Checkout movements are recorded by orders')
+        return v
+
+class StockThresholdUpdate(BaseModel):
+    """Schema for setting a product's low-stock threshold"""
+    threshold: int
+    
+    @field_validator('threshold')
+    @classmethod
+    def validate_threshold(cls, v):
+        if v < 0:
+            raise ValueError('Threshold must not be negative')
+        return v
+
+class StockMovementResponse(BaseModel):
+    """Schema for a stock movement log entry"""
+    id: int
+    product_id: int
+    change: int
+    quantity_after: int
+    reason: StockMovementReason
+    order_id: Optional[int] = None
+    user_id: Optional[int] = None
+    note: Optional[str] = None
+    created_at: Optional[datetime] = None
+    
+    model_config = ConfigDict(from_attributes=True)
+
+class StockMovementPage(BaseModel):
+    """Schema for a page of stock movements, newest first"""
+    movements: List[StockMovementResponse]
+    next_before_id: Optional[int] = None  # Pass as before_id to get the next page
+
+class LowStockProductResponse(BaseModel):
+    """Schema for a product below its low-stock threshold"""
+    product_id: int
+    name: str
+    unit: str
+    stock_quantity: int
+    threshold: int
+    since: Optional[datetime] = None
+
+# Promotion schemas
+class PromotionCreate(BaseModel):
+    """Schema for creating a promotion; without product_id or category_id it applies to every product"""
+    name: str
+    kind: PromotionKind
+    value: Optional[Decimal] = None  # Percent off, or amount off each unit
+    buy_quantity: Optional[int] = None
+    get_quantity: Optional[int] = None
+    product_id: Optional[int] = None
+    category_id: Optional[int] = None
+    code: Optional[str] = None  # Coupon code the shopper has to enter
+    starts_at: Optional[datetime] = None
+    ends_at: Optional[datetime] = None
+    
+    @field_validator('code')
+    @classmethod
+    def normalize_code(cls, v):
+        if v is None:
+            return None
+        return v.strip().upper() or None
+    
+    @model_validator(mode='after')
+    def validate_rule(self):
+        if self.product_id is not None and self.category_id is not None:
+            raise ValueError('Give a product_id or a category_id, not both')
+        if self.kind == PromotionKind.BUY_X_GET_Y:
+            if not self.buy_quantity or self.buy_quantity < 1 or not self.get_quantity or self.get_quantity < 1:
+                raise ValueError('Buy X get Y promotions need positive buy_quantity and get_quantity')
+        elif self.value is None or self.value <= 0:
+            raise ValueError('Value must be positive')
+        elif self.kind == PromotionKind.PERCENTAGE and self.value > 100:
+            raise ValueError('Percentage must not exceed 100')
+        if self.starts_at and self.ends_at and self.ends_at <= self.starts_at:
+            raise ValueError('ends_at must be after starts_at')
+        return self
+
+class PromotionUpdate(BaseModel):
+    """Schema for rescheduling or (de)activating a promotion; its discount itself can't change"""
+    name: Optional[str] = None
+    starts_at: Optional[datetime] = None
+    ends_at: Optional[datetime] = None
+    is_active: Optional[bool] = None
+
+class PromotionResponse(BaseModel):
+    """Schema for promotion response"""
+    id: int
+    name: str
+    kind: PromotionKind
+    value: Optional[Decimal] = None
+    buy_quantity: Optional[int] = None
+    get_quantity: Optional[int] = None
+    product_id: Optional[int] = None
+    category_id: Optional[int] = None
+    code: Optional[str] = None
+    starts_at: Optional[datetime] = None
+    ends_at: Optional[datetime] = None
+    is_active: bool
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    
+    model_config = ConfigDict(from_attributes=True)
+
+# Admin dashboard schemas
+class AdminStatsResponse(BaseModel):
+    """Schema for the admin dashboard totals"""
+    total_products: int
+    active_products: int
+    low_stock_products: int
+    total_users: int
+    total_orders: int
+    pending_orders: int
+    orders_today: int
+    paid_orders: int
+    total_revenue: Decimal
+    average_order_value: Decimal
+
+# Payment reconciliation schemas
+class SettlementMismatchResponse(BaseModel):
+    """Schema for a settlement row that couldn't be applied"""
+    line: int
+    order_number: str
+    kind: str
+    detail: str
+    expected_amount: Optional[str] = None
+    settled_amount: Optional[str] = None
+    
+    model_config = ConfigDict(from_attributes=True)
+
+class ReconciliationReportResponse(BaseModel):
+    """Schema for the outcome of a settlement file"""
+    rows: int
+    applied: Dict[str, int]
+    already_applied: int
+    conflicts: int
+    mismatch_counts: Dict[str, int]
+    mismatches: List[SettlementMismatchResponse]
+    dry_run: bool
+    
+    model_config = ConfigDict(from_attributes=True)
+
+# Order status transition schemas
+class OrderStatusFilter(BaseModel):
+    """Schema for picking a wave's orders by their current status"""
+    status: OrderStatus
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+    limit: int = 10000
+
+class BulkOrderStatusUpdate(BaseModel):
+    """Schema for moving many orders to one status"""
+    status: OrderStatus
+    order_ids: Optional[List[int]] = None
+    filter: Optional[OrderStatusFilter] = None
+    dry_run: bool = False
+    
+    @model_validator(mode='after')
+    def validate_targets(self):
+        if self.order_ids is None and self.filter is None:
+            raise ValueError('Give order_ids or a filter')
+        if self.order_ids is not None and self.filter is not None:
+            raise ValueError('Give order_ids or a filter, not both')
+        return self
+
+class OrderTransitionResponse(BaseModel):
+    """Schema for what happened to one order in a bulk status update"""
+    order_id: int
+    result: str
+    previous_status: Optional[OrderStatus] = None
+    
+    model_config = ConfigDict(from_attributes=True)
+
+class OrderStatusChangeResponse(BaseModel):
+    """Schema for one move in an order's status history"""
+    from_status: OrderStatus
+    to_status: OrderStatus
+    user_id: Optional[int] = None
+    changed_at: datetime
+    
+    model_config = ConfigDict(from_attributes=True)
+
+class BulkOrderStatusResponse(BaseModel):
+    """Schema for the outcome of a bulk status update"""
+    status: OrderStatus
+    requested: int
+    counts: Dict[str, int]
+    results: List[OrderTransitionResponse]
+    dry_run: bool
+    
+    model_config = ConfigDict(from_attributes=True)
+
+# Delivery batching schemas
+class DeliveryPlanResponse(BaseModel):
+    """Schema for the outcome of a delivery planning run"""
+    orders_batched: int
+    orders_released: int
+    batches_created: int
+    batches_topped_up: int
+    
+    model_config = ConfigDict(from_attributes=True)
+
+class DeliveryBatchOrderResponse(BaseModel):
+    """Schema for an order in a delivery batch"""
+    order_id: int
+    order_number: str
+    area: str
+    delivery_address: str
+
+class DeliveryBatchResponse(BaseModel):
+    """Schema for a delivery batch with its orders in route order"""
+    id: int
+    zone: str
+    capacity: int
+    order_count: int
+    created_at: Optional[datetime] = None
+    dispatched_at: Optional[datetime] = None
+    orders: List[DeliveryBatchOrderResponse]
+
+# Serviceability schemas
+class ServiceabilityResponse(BaseModel):
+    """Schema for whether we deliver to a pincode, and on what terms"""
+    pincode: str
+    serviceable: bool
+    zone: Optional[str] = None
+    delivery_fee: Optional[Decimal] = None
+    cutoff: Optional[time] = None
+    dispatch_date: Optional[date] = None  # For an order placed now, given the cutoff
+
+class ServiceAreasUploadResponse(BaseModel):
+    """Schema for a replaced serviceability table"""
+    prefixes: int
+    serviceable_prefixes: int
+
+# Page load schemas
+class BootstrapResponse(BaseModel):
+    """Schema for everything the storefront needs on page load"""
+    categories: List[CategoryNodeResponse]
+    products: List[ProductResponse]
+    user: Optional[UserResponse] = None
+    cart: Union[CartResponse, GuestCartResponse]  # The guest cart when signed out
+    wishlist: Optional[List[WishlistItemResponse]] = None
@@ -0,0 +1,192 @@
+"""
+Admin order search.
+
+Support staff look orders up by a fragment of the order number, the
+customer's username or email, or the delivery address or notes. A search
+reads three indexes and merges what they find, highest (most recently
+placed) order id first:
+
+* order numbers by prefix, with or without the "ORD-" in front, through
+  the unique B-tree indexes on ``orders.order_number`` and
+  ``orders_archive.order_number``;
+* customers by substring in ``customer_search``, whose orders are then read
+  through the user_id indexes, for up to ORDER_SEARCH_MAX_CUSTOMERS
+  customers, newest accounts first;
+* delivery addresses and notes by substring in ``order_search``.
+
+The two search tables are trigram indexes keyed by user and order id (which
+an order keeps when it moves to the archive). Rows are written in the
+transaction that registers the user or places the order; rows loaded outside
+the API are indexed at startup, from the highest id already indexed, since
+bulk loads append above it. How they are indexed depends on the database:
+
+* SQLite: contentless FTS5 tables with the trigram tokenizer. A query is a
+  single phrase, so it matches any substring of at least three characters.
+* PostgreSQL: plain tables with pg_trgm GIN indexes, queried with ILIKE.
+* Anything else, or either extension missing: the same plain tables,
+  scanned with LIKE from the highest id down until enough rows match.
+"""
+from typing import List, Optional
+from sqlalchemy import select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from app.models import ArchivedOrder, Order
+import heapq
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+MIN_QUERY_LENGTH = 3  # The shortest substring a trigram index can look up
+ORDER_SEARCH_MAX_CUSTOMERS = int(os.getenv("ORDER_SEARCH_MAX_CUSTOMERS", "100"))
+ORDER_NUMBER_PREFIX = "ORD-"
+
+FTS5 = "fts5"
+TRIGRAM = "trigram"
+SCAN = "scan"
+
+def _like_pattern(term: str) -> str:
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+class TrigramIndex:
+    """A substring index over some text columns of a table, rows keyed by the table's id"""
+
+    def __init__(self, name: str, key: str, columns: List[str], source: str):
+        self.name = name
+        self.key = key  # Id column of the plain table
+        self.columns = columns
+        self.source = source  # SELECT id, *columns FROM {table} ... WHERE {where}
+        self.backend: Optional[str] = None
+
+    def ensure(self, engine):
+        """Create the table on first start and work out which backend it is"""
+        dialect = engine.dialect.name
+        if dialect == "sqlite":
+            with engine.connect() as conn:
+                existing = conn.exec_driver_sql(f"SELECT sql FROM sqlite_master WHERE name = '{self.name}'").scalar()
+            if existing is not None:
+                self.backend = FTS5 if "fts5" in existing.lower() else SCAN
+                return
+            try:
+                with engine.begin() as conn:
+                    conn.exec_driver_sql(
+                        f"CREATE VIRTUAL TABLE {self.name} USING fts5("
+                        f"{', '.join(self.columns)}, tokenize='trigram', content='')"
+                    )
+                self.backend = FTS5
+                return
+            except DBAPIError:
+                logger.warning("SQLite lacks FTS5 with the trigram tokenizer; %s will be scanned", self.name)
+        with engine.begin() as conn:
+            conn.exec_driver_sql(f"CREATE TABLE IF NOT EXISTS {self.name} ({self.key} INTEGER PRIMARY KEY, document TEXT NOT NULL)")
+        self.backend = SCAN
+        if dialect == "postgresql":
+            try:
+                with engine.begin() as conn:
+                    conn.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+                    conn.exec_driver_sql(
+                        f"CREATE INDEX IF NOT EXISTS ix_{self.name}_document_trgm ON {self.name} USING gin (document gin_trgm_ops)"
+                    )
+                self.backend = TRIGRAM
+            except DBAPIError:
+                logger.warning("pg_trgm is unavailable; %s will be scanned", self.name)
+
+    def add(self, db: Session, where: str, table: Optional[str] = None, **params) -> int:
+        """Index the source rows matching `where` in the caller's transaction; returns how many"""
+        source = self.source.format(table=table, where=where)
+        if self.backend == FTS5:
+            statement = f"INSERT INTO {self.name} (rowid, {', '.join(self.columns)}) {source}"
+        else:
+            document = " || ' ' || ".join(f"COALESCE(s.{column}, '')" for column in self.columns)
+            statement = f"INSERT INTO {self.name} ({self.key}, document) SELECT s.id, {document} FROM ({source}) s"
+        return db.execute(text(statement), params).rowcount
+
+    def last_id(self, db: Session) -> int:
+        if self.backend == FTS5:
+            # A contentless table can't be scanned; its docsize shadow table has a row per indexed rowid
+            return db.execute(text(f"SELECT MAX(id) FROM {self.name}_docsize")).scalar() or 0
+        return db.execute(text(f"SELECT MAX({self.key}) FROM {self.name}")).scalar() or 0
+
+    def match(self, db: Session, term: str, limit: int) -> List[int]:
+        """Ids of rows with `term` in any column, highest first"""
+        if self.backend == FTS5:
+            statement = f"SELECT rowid FROM {self.name} WHERE {self.name} MATCH :query ORDER BY rowid DESC LIMIT :limit"
+            params = {"query": '"' + term.replace('"', '""') + '"'}
+        else:
+            operator = "ILIKE" if self.backend == TRIGRAM else "LIKE"
+            statement = (
+                f"SELECT {self.key} FROM {self.name} WHERE document {operator} :pattern ESCAPE '\\' "
+                f"ORDER BY {self.key} DESC LIMIT :limit"
+            )
+            params = {"pattern": _like_pattern(term)}
+        return db.execute(text(statement), {**params, "limit": limit}).scalars().all()
+
+class OrderSearch:
+    """Orders by number prefix, customer, and delivery address or notes"""
+
+    def __init__(self):
+        self.customers = TrigramIndex(
+            "customer_search", "user_id", ["username", "email"],
+            "SELECT u.id, u.username, u.email FROM users u WHERE {where}",
+        )
+        self.orders = TrigramIndex(
+            "order_search", "order_id", ["delivery_address", "notes"],
+            "SELECT o.id, o.delivery_address, o.notes FROM {table} o WHERE {where}",
+        )
+
+    def ensure(self, engine):
+        self.customers.ensure(engine)
+        self.orders.ensure(engine)
+
+    def index_customer(self, db: Session, user_id: int):
+        """Index a new user in the caller's transaction"""
+        self.customers.add(db, "u.id = :user_id", user_id=user_id)
+
+    def index_order(self, db: Session, order_id: int):
+        """Index a new order in the caller's transaction"""
+        self.orders.add(db, "o.id = :order_id", "orders", order_id=order_id)
+
+    def backfill(self, db: Session) -> int:
+        """Index users and orders loaded outside the API (seed scripts, bulk imports); returns how many rows were added"""
+        added = self.customers.add(db, "u.id > :last", last=self.customers.last_id(db))
+        last = self.orders.last_id(db)
+        for table in ("orders", "orders_archive"):
+            added += self.orders.add(db, "o.id > :last", table, last=last)
+        return added
+
+    def search(self, db: Session, term: str, skip: int = 0, limit: int = 50) -> List[int]:
+        """Ids of orders matching `term` by number prefix, customer, address or notes, highest first"""
+        count = skip + limit
+        sources = [self.orders.match(db, term, count)]
+        customer_ids = self.customers.match(db, term, ORDER_SEARCH_MAX_CUSTOMERS)
+        prefixes = [term.upper()]  # Order numbers are upper case
+        if not prefixes[0].startswith(ORDER_NUMBER_PREFIX[:len(prefixes[0])]):
+            prefixes.append(ORDER_NUMBER_PREFIX + prefixes[0])
+        for table in (Order.__table__, ArchivedOrder.__table__):
+            for prefix in prefixes:
+                # The range is what the index serves; LIKE keeps the match exact under any collation
+                sources.append(db.execute(
+                    select(table.c.id)
+                    .where(
+                        table.c.order_number >= prefix, table.c.order_number < prefix[:-1] + chr(ord(prefix[-1]) + 1),
+                        table.c.order_number.startswith(prefix, autoescape=True),
+                    )
+                    .order_by(table.c.id.desc())
+                    .limit(count)
+                ).scalars().all())
+            if customer_ids:
+                sources.append(db.execute(
+                    select(table.c.id).where(table.c.user_id.in_(customer_ids)).order_by(table.c.id.desc()).limit(count)
+                ).scalars().all())
+
+        order_ids, seen = [], set()
+        for order_id in heapq.merge(*sources, reverse=True):
+            if order_id not in seen:
+                seen.add(order_id)
+                order_ids.append(order_id)
+                if len(order_ids) == count:
+                    break
+        return order_ids[skip:]
+
+order_search = OrderSearch()
@@ -0,0 +1,186 @@
+"""
+Pincode serviceability.
+
+``service_areas`` maps pincode prefixes (one to six leading digits) to
+whether we deliver there, the delivery zone, fee and daily order cutoff;
+the longest prefix of a pincode applies, so "5600" can cover a city and
+"560300" carve one pincode out of it. The table is replaced wholesale from
+a CSV upload.
+
+Every process serves lookups from a ServiceabilityIndex: each prefix stands
+for a range of six-digit pincodes, and because prefix ranges are either
+nested or disjoint they flatten into one sorted array of range starts, each
+with the area that applies from there to the next start. A lookup is then a
+single bisect over an ``array`` of ints, with no queries and no per-pincode
+entries. The index is rebuilt when the "serviceability" cache namespace
+version changes, which every upload bumps. Until a table has been uploaded
+every pincode is accepted.
+
+Cutoffs are local times of day (SERVICE_UTC_OFFSET_MINUTES from UTC, India
+by default): orders placed before an area's cutoff are dispatched the same
+day, later ones the next day.
+"""
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+from app.cache import cache
+from app.database import SessionLocal
+from app.models import ServiceArea
+import csv
+import os
+import threading
+
+PINCODE_DIGITS = 6
+REQUIRED_COLUMNS = ("prefix", "zone", "delivery_fee")
+NOT_SERVED = -1
+SERVICE_UTC_OFFSET_MINUTES = int(os.getenv("SERVICE_UTC_OFFSET_MINUTES", "330"))  # Cutoffs are local times, this far ahead of UTC
+
+class ServiceabilityFileError(ValueError):
+    """Raised when a serviceability file is missing columns or has an invalid row"""
+
+@dataclass(frozen=True)
+class Area:
+    prefix: str
+    serviceable: bool
+    zone: Optional[str]
+    delivery_fee: Optional[Decimal]
+    cutoff: Optional[time]
+
+    def dispatch_date(self, now: Optional[datetime] = None) -> date:
+        """The local day an order placed at `now` (UTC) is dispatched: that day until the cutoff, the next day after it"""
+        local = (datetime.utcnow() if now is None else now) + timedelta(minutes=SERVICE_UTC_OFFSET_MINUTES)
+        if self.cutoff is not None and local.time() >= self.cutoff:
+            return local.date() + timedelta(days=1)
+        return local.date()
+
+def _truthy(value: str) -> bool:
+    return value.strip().lower() in ("", "1", "true", "yes", "y")
+
+def parse_service_areas(lines: Iterable[str]) -> List[Area]:
+    """Areas from a CSV with prefix, zone and delivery_fee columns, plus optional cutoff (HH:MM) and serviceable"""
+    reader = csv.DictReader(lines)
+    columns = [column.strip().lower() for column in reader.fieldnames or ()]
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+    if missing:
+        raise ServiceabilityFileError(f"Missing columns: {', '.join(missing)}")
+    reader.fieldnames = columns
+    areas = {}
+    for line, row in enumerate(reader, start=2):
+        prefix = (row["prefix"] or "").strip()
+        if not prefix.isdigit() or len(prefix) > PINCODE_DIGITS or prefix[0] == "0":
+            raise ServiceabilityFileError(f"Line {line}: prefix must be 1-{PINCODE_DIGITS} digits, not starting with 0")
+        if prefix in areas:
+            raise ServiceabilityFileError(f"Line {line}: prefix {prefix} appears twice")
+        serviceable = _truthy(row.get("serviceable") or "")
+        try:
+            fee = Decimal((row["delivery_fee"] or "0").strip())
+            cutoff = time.fromisoformat(row["cutoff"].strip()) if (row.get("cutoff") or "").strip() else None
+        except (InvalidOperation, ValueError):
+            raise ServiceabilityFileError(f"Line {line}: delivery_fee must be a number and cutoff HH:MM")
+        if not fee.is_finite() or fee < 0:
+            raise ServiceabilityFileError(f"Line {line}: delivery_fee must not be negative")
+        zone = (row["zone"] or "").strip() or None
+        if serviceable and zone is None:
+            raise ServiceabilityFileError(f"Line {line}: serviceable areas need a zone")
+        areas[prefix] = Area(prefix, serviceable, zone, fee.quantize(Decimal("0.01")), cutoff)
+    return list(areas.values())
+
+def replace_service_areas(db: Session, areas: List[Area]):
+    """Swap the whole serviceability table in the caller's transaction"""
+    db.execute(delete(ServiceArea))
+    if areas:
+        db.execute(insert(ServiceArea), [
+            {"prefix": area.prefix, "serviceable": area.serviceable, "zone": area.zone,
+             "delivery_fee": area.delivery_fee, "cutoff": area.cutoff}
+            for area in areas
+        ])
+
+def _pincode_range(prefix: str) -> Tuple[int, int]:
+    """[first, last + 1) of the six-digit pincodes starting with `prefix`"""
+    scale = 10 ** (PINCODE_DIGITS - len(prefix))
+    return int(prefix) * scale, (int(prefix) + 1) * scale
+
+class ServiceabilityIndex:
+    """Longest-prefix lookup of pincodes as a bisect over flattened prefix ranges"""
+
+    def __init__(self, version: int, areas: List[Area]):
+        self.version = version
+        self.prefixes = len(areas)  # Including unserviceable ones; zero until a table is uploaded
+        self.areas = tuple(area for area in areas if area.serviceable)
+        index = {area.prefix: i for i, area in enumerate(self.areas)}
+
+        # Walk the ranges by start, outer before inner, keeping the ones open at the current start on a stack; where
+        # one ends, the range enclosing it applies again. `points` is where the applicable area changes
+        points: List[Tuple[int, int]] = []
+
+        def mark(at: int, value: int):
+            if points and points[-1][0] == at:
+                points[-1] = (at, value)
+            else:
+                points.append((at, value))
+
+        ranges = sorted(
+            ((*_pincode_range(area.prefix), index.get(area.prefix, NOT_SERVED)) for area in areas),
+            key=lambda entry: (entry[0], -entry[1]),
+        )
+        open_ranges: List[Tuple[int, int]] = []  # (end, value)
+        for start, end, value in ranges:
+            while open_ranges and open_ranges[-1][0] <= start:
+                closed_end, _ = open_ranges.pop()
+                mark(closed_end, open_ranges[-1][1] if open_ranges else NOT_SERVED)
+            mark(start, value)
+            open_ranges.append((end, value))
+        while open_ranges:
+            closed_end, _ = open_ranges.pop()
+            mark(closed_end, open_ranges[-1][1] if open_ranges else NOT_SERVED)
+
+        self.starts = array("i")  # Sorted; pincodes from starts[i] up to starts[i + 1] get areas[values[i]]
+        self.values = array("i")
+        previous = NOT_SERVED
+        for at, value in points:
+            if value != previous:
+                self.starts.append(at)
+                self.values.append(value)
+                previous = value
+        # What bisect_right lands on, resolved up front: None before the first start and wherever we don't deliver
+        self._resolved = (None, *(self.areas[value] if value != NOT_SERVED else None for value in self.values))
+
+    def lookup(self, pincode: str) -> Optional[Area]:
+        """The area a six-digit pincode falls in, or None if we don't deliver there"""
+        if len(pincode) != PINCODE_DIGITS or not pincode.isdigit():
+            return None
+        return self._resolved[bisect_right(self.starts, int(pincode))]
+
+def load_service_areas(db: Session) -> List[Area]:
+    return [
+        Area(row.prefix, row.serviceable, row.zone, row.delivery_fee, row.cutoff)
+        for row in db.execute(select(ServiceArea)).scalars()
+    ]
+
+class Serviceability:
+    """Serves the current serviceability index, rebuilding it after uploads"""
+
+    def __init__(self):
+        self._index: Optional[ServiceabilityIndex] = None
+        self._lock = threading.Lock()
+
+    def current(self) -> ServiceabilityIndex:
+        version = cache.version("serviceability")
+        index = self._index
+        if index is not None and index.version == version:
+            return index
+        with self._lock:
+            if self._index is None or self._index.version != version:
+                db = SessionLocal()
+                try:
+                    self._index = ServiceabilityIndex(version, load_service_areas(db))
+                finally:
+                    db.close()
+            return self._index
+
+serviceability = Serviceability()
@@ -0,0 +1,58 @@
+"""
+Request coalescing for expensive cache misses.
+
+Endpoints run on the event loop, so a miss computed inline (rebuilding the
+catalog snapshot, rendering a QR code, aggregating admin stats) stalls every
+other request in the process until it finishes. ``flights.run(key, fn)``
+runs fn in the default thread pool instead, and every call made with the
+same key while it is running awaits that one computation: they all get its
+result, or its exception. A caller that waits longer than the timeout gets
+SingleFlightTimeout; the computation carries on, and callers that arrive
+before it finishes still join it rather than starting another.
+"""
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+import asyncio
+import os
+
+SINGLE_FLIGHT_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_TIMEOUT", "10"))  # Seconds a caller waits for a shared computation
+
+class SingleFlightTimeout(Exception):
+    """Raised to a caller that gave up waiting for a shared computation"""
+
+class SingleFlight:
+    """At most one running computation per key; concurrent callers share it"""
+
+    def __init__(self, timeout: float = SINGLE_FLIGHT_TIMEOUT):
+        self.timeout = timeout
+        self._flights: Dict[Tuple[asyncio.AbstractEventLoop, Hashable], asyncio.Future] = {}
+        self.started = 0
+        self.joined = 0
+
+    def _landed(self, flight_key, future: asyncio.Future):
+        if self._flights.get(flight_key) is future:
+            del self._flights[flight_key]
+        if not future.cancelled():
+            future.exception()  # Retrieved here, so a failure every caller timed out on isn't logged as unhandled
+
+    async def run(self, key: Hashable, fn: Callable[..., Any], *args, timeout: Optional[float] = None) -> Any:
+        """fn(*args) in a worker thread, or the result of the identical call already running"""
+        loop = asyncio.get_running_loop()
+        flight_key = (loop, key)  # Futures belong to one event loop
+        future = self._flights.get(flight_key)
+        if future is None:
+            future = loop.run_in_executor(None, fn, *args)
+            self._flights[flight_key] = future
+            future.add_done_callback(lambda done: self._landed(flight_key, done))
+            self.started += 1
+        else:
+            self.joined += 1
+        try:
+            # Shielded: one caller timing out or disconnecting mustn't cancel the others' result
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            raise SingleFlightTimeout(f"Timed out waiting for {key!r}")
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+flights = SingleFlight()
@@ -0,0 +1,52 @@
+"""
+Admin dashboard figures.
+
+Order counts and revenue come from one aggregate scan of each orders table
+(hot and archive), so loading the dashboard is the most expensive read an
+admin makes; /admin/stats runs it through the single-flight layer so
+admins refreshing at once share one scan.
+"""
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import case, func, select
+from app.database import SessionLocal
+from app.models import ArchivedOrder, LowStockProduct, Order, OrderStatus, PaymentStatus, Product, User
+
+def _order_totals(db, table) -> tuple:
+    """(orders, paid orders, revenue, pending orders, orders today) for one orders table"""
+    columns = table.c
+    paid = columns.payment_status == PaymentStatus.COMPLETED
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    return db.execute(select(
+        func.count(),
+        func.count(case((paid, 1))),
+        func.coalesce(func.sum(case((paid, columns.total_amount))), 0),
+        func.count(case((columns.status == OrderStatus.PENDING, 1))),
+        func.count(case((columns.created_at >= today, 1))),
+    ).select_from(table)).one()
+
+def dashboard_stats() -> dict:
+    """Catalog, user and order totals for the admin dashboard; opens its own session"""
+    db = SessionLocal()
+    try:
+        products, active_products = db.execute(
+            select(func.count(), func.count(case((Product.is_active == True, 1))))
+        ).one()
+        hot = _order_totals(db, Order.__table__)
+        archived = _order_totals(db, ArchivedOrder.__table__)
+        orders, paid_orders, revenue, pending, today = (a + b for a, b in zip(hot, archived))
+        revenue = Decimal(str(revenue)).quantize(Decimal("0.01"))
+        return {
+            "total_products": products,
+            "active_products": active_products,
+            "low_stock_products": db.execute(select(func.count()).select_from(LowStockProduct)).scalar(),
+            "total_users": db.execute(select(func.count()).select_from(User)).scalar(),
+            "total_orders": orders,
+            "pending_orders": pending,
+            "orders_today": today,
+            "paid_orders": paid_orders,
+            "total_revenue": revenue,
+            "average_order_value": (revenue / paid_orders).quantize(Decimal("0.01")) if paid_orders else Decimal("0.00"),
+        }
+    finally:
+        db.close()
@@ -0,0 +1,65 @@
+"""
+Background job handlers.
+Importing this module registers the handlers with the job queue.
+"""
+from sqlalchemy.orm import Session
+from app.archive import ORDER_ARCHIVE_INTERVAL_SECONDS, archive_orders
+from app.cache import cache
+from app.carts import GUEST_CART_COMPACT_SECONDS, guest_carts
+from app.delivery import DELIVERY_PLAN_INTERVAL_SECONDS, run_delivery_plan
+from app.idempotency import IDEMPOTENCY_PURGE_SECONDS, purge_expired_keys
+from app.jobs import JOB_LEASE_SECONDS, JOB_RETENTION_SECONDS, job_handler, periodic_job, purge_finished_jobs
+from app.models import Order, PaymentQRCode
+from app.payments import render_qr_code_image
+from app.pricing import PRICE_TICK_SECONDS, apply_due_prices
+from app.recommendations import RECOMMENDATIONS_INTERVAL_SECONDS, update_recommendations
+
+@job_handler("order.placed")
+def handle_order_placed(db: Session, payload: dict):
+    """Post-checkout work for a newly placed order"""
+    order = db.get(Order, payload["order_id"])
+    if order is None:
+        return
+
+    # Pre-render the payment QR code so the payment page doesn't have to
+    if order.qr_code_data and db.get(PaymentQRCode, order.id) is None:
+        db.add(PaymentQRCode(order_id=order.id, image_data=render_qr_code_image(order.qr_code_data)))
+        db.flush()
+
+@periodic_job("orders.archive", ORDER_ARCHIVE_INTERVAL_SECONDS)
+def archive_old_orders(db: Session, payload: dict):
+    """Move finished orders past the retention window to the archive tables"""
+    # Finish well inside the lease so the job is never reclaimed and run twice
+    archive_orders(db, max_seconds=JOB_LEASE_SECONDS / 2)
+
+@periodic_job("prices.apply_scheduled", PRICE_TICK_SECONDS)
+def apply_scheduled_prices(db: Session, payload: dict):
+    """Switch products to scheduled prices that have come into effect"""
+    if apply_due_prices(db):
+        db.commit()  # Visible before the catalogs re-read prices
+        cache.invalidate("prices")
+
+@periodic_job("guest_carts.compact", GUEST_CART_COMPACT_SECONDS)
+def compact_guest_carts(db: Session, payload: dict):
+    """Drop abandoned guest carts whose TTL has run out"""
+    guest_carts.compact()
+
+@periodic_job("recommendations.update", RECOMMENDATIONS_INTERVAL_SECONDS)
+def update_product_recommendations(db: Session, payload: dict):
+    """Count new orders into the recommendations, recounting everything once a day"""
+    update_recommendations(db)
+
+@periodic_job("delivery.plan", DELIVERY_PLAN_INTERVAL_SECONDS)
+def plan_delivery_batches(db: Session, payload: dict):
+    """Put newly confirmed orders into delivery batches"""
+    run_delivery_plan(db)
+
+@periodic_job("jobs.purge", min(JOB_RETENTION_SECONDS, 3600))
+def purge_jobs(db: Session, payload: dict):
+    """Delete finished jobs, periodic runs included, once past their retention"""
+    purge_finished_jobs(db)
+
+@periodic_job("idempotency.purge", IDEMPOTENCY_PURGE_SECONDS)
+def purge_idempotency_keys(db: Session, payload: dict):
+    """Delete Idempotency-Keys past their TTL"""
+    purge_expired_keys(db)
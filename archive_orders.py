@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Order archival for FV Commerce
+Moves delivered and cancelled orders older than the retention window into
+orders_archive / order_items_archive. Workers also do this periodically; run
+it by hand for the first large backlog:
+
+    python archive_orders.py --older-than-days 90 --batch-size 5000
+"""
+
+import argparse
+import logging
+from datetime import timedelta
+from app.database import engine, Base, SessionLocal
+from app.archive import archive_orders, ensure_order_indexes, ORDER_ARCHIVE_AFTER_DAYS, ORDER_ARCHIVE_BATCH_SIZE
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive old FV Commerce orders")
+    parser.add_argument("--older-than-days", type=int, default=ORDER_ARCHIVE_AFTER_DAYS, help="archive finished orders older than this")
+    parser.add_argument("--batch-size", type=int, default=ORDER_ARCHIVE_BATCH_SIZE, help="orders moved per transaction")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    Base.metadata.create_all(bind=engine)
+    ensure_order_indexes(engine)
+
+    db = SessionLocal()
+    try:
+        moved = archive_orders(db, older_than=timedelta(days=args.older_than_days), batch_size=args.batch_size)
+    finally:
+        db.close()
+    print(f"Archived {moved} orders")
@@ -0,0 +1,65 @@
+"""
+Order listing latency before and after archiving old orders.
+
+Seeds a year of orders, times the admin order listing and a shopper's order
+history, archives finished orders older than --older-than-days and times the
+same reads again against the smaller hot table plus the archive.
+
+    python -m benchmarks.bench_archive --orders 10000000 --iterations 50
+"""
+import argparse
+from benchmarks.common import use_temp_database, summarize, time_calls, report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--older-than-days", type=int, default=90)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_temp_database()
+    from datetime import timedelta
+    from sqlalchemy import func, select
+    from app.archive import archive_orders, ensure_order_indexes
+    from app.database import engine, SessionLocal
+    from app.listings import all_orders, order_history
+    from app.models import ArchivedOrder, Order, OrderStatus
+    from seed_bulk import seed_dataset
+    import time
+
+    seed_dataset(engine, users=args.users, orders=args.orders)
+    ensure_order_indexes(engine)
+    db = SessionLocal()
+
+    def measure():
+        db.expire_all()
+        return {
+            "admin_orders": summarize(time_calls(lambda: all_orders(db, limit=100), args.iterations)),
+            "admin_orders_skip_5000": summarize(time_calls(lambda: all_orders(db, skip=5000, limit=100), args.iterations)),
+            "admin_pending": summarize(time_calls(lambda: all_orders(db, OrderStatus.PENDING, limit=100), args.iterations)),
+            "order_history": summarize(time_calls(lambda: order_history(db, 1), args.iterations)),
+            "hot_count": summarize(time_calls(lambda: db.execute(select(func.count(Order.id))).scalar(), 5)),
+        }
+
+    try:
+        results = {"before": measure()}
+        start = time.perf_counter()
+        moved = archive_orders(db, older_than=timedelta(days=args.older_than_days), batch_size=args.batch_size)
+        elapsed = time.perf_counter() - start
+        results["archive"] = {
+            "orders_moved": moved,
+            "seconds": round(elapsed, 2),
+            "orders_per_s": round(moved / elapsed) if elapsed else 0,
+            "hot_orders": db.execute(select(func.count(Order.id))).scalar(),
+            "archived_orders": db.execute(select(func.count(ArchivedOrder.id))).scalar(),
+        }
+        results["after"] = measure()
+    finally:
+        db.close()
+    report("archive", results, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Authentication overhead per request.
+
+Times the admin dependency chain (token -> active user -> admin check) the
+old way, decoding with the raw secret and loading the user row, against the
+claims-based path with a cold and a warm verified-token cache, and counts
+the database queries each makes.
+
+    python -m benchmarks.bench_auth --iterations 20000
+"""
+import argparse
+from benchmarks.common import use_temp_database, summarize, time_calls, report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_temp_database()
+    from sqlalchemy import event
+    from jose import jwt
+    from app.auth import (
+        ALGORITHM, SECRET_KEY, _verified_tokens, create_access_token, get_admin_user,
+        get_current_active_user, get_current_user, get_user_by_username, user_claims
+    )
+    from app.database import engine, SessionLocal
+    from app.models import UserRole
+    from seed_bulk import seed_dataset
+    import asyncio
+
+    seed_dataset(engine, users=1000, orders=0)
+    import app.main  # noqa: F401 - creates the auth tables
+    db = SessionLocal()
+    admin = get_user_by_username(db, "admin")
+    token = create_access_token(data=user_claims(admin))
+    db.close()
+
+    queries = []
+    event.listen(engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+
+    def database_lookup():
+        # What every authenticated request used to do
+        session = SessionLocal()
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            user = get_user_by_username(session, payload["sub"])
+            assert user.is_active and user.role == UserRole.ADMIN
+        finally:
+            session.close()
+
+    async def claims_chain():
+        return await get_admin_user(await get_current_active_user(await get_current_user(token)))
+
+    loop = asyncio.new_event_loop()
+    def cold():
+        _verified_tokens.clear()
+        loop.run_until_complete(claims_chain())
+    def warm():
+        loop.run_until_complete(claims_chain())
+
+    results = {}
+    for name, func in (("database_lookup", database_lookup), ("claims_cold_cache", cold), ("claims_warm_cache", warm)):
+        func()
+        queries.clear()
+        result = summarize(time_calls(func, args.iterations))
+        result["queries_per_request"] = round(len(queries) / args.iterations, 2)
+        results[name] = result
+    results["speedup_warm"] = round(results["database_lookup"]["mean_ms"] / results["claims_warm_cache"]["mean_ms"], 1)
+    loop.close()
+    report("auth", results, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Storefront page load: five requests against one /bootstrap.
+
+Times a signed-in shopper's page load the old way, /categories, /products,
+/users/me, /cart and /wishlist one after another, against a single
+/bootstrap request, in-process, and counts the database queries each
+makes. Estimated time to interactive adds --rtt-ms of network latency per
+sequential round trip.
+
+    python -m benchmarks.bench_bootstrap --products 2000 --rtt-ms 80
+"""
+import argparse
+from benchmarks.common import use_temp_database, summarize, time_calls, report
+
+PAGE_LOAD = ("/categories", "/products", "/users/me", "/cart", "/wishlist")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--cart-lines", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--rtt-ms", type=float, default=50.0, help="network round trip added per sequential request")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_temp_database()
+    from sqlalchemy import event
+    from app.database import engine
+    from seed_bulk import seed_dataset
+
+    seed_dataset(engine, users=100, products=args.products, orders=0)
+    from app.main import app
+    from fastapi.testclient import TestClient
+
+    queries = []
+    with TestClient(app) as client:
+        token = client.post("/token", data={"username": "user3", "password": "benchpass"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        for product_id in range(1, args.cart_lines + 1):
+            client.post("/cart/add", json={"product_id": product_id, "quantity": 1}, headers=headers)
+            client.post("/wishlist/add", json={"product_id": product_id + args.cart_lines}, headers=headers)
+
+        def separate_requests():
+            for path in PAGE_LOAD:
+                assert client.get(path, headers=headers).status_code == 200
+
+        def bootstrap():
+            assert client.get("/bootstrap", headers=headers).status_code == 200
+
+        event.listen(engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+        results = {}
+        for name, func, round_trips in (("separate_requests", separate_requests, len(PAGE_LOAD)), ("bootstrap", bootstrap, 1)):
+            func()
+            queries.clear()
+            result = summarize(time_calls(func, args.iterations))
+            result["queries_per_page_load"] = round(len(queries) / args.iterations, 2)
+            result["round_trips"] = round_trips
+            result["estimated_time_to_interactive_ms"] = round(result["mean_ms"] + round_trips * args.rtt_ms, 1)
+            results[name] = result
+    results["server_speedup"] = round(results["separate_requests"]["mean_ms"] / results["bootstrap"]["mean_ms"], 1)
+    report("bootstrap", results, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Cache coherence across worker processes: how long after a price update
+does every worker serve the new price?
+
+    python -m benchmarks.bench_cache_coherence --workers 4
+"""
+import argparse
+import multiprocessing
+import time
+from benchmarks.common import use_temp_database, report
+
+def worker_process(product_id, ready, updated_at, results):
+    """One 'worker': warm its own cache, then poll until the new price shows up"""
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    client = TestClient(app)
+    for _ in range(5):
+        old_price = client.get(f"/products/{product_id}").json()["price"]
+    ready.wait()
+    while updated_at.value == 0:
+        time.sleep(0.001)
+    while client.get(f"/products/{product_id}").json()["price"] == old_price:
+        time.sleep(0.001)
+    results.put(time.time() - updated_at.value)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_temp_database()
+    from decimal import Decimal
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.cache import CACHE_SYNC_INTERVAL
+    from app.database import SessionLocal
+    from app.models import User, UserRole, Category, Product
+    from app.auth import create_access_token
+
+    db = SessionLocal()
+    db.add(User(email="admin@example.com", username="admin", hashed_password="x", role=UserRole.ADMIN))
+    category = Category(name="Fruits")
+    db.add(category)
+    db.flush()
+    product = Product(name="Apples", price=Decimal("100.00"), category_id=category.id)
+    db.add(product)
+    db.commit()
+    product_id = product.id
+    db.close()
+
+    context = multiprocessing.get_context("spawn")
+    ready = context.Barrier(args.workers + 1)
+    updated_at = context.Value("d", 0.0)
+    results = context.Queue()
+    workers = [
+        context.Process(target=worker_process, args=(product_id, ready, updated_at, results))
+        for _ in range(args.workers)
+    ]
+    for process in workers:
+        process.start()
+    ready.wait()
+
+    client = TestClient(app)
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'admin'})}"}
+    response = client.put(f"/products/{product_id}/price", json={"price": "120.00"}, headers=headers)
+    assert response.status_code == 200, response.text
+    updated_at.value = time.time()
+
+    delays = sorted(results.get(timeout=60) for _ in workers)
+    for process in workers:
+        process.join()
+
+    report("cache_coherence", {
+        "workers": args.workers,
+        "sync_interval_ms": CACHE_SYNC_INTERVAL * 1000,
+        "propagation_ms": [round(delay * 1000, 1) for delay in delays],
+        "all_workers_within_bound": delays[-1] <= CACHE_SYNC_INTERVAL + 0.1,
+    }, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Category listings with product counts over a deep category tree.
+
+Arranges the seeded categories into a tree (--roots top-level categories,
+every other one under a random earlier category) and times: counting each
+category's products with count queries walking its subtree a level at a
+time, as without the closure table and maintained counts (checking both
+agree), rebuilding the cached tree snapshot, GET /categories and
+GET /categories/tree, and listing the products under a top-level category
+level by level vs with the catalog snapshot's subtree filter.
+
+    python -m benchmarks.bench_categories --categories 500 --products 100000
+"""
+import argparse
+from benchmarks.common import use_temp_database, summarize, time_calls, report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--categories", type=int, default=500)
+    parser.add_argument("--roots", type=int, default=6, help="top-level categories")
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_temp_database()
+    from sqlalchemy import func, select
+    from app.database import engine, SessionLocal
+    from app.models import Category, Product
+    from seed_bulk import seed_dataset
+    import random
+
+    seed_dataset(engine, users=10, categories=args.categories, products=args.products, carts=0, orders=0)
+    from app.main import app
+    from app.cache import cache
+    from app.catalog import catalog
+    from app.categories import load_category_tree, move_category
+    from fastapi.testclient import TestClient
+
+    rng = random.Random(0)
+    parents = {}
+    with TestClient(app) as client:  # The lifespan puts the seeded categories into the tree
+        db = SessionLocal()
+        try:
+            category_ids = db.execute(select(Category.id).order_by(Category.id)).scalars().all()
+            for i, category_id in enumerate(category_ids[args.roots:], start=args.roots):
+                parents[category_id] = category_ids[rng.randrange(i)]
+                move_category(db, category_id, parents[category_id])
+            db.commit()
+        finally:
+            db.close()
+        cache.invalidate("catalog")
+        cache.invalidate("categories")
+
+        children = {}
+        for category_id, parent_id in parents.items():
+            children.setdefault(parent_id, []).append(category_id)
+
+        def naive_counts(db):
+            """(direct, subtree) active product counts with a count query per category, walking the subtree level by level"""
+            counts = {}
+            for category_id in category_ids:
+                direct = db.execute(
+                    select(func.count()).select_from(Product).where(Product.category_id == category_id, Product.is_active == True)
+                ).scalar()
+                subtree, level = direct, children.get(category_id, [])
+                while level:
+                    subtree += db.execute(
+                        select(func.count()).select_from(Product).where(Product.category_id.in_(level), Product.is_active == True)
+                    ).scalar()
+                    level = [child for parent_id in level for child in children.get(parent_id, [])]
+                counts[category_id] = (direct, subtree)
+            return counts
+
+        def naive_products(db, category_id):
+            """Ids of active products under a category, walking the subtree one level per query"""
+            ids, level = [], [category_id]
+            while level:
+                ids += db.execute(
+                    select(Product.id).where(Product.category_id.in_(level), Product.is_active == True).order_by(Product.id)
+                ).scalars().all()
+                level = [child for parent_id in level for child in children.get(parent_id, [])]
+            return sorted(ids)
+
+        db = SessionLocal()
+        try:
+            nodes = client.get("/categories", params={"limit": len(category_ids)}).json()
+            maintained = {node["id"]: (node["product_count"], node["subtree_product_count"]) for node in nodes}
+            assert naive_counts(db) == maintained, "maintained counts and counting queries disagree"
+            root = max(category_ids[:args.roots], key=lambda category_id: maintained[category_id][1])
+            snapshot = catalog.snapshot()
+            under_root = snapshot.filter(category_id=root, limit=args.products)
+            assert [product["id"] for product in under_root] == naive_products(db, root), "subtree filter and level walk disagree"
+
+            results = {
+                "categories": len(category_ids),
+                "depth": max(len(path) for path in (_path(parents, category_id) for category_id in category_ids)),
+                "products_under_largest_root": len(under_root),
+                "counts_per_category_queries": summarize(time_calls(lambda: naive_counts(db), max(1, args.iterations // 20))),
+                "counts_tree_snapshot_build": summarize(time_calls(lambda: load_category_tree(db), max(1, args.iterations // 10))),
+                "get_categories": summarize(time_calls(lambda: client.get("/categories"), args.iterations)),
+                "get_categories_tree": summarize(time_calls(lambda: client.get("/categories/tree"), args.iterations)),
+                "subtree_products_level_queries": summarize(time_calls(lambda: naive_products(db, root), max(1, args.iterations // 10))),
+                "subtree_products_snapshot": summarize(time_calls(lambda: snapshot.filter(category_id=root, limit=args.products), args.iterations)),
+            }
+        finally:
+            db.close()
+    report("categories", results, args.output)
+
+def _path(parents: dict, category_id: int) -> list:
+    path = [category_id]
+    while path[-1] in parents:
+        path.append(parents[path[-1]])
+    return path
+
+if __name__ == "__main__":
+    main()
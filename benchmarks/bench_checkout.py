@@ -0,0 +1,57 @@
+"""
+Checkout latency with post-checkout work run inline vs offloaded to the job queue.
+
+    python -m benchmarks.bench_checkout --orders 200
+"""
+import argparse
+from benchmarks.common import use_temp_database, summarize, report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--orders", type=int, default=200)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_temp_database()
+    from decimal import Decimal
+    from fastapi.testclient import TestClient
+    from app import jobs
+    from app.main import app
+    from app.database import SessionLocal
+    from app.models import User, Category, Product
+    from app.auth import create_access_token
+    import time
+
+    db = SessionLocal()
+    db.add(User(email="bench@example.com", username="bench", hashed_password="x"))
+    category = Category(name="Vegetables")
+    db.add(category)
+    db.flush()
+    product = Product(name="Tomatoes", price=Decimal("45.00"), category_id=category.id, stock_quantity=10 ** 9)
+    db.add(product)
+    db.commit()
+    product_id = product.id
+    db.close()
+
+    client = TestClient(app)
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'bench'})}"}
+
+    def checkout_latencies(inline: bool):
+        jobs.JOBS_INLINE = inline
+        samples = []
+        for _ in range(args.orders):
+            client.post("/cart/add", json={"product_id": product_id, "quantity": 2}, headers=headers)
+            start = time.perf_counter()
+            response = client.post("/orders", json={"delivery_address": "1 Bench Road"}, headers=headers)
+            samples.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.text
+        return samples
+
+    results = {
+        "inline": summarize(checkout_latencies(inline=True)),
+        "offloaded": summarize(checkout_latencies(inline=False)),
+    }
+    report("checkout", results, args.output)
+
+if __name__ == "__main__":
+    main()
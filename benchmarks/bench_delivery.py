@@ -0,0 +1,111 @@
+"""
+Delivery batching over a day's confirmed orders.
+
+Seeds --orders orders with --confirmed of them confirmed and times planning
+them into delivery batches in one run, then confirming another --increment
+and planning again (the incremental run the job does). For comparison, a
+sample of orders is batched one at a time, each looking its zone's open
+batch up with a query as without the in-memory packing. Also times a page of
+GET /admin/delivery/batches.
+
+    python -m benchmarks.bench_delivery --confirmed 100000
+"""
+import argparse
+from benchmarks.common import use_temp_database, summarize, time_calls, report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=300000)
+    parser.add_argument("--confirmed", type=int, default=100000)
+    parser.add_argument("--increment", type=int, default=5000, help="orders confirmed after the first run")
+    parser.add_argument("--per-order-sample", type=int, default=2000, help="orders batched one at a time")
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_temp_database()
+    from sqlalchemy import func, select, update
+    from app.database import engine, SessionLocal
+    from app.models import DeliveryBatch, DeliveryBatchOrder, Order, OrderStatus
+    from seed_bulk import seed_dataset
+    import time
+
+    seed_dataset(engine, users=10000, orders=args.orders, carts=0)
+    from app.main import app
+    from app.delivery import DELIVERY_BATCH_CAPACITY, address_key, plan_deliveries
+    from fastapi.testclient import TestClient
+
+    def confirm(offset: int, count: int):
+        with engine.begin() as conn:
+            order_ids = conn.execute(select(Order.id).order_by(Order.id.desc()).offset(offset).limit(count)).scalars().all()
+            conn.execute(update(Order).where(Order.id.in_(order_ids)).values(status=OrderStatus.CONFIRMED))
+
+    def timed_plan() -> dict:
+        db = SessionLocal()
+        try:
+            start = time.perf_counter()
+            outcome = plan_deliveries(db)
+            db.commit()
+            elapsed = time.perf_counter() - start
+        finally:
+            db.close()
+        return {
+            "orders_batched": outcome.orders_batched, "batches_created": outcome.batches_created,
+            "batches_topped_up": outcome.batches_topped_up, "seconds": round(elapsed, 3),
+            "orders_per_s": round(outcome.orders_batched / elapsed) if elapsed else 0,
+        }
+
+    def per_order(order_ids):
+        """The naive approach: normalize each order's address and find or open its zone's batch with queries"""
+        db = SessionLocal()
+        try:
+            for order_id in order_ids:
+                zone, area = address_key(db.get(Order, order_id).delivery_address)
+                batch = db.execute(
+                    select(DeliveryBatch)
+                    .where(DeliveryBatch.zone == zone, DeliveryBatch.dispatched_at.is_(None), DeliveryBatch.order_count < DeliveryBatch.capacity)
+                    .order_by(DeliveryBatch.id)
+                    .limit(1)
+                ).scalar()
+                if batch is None:
+                    batch = DeliveryBatch(zone=zone, capacity=DELIVERY_BATCH_CAPACITY, order_count=0)
+                    db.add(batch)
+                    db.flush()
+                batch.order_count += 1
+                db.add(DeliveryBatchOrder(order_id=order_id, batch_id=batch.id, area=area))
+                db.flush()
+            db.rollback()  # Leave the orders for the real runs
+        finally:
+            db.close()
+
+    with engine.begin() as conn:  # Put every seeded order out of planning's way first
+        conn.execute(update(Order).where(Order.status == OrderStatus.CONFIRMED).values(status=OrderStatus.DELIVERED))
+    confirm(0, args.confirmed)
+    with engine.connect() as conn:
+        sample = conn.execute(
+            select(Order.id).where(Order.status == OrderStatus.CONFIRMED).order_by(Order.id).limit(args.per_order_sample)
+        ).scalars().all()
+    start = time.perf_counter()
+    per_order(sample)
+    per_order_rate = len(sample) / (time.perf_counter() - start)
+
+    results = {"orders": args.orders, "capacity": DELIVERY_BATCH_CAPACITY}
+    results["full_plan"] = timed_plan()
+    confirm(args.confirmed, args.increment)
+    results["incremental_plan"] = timed_plan()
+    results["idle_plan"] = timed_plan()
+    results["per_order_orders_per_s"] = round(per_order_rate)
+    with engine.connect() as conn:
+        results["zones"] = conn.execute(select(func.count(func.distinct(DeliveryBatch.zone)))).scalar()
+        results["batches"] = conn.execute(select(func.count()).select_from(DeliveryBatch)).scalar()
+
+    with TestClient(app) as client:
+        token = client.post("/token", data={"username": "admin", "password": "admin123"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        results["get_batches_page"] = summarize(time_calls(
+            lambda: client.get("/admin/delivery/batches", params={"limit": 50}, headers=headers), args.iterations
+        ))
+    report("delivery", results, args.output)
+
+if __name__ == "__main__":
+    main()
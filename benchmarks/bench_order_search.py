@@ -0,0 +1,101 @@
+"""
+Admin order search over millions of orders.
+
+Seeds --orders orders, builds the search index as startup would (timing it
+and measuring its size on disk) and times a page of results for an order
+number prefix, a customer's email, an address fragment and a term nothing
+matches: through the index, with LIKE across the orders and users columns
+as without it (checking both return the same orders), and through
+GET /admin/orders/search end to end.
+
+    python -m benchmarks.bench_order_search --orders 10000000
+"""
+import argparse
+from benchmarks.common import use_temp_database, summarize, time_calls, report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--limit", type=int, default=50, help="results per search")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_temp_database()
+    from sqlalchemy import text
+    from app.database import engine, SessionLocal
+    from seed_bulk import seed_dataset
+    import time
+
+    seeded = seed_dataset(engine, users=args.users, orders=args.orders, carts=0)
+    from app.main import app
+    from app.search import order_search
+    from fastapi.testclient import TestClient
+
+    def database_bytes(db) -> int:
+        return db.execute(text("PRAGMA page_count")).scalar() * db.execute(text("PRAGMA page_size")).scalar()
+
+    db = SessionLocal()
+    try:
+        size_before = database_bytes(db)
+        start = time.perf_counter()
+        indexed = order_search.backfill(db)
+        db.commit()
+        build_seconds = time.perf_counter() - start
+        index_bytes = database_bytes(db) - size_before
+
+        middle = db.execute(text("SELECT order_number, user_id FROM orders ORDER BY id LIMIT 1 OFFSET :n"), {"n": args.orders // 2}).first()
+        email = db.execute(text("SELECT email FROM users WHERE id = :id"), {"id": middle.user_id}).scalar()
+        queries = {
+            "order_number_prefix": middle.order_number[:-2],
+            "order_number_without_ord": middle.order_number[4:-1],
+            "customer_email": email,
+            "address_fragment": "Koramangala, Bengaluru 56005",
+            "no_match": "Nowhere Lane",
+        }
+
+        def scan(term: str):
+            """A page of matches with LIKE over every searched column, as without the indexes"""
+            return db.execute(text(
+                "SELECT o.id FROM orders o JOIN users u ON u.id = o.user_id "
+                "WHERE o.order_number LIKE :prefix OR o.order_number LIKE 'ORD-' || :prefix "
+                "OR u.username LIKE :pattern OR u.email LIKE :pattern "
+                "OR o.delivery_address LIKE :pattern OR o.notes LIKE :pattern "
+                "ORDER BY o.id DESC LIMIT :limit"
+            ), {"prefix": f"{term}%", "pattern": f"%{term}%", "limit": args.limit}).scalars().all()
+
+        results = {
+            "orders": args.orders,
+            "backend": order_search.orders.backend,
+            "index_build": {
+                "orders_indexed": indexed,
+                "seconds": round(build_seconds, 2),
+                "orders_per_s": round(indexed / build_seconds) if build_seconds else 0,
+                "index_mb": round(index_bytes / 2 ** 20, 1),
+            },
+            "queries": {},
+        }
+        with TestClient(app) as client:
+            token = client.post("/token", data={"username": "admin", "password": "admin123"}).json()["access_token"]
+            headers = {"Authorization": f"Bearer {token}"}
+            for name, term in queries.items():
+                found = order_search.search(db, term, limit=args.limit)
+                assert found == scan(term), f"index and LIKE scan disagree for {term!r}"
+                results["queries"][name] = {
+                    "term": term,
+                    "results": len(found),
+                    "index": summarize(time_calls(lambda: order_search.search(db, term, limit=args.limit), args.iterations)),
+                    "like_scan": summarize(time_calls(lambda: scan(term), max(1, args.iterations // 10))),
+                    "endpoint": summarize(time_calls(
+                        lambda: client.get("/admin/orders/search", params={"q": term, "limit": args.limit}, headers=headers),
+                        args.iterations,
+                    )),
+                }
+        results["seed_timings"] = seeded.get("timings")
+    finally:
+        db.close()
+    report("order_search", results, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Bulk order status transition throughput.
+
+Seeds --orders orders, puts --wave of them back to PENDING and walks the wave
+through CONFIRMED, PROCESSING, SHIPPED and DELIVERED with
+POST /admin/orders/status/bulk, one request per step, timing each and
+checking every order was applied. A sample of the next wave is moved one
+order per transaction through the ORM first, as without the endpoint, and a
+last wave is cancelled to time the restocking path.
+
+    python -m benchmarks.bench_order_status --orders 1000000 --wave 10000
+"""
+import argparse
+from benchmarks.common import use_temp_database, report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--wave", type=int, default=10000, help="orders per bulk request")
+    parser.add_argument("--per-order-sample", type=int, default=1000, help="orders moved one transaction at a time")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_temp_database()
+    from sqlalchemy import select, update
+    from app.database import engine, SessionLocal
+    from app.models import Order, OrderStatus
+    from seed_bulk import seed_dataset
+    import time
+
+    seed_dataset(engine, users=10000, orders=args.orders, carts=0)
+    from app.main import app
+    from fastapi.testclient import TestClient
+
+    def new_wave(offset: int):
+        """--wave orders starting at `offset`, all made PENDING"""
+        with engine.begin() as conn:
+            order_ids = conn.execute(select(Order.id).order_by(Order.id).offset(offset).limit(args.wave)).scalars().all()
+            conn.execute(update(Order).where(Order.id.in_(order_ids)).values(status=OrderStatus.PENDING))
+        return order_ids
+
+    def per_order(order_ids):
+        """The naive approach: load, check and update each order in its own transaction"""
+        db = SessionLocal()
+        try:
+            for order_id in order_ids:
+                order = db.get(Order, order_id)
+                if order.status == OrderStatus.PENDING:
+                    order.status = OrderStatus.CONFIRMED
+                db.commit()
+        finally:
+            db.close()
+
+    results = {"orders": args.orders, "wave": args.wave, "steps": {}}
+    with TestClient(app) as client:
+        token = client.post("/token", data={"username": "admin", "password": "admin123"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        def bulk(order_ids, status: str) -> dict:
+            start = time.perf_counter()
+            response = client.post("/admin/orders/status/bulk", json={"status": status, "order_ids": order_ids}, headers=headers)
+            elapsed = time.perf_counter() - start
+            counts = response.json()["counts"]
+            assert counts == {"applied": len(order_ids)}, f"{status}: {counts}"
+            return {"seconds": round(elapsed, 3), "orders_per_s": round(len(order_ids) / elapsed)}
+
+        order_ids = new_wave(0)
+        for status in ("confirmed", "processing", "shipped", "delivered"):
+            results["steps"][status] = bulk(order_ids, status)
+
+        sample = new_wave(args.wave)[:args.per_order_sample]
+        start = time.perf_counter()
+        per_order(sample)
+        elapsed = time.perf_counter() - start
+        results["per_order_transactions"] = {"orders": len(sample), "seconds": round(elapsed, 3), "orders_per_s": round(len(sample) / elapsed)}
+
+        results["steps"]["cancelled_with_restock"] = bulk(new_wave(2 * args.wave), "cancelled")
+    report("order_status", results, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Point-in-time price lookups: one query per lookup vs one pass over the history.
+
+Seeds products with a year of price changes and orders, then prices every
+order line at its order's creation time both ways, checking they agree.
+
+    python -m benchmarks.bench_price_history --lookups 10000 100000 --changes 50
+"""
+import argparse
+from benchmarks.common import use_temp_database, report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lookups", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--changes", type=int, default=50, help="price changes per product over the year")
+    parser.add_argument("--per-row-limit", type=int, default=10000, help="largest lookup count timed one query at a time")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_temp_database()
+    from datetime import datetime, timedelta
+    from sqlalchemy import select
+    from app.database import engine, SessionLocal
+    from app.models import Order, OrderItem, Product
+    from app.pricing import price_at, prices_at
+    from seed_bulk import BulkWriter, DATETIME_FORMAT, money, relaxed_durability, seed_dataset
+    import random
+    import time
+
+    largest = max(args.lookups)
+    seed_dataset(engine, users=1000, orders=largest // 3 + 1)
+    rng = random.Random(0)
+    now = datetime.utcnow()
+    with engine.connect() as conn, relaxed_durability(conn):
+        product_ids = conn.execute(select(Product.id)).scalars().all()
+        rows = []
+        for product_id in product_ids:
+            for _ in range(args.changes):
+                effective_from = (now - timedelta(seconds=rng.randrange(366 * 86400))).strftime(DATETIME_FORMAT)
+                rows.append((product_id, money(rng.randrange(1000, 50000)), effective_from, effective_from))
+        BulkWriter(conn).write("product_prices", ("product_id", "price", "effective_from", "applied_at"), rows)
+        conn.commit()
+
+    db = SessionLocal()
+    try:
+        lines = db.execute(
+            select(OrderItem.product_id, Order.created_at).join(Order, Order.id == OrderItem.order_id).limit(largest)
+        ).all()
+        results = {}
+        for size in args.lookups:
+            lookups = [tuple(line) for line in lines[:size]]
+            start = time.perf_counter()
+            bulk = prices_at(db, lookups)
+            bulk_seconds = time.perf_counter() - start
+            result = {"bulk_seconds": round(bulk_seconds, 4), "bulk_lookups_per_s": round(size / bulk_seconds)}
+            if size <= args.per_row_limit:
+                start = time.perf_counter()
+                single = [price_at(db, product_id, at) for product_id, at in lookups]
+                single_seconds = time.perf_counter() - start
+                assert single == bulk, "bulk and per-row lookups disagree"
+                result.update({
+                    "per_row_seconds": round(single_seconds, 4),
+                    "per_row_lookups_per_s": round(size / single_seconds),
+                    "speedup": round(single_seconds / bulk_seconds, 1),
+                })
+            results[str(size)] = result
+    finally:
+        db.close()
+    report("price_history", results, args.output)
+
+if __name__ == "__main__":
+    main()
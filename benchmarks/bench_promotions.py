@@ -0,0 +1,123 @@
+"""
+Cart pricing with thousands of active promotions.
+
+For each promotion count, loads that many product, category and store-wide
+promotions (some of them coupons), fills a shopper's cart with --lines
+products and times: compiling the rules, pricing the cart against the
+compiled set, pricing it with one promotions query per line as a naive
+engine would (checking both agree), and GET /cart end to end.
+
+    python -m benchmarks.bench_promotions --promotions 0 1000 5000 --lines 100
+"""
+import argparse
+from benchmarks.common import use_temp_database, summarize, time_calls, report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--promotions", type=int, nargs="+", default=[0, 1000, 5000])
+    parser.add_argument("--lines", type=int, default=100, help="products in the cart")
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_temp_database()
+    from sqlalchemy import and_, delete, insert, or_, select
+    from app.database import engine, SessionLocal
+    from app.models import CartItem, Product, Promotion, PromotionKind, User
+    from app.promotions import CartLine, PromotionSet, promotions
+    from seed_bulk import seed_dataset
+    import random
+    import time
+
+    seed_dataset(engine, users=100, categories=args.categories, products=args.products, carts=0, orders=100)
+    from app.main import app
+    from app.cache import cache
+    from app.catalog import catalog
+    from fastapi.testclient import TestClient
+
+    rng = random.Random(0)
+    with engine.begin() as conn:
+        products = conn.execute(select(Product.id, Product.category_id)).all()
+        user_id = conn.execute(select(User.id).where(User.username == "user3")).scalar_one()
+        cart = rng.sample(products, args.lines)
+        conn.execute(delete(CartItem).where(CartItem.user_id == user_id))
+        conn.execute(insert(CartItem), [{"user_id": user_id, "product_id": pid, "quantity": rng.randint(1, 6)} for pid, _ in cart])
+    category_ids = sorted({category_id for _, category_id in products})
+
+    def promotion_rows(count: int):
+        rows = []
+        for i in range(count):
+            kind = rng.choice(list(PromotionKind))
+            row = {
+                "name": f"Promotion {i}", "kind": kind, "is_active": True,
+                "value": rng.randint(1, 30) if kind != PromotionKind.BUY_X_GET_Y else None,
+                "buy_quantity": rng.randint(1, 3) if kind == PromotionKind.BUY_X_GET_Y else None,
+                "get_quantity": 1 if kind == PromotionKind.BUY_X_GET_Y else None,
+                "product_id": None, "category_id": None, "code": f"CODE{i}" if rng.random() < 0.05 else None,
+            }
+            scope = rng.random()
+            if i >= 10 and scope < 0.8:  # The first ten apply store-wide
+                row["product_id"] = rng.choice(products)[0]
+            elif i >= 10:
+                row["category_id"] = rng.choice(category_ids)
+            rows.append(row)
+        return rows
+
+    def naive_price(db, lines):
+        """One promotions query per line, as without the compiled index"""
+        total = 0
+        for line in lines:
+            rows = db.execute(select(Promotion).where(
+                Promotion.is_active == True,
+                or_(
+                    Promotion.product_id == line.product_id,
+                    Promotion.category_id == line.category_id,
+                    and_(Promotion.product_id.is_(None), Promotion.category_id.is_(None)),
+                ),
+            )).scalars().all()
+            total += PromotionSet((0, 0), rows).price([line]).discount
+        return total
+
+    results = {}
+    with TestClient(app) as client:
+        token = client.post("/token", data={"username": "user3", "password": "benchpass"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        for count in args.promotions:
+            with engine.begin() as conn:
+                conn.execute(delete(Promotion))
+                if count:
+                    conn.execute(insert(Promotion), promotion_rows(count))
+            cache.invalidate("promotions")
+
+            start = time.perf_counter()
+            compiled = promotions.current()
+            compile_seconds = time.perf_counter() - start
+
+            snapshot = catalog.snapshot()
+            with engine.connect() as conn:
+                items = conn.execute(select(CartItem.product_id, CartItem.quantity).where(CartItem.user_id == user_id)).all()
+            lines = [CartLine.from_document(snapshot.document(pid), quantity) for pid, quantity in items]
+            discount = compiled.price(lines).discount
+            db = SessionLocal()
+            try:
+                assert naive_price(db, lines) == discount, "compiled and per-line pricing disagree"
+                naive = summarize(time_calls(lambda: naive_price(db, lines), max(1, args.iterations // 10)))
+            finally:
+                db.close()
+
+            results[str(count)] = {
+                "promotions": compiled.count,
+                "cart_lines": len(lines),
+                "lines_discounted": len(compiled.price(lines).discounts),
+                "discount": str(discount),
+                "compile_ms": round(compile_seconds * 1000, 2),
+                "price_compiled": summarize(time_calls(lambda: compiled.price(lines), args.iterations)),
+                "price_per_line_queries": naive,
+                "get_cart": summarize(time_calls(lambda: client.get("/cart", headers=headers), args.iterations)),
+            }
+    report("promotions", results, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Overhead of the token-bucket rate limiter on the request path.
+
+    python -m benchmarks.bench_rate_limit --iterations 200000
+"""
+import argparse
+import asyncio
+import time
+from benchmarks.common import use_temp_database, report
+
+def ns_per_op(func, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return round((time.perf_counter() - start) / iterations * 1e9, 1)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_temp_database()
+    from app.database import engine, Base
+    from app.auth import create_access_token
+    from app.ratelimit import (
+        MemoryBucketStore, DatabaseBucketStore, RateLimiter, RateLimitMiddleware, RateLimitRule
+    )
+    Base.metadata.create_all(bind=engine)
+    n = args.iterations
+
+    memory = MemoryBucketStore()
+    keys = [f"ip:10.0.{i // 256}.{i % 256}" for i in range(10000)]
+    key_iter = iter(keys * (n // len(keys) + 1))
+    database = DatabaseBucketStore()
+    results = {
+        "memory_take_hot_key_ns": ns_per_op(lambda: memory.take("ip:hot", 1e12, 1e12), n),
+        "memory_take_10k_keys_ns": ns_per_op(lambda: memory.take(next(key_iter), 1e12, 1e12), n),
+        "database_take_ns": ns_per_op(lambda: database.take("ip:hot", 1e12, 1e12), min(n, 2000)),
+    }
+
+    # Middleware overhead around a no-op ASGI app
+    async def noop_app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        pass
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    token = create_access_token(data={"sub": "bench"})
+    limiter = RateLimiter([
+        RateLimitRule("ip_rule", "POST", "/token", capacity=1e12, refill_per_second=1e12),
+        RateLimitRule("user_rule", "POST", "/orders", capacity=1e12, refill_per_second=1e12, per="user"),
+    ], MemoryBucketStore())
+    middleware = RateLimitMiddleware(noop_app, limiter)
+
+    def scope(method, path):
+        return {"type": "http", "method": method, "path": path, "client": ("127.0.0.1", 5000),
+                "headers": [(b"authorization", f"Bearer {token}".encode())]}
+
+    async def per_request_ns(asgi, request_scope, iterations):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await asgi(request_scope, receive, send)
+        return round((time.perf_counter() - start) / iterations * 1e9, 1)
+
+    async def middleware_results():
+        baseline = await per_request_ns(noop_app, scope("GET", "/products"), n)
+        return {
+            "no_middleware_ns": baseline,
+            "unlimited_route_ns": await per_request_ns(middleware, scope("GET", "/products"), n),
+            "ip_limited_route_ns": await per_request_ns(middleware, scope("POST", "/token"), n),
+            "user_limited_route_ns": await per_request_ns(middleware, scope("POST", "/orders"), n // 10),
+        }
+
+    results.update(asyncio.run(middleware_results()))
+    report("rate_limit", results, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Listing throughput: ORM objects + Pydantic validation vs Core rows encoded straight to JSON.
+
+Serializes pages of the admin order and user listings both ways and reports
+objects per second at each page size.
+
+    python -m benchmarks.bench_read_path --sizes 1000 10000 100000
+"""
+import argparse
+from benchmarks.common import use_temp_database, report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_temp_database()
+    from typing import List
+    from pydantic import TypeAdapter
+    from app.database import engine, SessionLocal
+    from app.listings import all_orders, all_users, json_response
+    from app.models import Order, User
+    from app.schemas import OrderResponse, UserResponse
+    from seed_bulk import seed_dataset
+    import time
+
+    largest = max(args.sizes)
+    seed_dataset(engine, users=largest, orders=largest)
+    orders_adapter = TypeAdapter(List[OrderResponse])
+    users_adapter = TypeAdapter(List[UserResponse])
+
+    # What the endpoints did before: hydrate ORM objects (lazy loading items and products),
+    # validate each into a response model, then serialize the list
+    def orm_orders(db, size):
+        orders = db.query(Order).order_by(Order.created_at.desc()).limit(size).all()
+        return orders_adapter.dump_json([OrderResponse.model_validate(order) for order in orders])
+
+    def orm_users(db, size):
+        users = db.query(User).limit(size).all()
+        return users_adapter.dump_json([UserResponse.model_validate(user) for user in users])
+
+    def core_orders(db, size):
+        return json_response(all_orders(db, limit=size)).body
+
+    def core_users(db, size):
+        return json_response(all_users(db, limit=size)).body
+
+    def measure(func, size):
+        db = SessionLocal()  # Fresh identity map for every run
+        try:
+            start = time.perf_counter()
+            body = func(db, size)
+            elapsed = time.perf_counter() - start
+        finally:
+            db.close()
+        return {"seconds": round(elapsed, 4), "objects_per_s": round(size / elapsed), "bytes": len(body)}
+
+    results = {}
+    for size in args.sizes:
+        measure(core_orders, min(size, 100))  # Build the catalog snapshot outside the timings
+        orm = {"orders": measure(orm_orders, size), "users": measure(orm_users, size)}
+        core = {"orders": measure(core_orders, size), "users": measure(core_users, size)}
+        results[str(size)] = {
+            "orm_pydantic": orm,
+            "core_json": core,
+            "speedup": {
+                listing: round(orm[listing]["seconds"] / core[listing]["seconds"], 1) for listing in ("orders", "users")
+            },
+        }
+    report("read_path", results, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+"Frequently bought together": job runtime and endpoint latency.
+
+Seeds orders, times a full recount of every basket and an incremental run
+over the newest --new-orders orders, then times the recommendations
+endpoint (one lookup in the precomputed table) against answering the same
+question with a self-join of order_items per request.
+
+    python -m benchmarks.bench_recommendations --orders 2000000 --products 2000
+"""
+import argparse
+from benchmarks.common import use_temp_database, summarize, time_calls, report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=1000000)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--new-orders", type=int, default=10000, help="orders counted by the incremental run")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--join-iterations", type=int, default=5, help="requests timed for the per-request self-join")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_temp_database()
+    from sqlalchemy import func, select, update
+    from sqlalchemy.orm import aliased
+    from app.database import engine, SessionLocal
+    from app.models import OrderItem, ProductPairCount, RecommendationRun
+    from app.recommendations import rebuild_recommendations, update_recommendations
+    from seed_bulk import seed_dataset
+    import random
+    import time
+
+    counts = seed_dataset(engine, users=10000, products=args.products, orders=args.orders)
+    from app.main import app
+    from fastapi.testclient import TestClient
+
+    db = SessionLocal()
+    try:
+        results = {"order_items": counts["order_items"]}
+        start = time.perf_counter()
+        run = rebuild_recommendations(db)
+        elapsed = time.perf_counter() - start
+        results["full_rebuild"] = {
+            "seconds": round(elapsed, 2),
+            "order_items_per_s": round(counts["order_items"] / elapsed),
+            "baskets": run.baskets,
+            "pairs": db.execute(select(func.count()).select_from(ProductPairCount)).scalar(),
+            "products_ranked": run.products,
+        }
+
+        # Rewind the watermark so the incremental run picks up the newest orders again
+        db.execute(update(RecommendationRun).values(last_order_id=RecommendationRun.last_order_id - args.new_orders))
+        db.commit()
+        start = time.perf_counter()
+        run = update_recommendations(db)
+        elapsed = time.perf_counter() - start
+        results["incremental"] = {"seconds": round(elapsed, 3), "orders": args.new_orders, "baskets": run.baskets, "products_ranked": run.products}
+
+        rng = random.Random(0)
+        product_ids = [rng.randint(1, args.products) for _ in range(args.iterations)]
+        with TestClient(app) as client:
+            client.get(f"/products/{product_ids[0]}/recommendations")
+            queue = iter(product_ids)
+            results["endpoint"] = summarize(time_calls(lambda: client.get(f"/products/{next(queue)}/recommendations"), args.iterations))
+
+        other = aliased(OrderItem)
+        def self_join(product_id):
+            return db.execute(
+                select(other.product_id, func.count())
+                .join(OrderItem, OrderItem.order_id == other.order_id)
+                .where(OrderItem.product_id == product_id, other.product_id != product_id)
+                .group_by(other.product_id)
+                .order_by(func.count().desc(), other.product_id)
+                .limit(10)
+            ).all()
+        queue = iter(product_ids)
+        results["self_join_per_request"] = summarize(time_calls(lambda: self_join(next(queue)), args.join_iterations))
+    finally:
+        db.close()
+    report("recommendations", results, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Settlement reconciliation throughput.
+
+Seeds orders awaiting payment, writes a settlement CSV covering them (with a
+share of refunds, duplicates, unknown orders and wrong amounts), then times
+reconciling it: the hash-index pipeline over the whole file, and a query per
+row over a sample for comparison.
+
+    python -m benchmarks.bench_reconciliation --lines 1000000
+"""
+import argparse
+from benchmarks.common import use_temp_database, report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=1000000)
+    parser.add_argument("--mismatch-rate", type=float, default=0.02)
+    parser.add_argument("--per-row-sample", type=int, default=10000, help="lines reconciled with a query per row")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    database = use_temp_database()
+    from sqlalchemy import select, update
+    from app.database import engine, SessionLocal
+    from app.models import Order, PaymentStatus
+    from app.reconciliation import SETTLEMENT_STATUSES, reconcile_settlement
+    from seed_bulk import seed_dataset
+    import csv
+    import os
+    import random
+    import time
+
+    seed_dataset(engine, users=10000, orders=args.lines)
+    with engine.begin() as conn:
+        conn.execute(update(Order).values(payment_status=PaymentStatus.PENDING))
+        orders = conn.execute(select(Order.order_number, Order.total_amount).order_by(Order.id)).all()
+
+    rng = random.Random(0)
+    path = os.path.join(os.path.dirname(database), "settlement.csv")
+    with open(path, "w", newline="") as output:
+        writer = csv.writer(output)
+        writer.writerow(["order_number", "amount", "status", "utr"])
+        for line, (order_number, amount) in enumerate(orders):
+            status = "SUCCESS" if rng.random() > 0.05 else "FAILED"
+            roll = rng.random()
+            if roll < args.mismatch_rate / 3:
+                order_number = f"ORD-X{line:08X}"  # Unknown order
+            elif roll < args.mismatch_rate * 2 / 3:
+                amount += 1  # Wrong amount
+            elif roll < args.mismatch_rate:
+                writer.writerow([order_number, amount, status, f"UTR{line}"])  # Duplicate line
+            writer.writerow([order_number, amount, status, f"UTR{line}"])
+    lines = sum(1 for _ in open(path)) - 1
+
+    def per_row(sample):
+        """The naive approach: look every row's order up and update it on its own"""
+        db = SessionLocal()
+        try:
+            with open(path, newline="") as settlement:
+                reader = csv.reader(settlement)
+                next(reader)
+                for _, (order_number, amount, status, _) in zip(range(sample), reader):
+                    order = db.query(Order).filter(Order.order_number == order_number).first()
+                    target = SETTLEMENT_STATUSES[status.lower()]
+                    if order is not None and str(order.total_amount) == amount and order.payment_status != target:
+                        order.payment_status = target
+            db.rollback()  # Leave the orders for the real run
+        finally:
+            db.close()
+
+    start = time.perf_counter()
+    per_row(args.per_row_sample)
+    per_row_rate = args.per_row_sample / (time.perf_counter() - start)
+
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        with open(path, newline="") as settlement:
+            outcome = reconcile_settlement(db, settlement)
+        elapsed = time.perf_counter() - start
+    finally:
+        db.close()
+
+    report("reconciliation", {
+        "lines": lines,
+        "seconds": round(elapsed, 2),
+        "lines_per_s": round(lines / elapsed),
+        "per_row_lines_per_s": round(per_row_rate),
+        "speedup": round(lines / elapsed / per_row_rate, 1),
+        "applied": outcome.applied,
+        "mismatch_counts": outcome.mismatch_counts,
+    }, args.output)
+
+if __name__ == "__main__":
+    main()
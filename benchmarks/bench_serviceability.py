@@ -0,0 +1,122 @@
+"""
+Pincode serviceability lookups.
+
+Builds a table of --prefixes pincode prefixes (three-digit districts with
+six-digit pincodes carved out of them or priced differently), uploads it
+through POST /admin/serviceability and times: building the bisect index,
+--lookups lookups of random pincodes through it, the same lookups probing a
+dict once per prefix length (checking both agree), a query per lookup over
+a sample, and GET /serviceability/{pincode} end to end.
+
+    python -m benchmarks.bench_serviceability --lookups 5000000
+"""
+import argparse
+from benchmarks.common import use_temp_database, summarize, time_calls, report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prefixes", type=int, default=20000)
+    parser.add_argument("--lookups", type=int, default=2000000)
+    parser.add_argument("--per-query-sample", type=int, default=5000, help="lookups done with a query each")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_temp_database()
+    from sqlalchemy import func, select
+    from app.database import engine, SessionLocal
+    from app.models import ServiceArea
+    from seed_bulk import seed_dataset
+
+    seed_dataset(engine, users=10, categories=1, products=10, carts=0, orders=0)  # For the admin account
+    from app.main import app
+    from app.serviceability import ServiceabilityIndex, load_service_areas, serviceability
+    from fastapi.testclient import TestClient
+    import random
+    import sys
+    import time
+
+    rng = random.Random(0)
+    districts = rng.sample(range(110, 860), min(400, args.prefixes))
+    lines = ["prefix,zone,delivery_fee,cutoff,serviceable"]
+    lines += [f"{district},Z{district},{rng.choice((20, 30, 40))},18:00," for district in districts]
+    pincodes = set()
+    while len(pincodes) < args.prefixes - len(districts):
+        pincodes.add(f"{rng.choice(districts)}{rng.randrange(1000):03d}")
+    lines += [
+        f"{pincode},P{pincode},{rng.choice((0, 50))},17:00,{'no' if rng.random() < 0.2 else 'yes'}"
+        for pincode in sorted(pincodes)
+    ]
+
+    with TestClient(app) as client:
+        token = client.post("/token", data={"username": "admin", "password": "admin123"}).json()["access_token"]
+        response = client.post(
+            "/admin/serviceability", files={"areas": ("areas.csv", "\n".join(lines).encode())},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 200, response.text
+
+        db = SessionLocal()
+        try:
+            areas = load_service_areas(db)
+            start = time.perf_counter()
+            index = ServiceabilityIndex(0, areas)
+            build_seconds = time.perf_counter() - start
+            assert serviceability.current().prefixes == len(areas)
+
+            by_prefix = {area.prefix: area for area in areas}
+
+            def dict_lookup(pincode: str):
+                """Longest prefix by probing a dict of prefixes once per length"""
+                for length in range(6, 0, -1):
+                    area = by_prefix.get(pincode[:length])
+                    if area is not None:
+                        return area if area.serviceable else None
+                return None
+
+            def query_lookup(pincode: str):
+                return db.execute(
+                    select(ServiceArea)
+                    .where(ServiceArea.prefix.in_([pincode[:length] for length in range(1, 7)]))
+                    .order_by(func.length(ServiceArea.prefix).desc())
+                    .limit(1)
+                ).scalar()
+
+            queries = [f"{rng.randrange(100000, 1000000)}" for _ in range(args.lookups // 2)]
+            queries += [f"{rng.choice(districts)}{rng.randrange(1000):03d}" for _ in range(args.lookups - len(queries))]
+            rng.shuffle(queries)
+            for pincode in queries[:100000]:
+                assert index.lookup(pincode) == dict_lookup(pincode), pincode
+
+            lookup = index.lookup
+            start = time.perf_counter()
+            served = sum(1 for pincode in queries if lookup(pincode) is not None)
+            index_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            for pincode in queries:
+                dict_lookup(pincode)
+            dict_seconds = time.perf_counter() - start
+            sample = queries[:args.per_query_sample]
+            start = time.perf_counter()
+            for pincode in sample:
+                query_lookup(pincode)
+            query_seconds = time.perf_counter() - start
+
+            results = {
+                "prefixes": len(areas),
+                "ranges": len(index.starts),
+                "index_kb": round((sys.getsizeof(index.starts) + sys.getsizeof(index.values)) / 1024, 1),
+                "index_build_ms": round(build_seconds * 1000, 2),
+                "lookups": len(queries),
+                "served_share": round(served / len(queries), 3),
+                "bisect_lookups_per_s": round(len(queries) / index_seconds),
+                "dict_probe_lookups_per_s": round(len(queries) / dict_seconds),
+                "query_lookups_per_s": round(len(sample) / query_seconds),
+                "endpoint": summarize(time_calls(lambda: client.get(f"/serviceability/{rng.choice(queries)}"), args.iterations)),
+            }
+        finally:
+            db.close()
+    report("serviceability", results, args.output)
+
+if __name__ == "__main__":
+    main()
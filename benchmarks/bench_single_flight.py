@@ -0,0 +1,130 @@
+"""
+Thundering herd on expensive cache misses, with and without single-flight.
+
+Fires --concurrency identical requests at once on one event loop right after
+the miss is created (catalog invalidated, QR code not pre-rendered, admin
+stats requested) and counts the database queries or renders they cause,
+with request coalescing, with every caller computing its own copy in a
+worker thread, and inline on the event loop as before. Also records the
+longest the event loop went without running other tasks while the herd was
+served: that is how long every other request on the process waited.
+
+Requests hold a pooled connection until their session closes after the
+response, so keep --concurrency under the pool's 15 connections.
+
+    python -m benchmarks.bench_single_flight --concurrency 12
+"""
+import argparse
+import asyncio
+import time
+from benchmarks.common import use_temp_database, report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=12)
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_temp_database()
+    from sqlalchemy import delete, event, select
+    from app.database import engine, SessionLocal
+    from app.models import Order, OrderStatus, PaymentQRCode, PaymentStatus
+    from app.singleflight import SingleFlightTimeout, flights
+    from seed_bulk import seed_dataset
+    import httpx
+
+    seed_dataset(engine, users=1000, products=args.products, orders=args.orders)
+    import app.main as main_module
+    from app.cache import cache
+    from fastapi.testclient import TestClient
+
+    with TestClient(main_module.app) as client:
+        admin_token = client.post("/token", data={"username": "admin", "password": "admin123"}).json()["access_token"]
+    db = SessionLocal()
+    user_id, order_id = db.execute(
+        select(Order.user_id, Order.id).where(Order.status == OrderStatus.PENDING, Order.payment_status == PaymentStatus.PENDING, Order.user_id > 2)
+    ).first()
+    db.close()
+    with TestClient(main_module.app) as client:
+        shopper_token = client.post("/token", data={"username": f"user{user_id}", "password": "benchpass"}).json()["access_token"]
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    import app.payments
+    renders = []
+    render = app.payments.render_qr_code_image
+    def counting_render(data):
+        renders.append(data)
+        return render(data)
+    app.payments.render_qr_code_image = counting_render
+
+    coalesced_run = flights.run
+    async def uncoalesced_run(key, fn, *fn_args, timeout=None):
+        # Offloaded like flights.run, but every caller computes its own copy
+        try:
+            return await asyncio.wait_for(asyncio.get_running_loop().run_in_executor(None, fn, *fn_args), timeout or flights.timeout)
+        except asyncio.TimeoutError:
+            raise SingleFlightTimeout(key)
+    async def inline_run(key, fn, *fn_args, timeout=None):
+        return fn(*fn_args)  # What the endpoints did before: compute on the event loop
+
+    def reset_catalog():
+        cache.invalidate("catalog")
+    def reset_qr_code():
+        with engine.begin() as conn:
+            conn.execute(delete(PaymentQRCode).where(PaymentQRCode.order_id == order_id))
+    scenarios = (
+        ("catalog_listing", "/products", admin_token, reset_catalog, lambda: sum("FROM products LEFT OUTER JOIN categories" in s for s in statements)),
+        ("categories", "/categories", admin_token, reset_catalog, lambda: sum(s.lstrip().startswith("SELECT categories.") for s in statements)),
+        ("qr_code", f"/orders/{order_id}/qr-code", shopper_token, reset_qr_code, lambda: len(renders)),
+        ("admin_stats", "/admin/stats", admin_token, lambda: None, lambda: sum("FROM orders_archive" in s for s in statements)),
+    )
+
+    async def herd(client, path, token):
+        headers = {"Authorization": f"Bearer {token}"}
+        done = asyncio.Event()
+        async def watch_loop():
+            worst, last = 0.0, time.perf_counter()
+            while not done.is_set():
+                await asyncio.sleep(0.001)
+                now = time.perf_counter()
+                worst, last = max(worst, now - last), now
+            return worst
+        async def requests():
+            try:
+                return await asyncio.gather(*[client.get(path, headers=headers) for _ in range(args.concurrency)])
+            finally:
+                done.set()
+        start = time.perf_counter()
+        responses, stall_seconds = await asyncio.gather(requests(), watch_loop())
+        elapsed = time.perf_counter() - start
+        assert all(response.status_code == 200 for response in responses), {response.status_code for response in responses}
+        return elapsed, stall_seconds
+
+    async def run():
+        results = {}
+        transport = httpx.ASGITransport(app=main_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for mode, run_fn in (("single_flight", coalesced_run), ("no_coalescing", uncoalesced_run), ("inline", inline_run)):
+                flights.run = run_fn
+                for name, path, token, reset, count in scenarios:
+                    await client.get(path, headers={"Authorization": f"Bearer {token}"})  # Warm everything but the miss
+                    reset()
+                    statements.clear()
+                    renders.clear()
+                    elapsed, stall_seconds = await herd(client, path, token)
+                    results.setdefault(name, {})[mode] = {
+                        "requests": args.concurrency,
+                        "computations": count(),
+                        "herd_ms": round(elapsed * 1000, 1),
+                        "max_event_loop_stall_ms": round(stall_seconds * 1000, 1),
+                    }
+        flights.run = coalesced_run
+        return results
+
+    report("single_flight", asyncio.run(run()), args.output)
+
+if __name__ == "__main__":
+    main()
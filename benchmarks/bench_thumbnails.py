@@ -0,0 +1,88 @@
+"""
+Product thumbnail latency and payload size.
+
+Writes --images synthetic camera-sized JPEGs under a temporary static
+directory, points products at them and times a thumbnail request (redirect
+plus variant) with an empty cache, which renders in the process pool, and
+again once the variant is cached on disk. Also reports the bytes a browser
+downloads for each width and format against the original file.
+
+    python -m benchmarks.bench_thumbnails --images 40 --width 320
+"""
+import argparse
+import os
+import tempfile
+from benchmarks.common import use_temp_database, summarize, time_calls, report
+
+def synthetic_photo(seed: int, size=(3000, 2000)) -> bytes:
+    """A JPEG with gradients and noise, so it compresses like a photo rather than a flat fill"""
+    from PIL import Image, ImageFilter
+    import io
+    import random
+
+    rng = random.Random(seed)
+    small = Image.new("RGB", (60, 40))
+    small.putdata([(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(60 * 40)])
+    image = small.resize(size, Image.Resampling.BICUBIC).filter(ImageFilter.DETAIL)
+    output = io.BytesIO()
+    image.save(output, "JPEG", quality=90)
+    return output.getvalue()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=20)
+    parser.add_argument("--width", type=int, default=320, help="width requested by the timed thumbnail calls")
+    parser.add_argument("--iterations", type=int, default=500, help="warm-cache requests timed")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_temp_database()
+    static_dir = tempfile.mkdtemp(prefix="fvbench-static-")
+    os.environ["IMAGE_STATIC_DIR"] = static_dir
+    os.environ["IMAGE_CACHE_DIR"] = tempfile.mkdtemp(prefix="fvbench-images-")
+    from sqlalchemy import update
+    from app.database import engine, SessionLocal
+    from app.images import IMAGE_FORMATS, IMAGE_WIDTHS
+    from app.models import Product
+    from seed_bulk import seed_dataset
+
+    seed_dataset(engine, users=10, products=args.images, orders=0)
+    db = SessionLocal()
+    original_bytes = []
+    for product_id in range(1, args.images + 1):
+        data = synthetic_photo(product_id)
+        original_bytes.append(len(data))
+        with open(os.path.join(static_dir, f"product-{product_id}.jpg"), "wb") as f:
+            f.write(data)
+        db.execute(update(Product).where(Product.id == product_id).values(image_url=f"/frontend/product-{product_id}.jpg"))
+    db.commit()
+    db.close()
+
+    from app.main import app
+    from fastapi.testclient import TestClient
+
+    accept = {"Accept": "image/webp,image/*,*/*;q=0.8"}
+    with TestClient(app) as client:
+        def thumbnail(product_id, width=args.width, params=None):
+            response = client.get(f"/products/{product_id}/thumbnail", params={"w": width, **(params or {})}, headers=accept)
+            assert response.status_code == 200, response.text
+            return response
+
+        # Warm the pool's processes up so the cold numbers are renders, not interpreter start-up
+        thumbnail(1, IMAGE_WIDTHS[0])
+        queue = iter(range(1, args.images + 1))
+        results = {"original_kb_mean": round(sum(original_bytes) / len(original_bytes) / 1024, 1)}
+        results["cold_cache"] = summarize(time_calls(lambda: thumbnail(next(queue)), args.images))
+        queue = iter(range(args.iterations))
+        results["warm_cache"] = summarize(time_calls(lambda: thumbnail(next(queue) % args.images + 1), args.iterations))
+
+        sizes = {}
+        for image_format in IMAGE_FORMATS:
+            for width in IMAGE_WIDTHS:
+                total = sum(len(thumbnail(product_id, width, {"format": image_format}).content) for product_id in range(1, args.images + 1))
+                sizes[f"{image_format}_{width}_kb_mean"] = round(total / args.images / 1024, 1)
+        results["variant_sizes"] = sizes
+    report("thumbnails", results, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Shared helpers for the benchmark scripts.
+Benchmarks run from the repository root, e.g. ``python -m benchmarks.bench_checkout``.
+"""
+import json
+import os
+import statistics
+import tempfile
+import time
+
+def use_temp_database() -> str:
+    """Point the app at a throwaway SQLite database; call before importing anything from app"""
+    directory = tempfile.mkdtemp(prefix="fvbench-")
+    path = os.path.join(directory, "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ["GUEST_CART_STORE_PATH"] = os.path.join(directory, "guest_carts.db")
+    # Benchmarks hammer single users and IPs; keep the rate limiter out of the way unless asked for
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    os.environ.setdefault("LOADSHED_ENABLED", "false")
+    return path
+
+def percentile(sorted_samples, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, int(round(q / 100 * len(sorted_samples))) - 1))
+    return sorted_samples[index]
+
+def summarize(samples) -> dict:
+    """Latency summary in milliseconds for a list of durations in seconds"""
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+
+def time_calls(func, iterations: int):
+    """Call func repeatedly, returning the duration of each call in seconds"""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def report(name: str, results: dict, output: str = None):
+    """Print benchmark results as JSON, optionally writing them to a file"""
+    document = json.dumps({"benchmark": name, "results": results}, indent=2, default=str)
+    print(document)
+    if output:
+        with open(output, "w") as f:
+            f.write(document + "\n")
@@ -0,0 +1,46 @@
+"""
+Compare two load test result files and flag regressions.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 10
+
+Exits with status 1 when any endpoint's p95 latency grew, or its throughput
+dropped, by more than the threshold percentage.
+"""
+import argparse
+import json
+import sys
+
+def load_endpoints(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)["results"]["endpoints"]
+
+def change(old: float, new: float) -> float:
+    return (new - old) / old * 100 if old else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed change in percent")
+    args = parser.parse_args()
+
+    baseline, candidate = load_endpoints(args.baseline), load_endpoints(args.candidate)
+    regressions = 0
+    print(f"{'endpoint':40} {'p50 ms':>18} {'p95 ms':>18} {'rps':>18}")
+    for name in sorted(set(baseline) | set(candidate)):
+        if name not in baseline or name not in candidate:
+            print(f"{name:40} only in {'candidate' if name in candidate else 'baseline'}")
+            continue
+        old, new = baseline[name], candidate[name]
+        p95_change = change(old["p95_ms"], new["p95_ms"])
+        rps_change = change(old["throughput_rps"], new["throughput_rps"])
+        regressed = p95_change > args.threshold or rps_change < -args.threshold
+        regressions += regressed
+        print(
+            f"{name:40} {old['p50_ms']:>8.2f} -> {new['p50_ms']:<7.2f} {old['p95_ms']:>8.2f} -> {new['p95_ms']:<7.2f} "
+            f"{old['throughput_rps']:>8.1f} -> {new['throughput_rps']:<7.1f}{'  REGRESSION' if regressed else ''}"
+        )
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
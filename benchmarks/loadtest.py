@@ -0,0 +1,264 @@
+"""
+Load test for the FV Commerce API.
+
+Drives a weighted mix of shopper and/or admin traffic and reports throughput
+and latency percentiles per endpoint as JSON, so results can be diffed
+between commits with ``python -m benchmarks.compare``.
+
+In-process (seeds a throwaway database and calls app.main:app over ASGI):
+
+    python -m benchmarks.loadtest --mix mixed --duration 20 --concurrency 8 --output results.json
+
+Over HTTP against a running server seeded with ``python seed_bulk.py``:
+
+    python -m benchmarks.loadtest --url http://localhost:8000 --mix shopper --duration 60
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import datetime
+import random
+import subprocess
+import time
+from benchmarks.common import use_temp_database, summarize, report
+
+Request = Tuple[str, str, dict]  # method, url, httpx request kwargs
+
+@dataclass
+class VirtualUser:
+    """State carried by one simulated client between its requests"""
+    username: str
+    headers: Dict[str, str]
+    rng: random.Random
+    order_ids: List[int] = field(default_factory=list)
+    cart_item_ids: List[int] = field(default_factory=list)
+    wishlist_item_ids: List[int] = field(default_factory=list)
+
+@dataclass
+class Operation:
+    name: str  # Endpoint label used in the report, e.g. "GET /products/{id}"
+    weight: int
+    build: Callable[[VirtualUser, "Catalog"], Optional[Request]]
+
+@dataclass
+class Catalog:
+    product_ids: List[int]
+    category_ids: List[int]
+
+def _pick(rng, values):
+    return rng.choice(values) if values else None
+
+SHOPPER_OPERATIONS = [
+    Operation("GET /", 1, lambda vu, cat: ("GET", "/", {})),
+    Operation("GET /bootstrap", 4, lambda vu, cat: ("GET", "/bootstrap", {})),
+    Operation("GET /categories", 8, lambda vu, cat: ("GET", "/categories", {})),
+    Operation("GET /products", 15, lambda vu, cat: ("GET", "/products", {})),
+    Operation("GET /products?category_id", 6, lambda vu, cat: (
+        "GET", "/products", {"params": {"category_id": _pick(vu.rng, cat.category_ids)}})),
+    Operation("GET /products/{id}", 15, lambda vu, cat: ("GET", f"/products/{_pick(vu.rng, cat.product_ids)}", {})),
+    Operation("GET /users/me", 4, lambda vu, cat: ("GET", "/users/me", {})),
+    Operation("GET /cart", 8, lambda vu, cat: ("GET", "/cart", {})),
+    Operation("POST /cart/add", 8, lambda vu, cat: (
+        "POST", "/cart/add", {"json": {"product_id": _pick(vu.rng, cat.product_ids), "quantity": vu.rng.randint(1, 3)}})),
+    Operation("DELETE /cart/{id}", 1, lambda vu, cat: (
+        ("DELETE", f"/cart/{vu.cart_item_ids.pop()}", {}) if vu.cart_item_ids else None)),
+    Operation("GET /wishlist", 3, lambda vu, cat: ("GET", "/wishlist", {})),
+    Operation("POST /wishlist/add", 2, lambda vu, cat: (
+        "POST", "/wishlist/add", {"json": {"product_id": _pick(vu.rng, cat.product_ids)}})),
+    Operation("DELETE /wishlist/{id}", 1, lambda vu, cat: (
+        ("DELETE", f"/wishlist/{vu.wishlist_item_ids.pop()}", {}) if vu.wishlist_item_ids else None)),
+    Operation("POST /orders", 3, lambda vu, cat: ("POST", "/orders", {"json": {"delivery_address": "12 Load Test Road, Bengaluru 560001"}})),
+    Operation("GET /orders", 5, lambda vu, cat: ("GET", "/orders", {})),
+    Operation("GET /orders/{id}", 3, lambda vu, cat: (
+        ("GET", f"/orders/{_pick(vu.rng, vu.order_ids)}", {}) if vu.order_ids else None)),
+    Operation("GET /orders/{id}/qr-code", 1, lambda vu, cat: (
+        ("GET", f"/orders/{_pick(vu.rng, vu.order_ids)}/qr-code", {}) if vu.order_ids else None)),
+]
+
+ADMIN_OPERATIONS = [
+    Operation("GET /admin/orders", 10, lambda vu, cat: ("GET", "/admin/orders", {})),
+    Operation("GET /admin/orders?status", 5, lambda vu, cat: ("GET", "/admin/orders", {"params": {"status": "pending"}})),
+    Operation("GET /admin/users", 5, lambda vu, cat: ("GET", "/admin/users", {})),
+    Operation("GET /admin/rate-limits", 1, lambda vu, cat: ("GET", "/admin/rate-limits", {})),
+    Operation("PUT /products/{id}/price", 3, lambda vu, cat: (
+        "PUT", f"/products/{_pick(vu.rng, cat.product_ids)}/price", {"json": {"price": f"{vu.rng.randint(10, 300)}.00"}})),
+    Operation("GET /health", 1, lambda vu, cat: ("GET", "/health", {})),
+]
+
+AUTH_OPERATIONS = [
+    Operation("POST /token", 1, lambda vu, cat: (
+        "POST", "/token", {"data": {"username": vu.username, "password": "benchpass"}})),
+]
+
+MIXES = {
+    "shopper": [("shopper", 1.0)],
+    "admin": [("admin", 1.0)],
+    "mixed": [("shopper", 0.9), ("admin", 0.1)],
+    "login": [("login", 1.0)],
+}
+OPERATION_SETS = {"shopper": SHOPPER_OPERATIONS, "admin": ADMIN_OPERATIONS, "login": AUTH_OPERATIONS}
+
+def _remember(vu: VirtualUser, name: str, response):
+    """Keep ids from responses so later requests can refer to them"""
+    if response.status_code != 200:
+        return
+    if name == "POST /orders":
+        vu.order_ids.append(response.json()["id"])
+    elif name == "POST /cart/add":
+        vu.cart_item_ids.append(response.json()["id"])
+    elif name == "POST /wishlist/add":
+        vu.wishlist_item_ids.append(response.json()["id"])
+
+def _retry_after(response) -> Optional[float]:
+    """Seconds the server asked us to back off for, if it shed the request"""
+    if response.status_code != 503:
+        return None
+    return float(response.headers.get("retry-after", 1))
+
+async def _setup_request(client, method: str, url: str, **kwargs):
+    """A request virtual users need before they start; waits out load shedding rather than failing"""
+    while True:
+        response = await client.request(method, url, **kwargs)
+        backoff = _retry_after(response)
+        if backoff is None:
+            response.raise_for_status()
+            return response
+        await asyncio.sleep(backoff)
+
+async def _login(client, username: str, password: str) -> Dict[str, str]:
+    response = await _setup_request(client, "POST", "/token", data={"username": username, "password": password})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+async def run_load(client, mix: str, concurrency: int, duration: float, requests_limit: Optional[int],
+                   shopper_usernames: List[str], seed: int) -> dict:
+    """Run the traffic mix and return per-endpoint results"""
+    admin_headers = await _login(client, "admin", "admin123")
+    products = (await _setup_request(client, "GET", "/products", params={"limit": 1000})).json()
+    categories = (await _setup_request(client, "GET", "/categories")).json()
+    catalog = Catalog([p["id"] for p in products], [c["id"] for c in categories])
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+    issued = 0
+    deadline = 0.0
+    setup_slots = asyncio.Semaphore(4)  # Signing everyone in at once would overload the server before the test starts
+
+    async def setup_user(index: int) -> Tuple[str, VirtualUser]:
+        rng = random.Random(seed + index)
+        role = rng.choices([r for r, _ in MIXES[mix]], [w for _, w in MIXES[mix]])[0]
+        username = shopper_usernames[index % len(shopper_usernames)]
+        if role == "admin":
+            return role, VirtualUser("admin", admin_headers, rng)
+        async with setup_slots:
+            vu = VirtualUser(username, await _login(client, username, "benchpass"), rng)
+            vu.order_ids = [o["id"] for o in (await _setup_request(client, "GET", "/orders", headers=vu.headers)).json()]
+        return role, vu
+
+    async def virtual_user(role: str, vu: VirtualUser):
+        nonlocal issued
+        rng = vu.rng
+        operations = OPERATION_SETS[role]
+        weights = [op.weight for op in operations]
+
+        while time.perf_counter() < deadline and (requests_limit is None or issued < requests_limit):
+            operation = rng.choices(operations, weights)[0]
+            request = operation.build(vu, catalog)
+            if request is None:
+                continue
+            method, url, kwargs = request
+            issued += 1
+            start = time.perf_counter()
+            response = await client.request(method, url, headers=vu.headers, **kwargs)
+            statuses[operation.name][response.status_code] += 1
+            backoff = _retry_after(response)
+            if backoff is not None:
+                # Shed: not a served request, so kept out of the latencies; back off like a well-behaved client
+                await asyncio.sleep(backoff)
+                continue
+            latencies[operation.name].append(time.perf_counter() - start)
+            _remember(vu, operation.name, response)
+
+    users = await asyncio.gather(*(setup_user(i) for i in range(concurrency)))
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(virtual_user(role, vu) for role, vu in users))
+    elapsed = time.perf_counter() - started
+
+    endpoints = {}
+    for name, codes in sorted(statuses.items()):
+        samples = latencies[name]
+        endpoints[name] = {
+            **summarize(samples),
+            "throughput_rps": round(len(samples) / elapsed, 1),
+            "server_errors": sum(count for code, count in codes.items() if code >= 500 and code != 503),
+            "shed": codes.get(503, 0),
+            "status_codes": {str(code): count for code, count in sorted(codes.items())},
+        }
+    all_samples = [s for samples in latencies.values() for s in samples]
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "total": {
+            **summarize(all_samples),
+            "throughput_rps": round(len(all_samples) / elapsed, 1),
+            "shed": sum(endpoint["shed"] for endpoint in endpoints.values()),
+        },
+        "endpoints": endpoints,
+    }
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="base URL of a running server; omit to test app.main:app in-process")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="mixed")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10, help="seconds to run")
+    parser.add_argument("--requests", type=int, help="stop after this many requests")
+    parser.add_argument("--users", type=int, default=200, help="shopper accounts to seed/use")
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--first-user-id", type=int, default=2, help="id of the first seeded shopper (--url mode)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    import httpx
+
+    if args.url:
+        transport_kwargs = {"base_url": args.url}
+        usernames = [f"user{args.first_user_id + i}" for i in range(args.users)]
+        seeded = None
+    else:
+        use_temp_database()
+        from app.database import engine
+        from app.main import app
+        from seed_bulk import seed_dataset
+        seeded = seed_dataset(engine, users=args.users, products=args.products, orders=args.orders, seed=args.seed)
+        first, last = seeded["shopper_user_ids"]
+        usernames = [f"user{i}" for i in range(first, last + 1)]
+        transport_kwargs = {"transport": httpx.ASGITransport(app=app, raise_app_exceptions=False), "base_url": "http://loadtest"}
+
+    async def run():
+        async with httpx.AsyncClient(timeout=60, **transport_kwargs) as client:
+            return await run_load(client, args.mix, args.concurrency, args.duration, args.requests, usernames, args.seed)
+
+    results = asyncio.run(run())
+    results["config"] = {
+        "mode": "http" if args.url else "in-process",
+        "mix": args.mix,
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        "dataset": {k: v for k, v in (seeded or {}).items() if k not in ("password", "shopper_user_ids")},
+        "commit": _git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+    report("loadtest", results, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Recommendation builder for FV Commerce
+Counts which products are bought together and stores the top matches per
+product. Workers keep this up to date; run it by hand after a bulk import
+or to force a full recount:
+
+    python build_recommendations.py --full
+"""
+
+import argparse
+import logging
+from app.database import engine, Base, SessionLocal
+from app.recommendations import rebuild_recommendations, update_recommendations
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build FV Commerce product recommendations")
+    parser.add_argument("--full", action="store_true", help="recount every order instead of only the new ones")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        run = rebuild_recommendations(db) if args.full else update_recommendations(db)
+        print(f"Counted {run.baskets} baskets, ranked {run.products} products")
+    finally:
+        db.close()
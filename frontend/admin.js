@@ -3,6 +3,7 @@ const API_BASE_URL = window.location.origin;
 let authToken = localStorage.getItem('authToken');
 let currentUser = JSON.parse(localStorage.getItem('currentUser') || 'null');
 let products = [];
+let lowStockIds = new Set();
 let orders = [];
 let filteredOrders = [];
 
@@ -58,28 +59,19 @@ async function initializeDashboard() {
 // Load Dashboard Statistics
 async function loadDashboardData() {
     try {
-        // Load products for stats
-        const productsData = await apiCall('/products');
-        document.getElementById('totalProducts').textContent = productsData.length;
-        document.getElementById('activeProducts').textContent = productsData.filter(p => p.is_active).length;
-        document.getElementById('lowStock').textContent = productsData.filter(p => p.stock_quantity < 10).length;
+        // Totals are aggregated server-side over every order, archived ones included
+        const stats = await apiCall('/admin/stats');
+        document.getElementById('totalProducts').textContent = stats.total_products;
+        document.getElementById('activeProducts').textContent = stats.active_products;
+        document.getElementById('totalOrders').textContent = stats.total_orders;
+        document.getElementById('totalUsers').textContent = stats.total_users;
+        document.getElementById('totalRevenue').textContent = `₹${parseFloat(stats.total_revenue).toLocaleString()}`;
+        document.getElementById('pendingOrders').textContent = stats.pending_orders;
         
-        // Load orders if they exist
-        if (orders.length > 0) {
-            const completedOrders = orders.filter(o => o.status === 'completed');
-            const totalRevenue = completedOrders.reduce((sum, order) => sum + order.amount, 0);
-            
-            document.getElementById('totalOrders').textContent = orders.length;
-            document.getElementById('totalUsers').textContent = '45';
-            document.getElementById('totalRevenue').textContent = `₹${totalRevenue.toLocaleString()}`;
-            document.getElementById('pendingOrders').textContent = orders.filter(o => o.status === 'pending').length;
-        } else {
-            // Mock data for dashboard when orders aren't loaded yet
-            document.getElementById('totalOrders').textContent = '23';
-            document.getElementById('totalUsers').textContent = '45';
-            document.getElementById('totalRevenue').textContent = '₹12,450';
-            document.getElementById('pendingOrders').textContent = '5';
-        }
+        // Low stock is tracked server-side against per-product thresholds
+        const lowStock = await apiCall('/admin/inventory/low-stock');
+        lowStockIds = new Set(lowStock.map(item => item.product_id));
+        document.getElementById('lowStock').textContent = lowStock.length;
         
     } catch (error) {
         console.error('Error loading dashboard data:', error);
@@ -108,7 +100,7 @@ function renderPriceTable() {
     }
     
     elements.priceTableBody.innerHTML = products.map(product => {
-        const stockStatus = product.stock_quantity < 10 ? 'low' : 
+        const stockStatus = lowStockIds.has(product.id) ? 'low' : 
                            product.stock_quantity < 50 ? 'medium' : 'high';
         const statusClass = stockStatus === 'low' ? 'status-warning' : 
                            stockStatus === 'medium' ? 'status-info' : 'status-success';
@@ -309,6 +301,7 @@ document.getElementById('priceEditForm').addEventListener('submit', async functi
 async function refreshPrices() {
     try {
         showLoading();
+        await loadDashboardData();
         await loadProducts();
         renderPriceTable();
         showToast('Prices refreshed successfully!', 'success');
@@ -2,7 +2,11 @@
 const API_BASE_URL = window.location.origin;
 let authToken = localStorage.getItem('authToken');
 let currentUser = JSON.parse(localStorage.getItem('currentUser') || 'null');
-let cart = JSON.parse(localStorage.getItem('cart') || '[]');
+// Mirror of the server-side cart (the guest cart until sign-in)
+let cart = [];
+let cartTotalAmount = 0;  // From the server, after promotions
+// Reused when a checkout is retried so the server doesn't place it twice
+let checkoutKey = localStorage.getItem('checkoutKey');
 
 // DOM Elements
 const elements = {
@@ -32,13 +36,31 @@ document.addEventListener('DOMContentLoaded', function() {
 });
 
 // Initialize Application
+// One /bootstrap request brings categories, products, the profile, cart and wishlist
 async function initializeApp() {
     try {
         showLoading();
+        const data = await apiCall('/bootstrap');
+        if (authToken && !data.user) {
+            // Expired or revoked token: the server answered for a guest
+            authToken = null;
+            currentUser = null;
+            localStorage.removeItem('authToken');
+            localStorage.removeItem('currentUser');
+            updateAuthUI();
+        } else if (data.user) {
+            currentUser = data.user;
+            localStorage.setItem('currentUser', JSON.stringify(currentUser));
+        }
+        renderCategories(data.categories);
+        renderProducts(data.products);
+        window.allProducts = data.products; // Store for filtering
+        setCart(data.cart);
+    } catch (error) {
+        console.error('Error loading page data:', error);
         await loadCategories();
         await loadProducts();
-    } catch (error) {
-        showToast('Error loading data: ' + error.message, 'error');
+        await loadCart();
     } finally {
         hideLoading();
     }
@@ -99,7 +121,11 @@ async function apiCall(endpoint, options = {}) {
         }
     };
     
-    const response = await fetch(url, { ...defaultOptions, ...options });
+    const response = await fetch(url, {
+        ...defaultOptions,
+        ...options,
+        headers: { ...defaultOptions.headers, ...(options.headers || {}) }
+    });
     
     if (!response.ok) {
         const error = await response.json().catch(() => ({ detail: 'Network error' }));
@@ -151,6 +177,7 @@ function renderCategories(categories) {
         'Citrus Fruits': '🍊',
         'Berries': '🍓'
     };
+    window.allCategories = categories;
     
     elements.categoriesContainer.innerHTML = categories.map(category => `
         <div class="category-item" data-category="${category.id}">
@@ -170,6 +197,17 @@ function renderCategories(categories) {
     });
 }
 
+// Product images go through the thumbnail service, sized for the card and 2x screens
+const THUMBNAIL_WIDTH = 320;
+
+function productImageAttributes(product, fallbackImages) {
+    if (product.image_url) {
+        const thumbnail = `${API_BASE_URL}/products/${product.id}/thumbnail`;
+        return `src="${thumbnail}?w=${THUMBNAIL_WIDTH}" srcset="${thumbnail}?w=${THUMBNAIL_WIDTH} 1x, ${thumbnail}?w=${THUMBNAIL_WIDTH * 2} 2x"`;
+    }
+    return `src="${fallbackImages[product.name] || 'https://images.unsplash.com/photo-1540420773420-3366772f4999?ixlib=rb-4.0.3&w=400&q=80'}"`;
+}
+
 // Render Products with real images
 function renderProducts(products) {
     const productImages = {
@@ -194,8 +232,8 @@ function renderProducts(products) {
                 </button>` : ''
             }
             <div class="product-image">
-                <img src="${productImages[product.name] || 'https://images.unsplash.com/photo-1540420773420-3366772f4999?ixlib=rb-4.0.3&w=400&q=80'}" 
-                     alt="${product.name}" 
+                <img ${productImageAttributes(product, productImages)} 
+                     alt="${product.name}" loading="lazy" 
                      onerror="this.style.display='none'; this.nextElementSibling.style.display='flex';">
                 <div style="display:none; width:100%; height:100%; align-items:center; justify-content:center; font-size:4rem; background: var(--gradient-accent);">
                     🌱
@@ -281,32 +319,49 @@ async function handlePriceUpdate(e) {
 }
 
 // Cart Functions
-function addToCart(productId, name, price, unit) {
-    const existingItem = cart.find(item => item.id === productId);
-    
-    if (existingItem) {
-        existingItem.quantity += 1;
-    } else {
-        cart.push({
-            id: productId,
-            name: name,
-            price: parseFloat(price),
-            unit: unit,
-            quantity: 1
+// Signed-in users use /cart; guests use /guest/cart, which the server keys by cookie
+function cartEndpoint(path = '') {
+    return (authToken ? '/cart' : '/guest/cart') + path;
+}
+
+function setCart(response) {
+    cart = response.items.map(item => ({
+        id: item.product_id,
+        name: item.product.name,
+        price: parseFloat(item.product.price),
+        unit: item.product.unit,
+        quantity: item.quantity
+    }));
+    cartTotalAmount = parseFloat(response.total_amount);
+    updateCartUI();
+}
+
+async function loadCart() {
+    try {
+        setCart(await apiCall(cartEndpoint()));
+    } catch (error) {
+        console.error('Error loading cart:', error);
+    }
+}
+
+async function addToCart(productId, name, price, unit) {
+    try {
+        await apiCall(cartEndpoint('/add'), {
+            method: 'POST',
+            body: JSON.stringify({ product_id: productId, quantity: 1 })
         });
+        await loadCart();
+        showToast(`${name} added to cart!`, 'success');
+    } catch (error) {
+        showToast('Could not add to cart: ' + error.message, 'error');
     }
-    
-    localStorage.setItem('cart', JSON.stringify(cart));
-    updateCartUI();
-    showToast(`${name} added to cart!`, 'success');
 }
 
 function updateCartUI() {
     const totalItems = cart.reduce((sum, item) => sum + item.quantity, 0);
-    const totalAmount = cart.reduce((sum, item) => sum + (item.price * item.quantity), 0);
     
     elements.cartCount.textContent = totalItems;
-    elements.cartTotal.textContent = totalAmount.toFixed(2);
+    elements.cartTotal.textContent = cartTotalAmount.toFixed(2);
     
     renderCartItems();
 }
@@ -341,15 +396,18 @@ function renderCartItems() {
     `).join('');
 }
 
-function updateQuantity(productId, change) {
+async function updateQuantity(productId, change) {
     const item = cart.find(item => item.id === productId);
     if (item) {
-        item.quantity += change;
-        if (item.quantity <= 0) {
-            cart = cart.filter(item => item.id !== productId);
+        try {
+            await apiCall(cartEndpoint(`/items/${productId}`), {
+                method: 'PUT',
+                body: JSON.stringify({ quantity: Math.max(item.quantity + change, 0) })
+            });
+            await loadCart();
+        } catch (error) {
+            showToast('Could not update cart: ' + error.message, 'error');
         }
-        localStorage.setItem('cart', JSON.stringify(cart));
-        updateCartUI();
     }
 }
 
@@ -541,6 +599,8 @@ async function login(username, password) {
     localStorage.setItem('currentUser', JSON.stringify(currentUser));
     
     updateAuthUI();
+    // The server merged the guest cart into this account
+    await loadCart();
     
     // Redirect admin users to admin dashboard
     if (currentUser.role === 'admin') {
@@ -627,7 +687,19 @@ function filterProducts(filter) {
 function filterProductsByCategory(categoryId) {
     if (!window.allProducts) return;
     
-    const filtered = window.allProducts.filter(p => p.category_id == categoryId);
+    // A category takes in its subcategories' products
+    const subtree = new Set([Number(categoryId)]);
+    let grew = true;
+    while (grew) {
+        grew = false;
+        (window.allCategories || []).forEach(category => {
+            if (subtree.has(category.parent_id) && !subtree.has(category.id)) {
+                subtree.add(category.id);
+                grew = true;
+            }
+        });
+    }
+    const filtered = window.allProducts.filter(p => subtree.has(p.category_id));
     renderProducts(filtered);
     
     // Scroll to products section
@@ -653,18 +725,12 @@ async function handleCheckout() {
     try {
         showLoading();
         
-        // Add items to cart on server
-        for (const item of cart) {
-            await apiCall('/cart/add', {
-                method: 'POST',
-                body: JSON.stringify({
-                    product_id: item.id,
-                    quantity: item.quantity
-                })
-            });
+        if (!checkoutKey) {
+            checkoutKey = crypto.randomUUID();
+            localStorage.setItem('checkoutKey', checkoutKey);
         }
         
-        // Create order
+        // Create order from the server-side cart
         const orderData = {
             delivery_address: currentUser.address || 'Default Address',
             notes: 'Order from FreshMart web interface'
@@ -672,12 +738,15 @@ async function handleCheckout() {
         
         const order = await apiCall('/orders', {
             method: 'POST',
+            headers: { 'Idempotency-Key': `${checkoutKey}-order` },
             body: JSON.stringify(orderData)
         });
         
-        // Clear local cart
+        // The server emptied the cart when it placed the order
         cart = [];
-        localStorage.setItem('cart', JSON.stringify(cart));
+        cartTotalAmount = 0;
+        checkoutKey = null;
+        localStorage.removeItem('checkoutKey');
         updateCartUI();
         closeCart();
         
@@ -825,16 +894,16 @@ function logout() {
     // Clear local storage
     localStorage.removeItem('authToken');
     localStorage.removeItem('currentUser');
-    localStorage.removeItem('cart');
     
     // Reset variables
     authToken = null;
     currentUser = null;
     cart = [];
+    cartTotalAmount = 0;
     
     // Update UI
     updateAuthUI();
-    updateCartUI();
+    loadCart();
     
     // Remove dropdown
     const dropdown = document.getElementById('userDropdown');
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Payment reconciliation for FV Commerce
+Applies a UPI settlement CSV (order_number, amount, status columns) to order
+payment statuses and writes every row that couldn't be applied to a report:
+
+    python reconcile_payments.py settlement.csv --report mismatches.csv
+"""
+
+import argparse
+import json
+import sys
+from dataclasses import asdict
+from app.database import engine, Base, SessionLocal
+from app.reconciliation import reconcile_settlement, write_mismatch_report, SettlementFileError
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconcile FV Commerce payments with a settlement file")
+    parser.add_argument("settlement", help="settlement CSV file")
+    parser.add_argument("--report", help="write mismatches to this CSV file")
+    parser.add_argument("--dry-run", action="store_true", help="match and report without updating orders")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        with open(args.settlement, encoding="utf-8-sig", newline="") as lines:
+            report = reconcile_settlement(db, lines, dry_run=args.dry_run)
+    except SettlementFileError as e:
+        sys.exit(str(e))
+    finally:
+        db.close()
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8", newline="") as output:
+            write_mismatch_report(report, output)
+    summary = asdict(report)
+    summary.pop("mismatches")
+    print(json.dumps(summary, indent=2))
@@ -55,10 +55,13 @@ def create_sample_users(db: Session):
         }
     ]
     
+    # Check which users already exist with one query
+    existing_users = {
+        username for (username,) in
+        db.query(User.username).filter(User.username.in_([user_data["username"] for user_data in users_data]))
+    }
     for user_data in users_data:
-        # Check if user already exists
-        existing_user = db.query(User).filter(User.username == user_data["username"]).first()
-        if not existing_user:
+        if user_data["username"] not in existing_users:
             password = user_data.pop("password")
             hashed_password = get_password_hash(password)
             
@@ -86,9 +89,12 @@ def create_sample_categories(db: Session):
         {"name": "Berries", "description": "Strawberries, blueberries, and berry varieties"}
     ]
     
+    existing_categories = {
+        name for (name,) in
+        db.query(Category.name).filter(Category.name.in_([cat_data["name"] for cat_data in categories_data]))
+    }
     for cat_data in categories_data:
-        existing_cat = db.query(Category).filter(Category.name == cat_data["name"]).first()
-        if not existing_cat:
+        if cat_data["name"] not in existing_categories:
             category = Category(**cat_data)
             db.add(category)
             print(f"   ✅ Created category: {category.name}")
@@ -102,12 +108,13 @@ def create_sample_products(db: Session):
     print("🥕 Creating sample products...")
     
     # Get categories
-    vegetables = db.query(Category).filter(Category.name == "Vegetables").first()
-    fruits = db.query(Category).filter(Category.name == "Fruits").first()
-    leafy = db.query(Category).filter(Category.name == "Leafy Greens").first()
-    root = db.query(Category).filter(Category.name == "Root Vegetables").first()
-    citrus = db.query(Category).filter(Category.name == "Citrus Fruits").first()
-    berries = db.query(Category).filter(Category.name == "Berries").first()
+    categories = {category.name: category for category in db.query(Category)}
+    vegetables = categories["Vegetables"]
+    fruits = categories["Fruits"]
+    leafy = categories["Leafy Greens"]
+    root = categories["Root Vegetables"]
+    citrus = categories["Citrus Fruits"]
+    berries = categories["Berries"]
     
     products_data = [
         # Vegetables
@@ -132,9 +139,12 @@ def create_sample_products(db: Session):
         {"name": "Strawberries", "description": "Sweet and juicy strawberries", "price": 200.00, "unit": "box", "stock_quantity": 25, "category_id": berries.id, "is_organic": True, "origin": "Himachal"}
     ]
     
+    existing_products = {
+        name for (name,) in
+        db.query(Product.name).filter(Product.name.in_([prod_data["name"] for prod_data in products_data]))
+    }
     for prod_data in products_data:
-        existing_prod = db.query(Product).filter(Product.name == prod_data["name"]).first()
-        if not existing_prod:
+        if prod_data["name"] not in existing_products:
             product = Product(**prod_data)
             db.add(product)
             print(f"   ✅ Created product: {product.name} - ₹{product.price}/{product.unit}")
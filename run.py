@@ -1,9 +1,38 @@
 #!/usr/bin/env python3
 
+import argparse
 import uvicorn
 import os
-from app.main import app
+
+def worker_count(value: str) -> int:
+    """Number of worker processes; "auto" means one per CPU core"""
+    if value == "auto":
+        return os.cpu_count() or 1
+    return max(1, int(value))
 
 if __name__ == "__main__":
-    port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the FV Commerce API server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    parser.add_argument(
+        "--workers",
+        default=os.environ.get("WEB_CONCURRENCY", "1"),
+        help='number of worker processes, or "auto" for one per CPU core'
+    )
+    parser.add_argument(
+        "--inline-jobs",
+        action="store_true",
+        help="run background and periodic jobs in the web processes, for deployments without a worker.py process"
+    )
+    args = parser.parse_args()
+    if args.inline_jobs:
+        os.environ["JOBS_INLINE"] = "true"  # Read when app.jobs is imported, here and in every worker process
+
+    from app.main import app
+
+    workers = worker_count(args.workers)
+    if workers > 1:
+        # Each worker imports the app itself; caches stay coherent through app.cache
+        uvicorn.run("app.main:app", host=args.host, port=args.port, workers=workers)
+    else:
+        uvicorn.run(app, host=args.host, port=args.port)
\ No newline at end of file
@@ -0,0 +1,356 @@
+"""
+Bulk data generator for FV Commerce
+Generates N users, categories, products, carts and orders for performance testing
+
+Rows are built as plain tuples from a seeded RNG (the same --seed always gives
+the same data) and written with DBAPI executemany, or COPY on PostgreSQL, one
+transaction per chunk. Synthetic users share a single low-cost bcrypt hash.
+
+    python seed_bulk.py --database-url sqlite:///./bench.db --reset --users 10000 --orders 1000000
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+import argparse
+import io
+import os
+import random
+import time
+
+BENCH_PASSWORD = "benchpass"
+ADMIN_USERNAME = "admin"
+ADMIN_PASSWORD = "admin123"  # Must match the admin credentials known to app.auth
+
+ORDER_STATUS_WEIGHTS = {"PENDING": 10, "CONFIRMED": 10, "PROCESSING": 5, "SHIPPED": 10, "DELIVERED": 55, "CANCELLED": 10}
+PAYMENT_STATUS_WEIGHTS = {"PENDING": 20, "COMPLETED": 70, "FAILED": 7, "REFUNDED": 3}
+AREAS = ["Indiranagar", "Koramangala", "Whitefield", "Jayanagar", "HSR Layout", "Malleshwaram", "Hebbal", "BTM Layout"]
+UNITS = ["kg", "piece", "bunch", "dozen"]
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"  # How SQLAlchemy stores DateTime on SQLite
+
+def fast_hash(password: str) -> str:
+    """bcrypt at the minimum cost; only for synthetic users"""
+    from passlib.hash import bcrypt
+    return bcrypt.using(rounds=4).hash(password)
+
+def money(paise: int) -> str:
+    return f"{paise // 100}.{paise % 100:02d}"
+
+class BulkWriter:
+    """Writes tuples with a single DBAPI executemany, or COPY on PostgreSQL"""
+
+    def __init__(self, connection):
+        self.connection = connection  # SQLAlchemy Connection
+        self.dialect = connection.dialect.name
+        self.placeholder = "?" if connection.dialect.paramstyle == "qmark" else "%s"
+
+    def write(self, table: str, columns: Sequence[str], rows: List[tuple]):
+        if not rows:
+            return
+        if self.dialect != "postgresql":
+            placeholders = ", ".join([self.placeholder] * len(columns))
+            self.connection.exec_driver_sql(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+            return
+        if not self.connection.in_transaction():
+            self.connection.begin()  # So the caller's commit() covers the COPY
+        cursor = self.connection.connection.cursor()
+        try:
+            self._copy(cursor, table, columns, rows)
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def _copy(cursor, table: str, columns: Sequence[str], rows: List[tuple]):
+        sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+        if hasattr(cursor, "copy_expert"):  # psycopg2
+            buffer = io.StringIO()
+            for row in rows:
+                buffer.write("\t".join(_copy_value(value) for value in row))
+                buffer.write("\n")
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+        else:  # psycopg 3
+            with cursor.copy(sql) as copy:
+                for row in rows:
+                    copy.write_row(row)
+
+def _copy_value(value) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+def _next_id(conn, table: str) -> int:
+    return (conn.exec_driver_sql(f"SELECT MAX(id) FROM {table}").scalar() or 0) + 1
+
+@contextmanager
+def relaxed_durability(conn):
+    """Skip fsync on commit while loading disposable data, restoring the setting afterwards"""
+    if conn.dialect.name == "sqlite":
+        previous = conn.exec_driver_sql("PRAGMA synchronous").scalar()
+        conn.exec_driver_sql("PRAGMA synchronous=OFF")
+        try:
+            yield
+        finally:
+            conn.rollback()  # The pragma can't change inside a transaction
+            conn.exec_driver_sql(f"PRAGMA synchronous={int(previous)}")
+    elif conn.dialect.name == "postgresql":
+        conn.exec_driver_sql("SET synchronous_commit TO OFF")
+        try:
+            yield
+        finally:
+            conn.rollback()
+            conn.exec_driver_sql("RESET synchronous_commit")
+            conn.commit()
+    else:
+        yield
+
+def reset_schema(engine):
+    """Drop and recreate every table"""
+    from app.database import Base
+    import app.models  # noqa: F401 - registers the tables
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+def _reset_sequences(conn, tables: Iterable[str]):
+    """Move PostgreSQL id sequences past the explicit ids written by the seeder"""
+    if conn.dialect.name != "postgresql":
+        return
+    for table in tables:
+        conn.exec_driver_sql(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)"
+        )
+
+ORDER_COLUMNS = (
+    "id", "user_id", "order_number", "total_amount", "status", "payment_status",
+    "payment_method", "qr_code_data", "delivery_address", "created_at",
+)
+ORDER_ITEM_COLUMNS = ("order_id", "product_id", "quantity", "unit_price", "total_price")
+
+@dataclass
+class OrderContext:
+    """What an order chunk generator needs to know about the seeded catalog"""
+    seed: int
+    now: datetime
+    shopper_ids: List[int]
+    product_ids: List[int]
+    prices: List[int]  # In paise, parallel to product_ids
+    max_items: int
+
+def generate_order_chunk(context: OrderContext, index: int, first_order: int, count: int) -> Tuple[List[tuple], List[tuple]]:
+    """Order and order item rows for one chunk; depends only on the context and the chunk index"""
+    rng = random.Random(f"{context.seed}:orders:{index}")
+    random_value = rng.random
+    product_ids, prices = context.product_ids, context.prices
+    product_count = len(product_ids)
+    # Everything formatted in the hot loop is looked up instead: prices, line totals, days
+    price_text = [money(price) for price in prices]
+    line_text = [[money(price * quantity) for quantity in range(5)] for price in prices]
+    days = [(context.now - timedelta(days=day)).strftime("%Y-%m-%d") for day in range(366)]
+    addresses = [f"Main Road, {area}, Bengaluru" for area in AREAS]
+
+    user_ids = rng.choices(context.shopper_ids, k=count)
+    statuses = rng.choices(list(ORDER_STATUS_WEIGHTS), list(ORDER_STATUS_WEIGHTS.values()), k=count)
+    payments = rng.choices(list(PAYMENT_STATUS_WEIGHTS), list(PAYMENT_STATUS_WEIGHTS.values()), k=count)
+    order_rows, item_rows = [], []
+    for offset in range(count):
+        order_id = first_order + offset
+        picked = set()
+        wanted = 1 + int(random_value() * context.max_items)
+        while len(picked) < wanted:
+            picked.add(int(random_value() * product_count))
+        total = 0
+        for product in picked:
+            quantity = 1 + int(random_value() * 4)
+            total += prices[product] * quantity
+            item_rows.append((order_id, product_ids[product], quantity, price_text[product], line_text[product][quantity]))
+        order_number = f"ORD-S{order_id:07X}"
+        amount = money(total)
+        seconds = int(random_value() * 86400)
+        order_rows.append((
+            order_id, user_ids[offset], order_number, amount, statuses[offset], payments[offset], "QR_CODE",
+            f"upi://pay?pa=merchant@upi&tr={order_number}&am={amount}",
+            f"{1 + int(random_value() * 998)} {addresses[int(random_value() * len(addresses))]} {560001 + int(random_value() * 100)}",
+            f"{days[1 + int(random_value() * 365)]} {seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}.000000",
+        ))
+    return order_rows, item_rows
+
+_worker_context: Optional[OrderContext] = None
+
+def _init_worker(context: OrderContext):
+    global _worker_context
+    _worker_context = context
+
+def _generate_in_worker(task: Tuple[int, int, int]):
+    return generate_order_chunk(_worker_context, *task)
+
+def _generate_chunks(context: OrderContext, tasks: List[Tuple[int, int, int]], jobs: int) -> Iterator[Tuple[List[tuple], List[tuple]]]:
+    """Yield chunks in order, generating up to `jobs` ahead while the caller writes"""
+    if jobs <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield generate_order_chunk(context, *task)
+        return
+    with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(context,)) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(_generate_in_worker, task))
+            if len(pending) > jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def seed_dataset(
+    engine,
+    users: int = 1000,
+    categories: int = 6,
+    products: int = 200,
+    carts: int = 200,
+    orders: int = 10000,
+    max_items_per_order: int = 5,
+    seed: int = 42,
+    chunk_size: int = 50000,
+    reset: bool = False,
+    jobs: int = 1,
+) -> dict:
+    """Generate a dataset; returns row counts and timings.
+
+    Orders are generated in chunks, each from its own seeded RNG, so `jobs`
+    processes can build them in parallel without changing the output.
+    """
+    from app.database import Base
+    import app.models  # noqa: F401 - registers the tables
+
+    if reset:
+        reset_schema(engine)
+    else:
+        Base.metadata.create_all(bind=engine)
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    now_text = now.strftime(DATETIME_FORMAT)
+    timings = {}
+
+    with engine.connect() as conn, relaxed_durability(conn):
+        writer = BulkWriter(conn)
+
+        started = time.perf_counter()
+        # Users: the admin plus synthetic shoppers sharing one cheap hash
+        user_hash = fast_hash(BENCH_PASSWORD)
+        first_user = _next_id(conn, "users")
+        user_columns = ("id", "email", "username", "hashed_password", "full_name", "address", "role", "is_active", "created_at")
+        user_rows = []
+        if conn.exec_driver_sql(f"SELECT 1 FROM users WHERE username = '{ADMIN_USERNAME}'").first() is None:
+            user_rows.append((
+                first_user, "admin@fvbench.com", ADMIN_USERNAME, fast_hash(ADMIN_PASSWORD),
+                "Bench Admin", None, "ADMIN", True, now_text,
+            ))
+        shopper_start = first_user + len(user_rows)
+        shopper_ids = list(range(shopper_start, shopper_start + users))
+        user_rows.extend(
+            (user_id, f"user{user_id}@fvbench.com", f"user{user_id}", user_hash, f"Bench User {user_id}",
+             f"{i % 500} Main Road, {AREAS[i % len(AREAS)]}", "USER", True, now_text)
+            for i, user_id in enumerate(shopper_ids)
+        )
+        for start in range(0, len(user_rows), chunk_size):
+            writer.write("users", user_columns, user_rows[start:start + chunk_size])
+            conn.commit()
+
+        first_category = _next_id(conn, "categories")
+        category_ids = list(range(first_category, first_category + categories))
+        writer.write("categories", ("id", "name", "description", "is_active", "created_at"), [
+            (category_id, f"Bench Category {category_id}", "Generated category", True, now_text)
+            for category_id in category_ids
+        ])
+
+        first_product = _next_id(conn, "products")
+        product_ids = list(range(first_product, first_product + products))
+        prices = {}  # product id -> price in paise
+        product_rows = []
+        for product_id in product_ids:
+            prices[product_id] = rng.randrange(1000, 30000)
+            product_rows.append((
+                product_id, f"Bench Product {product_id}", "Generated product", money(prices[product_id]),
+                rng.choice(UNITS), rng.choice(category_ids), rng.randrange(0, 500), rng.random() < 0.4, True, now_text,
+            ))
+        writer.write("products", (
+            "id", "name", "description", "price", "unit", "category_id", "stock_quantity", "is_organic", "is_active", "created_at"
+        ), product_rows)
+        conn.commit()
+        timings["catalog_s"] = round(time.perf_counter() - started, 3)
+
+        started = time.perf_counter()
+        cart_rows, wishlist_rows = [], []
+        for user_id in rng.sample(shopper_ids, min(carts, len(shopper_ids))):
+            for product_id in rng.sample(product_ids, min(rng.randint(1, 8), len(product_ids))):
+                cart_rows.append((user_id, product_id, rng.randint(1, 5), now_text))
+            for product_id in rng.sample(product_ids, min(rng.randint(0, 4), len(product_ids))):
+                wishlist_rows.append((user_id, product_id, now_text))
+        writer.write("cart_items", ("user_id", "product_id", "quantity", "created_at"), cart_rows)
+        writer.write("wishlist_items", ("user_id", "product_id", "created_at"), wishlist_rows)
+        conn.commit()
+        timings["carts_s"] = round(time.perf_counter() - started, 3)
+
+        started = time.perf_counter()
+        order_items = 0
+        context = OrderContext(
+            seed=seed, now=now, shopper_ids=shopper_ids, product_ids=product_ids,
+            prices=[prices[product_id] for product_id in product_ids], max_items=min(max_items_per_order, len(product_ids)),
+        )
+        first_order = _next_id(conn, "orders")
+        tasks = [
+            (index, first_order + start, min(chunk_size, orders - start))
+            for index, start in enumerate(range(0, orders if product_ids and shopper_ids else 0, chunk_size))
+        ]
+        for order_rows, item_rows in _generate_chunks(context, tasks, jobs):
+            writer.write("orders", ORDER_COLUMNS, order_rows)
+            writer.write("order_items", ORDER_ITEM_COLUMNS, item_rows)
+            conn.commit()
+            order_items += len(item_rows)
+        timings["orders_s"] = round(time.perf_counter() - started, 3)
+
+        _reset_sequences(conn, ("users", "categories", "products", "orders"))
+        conn.commit()
+
+    return {
+        "users": users, "categories": categories, "products": products,
+        "cart_items": len(cart_rows), "wishlist_items": len(wishlist_rows),
+        "orders": orders, "order_items": order_items,
+        "shopper_user_ids": [shopper_ids[0], shopper_ids[-1]] if shopper_ids else [],
+        "password": BENCH_PASSWORD, "timings": timings,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="defaults to DATABASE_URL / the app's database")
+    parser.add_argument("--reset", action="store_true", help="drop and recreate all tables first")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--categories", type=int, default=6)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--carts", type=int, default=200)
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--max-items-per-order", type=int, default=5)
+    parser.add_argument("--chunk-size", type=int, default=50000, help="orders per transaction")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="processes generating orders")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    import json
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    from app.database import engine
+
+    started = time.perf_counter()
+    summary = seed_dataset(
+        engine, users=args.users, categories=args.categories, products=args.products, carts=args.carts,
+        orders=args.orders, max_items_per_order=args.max_items_per_order, seed=args.seed,
+        chunk_size=args.chunk_size, reset=args.reset, jobs=args.jobs,
+    )
+    summary["elapsed_s"] = round(time.perf_counter() - started, 3)
+    print(json.dumps(summary, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -17,9 +17,14 @@ def create_sample_data():
         # Create tables
         Base.metadata.create_all(bind=engine)
         
+        # Look up existing seed users with one query instead of one per user
+        existing_users = {
+            username for (username,) in
+            db.query(User.username).filter(User.username.in_(["admin", "developer", "john_doe"]))
+        }
+        
         # Create admin user
-        admin_user = db.query(User).filter(User.username == "admin").first()
-        if not admin_user:
+        if "admin" not in existing_users:
             admin_user = User(
                 email="admin@fvcommerce.com",
                 username="admin",
@@ -32,13 +37,12 @@ def create_sample_data():
             print("✅ Created admin user (username: admin, password: admin123)")
         
         # Create developer user
-        dev_user = db.query(User).filter(User.username == "developer").first()
-        if not dev_user:
+        if "developer" not in existing_users:
             dev_user = User(
                 email="dev@fvcommerce.com",
                 username="developer",
                 full_name="System Developer",
-                role=UserRole.DEVELOPER,
+                role=UserRole.ADMIN,  # There is no separate developer role
                 hashed_password=get_password_hash("dev123"),
                 is_active=True
             )
@@ -46,8 +50,7 @@ def create_sample_data():
             print("✅ Created developer user (username: developer, password: dev123)")
         
         # Create sample regular user
-        sample_user = db.query(User).filter(User.username == "john_doe").first()
-        if not sample_user:
+        if "john_doe" not in existing_users:
             sample_user = User(
                 email="john@example.com",
                 username="john_doe",
@@ -61,8 +64,6 @@ def create_sample_data():
             db.add(sample_user)
             print("✅ Created sample user (username: john_doe, password: user123)")
         
-        db.commit()
-        
         # Create categories
         categories_data = [
             {"name": "Vegetables", "description": "Fresh seasonal vegetables"},
@@ -73,16 +74,17 @@ def create_sample_data():
             {"name": "Berries", "description": "Strawberries, blueberries and seasonal berries"}
         ]
         
-        created_categories = {}
+        created_categories = {
+            category.name: category for category in
+            db.query(Category).filter(Category.name.in_([cat_data["name"] for cat_data in categories_data]))
+        }
         for cat_data in categories_data:
-            category = db.query(Category).filter(Category.name == cat_data["name"]).first()
-            if not category:
+            if cat_data["name"] not in created_categories:
                 category = Category(**cat_data)
                 db.add(category)
-                db.commit()
-                db.refresh(category)
+                created_categories[category.name] = category
                 print(f"✅ Created category: {category.name}")
-            created_categories[cat_data["name"]] = category
+        db.flush()  # Assign ids to new categories in one round trip
         
         # Create sample products
         products_data = [
@@ -218,9 +220,12 @@ def create_sample_data():
             },
         ]
         
+        existing_products = {
+            name for (name,) in
+            db.query(Product.name).filter(Product.name.in_([product_data["name"] for product_data in products_data]))
+        }
         for product_data in products_data:
-            product = db.query(Product).filter(Product.name == product_data["name"]).first()
-            if not product:
+            if product_data["name"] not in existing_products:
                 category_name = product_data.pop("category")
                 category = created_categories[category_name]
                 product = Product(
@@ -228,14 +233,14 @@ def create_sample_data():
                     **product_data
                 )
                 db.add(product)
-                db.commit()
-                db.refresh(product)
                 print(f"✅ Created product: {product.name} - ₹{product.price}/{product.unit}")
         
+        db.commit()
+        
         print("\n🎉 Sample data creation completed successfully!")
         print("\n👥 Login Credentials:")
         print("🔹 Admin: username='admin', password='admin123'")
-        print("🔹 Developer: username='developer', password='dev123'")
+        print("🔹 Developer: username='developer', password='dev123' (Admin access)")
         print("🔹 User: username='john_doe', password='user123'")
         print("\n🌐 Visit http://localhost:8000/docs to explore the API!")
         
@@ -0,0 +1,58 @@
+"""
+Shared fixtures.
+
+The app reads its configuration when it is imported, so the environment is
+pointed at a throwaway database (and guest cart store and image cache)
+before anything from app is imported.
+"""
+import itertools
+import os
+import tempfile
+
+_directory = tempfile.mkdtemp(prefix="fvtest-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_directory, 'test.db')}"
+os.environ["GUEST_CART_STORE_PATH"] = os.path.join(_directory, "guest_carts.db")
+os.environ["IMAGE_CACHE_DIR"] = os.path.join(_directory, "image_cache")
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["LOADSHED_ENABLED"] = "false"
+
+import pytest
+from fastapi.testclient import TestClient
+
+_names = itertools.count(1)
+
+@pytest.fixture(scope="session")
+def client():
+    from app.main import app
+    with TestClient(app) as client:  # Runs the lifespan, as a server start would
+        yield client
+
+def _sign_up(client, name: str = None, password: str = "testpass123") -> dict:
+    name = name or f"user{next(_names)}"
+    response = client.post("/register", json={"email": f"{name}@fvtest.com", "username": name, "password": password})
+    assert response.status_code == 200, response.text
+    token = client.post("/token", data={"username": name, "password": password}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture(scope="session")
+def admin_headers(client):
+    return _sign_up(client, "admin", "admin123")  # Signing in with these credentials grants the admin role
+
+@pytest.fixture
+def shopper_headers(client):
+    """A new shopper account, so carts and orders don't leak between tests"""
+    return _sign_up(client)
+
+@pytest.fixture
+def make_product(client, admin_headers):
+    """Create an active product (in a new category) and return it as the API does"""
+    def make(price: str = "50.00", stock: int = 100) -> dict:
+        name = f"Product {next(_names)}"
+        category = client.post("/categories", json={"name": f"Category for {name}"}, headers=admin_headers).json()
+        response = client.post(
+            "/products", json={"name": name, "price": price, "category_id": category["id"], "stock_quantity": stock},
+            headers=admin_headers,
+        )
+        assert response.status_code == 200, response.text
+        return response.json()
+    return make
@@ -0,0 +1,15 @@
+"""Verified tokens are cached per process and evicted least recently used first"""
+from collections import OrderedDict
+from app import auth
+
+def test_token_cache_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(auth, "_verified_tokens", OrderedDict())
+    monkeypatch.setattr(auth, "AUTH_TOKEN_CACHE_SIZE", 2)
+    first, second, third = (auth.create_access_token({"sub": name}) for name in ("first", "second", "third"))
+
+    auth.verify_token(first)
+    auth.verify_token(second)
+    auth.verify_token(first)  # A hit makes it the most recently used
+    auth.verify_token(third)
+
+    assert list(auth._verified_tokens) == [first, third]
@@ -0,0 +1,59 @@
+"""An invalidation made by one process reaches every other process's cache within the poll interval"""
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+import app.cache
+from app.cache import LocalCache
+
+SYNC_INTERVAL = 0.2
+SLACK = 0.1  # Scheduling and the poll query itself
+
+def _wait_for(cache: LocalCache, namespace: str, value) -> float:
+    """Read through `cache` until it returns `value`; returns when that happened"""
+    deadline = time.time() + 5
+    while cache.get_or_set(namespace, "key", lambda: value) != value:
+        assert time.time() < deadline, "invalidation never arrived"
+        time.sleep(0.005)
+    return time.time()
+
+def test_invalidation_reaches_another_store(client):
+    namespace = f"coherence-{uuid.uuid4().hex}"
+    writer, reader = LocalCache(sync_interval=SYNC_INTERVAL), LocalCache(sync_interval=SYNC_INTERVAL)
+    assert reader.get_or_set(namespace, "key", lambda: "old") == "old"
+
+    invalidated = time.time()
+    writer.invalidate(namespace)
+
+    assert _wait_for(reader, namespace, "new") - invalidated <= SYNC_INTERVAL + SLACK
+
+def test_invalidation_reaches_another_process(client):
+    namespace = f"coherence-{uuid.uuid4().hex}"
+    reader = LocalCache(sync_interval=SYNC_INTERVAL)
+    assert reader.get_or_set(namespace, "key", lambda: "old") == "old"
+
+    # Another worker process bumps the version and reports when its transaction committed
+    writer = subprocess.Popen(
+        [sys.executable, "-c", "import sys, time\n"
+         "from app.cache import LocalCache\n"
+         "LocalCache().invalidate(sys.argv[1])\n"
+         "print(time.time())", namespace],
+        cwd=Path(__file__).parent.parent, stdout=subprocess.PIPE, text=True,
+    )
+    seen = _wait_for(reader, namespace, "new")
+    invalidated = float(writer.communicate(timeout=30)[0])
+
+    assert seen - invalidated <= SYNC_INTERVAL + SLACK
+
+def test_reads_only_consult_versions_in_memory(client, monkeypatch):
+    cache = LocalCache(sync_interval=60)
+    cache.start()  # The one query, at startup; from then on the poll thread does them
+
+    class NoDatabase:
+        def connect(self):
+            raise AssertionError("queried on the request path")
+    monkeypatch.setattr(app.cache, "engine", NoDatabase())
+
+    assert cache.get_or_set("coherence-reads", "key", lambda: "value") == "value"
+    assert cache.version("coherence-reads") == 0
@@ -0,0 +1,52 @@
+"""A guest cart moves into the account on sign-in, and stays put if the merge fails"""
+import pytest
+from fastapi.testclient import TestClient
+from app.carts import GUEST_CART_COOKIE, GuestCartStore, cart_id_from_cookie, guest_carts
+
+@pytest.fixture
+def guest(client):
+    """A browser of its own, so the guest cart cookie doesn't leak into other tests"""
+    return TestClient(client.app)
+
+def _register(client, username: str):
+    response = client.post("/register", json={"email": f"{username}@fvtest.com", "username": username, "password": "testpass123"})
+    assert response.status_code == 200, response.text
+
+def _sign_in(guest, username: str):
+    return guest.post("/token", data={"username": username, "password": "testpass123"})
+
+def test_sign_in_merges_guest_cart(client, guest, make_product):
+    product = make_product()
+    assert guest.post("/guest/cart/add", json={"product_id": product["id"], "quantity": 2}).status_code == 200
+    cart_id = cart_id_from_cookie(guest.cookies[GUEST_CART_COOKIE])
+    _register(client, "merger")
+
+    token = _sign_in(guest, "merger").json()["access_token"]
+
+    cart = guest.get("/cart", headers={"Authorization": f"Bearer {token}"}).json()
+    assert [(item["product_id"], item["quantity"]) for item in cart["items"]] == [(product["id"], 2)]
+    assert guest_carts.get(cart_id) == {}
+
+def test_failed_merge_keeps_guest_cart(client, guest, make_product, monkeypatch):
+    product = make_product()
+    guest.post("/guest/cart/add", json={"product_id": product["id"], "quantity": 3})
+    cart_id = cart_id_from_cookie(guest.cookies[GUEST_CART_COOKIE])
+    _register(client, "unlucky")
+
+    import app.main
+    def fail(*args, **kwargs):
+        raise RuntimeError("database went away")
+    monkeypatch.setattr(app.main, "add_cart_items", fail)
+    with pytest.raises(RuntimeError):
+        _sign_in(guest, "unlucky")
+
+    assert guest_carts.get(cart_id) == {product["id"]: 3}
+
+def test_remove_items_keeps_later_additions(tmp_path):
+    store = GuestCartStore(str(tmp_path / "carts" / "guest_carts.db"))
+    store.add("cart", 1, 2)
+    merged = store.get("cart")
+    store.add("cart", 1, 1)  # Added while the merge was running
+    store.add("cart", 2, 4)
+
+    assert store.remove_items("cart", merged) == {1: 1, 2: 4}
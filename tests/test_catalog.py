@@ -0,0 +1,43 @@
+"""The catalog snapshot follows checkouts and repricing by patching itself, not by reloading every product"""
+import pytest
+from app.catalog import CatalogSnapshot, catalog
+
+@pytest.fixture
+def snapshot_calls(monkeypatch):
+    """Counts of full snapshot builds and of incremental stock and price patches"""
+    calls = {"full": 0, "stock": 0, "prices": 0}
+    build, with_stock, with_prices = CatalogSnapshot.__init__, CatalogSnapshot.with_stock_changes, CatalogSnapshot.with_price_changes
+
+    def counted(name, method):
+        def wrapper(*args, **kwargs):
+            calls[name] += 1
+            return method(*args, **kwargs)
+        return wrapper
+
+    monkeypatch.setattr(CatalogSnapshot, "__init__", counted("full", build))
+    monkeypatch.setattr(CatalogSnapshot, "with_stock_changes", counted("stock", with_stock))
+    monkeypatch.setattr(CatalogSnapshot, "with_price_changes", counted("prices", with_prices))
+    return calls
+
+def test_checkout_patches_stock(client, make_product, shopper_headers, snapshot_calls):
+    product = make_product(stock=20)
+    assert client.get(f"/products/{product['id']}").json()["stock_quantity"] == 20
+    snapshot_calls.update(full=0)
+
+    client.post("/cart/add", json={"product_id": product["id"], "quantity": 3}, headers=shopper_headers)
+    response = client.post("/orders", json={"delivery_address": "1 Main Road, Koramangala, Bengaluru 560034"}, headers=shopper_headers)
+    assert response.status_code == 200, response.text
+
+    assert client.get(f"/products/{product['id']}").json()["stock_quantity"] == 17
+    assert snapshot_calls == {"full": 0, "stock": 1, "prices": 0}
+
+def test_price_change_patches_prices(client, make_product, admin_headers, snapshot_calls):
+    product = make_product(price="40.00")
+    catalog.snapshot()
+    snapshot_calls.update(full=0)
+
+    response = client.put(f"/products/{product['id']}/price", json={"price": "45.50"}, headers=admin_headers)
+    assert response.status_code == 200, response.text
+
+    assert client.get(f"/products/{product['id']}").json()["price"] == "45.50"
+    assert snapshot_calls == {"full": 0, "stock": 0, "prices": 1}
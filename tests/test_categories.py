@@ -0,0 +1,17 @@
+"""Category writes answer from the rows they committed, not from a tree load that may predate them"""
+import app.main as main
+
+def test_create_and_move_answer_from_committed_rows(client, admin_headers, monkeypatch):
+    stale = main._load_category_tree()  # A shared tree load that started before the writes below
+    monkeypatch.setattr(main, "_load_category_tree", lambda: stale)
+
+    parent = client.post("/categories", json={"name": "Citrus"}, headers=admin_headers)
+    assert parent.status_code == 200, parent.text
+    child = client.post("/categories", json={"name": "Lemons", "parent_id": parent.json()["id"]}, headers=admin_headers)
+    assert child.status_code == 200, child.text
+    assert child.json()["parent_id"] == parent.json()["id"]
+    assert child.json()["subtree_product_count"] == 0
+
+    moved = client.put(f"/categories/{child.json()['id']}/parent", json={"parent_id": None}, headers=admin_headers)
+    assert moved.status_code == 200, moved.text
+    assert moved.json()["parent_id"] is None
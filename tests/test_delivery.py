@@ -0,0 +1,40 @@
+"""A delivery plan that races another run is planned again instead of failing"""
+from sqlalchemy import func, select
+import app.delivery as delivery
+from app.database import SessionLocal
+from app.models import DeliveryBatchOrder
+
+def test_plan_racing_another_run(client, make_product, shopper_headers, admin_headers, monkeypatch):
+    product = make_product()
+    client.post("/cart/add", json={"product_id": product["id"], "quantity": 1}, headers=shopper_headers)
+    order = client.post("/orders", json={"delivery_address": "4 Park Street, Indiranagar, Bengaluru 560038"}, headers=shopper_headers).json()
+    client.post("/admin/orders/status/bulk", json={"status": "confirmed", "order_ids": [order["id"]]}, headers=admin_headers)
+
+    # The admin run reads the unbatched orders, then the planning job batches them and commits before it writes
+    address_key, plan_deliveries = delivery.address_key, delivery.plan_deliveries
+    runs = []
+    def competing_run(address):
+        if "job" not in runs:
+            runs.append("job")
+            db = SessionLocal()
+            try:
+                plan_deliveries(db)
+                db.commit()
+            finally:
+                db.close()
+        return address_key(address)
+    def counted_plan(db, capacity):
+        runs.append("admin")
+        return plan_deliveries(db, capacity)
+    monkeypatch.setattr(delivery, "address_key", competing_run)
+    monkeypatch.setattr(delivery, "plan_deliveries", counted_plan)
+
+    response = client.post("/admin/delivery/plan", headers=admin_headers)
+
+    assert response.status_code == 200, response.text
+    assert runs == ["admin", "job", "admin"]
+    db = SessionLocal()
+    try:
+        assert db.scalar(select(func.count()).where(DeliveryBatchOrder.order_id == order["id"])) == 1
+    finally:
+        db.close()
@@ -0,0 +1,44 @@
+"""Bulk status moves: a dry run only reports, a real one moves the orders and logs each move"""
+
+def _place_order(client, make_product, shopper_headers) -> dict:
+    product = make_product()
+    client.post("/cart/add", json={"product_id": product["id"], "quantity": 1}, headers=shopper_headers)
+    response = client.post("/orders", json={"delivery_address": "1 Main Road, Koramangala, Bengaluru 560034"}, headers=shopper_headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def _move(client, admin_headers, order_ids, status, dry_run=False) -> dict:
+    response = client.post(
+        "/admin/orders/status/bulk", json={"status": status, "order_ids": order_ids, "dry_run": dry_run}, headers=admin_headers
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def test_dry_run_reports_would_apply(client, make_product, shopper_headers, admin_headers):
+    order = _place_order(client, make_product, shopper_headers)
+
+    report = _move(client, admin_headers, [order["id"]], "confirmed", dry_run=True)
+
+    assert report["counts"] == {"would_apply": 1}
+    assert report["results"] == [{"order_id": order["id"], "result": "would_apply", "previous_status": "pending"}]
+    assert client.get(f"/orders/{order['id']}", headers=shopper_headers).json()["status"] == "pending"
+    assert client.get(f"/admin/orders/{order['id']}/status-history", headers=admin_headers).json() == []
+
+def test_moves_are_logged(client, make_product, shopper_headers, admin_headers):
+    order = _place_order(client, make_product, shopper_headers)
+
+    assert _move(client, admin_headers, [order["id"], 999999999], "confirmed")["counts"] == {"applied": 1, "not_found": 1}
+    assert _move(client, admin_headers, [order["id"]], "processing")["counts"] == {"applied": 1}
+
+    history = client.get(f"/admin/orders/{order['id']}/status-history", headers=admin_headers).json()
+    assert [(move["from_status"], move["to_status"]) for move in history] == [("pending", "confirmed"), ("confirmed", "processing")]
+    assert client.get("/admin/orders/999999999/status-history", headers=admin_headers).status_code == 404
+
+def test_targets_are_order_ids_or_a_filter(client, admin_headers):
+    def rejected(payload) -> str:
+        response = client.post("/admin/orders/status/bulk", json={"status": "confirmed", **payload}, headers=admin_headers)
+        assert response.status_code == 422
+        return response.json()["detail"][0]["msg"]
+
+    assert rejected({}).endswith("Give order_ids or a filter")
+    assert rejected({"order_ids": [1], "filter": {"status": "pending"}}).endswith("Give order_ids or a filter, not both")
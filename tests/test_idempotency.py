@@ -0,0 +1,113 @@
+"""Duplicate requests with one Idempotency-Key run once, even when they race each other in different workers"""
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import pytest
+from app.database import SessionLocal
+from app.idempotency import IdempotencyStore
+from app.models import Category
+
+# One "worker": claims the key when told to start, and holds it for a while before saving its response
+_WORKER = """
+import sys, time
+from fastapi import HTTPException
+from pydantic import BaseModel
+from app.database import SessionLocal
+from app.idempotency import IdempotencyStore
+
+class Placed(BaseModel):
+    worker: int
+
+key, worker, start = sys.argv[1], int(sys.argv[2]), float(sys.argv[3])
+time.sleep(max(0.0, start - time.time()))
+try:
+    with IdempotencyStore().claim(key, "fingerprint") as slot:
+        if slot.replayed:
+            print("replayed", slot.response.body.decode())
+            sys.exit()
+        time.sleep(0.5)
+        db = SessionLocal()
+        try:
+            slot.save(Placed(worker=worker), db)
+            db.commit()
+        finally:
+            db.close()
+        print("ran")
+except HTTPException as error:
+    print(error.status_code)
+"""
+
+def test_racing_workers_run_once(client):
+    key = f"race:{uuid.uuid4()}"
+    start = time.time() + 3  # Once every process has imported the app
+    workers = [
+        subprocess.Popen([sys.executable, "-c", _WORKER, key, str(worker), str(start)],
+                         cwd=Path(__file__).parent.parent, stdout=subprocess.PIPE, text=True)
+        for worker in range(4)
+    ]
+    outcomes = [worker.communicate(timeout=60)[0].strip() for worker in workers]
+    assert outcomes.count("ran") == 1, outcomes
+    assert all(outcome in ("ran", "409") or outcome.startswith("replayed") for outcome in outcomes), outcomes
+
+    # Once the winner committed, a retry replays its response
+    with IdempotencyStore().claim(key, "fingerprint") as slot:
+        assert slot.replayed
+        assert slot.response.body == f'{{"worker":{outcomes.index("ran")}}}'.encode()
+
+def test_racing_duplicate_orders_place_one(client, make_product, shopper_headers):
+    product = make_product(stock=10)
+    client.post("/cart/add", json={"product_id": product["id"], "quantity": 2}, headers=shopper_headers)
+    headers = {**shopper_headers, "Idempotency-Key": str(uuid.uuid4())}
+
+    def place(_):
+        return client.post("/orders", json={"delivery_address": "1 Main Road, Koramangala, Bengaluru 560034"}, headers=headers)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        responses = list(pool.map(place, range(8)))
+
+    placed = {response.json()["order_number"] for response in responses if response.status_code == 200}
+    assert all(response.status_code in (200, 409) for response in responses), [r.text for r in responses]
+    assert len(placed) == 1
+    assert len(client.get("/orders", headers=shopper_headers).json()) == 1
+    assert client.get(f"/products/{product['id']}").json()["stock_quantity"] == 8
+
+def test_failed_request_releases_key(client, shopper_headers):
+    headers = {**shopper_headers, "Idempotency-Key": str(uuid.uuid4())}
+    order = {"delivery_address": "1 Main Road, Koramangala, Bengaluru 560034"}
+
+    assert client.post("/orders", json=order, headers=headers).status_code == 400  # Cart is empty
+    assert client.post("/orders", json=order, headers=headers).status_code == 400  # Runs again rather than replaying
+
+def test_key_reused_for_another_request(client, make_product, shopper_headers):
+    product = make_product()
+    headers = {**shopper_headers, "Idempotency-Key": str(uuid.uuid4())}
+
+    first = client.post("/cart/add", json={"product_id": product["id"], "quantity": 1}, headers=headers)
+    retry = client.post("/cart/add", json={"product_id": product["id"], "quantity": 1}, headers=headers)
+    other = client.post("/cart/add", json={"product_id": product["id"], "quantity": 2}, headers=headers)
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json()
+    assert other.status_code == 422
+    assert client.get("/cart", headers=shopper_headers).json()["items"][0]["quantity"] == 1
+
+def test_failure_after_a_write_releases_key(client):
+    key = f"flushed:{uuid.uuid4()}"
+    db = SessionLocal()
+    started = time.monotonic()
+    try:
+        # The flushed row holds the SQLite write lock until the session rolls back
+        with pytest.raises(RuntimeError):
+            with IdempotencyStore().claim(key, "fingerprint", db) as slot:
+                db.add(Category(name=f"Flushed {key}"))
+                db.flush()
+                raise RuntimeError("checkout failed")
+    finally:
+        db.close()
+    assert time.monotonic() - started < 5
+
+    with IdempotencyStore().claim(key, "fingerprint") as slot:  # Released, so the retry runs rather than getting a 409
+        assert not slot.replayed
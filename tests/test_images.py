@@ -0,0 +1,79 @@
+"""Thumbnail cache reads, writes and eviction scans stay off the event loop"""
+import asyncio
+import io
+import threading
+import pytest
+from PIL import Image
+import app.images
+from app.images import DiskCache, ImageService, ImageUnavailable
+
+@pytest.fixture
+def static_picture(tmp_path, monkeypatch):
+    """A PNG served from a temporary /frontend directory; returns its bytes"""
+    static = tmp_path / "static"
+    static.mkdir()
+    picture = io.BytesIO()
+    Image.new("RGB", (800, 600), "green").save(picture, "PNG")
+    (static / "tomato.png").write_bytes(picture.getvalue())
+    monkeypatch.setattr(app.images, "IMAGE_STATIC_DIR", str(static))
+    return picture.getvalue()
+
+@pytest.fixture
+def disk_threads(monkeypatch):
+    """Names of the threads each DiskCache method ran on"""
+    threads = {"get": set(), "put": set(), "evict": set()}
+    for name in threads:
+        method = getattr(DiskCache, name)
+        def recorded(self, *args, _name=name, _method=method):
+            threads[_name].add(threading.current_thread().name)
+            return _method(self, *args)
+        monkeypatch.setattr(DiskCache, name, recorded)
+    return threads
+
+def test_cache_io_runs_in_the_thread_pool(tmp_path, static_picture, disk_threads):
+    # Small enough that storing the variant evicts
+    service = ImageService(DiskCache(str(tmp_path / "cache"), max_bytes=len(static_picture) + 100), workers=1)
+
+    async def thumbnail():
+        digest = await service.resolve("/frontend/tomato.png")
+        return await service.variant(digest, 320, "webp")
+
+    try:
+        assert asyncio.run(thumbnail())[:4] == b"RIFF"
+    finally:
+        service.close()
+
+    assert disk_threads["get"] and disk_threads["put"] and disk_threads["evict"]
+    assert threading.main_thread().name not in set().union(*disk_threads.values())
+
+def test_render_outlives_the_request_that_started_it(tmp_path, static_picture):
+    service = ImageService(DiskCache(str(tmp_path / "cache")), workers=1)
+
+    async def thumbnails():
+        digest = await service.resolve("/frontend/tomato.png")
+        first = asyncio.ensure_future(service.variant(digest, 320, "webp"))
+        await asyncio.sleep(0.05)  # The render is under way
+        joined = asyncio.ensure_future(service.variant(digest, 320, "webp"))
+        await asyncio.sleep(0.05)
+        first.cancel()  # Its client disconnected
+        data = await joined
+        return first, data, f"{digest}-320.webp" in service.cache
+
+    try:
+        first, data, cached = asyncio.run(thumbnails())
+    finally:
+        service.close()
+    assert first.cancelled()
+    assert data[:4] == b"RIFF"
+    assert cached
+
+@pytest.mark.parametrize("image_url", [
+    "http://127.0.0.1/tomato.png", "http://169.254.169.254/latest/meta-data/", "http://[::1]/tomato.png",
+    "http://10.0.0.5/tomato.png", "http://localhost:8000/frontend/tomato.png",
+])
+def test_internal_hosts_are_not_fetched(image_url, monkeypatch):
+    opened = []
+    monkeypatch.setattr(app.images._opener, "open", lambda request, **kwargs: opened.append(request.full_url))
+    with pytest.raises(ImageUnavailable):
+        ImageService(workers=1)._read_source(image_url)
+    assert not opened
@@ -0,0 +1,71 @@
+"""Finished jobs are purged after their retention, and inline mode still runs periodic jobs"""
+import threading
+from datetime import datetime, timedelta
+from app import jobs
+from app.database import SessionLocal
+from app.models import Job, JobStatus
+
+def _job(status: JobStatus, age: timedelta) -> Job:
+    return Job(kind="test.noop", payload="{}", status=status, attempts=1, max_attempts=1, run_at=datetime.utcnow() - age)
+
+def test_purge_keeps_unfinished_and_recent_jobs(client):
+    db = SessionLocal()
+    try:
+        old, recent = timedelta(days=8), timedelta(hours=1)
+        kept = [_job(JobStatus.PENDING, old), _job(JobStatus.RUNNING, old), _job(JobStatus.SUCCEEDED, recent)]
+        purged = [_job(JobStatus.SUCCEEDED, old), _job(JobStatus.FAILED, old)]
+        db.add_all(kept + purged)
+        db.commit()
+        kept_ids, purged_ids = [job.id for job in kept], [job.id for job in purged]
+
+        assert jobs.purge_finished_jobs(db, retention_seconds=7 * 24 * 3600) >= 2
+
+        remaining = {job_id for (job_id,) in db.query(Job.id).filter(Job.id.in_(kept_ids + purged_ids))}
+        assert remaining == set(kept_ids)
+    finally:
+        db.close()
+
+def test_inline_worker_runs_periodic_jobs(client, monkeypatch):
+    ran = threading.Event()
+    monkeypatch.setattr(jobs, "JOBS_INLINE", True)
+    monkeypatch.setattr(jobs, "_periodic", {"test.tick": 0.05})
+    monkeypatch.setitem(jobs._handlers, "test.tick", lambda db, payload: ran.set())
+
+    thread = jobs.start_inline_worker()
+    try:
+        assert ran.wait(5)
+    finally:
+        jobs.stop_inline_worker()
+        thread.join(5)
+    assert not thread.is_alive()
+
+def test_inline_mode_survives_a_slot_queued_elsewhere(client, monkeypatch):
+    ran = []
+    monkeypatch.setattr(jobs, "JOBS_INLINE", True)
+    monkeypatch.setattr(jobs, "_periodic", {"test.slot": 3600})
+    monkeypatch.setitem(jobs._handlers, "test.slot", lambda db, payload: ran.append("slot"))
+    monkeypatch.setitem(jobs._handlers, "test.after", lambda db, payload: ran.append("after"))
+
+    # Another worker queues the same slot between this one's check and its commit
+    enqueue = jobs.enqueue
+    def racing_enqueue(db, kind, payload=None, idempotency_key=None, **kwargs):
+        job = enqueue(db, kind, payload, idempotency_key=idempotency_key, **kwargs)
+        other = SessionLocal()
+        try:
+            other.add(Job(kind=kind, payload="{}", idempotency_key=idempotency_key, status=JobStatus.SUCCEEDED,
+                          attempts=1, max_attempts=1, run_at=datetime.utcnow()))
+            other.commit()
+        finally:
+            other.close()
+        return job
+    monkeypatch.setattr(jobs, "enqueue", racing_enqueue)
+
+    db = SessionLocal()
+    try:
+        jobs.schedule_periodic_jobs(db)  # Rolls back on the duplicate slot
+        monkeypatch.setattr(jobs, "enqueue", enqueue)
+        jobs.enqueue(db, "test.after")
+        db.commit()  # Runs only the job from this transaction
+    finally:
+        db.close()
+    assert ran == ["after"]
@@ -0,0 +1,23 @@
+"""Load shedding admits checkout writes first and only learns from requests that did real work"""
+from app.loadshed import CRITICAL, LOW, NORMAL, ConcurrencyLimiter, LoadSheddingMiddleware, priority_for
+from app.ratelimit import RateLimitMiddleware
+
+def test_checkout_writes_are_critical():
+    assert priority_for("POST", "/orders") == CRITICAL
+    assert priority_for("POST", "/cart/add") == CRITICAL
+    assert priority_for("POST", "/token") == CRITICAL
+    assert priority_for("GET", "/orders") == NORMAL
+    assert priority_for("GET", "/cart") == NORMAL
+    assert priority_for("GET", "/admin/orders") == LOW
+    assert priority_for("GET", "/health") is None
+
+def test_rate_limiter_runs_before_load_shedding(client):
+    layers = [middleware.cls for middleware in client.app.user_middleware]  # Outermost first
+    assert layers.index(RateLimitMiddleware) < layers.index(LoadSheddingMiddleware)
+
+def test_rejections_are_not_latency_samples():
+    limiter = ConcurrencyLimiter(max_limit=10, enabled=True)
+    assert limiter.try_acquire(NORMAL)
+    limiter.release(NORMAL, 0.001, sample=False)
+    assert limiter.in_flight == 0
+    assert limiter._window == []
@@ -0,0 +1,52 @@
+"""Scheduled prices show up in point-in-time lookups from their effective time, and reach products when applied"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+from app.database import SessionLocal
+from app.models import Category, Product
+from app.pricing import apply_due_prices, price_history
+
+def _price_at(client, admin_headers, product_id: int, at: datetime) -> Decimal:
+    response = client.get("/admin/prices", params={"at": at.isoformat(), "product_id": product_id}, headers=admin_headers)
+    assert response.status_code == 200, response.text
+    return Decimal(str(response.json()[0]["price"]))
+
+def test_scheduled_price_takes_effect_at_its_time(client, make_product, admin_headers):
+    product = make_product(price="50.00")
+    effective_from = datetime.utcnow() + timedelta(hours=1)
+    response = client.put(
+        f"/products/{product['id']}/price", json={"price": "60.00", "effective_from": effective_from.isoformat()},
+        headers=admin_headers,
+    )
+    assert response.status_code == 200, response.text
+    assert Decimal(str(response.json()["price"])) == Decimal("50.00")  # Not yet
+
+    assert _price_at(client, admin_headers, product["id"], effective_from - timedelta(minutes=1)) == Decimal("50.00")
+    assert _price_at(client, admin_headers, product["id"], effective_from + timedelta(minutes=1)) == Decimal("60.00")
+
+    db = SessionLocal()
+    try:
+        assert product["id"] in apply_due_prices(db, now=effective_from + timedelta(minutes=1))
+        db.commit()
+        assert db.get(Product, product["id"]).price == Decimal("60.00")
+    finally:
+        db.close()
+
+def test_bulk_loaded_products_get_one_opening_price(client):
+    import app.main
+    db = SessionLocal()
+    try:
+        category = Category(name="Bulk loaded vegetables")
+        db.add(category)
+        db.flush()
+        product = Product(name="Bulk loaded onion", price=Decimal("22.00"), category_id=category.id, stock_quantity=5, is_active=True)
+        db.add(product)
+        db.commit()
+        assert price_history(db, product.id) == []
+
+        app.main.reconcile_bulk_loads()
+        app.main.reconcile_bulk_loads()  # As a second worker starting up would
+
+        db.expire_all()
+        assert [entry.price for entry in price_history(db, product.id)] == [Decimal("22.00")]
+    finally:
+        db.close()
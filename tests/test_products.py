@@ -0,0 +1,20 @@
+"""Product writes reject values the dedicated stock and price endpoints would refuse"""
+
+def test_negative_opening_stock_is_rejected(client, admin_headers):
+    category = client.post("/categories", json={"name": "Opening stock checks"}, headers=admin_headers).json()
+    response = client.post(
+        "/products", json={"name": "Minus carrots", "price": "20.00", "category_id": category["id"], "stock_quantity": -5},
+        headers=admin_headers,
+    )
+    assert response.status_code == 422
+
+def test_update_rejects_non_positive_price(client, make_product, admin_headers):
+    product = make_product(price="30.00")
+    history = client.get(f"/products/{product['id']}/prices", headers=admin_headers).json()
+
+    for price in ("0", "-1.00"):
+        response = client.put(f"/products/{product['id']}", json={"price": price}, headers=admin_headers)
+        assert response.status_code == 422
+
+    assert client.get(f"/products/{product['id']}").json()["price"] == "30.00"
+    assert client.get(f"/products/{product['id']}/prices", headers=admin_headers).json() == history
@@ -0,0 +1,79 @@
+"""Promotions and coupons price the cart and checkout, only within their window and with a valid code"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+import uuid
+import pytest
+from app.database import SessionLocal
+from app.models import OrderDiscount
+
+ADDRESS = {"delivery_address": "1 Main Road, Koramangala, Bengaluru 560034"}
+
+@pytest.fixture
+def promote(client, admin_headers):
+    """Create promotions, deactivated again after the test so they don't discount other tests' carts"""
+    created = []
+
+    def create(**rule) -> dict:
+        response = client.post("/admin/promotions", json={"name": f"Promotion {len(created) + 1}", **rule}, headers=admin_headers)
+        assert response.status_code == 200, response.text
+        created.append(response.json()["id"])
+        return response.json()
+
+    yield create
+    for promotion_id in created:
+        client.put(f"/admin/promotions/{promotion_id}", json={"is_active": False}, headers=admin_headers)
+
+def _amounts(cart: dict) -> tuple:
+    return tuple(Decimal(str(cart[name])) for name in ("subtotal_amount", "discount_amount", "total_amount"))
+
+def test_category_promotion_prices_cart_and_order(client, make_product, shopper_headers, promote):
+    product = make_product(price="50.00")
+    promotion = promote(kind="percentage", value="10", category_id=product["category_id"])
+    client.post("/cart/add", json={"product_id": product["id"], "quantity": 2}, headers=shopper_headers)
+
+    cart = client.get("/cart", headers=shopper_headers).json()
+    assert _amounts(cart) == (Decimal("100.00"), Decimal("10.00"), Decimal("90.00"))
+    assert [discount["promotion_id"] for discount in cart["discounts"]] == [promotion["id"]]
+
+    response = client.post("/orders", json=ADDRESS, headers=shopper_headers)
+    assert response.status_code == 200, response.text
+    assert Decimal(str(response.json()["total_amount"])) == Decimal("90.00")
+    db = SessionLocal()
+    try:
+        discounts = db.query(OrderDiscount).filter(OrderDiscount.order_id == response.json()["id"]).all()
+    finally:
+        db.close()
+    assert [(discount.promotion_id, discount.amount) for discount in discounts] == [(promotion["id"], Decimal("10.00"))]
+
+def test_coupon_applies_only_with_its_code(client, make_product, shopper_headers, promote):
+    product = make_product(price="40.00")
+    code = f"SAVE{uuid.uuid4().hex[:6]}".upper()
+    promote(kind="fixed", value="5", product_id=product["id"], code=code)
+    client.post("/cart/add", json={"product_id": product["id"], "quantity": 1}, headers=shopper_headers)
+
+    assert _amounts(client.get("/cart", headers=shopper_headers).json())[1] == Decimal("0.00")
+    assert _amounts(client.get(f"/cart?coupon={code.lower()}", headers=shopper_headers).json())[1] == Decimal("5.00")
+
+def test_invalid_coupon_is_rejected(client, make_product, shopper_headers):
+    product = make_product()
+    client.post("/cart/add", json={"product_id": product["id"], "quantity": 1}, headers=shopper_headers)
+
+    assert client.get("/cart?coupon=NOSUCHCODE", headers=shopper_headers).status_code == 400
+    response = client.post("/orders", json={**ADDRESS, "coupon_code": "NOSUCHCODE"}, headers=shopper_headers)
+    assert response.status_code == 400
+    assert len(client.get("/orders", headers=shopper_headers).json()) == 0
+
+def test_promotions_outside_their_window_are_ignored(client, make_product, shopper_headers, promote):
+    product = make_product(price="30.00")
+    now = datetime.utcnow()
+    promote(kind="percentage", value="50", product_id=product["id"], starts_at=(now + timedelta(days=1)).isoformat())
+    promote(
+        kind="percentage", value="50", product_id=product["id"],
+        starts_at=(now - timedelta(days=2)).isoformat(), ends_at=(now - timedelta(days=1)).isoformat(),
+    )
+    client.post("/cart/add", json={"product_id": product["id"], "quantity": 1}, headers=shopper_headers)
+
+    cart = client.get("/cart", headers=shopper_headers).json()
+    assert _amounts(cart) == (Decimal("30.00"), Decimal("0.00"), Decimal("30.00"))
+    response = client.post("/orders", json=ADDRESS, headers=shopper_headers)
+    assert Decimal(str(response.json()["total_amount"])) == Decimal("30.00")
@@ -0,0 +1,43 @@
+"""Every bucket store backend enforces the same budget, and database buckets are taken off the event loop"""
+import asyncio
+import threading
+import uuid
+import pytest
+from app.ratelimit import BucketStore, DatabaseBucketStore, MemoryBucketStore, RateLimiter, RateLimitMiddleware, RateLimitRule
+
+def test_store_interface_is_abstract():
+    with pytest.raises(TypeError):
+        BucketStore()
+
+@pytest.mark.parametrize("store_class", [MemoryBucketStore, DatabaseBucketStore])
+def test_burst_then_throttle(client, store_class):
+    store, key = store_class(), f"test:{uuid.uuid4()}"
+    assert all(store.take(key, capacity=3, refill_per_second=0.5)[0] for _ in range(3))
+    allowed, retry_after = store.take(key, capacity=3, refill_per_second=0.5)
+    assert not allowed
+    assert 0 < retry_after <= 2
+
+def test_database_buckets_are_taken_in_a_worker_thread(client):
+    threads = []
+
+    class RecordedStore(DatabaseBucketStore):
+        def take(self, *args, **kwargs):
+            threads.append(threading.current_thread())
+            return super().take(*args, **kwargs)
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def request():
+        sent = []
+        async def send(message):
+            sent.append(message)
+        scope = {"type": "http", "method": "POST", "path": "/limited", "headers": [], "client": ("10.9.0.1", 1)}
+        await middleware(scope, None, send)
+        return sent[0]["status"]
+
+    limiter = RateLimiter([RateLimitRule(f"limited:{uuid.uuid4()}", "POST", "/limited", capacity=1, refill_per_second=0.01)], RecordedStore())
+    middleware = RateLimitMiddleware(app, limiter)
+    assert asyncio.run(request()) == 200
+    assert threads and threading.main_thread() not in threads
@@ -0,0 +1,78 @@
+"""Settlement files: unreadable amounts are mismatches, archived orders can be refunded, and only real moves count"""
+import uuid
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import update
+from app.database import SessionLocal
+from app.models import ArchivedOrder, Order, OrderStatus, PaymentStatus
+from app.reconciliation import Reconciler, _paise
+
+def _upload(client, admin_headers, rows):
+    settlement = "order_number,amount,status\n" + "".join(f"{number},{amount},{status}\n" for number, amount, status in rows)
+    response = client.post(
+        "/admin/payments/reconcile", files={"settlement": ("settlement.csv", settlement, "text/csv")}, headers=admin_headers
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def _place_order(client, make_product, shopper_headers) -> dict:
+    product = make_product(price="120.00")
+    client.post("/cart/add", json={"product_id": product["id"], "quantity": 1}, headers=shopper_headers)
+    response = client.post("/orders", json={"delivery_address": "1 Main Road, Koramangala, Bengaluru 560034"}, headers=shopper_headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def test_amounts():
+    assert _paise(" 120.50 ") == 12050
+    assert _paise("120.505") is None
+    for amount in ("Infinity", "-inf", "NaN", "sNaN", "1e999999999", "9" * 20, "abc"):
+        assert _paise(amount) is None, amount
+
+def test_non_finite_amounts_are_mismatches(client, admin_headers):
+    report = _upload(client, admin_headers, [("ORD-X", "Infinity", "success"), ("ORD-Y", "1e999999999", "success")])
+    assert report["mismatch_counts"] == {"invalid_row": 2}
+
+def test_archived_order_refund(client, admin_headers):
+    number = f"ORD-{uuid.uuid4().hex[:8].upper()}"
+    db = SessionLocal()
+    try:
+        db.add(ArchivedOrder(
+            id=10_000_000 + uuid.uuid4().int % 1_000_000, user_id=1, order_number=number, total_amount=Decimal("80.00"),
+            status=OrderStatus.DELIVERED, payment_status=PaymentStatus.COMPLETED, created_at=datetime(2024, 1, 5),
+            archive_month="2024-01",
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+    report = _upload(client, admin_headers, [(number, "80.00", "refunded")])
+    assert report["applied"] == {"refunded": 1}
+    assert report["mismatch_counts"] == {}
+    db = SessionLocal()
+    try:
+        assert db.query(ArchivedOrder).filter(ArchivedOrder.order_number == number).one().payment_status == PaymentStatus.REFUNDED
+    finally:
+        db.close()
+
+def test_conflicts_are_not_counted_as_applied(client, make_product, shopper_headers):
+    order = _place_order(client, make_product, shopper_headers)
+    db = SessionLocal()
+    try:
+        reconciler = Reconciler(db)
+        reconciler.apply(2, order["order_number"], _paise(order["total_amount"]), PaymentStatus.COMPLETED)
+        # The payment moves on in another session before the run writes
+        other = SessionLocal()
+        other.execute(update(Order).where(Order.id == order["id"]).values(payment_status=PaymentStatus.FAILED))
+        other.commit()
+        other.close()
+
+        reconciler.flush()
+        # A later row is checked against the status the order really has, not the one the run failed to write
+        reconciler.apply(3, order["order_number"], _paise(order["total_amount"]), PaymentStatus.COMPLETED)
+        report = reconciler.finish()
+        assert db.get(Order, order["id"]).payment_status == PaymentStatus.COMPLETED
+    finally:
+        db.close()
+    assert report.applied == {"completed": 1}
+    assert report.conflicts == 1
+    assert report.mismatch_counts == {}
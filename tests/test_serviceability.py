@@ -0,0 +1,36 @@
+"""An uploaded serviceability table is what pincode lookups and checkout go by"""
+from datetime import date, datetime, time
+import pytest
+from app.serviceability import Area
+
+def _upload(client, admin_headers, rows: str):
+    return client.post(
+        "/admin/serviceability", files={"areas": ("areas.csv", "prefix,zone,delivery_fee,cutoff,serviceable\n" + rows, "text/csv")},
+        headers=admin_headers,
+    )
+
+@pytest.fixture
+def service_areas(client, admin_headers):
+    yield lambda rows: _upload(client, admin_headers, rows)
+    _upload(client, admin_headers, "")  # Back to accepting every pincode, as the other tests expect
+
+def test_longest_prefix_applies(client, service_areas):
+    response = service_areas("5600,blr-central,30.00,18:00,yes\n560300,,0,,no\n")
+    assert response.status_code == 200, response.text
+    assert response.json() == {"prefixes": 2, "serviceable_prefixes": 1}
+
+    area = client.get("/serviceability/560034").json()
+    assert (area["serviceable"], area["zone"], area["delivery_fee"]) == (True, "blr-central", "30.00")
+    assert client.get("/serviceability/560300").json()["serviceable"] is False
+    assert client.get("/serviceability/110001").json()["serviceable"] is False
+
+def test_invalid_file_is_rejected(service_areas):
+    response = service_areas("56,,abc,,yes\n")
+    assert response.status_code == 400
+
+def test_orders_after_the_cutoff_go_out_the_next_day():
+    area = Area("5600", True, "blr-central", None, time(18, 0))
+    # 12:00 and 12:45 UTC are 17:30 and 18:15 in India
+    assert area.dispatch_date(datetime(2026, 3, 2, 12, 0)) == date(2026, 3, 2)
+    assert area.dispatch_date(datetime(2026, 3, 2, 12, 45)) == date(2026, 3, 3)
+    assert Area("5600", True, "blr-central", None, None).dispatch_date(datetime(2026, 3, 2, 20, 0)) == date(2026, 3, 3)
@@ -0,0 +1,88 @@
+"""A herd of identical cache misses runs the expensive work once; failures and timeouts reach every caller"""
+import asyncio
+import threading
+import time
+import httpx
+import pytest
+from sqlalchemy import delete, event
+from app.cache import cache
+from app.database import engine
+from app.models import PaymentQRCode
+from app.singleflight import SingleFlight, SingleFlightTimeout
+
+HERD = 12  # Under the connection pool's size plus overflow
+
+def _herd(client, path: str, headers: dict) -> list:
+    """HERD identical GETs at once, on one event loop as a worker serves them"""
+    async def run():
+        transport = httpx.ASGITransport(app=client.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as herd_client:
+            return await asyncio.gather(*[herd_client.get(path, headers=headers) for _ in range(HERD)])
+    responses = asyncio.run(run())
+    assert all(response.status_code == 200 for response in responses), [response.text for response in responses]
+    return responses
+
+@pytest.fixture
+def statements():
+    executed = []
+    def record(conn, cursor, statement, *args):
+        executed.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(engine, "before_cursor_execute", record)
+
+def test_category_tree_miss_loads_once(client, make_product, statements):
+    make_product()
+    cache.invalidate("catalog")
+    statements.clear()
+
+    responses = _herd(client, "/categories/tree", {})
+
+    assert sum(statement.lstrip().startswith("SELECT categories.") for statement in statements) == 1
+    assert len({response.content for response in responses}) == 1
+
+def test_qr_code_miss_renders_once(client, make_product, shopper_headers, monkeypatch):
+    import app.payments
+    renders = []
+    render = app.payments.render_qr_code_image
+    monkeypatch.setattr(app.payments, "render_qr_code_image", lambda data: renders.append(data) or render(data))
+
+    product = make_product()
+    client.post("/cart/add", json={"product_id": product["id"], "quantity": 1}, headers=shopper_headers)
+    order = client.post("/orders", json={"delivery_address": "1 Main Road, Koramangala, Bengaluru 560034"}, headers=shopper_headers).json()
+    with engine.begin() as conn:
+        conn.execute(delete(PaymentQRCode).where(PaymentQRCode.order_id == order["id"]))
+
+    _herd(client, f"/orders/{order['id']}/qr-code", shopper_headers)
+
+    assert len(renders) == 1
+
+def test_failure_reaches_every_caller():
+    flights = SingleFlight()
+    calls = []
+
+    def fail():
+        calls.append(threading.get_ident())
+        time.sleep(0.05)
+        raise ValueError("boom")
+
+    async def run():
+        return await asyncio.gather(*[flights.run("key", fail) for _ in range(5)], return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(isinstance(result, ValueError) for result in results)
+
+def test_timeout_leaves_the_flight_running():
+    flights = SingleFlight(timeout=0.05)
+    release = threading.Event()
+
+    async def run():
+        with pytest.raises(SingleFlightTimeout):
+            await flights.run("key", release.wait)
+        assert flights.in_flight() == 1  # A later caller can still join it
+        release.set()
+        return await flights.run("key", release.wait, timeout=5)
+
+    assert asyncio.run(run()) is True
+    assert flights.started == 1 and flights.joined == 1
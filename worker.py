@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Background job worker for FV Commerce
+Run this alongside the web process to execute queued post-checkout jobs:
+
+    python worker.py --processes 2
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+from app.database import engine, Base
+from app.jobs import run_worker, JOB_POLL_INTERVAL
+from app import tasks  # noqa: F401 - registers background job handlers
+
+def start_worker(poll_interval: float):
+    """Entry point for a single worker process"""
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s [worker {os.getpid()}] %(levelname)s %(message)s")
+    engine.dispose()  # Don't share pooled connections with the parent process
+    run_worker(poll_interval=poll_interval)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run FV Commerce background job workers")
+    parser.add_argument("--processes", type=int, default=int(os.environ.get("JOB_WORKERS", 1)), help="number of worker processes")
+    parser.add_argument("--poll-interval", type=float, default=JOB_POLL_INTERVAL, help="seconds to sleep when the queue is empty")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+
+    if args.processes <= 1:
+        start_worker(args.poll_interval)
+    else:
+        workers = [
+            multiprocessing.Process(target=start_worker, args=(args.poll_interval,), daemon=True)
+            for _ in range(args.processes)
+        ]
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join()